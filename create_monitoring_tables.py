@@ -1,11 +1,13 @@
-import sqlite3
 from pathlib import Path
 from conf import BASE_DIR
+from sau_backend.utils.sqlite_pool import get_pool
+
+DB_PATH = Path(BASE_DIR / "db" / "database.db")
 
 def create_monitoring_tables():
     """创建监控相关表"""
     try:
-        with sqlite3.connect(Path(BASE_DIR / "db" / "database.db")) as conn:
+        with get_pool(DB_PATH).session() as conn:
             cursor = conn.cursor()
 
             # 访问日志表
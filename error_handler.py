@@ -345,7 +345,7 @@ def sanitize_input(data: Any) -> Any:
 
 def security_event(event: str, **kwargs):
     """记录安全事件"""
-    logger.security(event, **kwargs)
+    logger.security_event(event, **kwargs)
 
 def get_error_response(error: APIError) -> Dict[str, Any]:
     """获取错误响应格式"""
@@ -11,6 +11,7 @@ import time
 import threading
 import asyncio
 import sqlite3
+from sau_backend.utils.sqlite_pool import get_pool
 from datetime import datetime
 from queue import Queue
 import base64
@@ -23,25 +24,22 @@ CORS(app)
 # 数据库初始化
 def init_database():
     """初始化数据库"""
-    conn = sqlite3.connect('db/database.db')
-    cursor = conn.cursor()
-
-    # 确保db目录存在
-    os.makedirs('db', exist_ok=True)
-
-    # 创建用户信息表（使用原生表结构）
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS user_info (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            type INTEGER NOT NULL,
-            filePath TEXT NOT NULL,
-            userName TEXT NOT NULL,
-            status INTEGER DEFAULT 0
-        )
-    ''')
-
-    conn.commit()
-    conn.close()
+    with get_pool('db/database.db').session() as conn:
+        cursor = conn.cursor()
+
+        # 确保db目录存在
+        os.makedirs('db', exist_ok=True)
+
+        # 创建用户信息表（使用原生表结构）
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS user_info (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                type INTEGER NOT NULL,
+                filePath TEXT NOT NULL,
+                userName TEXT NOT NULL,
+                status INTEGER DEFAULT 0
+            )
+        ''')
 
 # 初始化数据库
 init_database()
@@ -49,34 +47,28 @@ init_database()
 # 活跃的SSE队列
 active_queues = {}
 
-def get_db_connection():
-    """获取数据库连接"""
-    conn = sqlite3.connect('db/database.db')
-    conn.row_factory = sqlite3.Row
-    return conn
+def db_session():
+    """数据库会话：with 块结束时提交（异常时回滚）并归还连接"""
+    return get_pool('db/database.db').session(row_factory=sqlite3.Row)
 
 def create_account_in_db(account_name, platform_type):
     """在数据库中创建账号"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        # 检查账号是否已存在
-        cursor.execute('SELECT * FROM user_info WHERE userName = ?', (account_name,))
-        existing = cursor.fetchone()
+        with db_session() as conn:
+            cursor = conn.cursor()
 
-        if existing:
-            conn.close()
-            return False, "账号已存在"
+            # 检查账号是否已存在
+            cursor.execute('SELECT * FROM user_info WHERE userName = ?', (account_name,))
+            existing = cursor.fetchone()
 
-        # 创建新账号（使用原生表结构）
-        cursor.execute('''
-            INSERT INTO user_info (type, filePath, userName, status)
-            VALUES (?, ?, ?, ?)
-        ''', (int(platform_type), f"cookie_{account_name}.txt", account_name, 1))
+            if existing:
+                return False, "账号已存在"
 
-        conn.commit()
-        conn.close()
+            # 创建新账号（使用原生表结构）
+            cursor.execute('''
+                INSERT INTO user_info (type, filePath, userName, status)
+                VALUES (?, ?, ?, ?)
+            ''', (int(platform_type), f"cookie_{account_name}.txt", account_name, 1))
 
         return True, "账号创建成功"
 
@@ -244,27 +236,25 @@ def login_sse():
 def get_valid_accounts():
     """获取有效账号列表"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        cursor.execute('''
-            SELECT id, type, filePath, userName, status
-            FROM user_info
-            ORDER BY id DESC
-        ''')
-        accounts = cursor.fetchall()
-
-        account_list = []
-        for account in accounts:
-            account_list.append({
-                'id': account['id'],
-                'type': account['type'],
-                'filePath': account['filePath'],
-                'userName': account['userName'],
-                'status': account['status']
-            })
-
-        conn.close()
+        with db_session() as conn:
+            cursor = conn.cursor()
+
+            cursor.execute('''
+                SELECT id, type, filePath, userName, status
+                FROM user_info
+                ORDER BY id DESC
+            ''')
+            accounts = cursor.fetchall()
+
+            account_list = []
+            for account in accounts:
+                account_list.append({
+                    'id': account['id'],
+                    'type': account['type'],
+                    'filePath': account['filePath'],
+                    'userName': account['userName'],
+                    'status': account['status']
+                })
 
         return jsonify({
             'code': 200,
@@ -1,5 +1,4 @@
 import psutil
-import sqlite3
 import threading
 import time
 from datetime import datetime, timedelta
@@ -7,8 +6,19 @@ from pathlib import Path
 from typing import Dict, Any, List, Optional
 from dataclasses import dataclass
 from conf import BASE_DIR
+from sau_backend.utils.sqlite_pool import get_pool
+from sau_backend.utils.batch_writer import get_batch_writer
+from sau_backend.utils.metrics_rollup import estimate_percentile, get_rollup_store
+from sau_backend.utils.system_sampler import system_sampler
 from error_handler import logger, security_event
 
+# 主数据库，连接由连接池按线程复用
+DB_PATH = Path(BASE_DIR / "db" / "database.db")
+
+# 写入汇总表的系统指标字段
+SYSTEM_SERIES = ('cpu_percent', 'memory_percent', 'disk_percent', 'network_sent', 'network_recv',
+                 'active_connections', 'uptime')
+
 @dataclass
 class SystemMetrics:
     """系统指标"""
@@ -42,8 +52,13 @@ class HealthMonitor:
         self.running = False
         self.start_time = datetime.now()
         self.last_network_stats = psutil.net_io_counters()
-        self.metrics_history = []
-        self.max_history_size = 1000
+        # 秒级系统采样（环形缓冲区），监控循环与状态接口都从这里取数
+        self.sampler = system_sampler
+        self.latest_metrics: Optional[Dict[str, Any]] = None
+        # 指标、健康检查与访问日志共用的批量写入器
+        self.writer = get_batch_writer(DB_PATH)
+        # 请求、上传与系统指标的分钟/15分钟/小时汇总，看板查询只读汇总表
+        self.rollups = get_rollup_store(DB_PATH)
 
         # 创建必要的表
         self.create_tables()
@@ -51,7 +66,7 @@ class HealthMonitor:
     def create_tables(self):
         """创建监控相关表"""
         try:
-            with sqlite3.connect(Path(BASE_DIR / "db" / "database.db")) as conn:
+            with get_pool(DB_PATH).session() as conn:
                 cursor = conn.cursor()
 
                 # 系统监控表
@@ -122,6 +137,7 @@ class HealthMonitor:
             return
 
         self.running = True
+        self.sampler.start()
         self.monitor_thread = threading.Thread(target=self._monitor_loop, daemon=True)
         self.monitor_thread.start()
 
@@ -130,6 +146,8 @@ class HealthMonitor:
     def stop_monitoring(self):
         """停止监控"""
         self.running = False
+        self.sampler.stop()
+        self.writer.flush()
         logger.info("健康监控已停止")
 
     def _monitor_loop(self):
@@ -144,16 +162,12 @@ class HealthMonitor:
                 app_metrics = self.collect_application_metrics()
                 self.save_application_metrics(app_metrics)
 
-                # 保存到历史
+                # 保存最新一轮指标
                 with self.metrics_lock:
-                    self.metrics_history.append({
+                    self.latest_metrics = {
                         'system': system_metrics,
                         'application': app_metrics
-                    })
-
-                    # 限制历史大小
-                    if len(self.metrics_history) > self.max_history_size:
-                        self.metrics_history = self.metrics_history[-self.max_history_size:]
+                    }
 
                 # 健康检查
                 self.perform_health_checks()
@@ -171,11 +185,11 @@ class HealthMonitor:
                 time.sleep(30)  # 出错后等待30秒再继续
 
     def collect_system_metrics(self) -> SystemMetrics:
-        """收集系统指标"""
+        """收集系统指标（取自后台采样器，不阻塞）"""
         try:
-            cpu_percent = psutil.cpu_percent(interval=1)
-            memory = psutil.virtual_memory()
-            disk = psutil.disk_usage('/')
+            sample = self.sampler.latest()
+            # CPU 取最近一分钟的均值，避免单点抖动
+            cpu_percent = self.sampler.buffer.stats('cpu_percent', 60)['mean'] or sample['cpu_percent']
             network = psutil.net_io_counters()
 
             # 计算网络流量变化
@@ -186,19 +200,13 @@ class HealthMonitor:
 
             uptime = int((datetime.now() - self.start_time).total_seconds())
 
-            # 安全获取活动连接数
-            try:
-                active_connections = len(psutil.net_connections())
-            except (psutil.AccessDenied, psutil.NoSuchProcess):
-                active_connections = 0
-
             return SystemMetrics(
                 cpu_percent=cpu_percent,
-                memory_percent=memory.percent,
-                disk_percent=disk.percent,
+                memory_percent=sample['memory_percent'],
+                disk_percent=sample['disk_percent'],
                 network_sent=network_sent,
                 network_recv=network_recv,
-                active_connections=active_connections,
+                active_connections=int(sample['connections']),
                 uptime=uptime,
                 timestamp=datetime.now()
             )
@@ -207,100 +215,61 @@ class HealthMonitor:
             return SystemMetrics(0, 0, 0, 0, 0, 0, 0, datetime.now())
 
     def collect_application_metrics(self) -> ApplicationMetrics:
-        """收集应用指标"""
+        """收集应用指标（最近一小时，按分钟汇总计算）"""
         try:
-            with sqlite3.connect(Path(BASE_DIR / "db" / "database.db")) as conn:
-                cursor = conn.cursor()
-
-                # 获取请求统计
-                cursor.execute("""
-                    SELECT COUNT(*) as total_requests,
-                           SUM(CASE WHEN status_code < 400 THEN 1 ELSE 0 END) as successful_requests,
-                           SUM(CASE WHEN status_code >= 400 THEN 1 ELSE 0 END) as failed_requests,
-                           AVG(response_time) as avg_response_time
-                    FROM access_logs
-                    WHERE timestamp > datetime('now', '-1 hour')
-                """)
-                request_stats = cursor.fetchone()
-
-                # 获取上传统计
-                cursor.execute("""
-                    SELECT COUNT(*) as total_uploads,
-                           SUM(CASE WHEN success = 1 THEN 1 ELSE 0 END) as successful_uploads
-                    FROM upload_logs
-                    WHERE timestamp > datetime('now', '-1 hour')
-                """)
-                upload_stats = cursor.fetchone()
-
-                # 获取活跃用户数
-                cursor.execute("""
-                    SELECT COUNT(DISTINCT ip) as active_users
-                    FROM access_logs
-                    WHERE timestamp > datetime('now', '-1 hour')
-                """)
-                active_users = cursor.fetchone()[0]
-
-                total_requests = request_stats[0] or 0
-                successful_requests = request_stats[1] or 0
-                failed_requests = request_stats[2] or 0
-                avg_response_time = request_stats[3] or 0
-
-                total_uploads = upload_stats[0] or 0
-                successful_uploads = upload_stats[1] or 0
-                upload_success_rate = (successful_uploads / total_uploads) if total_uploads > 0 else 0
-
-                return ApplicationMetrics(
-                    total_requests=total_requests,
-                    successful_requests=successful_requests,
-                    failed_requests=failed_requests,
-                    average_response_time=avg_response_time,
-                    active_users=active_users,
-                    database_connections=1,  # 简化处理
-                    upload_count=total_uploads,
-                    upload_success_rate=upload_success_rate,
-                    timestamp=datetime.now()
-                )
+            requests = self.rollups.summary('http', 3600)
+            uploads = self.rollups.summary('upload', 3600)
+
+            total_requests = requests['count']
+            failed_requests = requests['errors']
+            total_uploads = uploads['count']
+            successful_uploads = total_uploads - uploads['errors']
+            upload_success_rate = (successful_uploads / total_uploads) if total_uploads > 0 else 0
+
+            return ApplicationMetrics(
+                total_requests=total_requests,
+                successful_requests=total_requests - failed_requests,
+                failed_requests=failed_requests,
+                average_response_time=requests['avg'],
+                active_users=requests['distinct'],
+                database_connections=get_pool(DB_PATH).get_stats()["connections"],
+                upload_count=total_uploads,
+                upload_success_rate=upload_success_rate,
+                timestamp=datetime.now()
+            )
         except Exception as e:
             logger.error(f"应用指标收集失败: {str(e)}", error=e)
             return ApplicationMetrics(0, 0, 0, 0, 0, 0, 0, 0, datetime.now())
 
     def save_system_metrics(self, metrics: SystemMetrics):
-        """保存系统指标"""
-        try:
-            with sqlite3.connect(Path(BASE_DIR / "db" / "database.db")) as conn:
-                cursor = conn.cursor()
-                cursor.execute('''
-                    INSERT INTO system_metrics (
-                        cpu_percent, memory_percent, disk_percent,
-                        network_sent, network_recv, active_connections, uptime
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?)
-                ''', (
-                    metrics.cpu_percent, metrics.memory_percent, metrics.disk_percent,
-                    metrics.network_sent, metrics.network_recv, metrics.active_connections, metrics.uptime
-                ))
-                conn.commit()
-        except Exception as e:
-            logger.error(f"系统指标保存失败: {str(e)}", error=e)
+        """保存系统指标（交给批量写入器异步落盘）"""
+        for name in SYSTEM_SERIES:
+            self.rollups.record(f'system.{name}', getattr(metrics, name))
+        if not self.writer.submit('system_metrics', {
+            'cpu_percent': metrics.cpu_percent,
+            'memory_percent': metrics.memory_percent,
+            'disk_percent': metrics.disk_percent,
+            'network_sent': metrics.network_sent,
+            'network_recv': metrics.network_recv,
+            'active_connections': metrics.active_connections,
+            'uptime': metrics.uptime,
+        }):
+            logger.warning("系统指标写入队列已满，本次指标被丢弃")
 
     def save_application_metrics(self, metrics: ApplicationMetrics):
-        """保存应用指标"""
-        try:
-            with sqlite3.connect(Path(BASE_DIR / "db" / "database.db")) as conn:
-                cursor = conn.cursor()
-                cursor.execute('''
-                    INSERT INTO application_metrics (
-                        total_requests, successful_requests, failed_requests,
-                        average_response_time, active_users, database_connections,
-                        upload_count, upload_success_rate
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (
-                    metrics.total_requests, metrics.successful_requests, metrics.failed_requests,
-                    metrics.average_response_time, metrics.active_users, metrics.database_connections,
-                    metrics.upload_count, metrics.upload_success_rate
-                ))
-                conn.commit()
-        except Exception as e:
-            logger.error(f"应用指标保存失败: {str(e)}", error=e)
+        """保存应用指标（交给批量写入器异步落盘）"""
+        self.rollups.record('app.database_connections', metrics.database_connections)
+        if not self.writer.submit('application_metrics', {
+            'total_requests': metrics.total_requests,
+            'successful_requests': metrics.successful_requests,
+            'failed_requests': metrics.failed_requests,
+            'average_response_time': metrics.average_response_time,
+            'active_users': metrics.active_users,
+            'database_connections': metrics.database_connections,
+            'upload_count': metrics.upload_count,
+            'upload_success_rate': metrics.upload_success_rate,
+        }):
+            logger.warning("应用指标写入队列已满，本次指标被丢弃")
 
     def perform_health_checks(self):
         """执行健康检查"""
@@ -336,7 +305,7 @@ class HealthMonitor:
 
     def _check_database(self):
         """检查数据库连接"""
-        with sqlite3.connect(Path(BASE_DIR / "db" / "database.db")) as conn:
+        with get_pool(DB_PATH).session() as conn:
             cursor = conn.cursor()
             cursor.execute("SELECT 1")
             cursor.fetchone()
@@ -360,16 +329,12 @@ class HealthMonitor:
 
     def _save_health_check(self, component: str, status: str, message: str, response_time: float):
         """保存健康检查结果"""
-        try:
-            with sqlite3.connect(Path(BASE_DIR / "db" / "database.db")) as conn:
-                cursor = conn.cursor()
-                cursor.execute('''
-                    INSERT INTO health_checks (component, status, message, response_time)
-                    VALUES (?, ?, ?, ?)
-                ''', (component, status, message, response_time))
-                conn.commit()
-        except Exception as e:
-            logger.error(f"健康检查保存失败: {str(e)}", error=e)
+        self.writer.submit('health_checks', {
+            'component': component,
+            'status': status,
+            'message': message,
+            'response_time': response_time,
+        })
 
     def check_alerts(self, system_metrics: SystemMetrics, app_metrics: ApplicationMetrics):
         """检查告警条件"""
@@ -434,7 +399,7 @@ class HealthMonitor:
     def create_alert(self, alert_type: str, severity: str, message: str, component: str = None):
         """创建告警"""
         try:
-            with sqlite3.connect(Path(BASE_DIR / "db" / "database.db")) as conn:
+            with get_pool(DB_PATH).session() as conn:
                 cursor = conn.cursor()
                 cursor.execute('''
                     INSERT INTO alerts (alert_type, severity, message, component)
@@ -457,7 +422,7 @@ class HealthMonitor:
     def cleanup_old_data(self):
         """清理旧数据"""
         try:
-            with sqlite3.connect(Path(BASE_DIR / "db" / "database.db")) as conn:
+            with get_pool(DB_PATH).session() as conn:
                 cursor = conn.cursor()
 
                 # 清理7天前的系统指标
@@ -486,6 +451,11 @@ class HealthMonitor:
 
                 conn.commit()
 
+            # 汇总表按分区整表删除
+            dropped = self.rollups.drop_expired()
+            if dropped:
+                logger.info(f"已删除过期汇总分区: {', '.join(dropped)}")
+
         except Exception as e:
             logger.error(f"数据清理失败: {str(e)}", error=e)
 
@@ -493,21 +463,22 @@ class HealthMonitor:
         """获取系统状态"""
         try:
             with self.metrics_lock:
-                if not self.metrics_history:
+                if not self.latest_metrics:
                     return {"status": "unknown", "message": "暂无监控数据"}
 
-                latest = self.metrics_history[-1]
-                system = latest['system']
-                app = latest['application']
+                system = self.latest_metrics['system']
+                app = self.latest_metrics['application']
+                sample = self.sampler.latest()
 
                 return {
                     "status": "healthy",
                     "system": {
-                        "cpu_percent": system.cpu_percent,
-                        "memory_percent": system.memory_percent,
-                        "disk_percent": system.disk_percent,
-                        "uptime": system.uptime
+                        "cpu_percent": sample['cpu_percent'],
+                        "memory_percent": sample['memory_percent'],
+                        "disk_percent": sample['disk_percent'],
+                        "uptime": int((datetime.now() - self.start_time).total_seconds())
                     },
+                    "recent": self.sampler.summary(300),
                     "application": {
                         "total_requests": app.total_requests,
                         "success_rate": (app.successful_requests / app.total_requests) if app.total_requests > 0 else 0,
@@ -515,6 +486,8 @@ class HealthMonitor:
                         "active_users": app.active_users,
                         "upload_success_rate": app.upload_success_rate
                     },
+                    "log_writer": self.writer.get_stats(),
+                    "sampler": self.sampler.get_stats(),
                     "timestamp": system.timestamp.isoformat()
                 }
         except Exception as e:
@@ -522,56 +495,53 @@ class HealthMonitor:
             return {"status": "error", "message": str(e)}
 
     def get_metrics_history(self, hours: int = 24) -> Dict[str, List[Dict[str, Any]]]:
-        """获取历史指标"""
+        """获取历史指标（按时间窗口自动选择 1分钟/15分钟/1小时 汇总粒度，时间倒序）"""
         try:
-            with sqlite3.connect(Path(BASE_DIR / "db" / "database.db")) as conn:
-                cursor = conn.cursor()
-
-                # 获取系统指标历史
-                cursor.execute("""
-                    SELECT * FROM system_metrics
-                    WHERE timestamp > datetime('now', '-{} hours')
-                    ORDER BY timestamp DESC
-                """.format(hours))
-
-                system_history = []
-                for row in cursor.fetchall():
-                    system_history.append({
-                        "timestamp": row[8],
-                        "cpu_percent": row[1],
-                        "memory_percent": row[2],
-                        "disk_percent": row[3],
-                        "network_sent": row[4],
-                        "network_recv": row[5],
-                        "active_connections": row[6],
-                        "uptime": row[7]
-                    })
-
-                # 获取应用指标历史
-                cursor.execute("""
-                    SELECT * FROM application_metrics
-                    WHERE timestamp > datetime('now', '-{} hours')
-                    ORDER BY timestamp DESC
-                """.format(hours))
-
-                app_history = []
-                for row in cursor.fetchall():
-                    app_history.append({
-                        "timestamp": row[9],
-                        "total_requests": row[1],
-                        "successful_requests": row[2],
-                        "failed_requests": row[3],
-                        "average_response_time": row[4],
-                        "active_users": row[5],
-                        "database_connections": row[6],
-                        "upload_count": row[7],
-                        "upload_success_rate": row[8]
-                    })
+            window = int(hours * 3600)
+            resolution = self.rollups.choose_resolution(window)
+
+            system_by_bucket: Dict[int, Dict[str, Any]] = {}
+            for name in SYSTEM_SERIES:
+                for item in self.rollups.buckets(f'system.{name}', window, resolution):
+                    system_by_bucket.setdefault(item['bucket'], {})[name] = item['avg']
+
+            system_history = [
+                {"timestamp": datetime.fromtimestamp(bucket).isoformat(), **{
+                    name: values.get(name, 0) for name in SYSTEM_SERIES
+                }}
+                for bucket, values in sorted(system_by_bucket.items(), reverse=True)
+            ]
+
+            requests = {item['bucket']: item for item in self.rollups.buckets('http', window, resolution)}
+            uploads = {item['bucket']: item for item in self.rollups.buckets('upload', window, resolution)}
+            connections = {item['bucket']: item['max']
+                           for item in self.rollups.buckets('app.database_connections', window, resolution)}
+
+            app_history = []
+            for bucket in sorted(set(requests) | set(uploads), reverse=True):
+                request_stats = requests.get(bucket)
+                upload_stats = uploads.get(bucket)
+                total_requests = request_stats['count'] if request_stats else 0
+                failed_requests = request_stats['errors'] if request_stats else 0
+                upload_count = upload_stats['count'] if upload_stats else 0
+                app_history.append({
+                    "timestamp": datetime.fromtimestamp(bucket).isoformat(),
+                    "total_requests": total_requests,
+                    "successful_requests": total_requests - failed_requests,
+                    "failed_requests": failed_requests,
+                    "average_response_time": request_stats['avg'] if request_stats else 0,
+                    "p95_response_time": estimate_percentile(request_stats['histogram'], 0.95) if request_stats else None,
+                    "active_users": request_stats.get('distinct', 0) if request_stats else 0,
+                    "database_connections": connections.get(bucket, 0),
+                    "upload_count": upload_count,
+                    "upload_success_rate": (upload_count - upload_stats['errors']) / upload_count if upload_count else 0
+                })
 
-                return {
-                    "system": system_history,
-                    "application": app_history
-                }
+            return {
+                "resolution": resolution.label,
+                "system": system_history,
+                "application": app_history
+            }
         except Exception as e:
             logger.error(f"获取历史指标失败: {str(e)}", error=e)
             return {"system": [], "application": []}
@@ -579,7 +549,7 @@ class HealthMonitor:
     def get_alerts(self, resolved: bool = None, limit: int = 50) -> List[Dict[str, Any]]:
         """获取告警列表"""
         try:
-            with sqlite3.connect(Path(BASE_DIR / "db" / "database.db")) as conn:
+            with get_pool(DB_PATH).session() as conn:
                 cursor = conn.cursor()
 
                 query = "SELECT * FROM alerts"
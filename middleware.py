@@ -1,24 +1,35 @@
-import json
 import time
-import sqlite3
 from datetime import datetime
 from pathlib import Path
 from flask import request, g, jsonify
 from functools import wraps
 from typing import Dict, Any, Optional, Callable
 from conf import BASE_DIR
+from sau_backend.utils.sqlite_pool import get_pool
+from sau_backend.utils.batch_writer import get_batch_writer
+from sau_backend.utils.metrics_rollup import get_rollup_store
+from create_monitoring_tables import create_monitoring_tables
 from error_handler import logger, APIError, security_event, sanitize_input, validate_input
+from sau_backend.utils.rate_limiter import rate_limiter
+# 响应缓存使用共享缓存后端，按路由、查询参数与认证主体区分，支持 ETag/304
+from sau_backend.utils.http_cache import cache_response, invalidate_responses, response_cache
+
+DB_PATH = Path(BASE_DIR / "db" / "database.db")
 
 class RequestMonitor:
     """请求监控中间件"""
 
     def __init__(self, app=None):
         self.app = app
+        # 访问日志与上传日志经批量写入器合并提交，不占用请求线程
+        self.log_writer = get_batch_writer(DB_PATH)
+        self.rollups = get_rollup_store(DB_PATH)
         if app:
             self.init_app(app)
 
     def init_app(self, app):
         """初始化应用"""
+        create_monitoring_tables()
         app.before_request(self.before_request)
         app.after_request(self.after_request)
         app.teardown_request(self.teardown_request)
@@ -69,6 +80,19 @@ class RequestMonitor:
                 response_time=duration,
                 request_id=g.request_id
             )
+            self.log_writer.submit('access_logs', {
+                'method': request.method,
+                'path': request.path,
+                'status_code': response.status_code,
+                'ip': request.remote_addr or '',
+                'user_agent': request.headers.get('User-Agent', ''),
+                'response_time': duration,
+                'request_id': g.request_id,
+            })
+            self.rollups.observe('http', duration, error=response.status_code >= 400,
+                                 member=request.remote_addr)
+            if self._is_upload_request():
+                self._log_upload(response, duration)
 
             # 记录性能日志
             logger.performance(
@@ -81,8 +105,37 @@ class RequestMonitor:
             response.headers['X-Request-ID'] = g.request_id
             response.headers['X-Response-Time'] = f"{duration:.3f}s"
 
+        if getattr(g, 'rate_limit', None) is not None:
+            response.headers.extend(g.rate_limit.headers())
+
         return response
 
+    @staticmethod
+    def _is_upload_request() -> bool:
+        """文件上传请求（分片上传只在合并完成时记一次）"""
+        if request.method != 'POST' or '/upload' not in request.path:
+            return False
+        return not request.path.rstrip('/').endswith('/init')
+
+    def _log_upload(self, response, duration: float):
+        """记录上传日志"""
+        files = [f for f in request.files.values() if f.filename] if request.files else []
+        filename = (', '.join(f.filename for f in files)
+                    or (request.view_args or {}).get('upload_id') or request.path)
+        error_message = None
+        if response.status_code >= 400 and response.is_json:
+            body = response.get_json(silent=True) or {}
+            error_message = body.get('error') or body.get('message')
+        self.log_writer.submit('upload_logs', {
+            'filename': filename,
+            'file_size': request.content_length,
+            'upload_time': duration,
+            'success': response.status_code < 400,
+            'error_message': error_message,
+            'ip': request.remote_addr,
+        })
+        self.rollups.observe('upload', duration, error=response.status_code >= 400)
+
     def teardown_request(self, exception):
         """请求清理"""
         if exception:
@@ -132,45 +185,18 @@ class RequestMonitor:
             raise APIError("请求过大", status_code=413, error_code="REQUEST_TOO_LARGE")
 
     def _rate_limit_check(self):
-        """请求频率限制检查"""
-        # 简单的IP限制
-        ip = request.remote_addr
-        current_time = int(time.time())
-
-        try:
-            with sqlite3.connect(Path(BASE_DIR / "db" / "database.db")) as conn:
-                cursor = conn.cursor()
-
-                # 检查请求频率
-                cursor.execute("""
-                    SELECT COUNT(*) FROM rate_limits
-                    WHERE ip = ? AND timestamp > ?
-                """, (ip, current_time - 60))  # 1分钟内
-
-                count = cursor.fetchone()[0]
-
-                if count > 100:  # 每分钟最多100次请求
-                    security_event("RATE_LIMIT_EXCEEDED",
-                                   ip=ip,
-                                   count=count)
-                    raise APIError("请求频率超限", status_code=429, error_code="RATE_LIMIT_EXCEEDED")
-
-                # 记录请求
-                cursor.execute("""
-                    INSERT INTO rate_limits (ip, timestamp)
-                    VALUES (?, ?)
-                """, (ip, current_time))
-
-                # 清理旧记录
-                cursor.execute("""
-                    DELETE FROM rate_limits
-                    WHERE timestamp < ?
-                """, (current_time - 3600,))  # 清理1小时前的记录
-
-                conn.commit()
-
-        except Exception as e:
-            logger.error(f"频率限制检查失败: {str(e)}", error=e)
+        """请求频率限制检查（进程内滑动窗口计数，配置 Redis 时多进程共享）"""
+        ip = request.remote_addr or 'unknown'
+        result = rate_limiter.check_ip(request.path, ip)
+        g.rate_limit = result
+
+        if not result.allowed:
+            security_event("RATE_LIMIT_EXCEEDED",
+                           ip=ip,
+                           path=request.path,
+                           limit=result.limit)
+            raise APIError("请求频率超限", status_code=429, error_code="RATE_LIMIT_EXCEEDED",
+                           details={"retry_after": round(result.retry_after, 3)})
 
     def handle_api_error(self, error):
         """处理API错误"""
@@ -238,9 +264,9 @@ class RequestMonitor:
         return jsonify(response), 413
 
 def create_rate_limit_table():
-    """创建请求限制表"""
+    """创建请求限制表（旧版按请求写库的限流使用，限流已改为内存计数，保留以兼容旧部署）"""
     try:
-        with sqlite3.connect(Path(BASE_DIR / "db" / "database.db")) as conn:
+        with get_pool(DB_PATH).session() as conn:
             cursor = conn.cursor()
             cursor.execute('''
                 CREATE TABLE IF NOT EXISTS rate_limits (
@@ -338,65 +364,10 @@ def require_auth(f):
 
     return decorated_function
 
-def cache_response(timeout: int = 300):
-    """响应缓存装饰器"""
-    def decorator(f):
-        @wraps(f)
-        def decorated_function(*args, **kwargs):
-            cache_key = f"{request.path}_{request.query_string.decode('utf-8')}"
-
-            # 检查缓存
-            cached_response = get_cache(cache_key)
-            if cached_response:
-                logger.info(f"缓存命中: {cache_key}")
-                return cached_response
-
-            # 执行函数
-            response = f(*args, **kwargs)
-
-            # 设置缓存
-            set_cache(cache_key, response, timeout)
-
-            return response
-
-        return decorated_function
-    return decorator
-
-def get_cache(key: str) -> Optional[Any]:
-    """获取缓存"""
-    try:
-        with sqlite3.connect(Path(BASE_DIR / "db" / "database.db")) as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                SELECT data FROM cache
-                WHERE key = ? AND expires_at > datetime('now')
-            """, (key,))
-
-            result = cursor.fetchone()
-            if result:
-                return json.loads(result[0])
-    except Exception as e:
-        logger.error(f"缓存获取失败: {str(e)}", error=e)
-
-    return None
-
-def set_cache(key: str, value: Any, timeout: int):
-    """设置缓存"""
-    try:
-        with sqlite3.connect(Path(BASE_DIR / "db" / "database.db")) as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                INSERT OR REPLACE INTO cache (key, data, expires_at)
-                VALUES (?, ?, datetime('now', '+{} seconds'))
-            """.format(timeout), (key, json.dumps(value, ensure_ascii=False)))
-            conn.commit()
-    except Exception as e:
-        logger.error(f"缓存设置失败: {str(e)}", error=e)
-
 def create_cache_table():
-    """创建缓存表"""
+    """创建缓存表（旧版响应缓存使用，响应缓存已改用共享缓存后端，保留以兼容旧部署）"""
     try:
-        with sqlite3.connect(Path(BASE_DIR / "db" / "database.db")) as conn:
+        with get_pool(DB_PATH).session() as conn:
             cursor = conn.cursor()
             cursor.execute('''
                 CREATE TABLE IF NOT EXISTS cache (
@@ -11,6 +11,7 @@ import time
 import threading
 import asyncio
 import sqlite3
+from sau_backend.utils.sqlite_pool import get_pool
 from datetime import datetime
 from queue import Queue
 import base64
@@ -28,22 +29,19 @@ def init_database():
     os.makedirs('cookies', exist_ok=True)
     os.makedirs('cookies/douyin_uploader', exist_ok=True)
 
-    conn = sqlite3.connect('db/database.db')
-    cursor = conn.cursor()
-
-    # 创建用户信息表（使用原生表结构）
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS user_info (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            type INTEGER NOT NULL,
-            filePath TEXT NOT NULL,
-            userName TEXT NOT NULL,
-            status INTEGER DEFAULT 0
-        )
-    ''')
+    with get_pool('db/database.db').session() as conn:
+        cursor = conn.cursor()
 
-    conn.commit()
-    conn.close()
+        # 创建用户信息表（使用原生表结构）
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS user_info (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                type INTEGER NOT NULL,
+                filePath TEXT NOT NULL,
+                userName TEXT NOT NULL,
+                status INTEGER DEFAULT 0
+            )
+        ''')
 
 # 初始化数据库
 init_database()
@@ -51,35 +49,29 @@ init_database()
 # 活跃的SSE队列
 active_queues = {}
 
-def get_db_connection():
-    """获取数据库连接"""
-    conn = sqlite3.connect('db/database.db')
-    conn.row_factory = sqlite3.Row
-    return conn
+def db_session():
+    """数据库会话：with 块结束时提交（异常时回滚）并归还连接"""
+    return get_pool('db/database.db').session(row_factory=sqlite3.Row)
 
 def create_account_in_db(account_name, platform_type):
     """在数据库中创建账号"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        with db_session() as conn:
+            cursor = conn.cursor()
 
-        # 检查账号是否已存在
-        cursor.execute('SELECT * FROM user_info WHERE userName = ?', (account_name,))
-        existing = cursor.fetchone()
+            # 检查账号是否已存在
+            cursor.execute('SELECT * FROM user_info WHERE userName = ?', (account_name,))
+            existing = cursor.fetchone()
 
-        if existing:
-            conn.close()
-            return False, "账号已存在"
+            if existing:
+                return False, "账号已存在"
 
-        # 创建新账号（使用原生表结构）
-        cookie_file = f"cookies/douyin_uploader/cookie_{account_name}.json"
-        cursor.execute('''
-            INSERT INTO user_info (type, filePath, userName, status)
-            VALUES (?, ?, ?, ?)
-        ''', (int(platform_type), cookie_file, account_name, 1))
-
-        conn.commit()
-        conn.close()
+            # 创建新账号（使用原生表结构）
+            cookie_file = f"cookies/douyin_uploader/cookie_{account_name}.json"
+            cursor.execute('''
+                INSERT INTO user_info (type, filePath, userName, status)
+                VALUES (?, ?, ?, ?)
+            ''', (int(platform_type), cookie_file, account_name, 1))
 
         return True, "账号创建成功"
 
@@ -335,27 +327,25 @@ def login_sse():
 def get_valid_accounts():
     """获取有效账号列表"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        cursor.execute('''
-            SELECT id, type, filePath, userName, status
-            FROM user_info
-            ORDER BY id DESC
-        ''')
-        accounts = cursor.fetchall()
-
-        account_list = []
-        for account in accounts:
-            account_list.append({
-                'id': account['id'],
-                'type': account['type'],
-                'filePath': account['filePath'],
-                'userName': account['userName'],
-                'status': account['status']
-            })
-
-        conn.close()
+        with db_session() as conn:
+            cursor = conn.cursor()
+
+            cursor.execute('''
+                SELECT id, type, filePath, userName, status
+                FROM user_info
+                ORDER BY id DESC
+            ''')
+            accounts = cursor.fetchall()
+
+            account_list = []
+            for account in accounts:
+                account_list.append({
+                    'id': account['id'],
+                    'type': account['type'],
+                    'filePath': account['filePath'],
+                    'userName': account['userName'],
+                    'status': account['status']
+                })
 
         return jsonify({
             'code': 200,
@@ -1,14 +1,95 @@
 # -*- coding: utf-8 -*-
-from typing import Dict, Optional
+import asyncio
+import os
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 from .providers.base import BaseProvider
 from .providers.zhipu_glm import ZhipuGLM
 from .providers.qwen_dashscope import QwenDashScope
+from ..utils.async_runtime import async_runtime, run_async
+
+def _parse_limits(raw: str, cast=int) -> Dict[str, Any]:
+    """解析形如 "qwen=8,zhipu=4" 的按提供商配置"""
+    limits = {}
+    for item in (raw or "").split(","):
+        if "=" not in item:
+            continue
+        name, value = item.split("=", 1)
+        try:
+            limits[name.strip()] = cast(value)
+        except ValueError:
+            continue
+    return limits
+
+# 每个提供商的并发请求上限
+DEFAULT_CONCURRENCY = int(os.getenv("SAU_AI_DEFAULT_CONCURRENCY", 4))
+PROVIDER_CONCURRENCY = _parse_limits(os.getenv("SAU_AI_CONCURRENCY", ""))
+# 每个提供商每秒发起的请求数上限（0 表示不限）
+PROVIDER_RPS = _parse_limits(os.getenv("SAU_AI_RPS", ""), float)
+# 对冲请求：主提供商在该时间内未返回时，向备用提供商发起同样的请求（秒）
+HEDGE_DELAY = float(os.getenv("SAU_AI_HEDGE_DELAY", 2.0))
+
+class ProviderLimiter:
+    """单个提供商的并发与速率限制（异步）"""
+
+    def __init__(self, concurrency: int, rps: float = 0.0):
+        self.concurrency = max(1, concurrency)
+        self.rps = max(0.0, rps)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._rate_lock: Optional[asyncio.Lock] = None
+        self._next_slot = 0.0
+        self.stats = {"requests": 0, "errors": 0, "throttled": 0, "total_latency": 0.0}
+
+    def _bind_loop(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+            self._rate_lock = asyncio.Lock()
+
+    async def _wait_rate(self):
+        if not self.rps:
+            return
+        async with self._rate_lock:
+            now = time.monotonic()
+            delay = self._next_slot - now
+            self._next_slot = max(now, self._next_slot) + 1.0 / self.rps
+        if delay > 0:
+            self.stats["throttled"] += 1
+            await asyncio.sleep(delay)
+
+    async def run(self, coro_factory):
+        """在限制内执行 coro_factory() 返回的协程"""
+        self._bind_loop()
+        async with self._semaphore:
+            await self._wait_rate()
+            started = time.perf_counter()
+            self.stats["requests"] += 1
+            try:
+                return await coro_factory()
+            except Exception:
+                self.stats["errors"] += 1
+                raise
+            finally:
+                self.stats["total_latency"] += time.perf_counter() - started
+
+    def to_dict(self) -> Dict[str, Any]:
+        requests = self.stats["requests"]
+        return {
+            **self.stats,
+            "concurrency": self.concurrency,
+            "rps": self.rps,
+            "avg_latency": round(self.stats["total_latency"] / requests, 3) if requests else 0.0,
+        }
 
 class ModelManager:
     """AI模型管理器"""
 
     def __init__(self):
         self._providers: Dict[str, BaseProvider] = {}
+        self._limiters: Dict[str, ProviderLimiter] = {}
+        self._hedge_stats = {"hedged": 0, "primary_wins": 0, "hedge_wins": 0}
         self._init_providers()
 
     def _init_providers(self):
@@ -27,18 +108,38 @@ class ModelManager:
         except Exception as e:
             print(f"⚠️ QwenDashScope provider failed: {e}")
 
+        for name in self._providers:
+            self._limiters[name] = ProviderLimiter(
+                PROVIDER_CONCURRENCY.get(name, DEFAULT_CONCURRENCY),
+                PROVIDER_RPS.get(name, 0.0)
+            )
+
     def get_provider(self, provider_name: str) -> Optional[BaseProvider]:
         """获取模型提供商实例"""
         return self._providers.get(provider_name)
 
     def get_default_provider(self) -> Optional[BaseProvider]:
         """获取默认提供商（优先级：qwen > zhipu）"""
+        name = self._default_provider_name()
+        return self.get_provider(name) if name else None
+
+    def _default_provider_name(self) -> Optional[str]:
         for name in ["qwen", "zhipu"]:
-            provider = self.get_provider(name)
-            if provider:
-                return provider
+            if name in self._providers:
+                return name
         return None
 
+    def _resolve(self, provider: Optional[str]) -> str:
+        name = provider or self._default_provider_name()
+        if not name or name not in self._providers:
+            raise Exception("No available AI provider")
+        return name
+
+    def resolve(self, provider: Optional[str] = None, model: Optional[str] = None) -> Tuple[str, str]:
+        """解析实际使用的提供商与模型名称"""
+        name = self._resolve(provider)
+        return name, model or getattr(self._providers[name], "default_model", "") or "default"
+
     def get_available_providers(self) -> Dict[str, list]:
         """获取可用提供商及其模型列表"""
         result = {}
@@ -55,6 +156,7 @@ class ModelManager:
              provider: Optional[str] = None,
              model: Optional[str] = None,
              temperature: float = 0.7,
+             hedge: bool = False,
              **kwargs) -> str:
         """
         聊天对话接口
@@ -64,22 +166,132 @@ class ModelManager:
             provider: 提供商名称（可选）
             model: 模型名称（可选）
             temperature: 温度参数
+            hedge: 是否同时向备用提供商发起对冲请求
             **kwargs: 其他参数
 
         Returns:
             响应文本
         """
-        # 获取提供商
-        if provider:
-            ai_provider = self.get_provider(provider)
-        else:
-            ai_provider = self.get_default_provider()
+        if hedge:
+            return run_async(self.ahedged_chat(messages, provider, model, temperature, **kwargs))
 
-        if not ai_provider:
-            raise Exception("No available AI provider")
+        # 获取提供商
+        ai_provider = self.get_provider(self._resolve(provider))
 
         # 调用聊天接口
         return ai_provider.chat(messages, model, temperature, **kwargs)
 
+    async def achat(self,
+                    messages,
+                    provider: Optional[str] = None,
+                    model: Optional[str] = None,
+                    temperature: float = 0.7,
+                    **kwargs) -> str:
+        """异步聊天接口，受提供商的并发与速率限制约束"""
+        name = self._resolve(provider)
+        ai_provider = self._providers[name]
+        return await self._limiters[name].run(
+            lambda: ai_provider.achat(messages, model, temperature, **kwargs)
+        )
+
+    async def ahedged_chat(self,
+                           messages,
+                           provider: Optional[str] = None,
+                           model: Optional[str] = None,
+                           temperature: float = 0.7,
+                           hedge_delay: Optional[float] = None,
+                           **kwargs) -> str:
+        """
+        对冲请求：主提供商在 hedge_delay 秒内未返回（或失败）时，向另一提供商发起同样的请求，
+        取先成功的结果并取消另一个。指定的 model 只作用于主提供商，备用提供商使用默认模型
+        """
+        primary = self._resolve(provider)
+        backups = [name for name in self._providers if name != primary]
+        if not backups:
+            return await self.achat(messages, primary, model, temperature, **kwargs)
+
+        delay = HEDGE_DELAY if hedge_delay is None else hedge_delay
+        primary_task = asyncio.ensure_future(self.achat(messages, primary, model, temperature, **kwargs))
+        tasks = {primary_task}
+        hedge_task = None
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if primary_task in done and primary_task.exception() is None:
+                self._hedge_stats["primary_wins"] += 1
+                return primary_task.result()
+
+            self._hedge_stats["hedged"] += 1
+            hedge_task = asyncio.ensure_future(self.achat(messages, backups[0], None, temperature, **kwargs))
+            tasks.add(hedge_task)
+            if primary_task in done:
+                tasks.discard(primary_task)
+
+            errors = [primary_task.exception()] if primary_task in done else []
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        self._hedge_stats["hedge_wins" if task is hedge_task else "primary_wins"] += 1
+                        return task.result()
+                    errors.append(task.exception())
+            raise errors[-1]
+        finally:
+            for task in (primary_task, hedge_task):
+                if task is not None and not task.done():
+                    task.cancel()
+
+    async def achat_many(self,
+                         prompts: Sequence[Any],
+                         provider: Optional[str] = None,
+                         model: Optional[str] = None,
+                         temperature: float = 0.7,
+                         hedge: bool = False,
+                         **kwargs) -> List[Any]:
+        """并发执行多个对话，结果顺序与 prompts 一致，失败项为异常对象"""
+        chat = self.ahedged_chat if hedge else self.achat
+        return await asyncio.gather(
+            *(chat(prompt, provider, model, temperature, **kwargs) for prompt in prompts),
+            return_exceptions=True
+        )
+
+    def chat_many(self,
+                  prompts: Sequence[Any],
+                  provider: Optional[str] = None,
+                  model: Optional[str] = None,
+                  temperature: float = 0.7,
+                  hedge: bool = False,
+                  **kwargs) -> List[Any]:
+        """
+        批量对话接口（同步），在后台事件循环中并发执行
+
+        Args:
+            prompts: 文本或消息列表组成的序列
+            provider: 提供商名称（可选）
+            model: 模型名称（可选）
+            temperature: 温度参数
+            hedge: 是否对每个请求启用对冲
+            **kwargs: 其他参数
+
+        Returns:
+            与 prompts 等长的列表，成功项为响应文本，失败项为异常对象
+        """
+        return run_async(self.achat_many(prompts, provider, model, temperature, hedge, **kwargs))
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取各提供商的请求统计"""
+        return {
+            "providers": {name: limiter.to_dict() for name, limiter in self._limiters.items()},
+            "hedge": dict(self._hedge_stats),
+        }
+
+    async def aclose(self):
+        """关闭所有提供商的连接池"""
+        for provider in self._providers.values():
+            await provider.aclose()
+            provider.close()
+
 # 全局模型管理器实例
-model_manager = ModelManager()
\ No newline at end of file
+model_manager = ModelManager()
+
+# 事件循环服务关闭时释放连接池
+async_runtime.add_shutdown_hook(model_manager.aclose)
@@ -1,10 +1,23 @@
 # -*- coding: utf-8 -*-
+import asyncio
+import os
+import threading
 from abc import ABC, abstractmethod
 from typing import List, Dict, Any, Optional
 
+import requests
+from requests.adapters import HTTPAdapter
+
+# 每个提供商保持的 keep-alive 连接数
+POOL_SIZE = int(os.getenv("SAU_AI_POOL_SIZE", 16))
+# 请求超时（秒）
+REQUEST_TIMEOUT = float(os.getenv("SAU_AI_TIMEOUT", 60))
+
 class BaseProvider(ABC):
     """AI模型提供商基类"""
 
+    name = "base"
+
     def __init__(self, api_key: Optional[str] = None, base_url: Optional[str] = None):
         self.api_key = api_key
         self.base_url = base_url
@@ -29,13 +42,153 @@ class BaseProvider(ABC):
         """
         ...
 
+    async def achat(self,
+                    messages: List[Dict[str, str]],
+                    model: Optional[str] = None,
+                    temperature: float = 0.7,
+                    **kwargs) -> str:
+        """异步聊天接口，默认在线程池中执行同步实现"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, lambda: self.chat(messages, model, temperature, **kwargs))
+
     @abstractmethod
     def get_available_models(self) -> List[str]:
         """获取可用模型列表"""
         ...
 
+    def close(self):
+        """释放同步连接"""
+
+    async def aclose(self):
+        """释放异步连接"""
+
+class OpenAICompatibleProvider(BaseProvider):
+    """OpenAI兼容接口的提供商
+
+    同步请求复用 requests.Session 的连接池，异步请求复用 aiohttp.ClientSession，
+    避免每次调用都重新建立 TLS 连接
+    """
+
+    default_model = ""
+
+    def __init__(self, api_key: Optional[str] = None, base_url: Optional[str] = None,
+                 pool_size: int = POOL_SIZE, timeout: float = REQUEST_TIMEOUT):
+        super().__init__(api_key=api_key, base_url=base_url)
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self._session: Optional[requests.Session] = None
+        self._session_lock = threading.Lock()
+        self._async_session = None
+        self._async_loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        return {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
+
+    @property
+    def session(self) -> requests.Session:
+        """线程安全的同步会话（连接池）"""
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                    session.mount("https://", adapter)
+                    session.mount("http://", adapter)
+                    session.headers.update(self.headers)
+                    self._session = session
+        return self._session
+
+    async def _get_async_session(self):
+        """当前事件循环中的异步会话（aiohttp 会话不能跨事件循环使用）"""
+        import aiohttp
+
+        loop = asyncio.get_running_loop()
+        if self._async_session is None or self._async_session.closed or self._async_loop is not loop:
+            connector = aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=60)
+            self._async_session = aiohttp.ClientSession(
+                connector=connector,
+                headers=self.headers,
+                timeout=aiohttp.ClientTimeout(total=self.timeout)
+            )
+            self._async_loop = loop
+        return self._async_session
+
+    def build_payload(self,
+                      messages: List[Dict[str, str]],
+                      model: Optional[str] = None,
+                      temperature: float = 0.7,
+                      **kwargs) -> Dict[str, Any]:
+        """构造请求体"""
+        data = {
+            "model": model or self.default_model,
+            "messages": normalize_messages(messages),
+            "temperature": temperature
+        }
+
+        # 添加额外参数
+        if "max_tokens" in kwargs:
+            data["max_tokens"] = kwargs["max_tokens"]
+        if "top_p" in kwargs:
+            data["top_p"] = kwargs["top_p"]
+        return data
+
+    @staticmethod
+    def parse_response(result: Dict[str, Any]) -> str:
+        return result["choices"][0]["message"]["content"]
+
+    def chat(self,
+             messages: List[Dict[str, str]],
+             model: Optional[str] = None,
+             temperature: float = 0.7,
+             **kwargs) -> str:
+        url = f"{self.base_url}/chat/completions"
+        data = self.build_payload(messages, model, temperature, **kwargs)
+
+        try:
+            response = self.session.post(url, json=data, timeout=self.timeout)
+            response.raise_for_status()
+            return self.parse_response(response.json())
+        except requests.RequestException as e:
+            raise Exception(f"{self.name} API error: {e}")
+
+    async def achat(self,
+                    messages: List[Dict[str, str]],
+                    model: Optional[str] = None,
+                    temperature: float = 0.7,
+                    **kwargs) -> str:
+        import aiohttp
+
+        url = f"{self.base_url}/chat/completions"
+        data = self.build_payload(messages, model, temperature, **kwargs)
+        session = await self._get_async_session()
+
+        try:
+            async with session.post(url, json=data) as response:
+                response.raise_for_status()
+                return self.parse_response(await response.json(content_type=None))
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise Exception(f"{self.name} API error: {e!r}")
+
+    def close(self):
+        with self._session_lock:
+            session, self._session = self._session, None
+        if session is not None:
+            session.close()
+
+    async def aclose(self):
+        session, self._async_session = self._async_session, None
+        if session is not None and not session.closed and self._async_loop is asyncio.get_running_loop():
+            await session.close()
+
+    def __str__(self):
+        return f"{self.name}(base_url={self.base_url})"
+
 def normalize_messages(prompt_or_messages):
     """标准化消息格式"""
     if isinstance(prompt_or_messages, str):
         return [{"role": "user", "content": prompt_or_messages}]
-    return prompt_or_messages
\ No newline at end of file
+    return prompt_or_messages
@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+"""
+AI 响应缓存
+以归一化后的 (提供商, 模型, 温度, 其他参数, 提示词) 为键，把模型输出持久化到 SQLite；
+条目带 TTL，总大小超过上限时按最近使用时间淘汰。温度大于 0 的请求输出不确定，
+默认不读写缓存，调用方显式允许时才缓存
+"""
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from sau_backend.conf import BASE_DIR
+from sau_backend.utils.sqlite_pool import get_pool
+
+# 缓存数据库
+AI_CACHE_DB = Path(os.getenv("SAU_AI_CACHE_DB", BASE_DIR / "db" / "ai_cache.db"))
+# 条目有效期（秒）
+AI_CACHE_TTL = int(os.getenv("SAU_AI_CACHE_TTL", 7 * 24 * 3600))
+# 缓存总大小上限（MB）
+AI_CACHE_MAX_MB = float(os.getenv("SAU_AI_CACHE_MAX_MB", 256))
+# 是否默认缓存温度大于 0 的请求
+AI_CACHE_ALLOW_SAMPLED = os.getenv("SAU_AI_CACHE_ALLOW_SAMPLED", "").lower() in ("1", "true", "yes")
+
+_SPACES = re.compile(r"[ \t　]+")
+_BLANK_LINES = re.compile(r"\n{3,}")
+
+
+def normalize_prompt(prompt: Any) -> str:
+    """归一化提示词：统一全半角与换行，压缩行内空白与多余空行"""
+    if not isinstance(prompt, str):
+        prompt = json.dumps(prompt, ensure_ascii=False, sort_keys=True)
+    text = unicodedata.normalize("NFKC", prompt).replace("\r\n", "\n").replace("\r", "\n")
+    lines = [_SPACES.sub(" ", line).strip() for line in text.split("\n")]
+    return _BLANK_LINES.sub("\n\n", "\n".join(lines)).strip()
+
+
+def ai_cache_key(provider: str, model: str, temperature: float, prompt: Any,
+                 params: Optional[Dict[str, Any]] = None) -> str:
+    """缓存键：归一化请求参数的 SHA-256"""
+    payload = json.dumps({
+        "provider": provider,
+        "model": model,
+        "temperature": round(float(temperature), 2),
+        "params": {k: v for k, v in sorted((params or {}).items()) if v is not None},
+        "prompt": normalize_prompt(prompt),
+    }, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class AIResponseCache:
+    """AI 响应缓存"""
+
+    def __init__(self, db_path: Path = AI_CACHE_DB, ttl: int = AI_CACHE_TTL,
+                 max_bytes: int = int(AI_CACHE_MAX_MB * 1024 * 1024),
+                 allow_sampled: bool = AI_CACHE_ALLOW_SAMPLED):
+        self.db_path = Path(db_path)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.allow_sampled = allow_sampled
+        self._lock = threading.Lock()
+        self._initialized = False
+        self._stats = {"hits": 0, "misses": 0, "bypassed": 0, "stores": 0, "expired": 0, "evictions": 0}
+
+    def _connect(self):
+        return get_pool(self.db_path).session(row_factory=sqlite3.Row)
+
+    def _ensure_init(self):
+        if self._initialized:
+            return
+        with self._lock:
+            if self._initialized:
+                return
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            with self._connect() as conn:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.executescript("""
+                    CREATE TABLE IF NOT EXISTS ai_response_cache (
+                        key TEXT PRIMARY KEY,
+                        provider TEXT NOT NULL,
+                        model TEXT NOT NULL,
+                        temperature REAL NOT NULL,
+                        response TEXT NOT NULL,
+                        size INTEGER NOT NULL,
+                        created_at REAL NOT NULL,
+                        expires_at REAL NOT NULL,
+                        last_used REAL NOT NULL,
+                        hits INTEGER NOT NULL DEFAULT 0
+                    );
+                    CREATE INDEX IF NOT EXISTS idx_ai_response_cache_last_used ON ai_response_cache(last_used);
+                    CREATE INDEX IF NOT EXISTS idx_ai_response_cache_expires ON ai_response_cache(expires_at);
+                """)
+            self._initialized = True
+
+    def should_cache(self, temperature: float, cache: Optional[bool] = None) -> bool:
+        """是否使用缓存：显式指定优先，否则只缓存温度为 0 的确定性请求"""
+        if cache is not None:
+            return bool(cache)
+        return float(temperature) <= 0 or self.allow_sampled
+
+    def get(self, key: str) -> Optional[str]:
+        """读取未过期的缓存响应"""
+        self._ensure_init()
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT response, expires_at FROM ai_response_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self._stats["misses"] += 1
+                return None
+            if row["expires_at"] <= now:
+                conn.execute("DELETE FROM ai_response_cache WHERE key = ?", (key,))
+                self._stats["expired"] += 1
+                self._stats["misses"] += 1
+                return None
+            conn.execute("UPDATE ai_response_cache SET last_used = ?, hits = hits + 1 WHERE key = ?", (now, key))
+        self._stats["hits"] += 1
+        return row["response"]
+
+    def set(self, key: str, response: str, provider: str, model: str, temperature: float,
+            ttl: Optional[int] = None):
+        """写入缓存并按容量淘汰"""
+        if not isinstance(response, str) or not response:
+            return
+        self._ensure_init()
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("""
+                INSERT OR REPLACE INTO ai_response_cache (key, provider, model, temperature, response, size,
+                                                          created_at, expires_at, last_used, hits)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 0)
+            """, (key, provider, model, float(temperature), response, len(response.encode("utf-8")),
+                  now, now + (ttl or self.ttl), now))
+        self._stats["stores"] += 1
+        self.evict()
+
+    def record_bypass(self):
+        self._stats["bypassed"] += 1
+
+    def evict(self, max_bytes: Optional[int] = None) -> int:
+        """删除过期条目，并按最近使用时间淘汰直到总大小不超过上限，返回删除数量"""
+        self._ensure_init()
+        limit = self.max_bytes if max_bytes is None else max_bytes
+        with self._connect() as conn:
+            removed = conn.execute("DELETE FROM ai_response_cache WHERE expires_at <= ?", (time.time(),)).rowcount
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM ai_response_cache").fetchone()[0]
+            if total > limit:
+                for row in conn.execute("SELECT key, size FROM ai_response_cache ORDER BY last_used").fetchall():
+                    if total <= limit:
+                        break
+                    conn.execute("DELETE FROM ai_response_cache WHERE key = ?", (row["key"],))
+                    total -= row["size"]
+                    removed += 1
+        self._stats["evictions"] += removed
+        return removed
+
+    def clear(self):
+        """清空缓存"""
+        self._ensure_init()
+        with self._connect() as conn:
+            conn.execute("DELETE FROM ai_response_cache")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存统计信息"""
+        self._ensure_init()
+        with self._connect() as conn:
+            entries, total = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM ai_response_cache"
+            ).fetchone()
+        lookups = self._stats["hits"] + self._stats["misses"]
+        return {
+            **self._stats,
+            "entries": entries,
+            "size": total,
+            "max_bytes": self.max_bytes,
+            "ttl": self.ttl,
+            "hit_rate": round(self._stats["hits"] / lookups, 4) if lookups else 0.0,
+        }
+
+
+# 全局 AI 响应缓存实例
+ai_response_cache = AIResponseCache()
@@ -8,10 +8,12 @@ def register_blueprints(app: Flask) -> None:
     """Register all API blueprints on the supplied app."""
     from .ai import bp as ai_bp
     from .media import bp as media_bp
+    from .metrics import bp as metrics_bp
     from .tts import bp as tts_bp
 
     app.register_blueprint(ai_bp)
     app.register_blueprint(media_bp)
+    app.register_blueprint(metrics_bp)
     app.register_blueprint(tts_bp)
 
 
@@ -3,7 +3,9 @@ from flask import Blueprint, request, jsonify
 from ..services.ai_service import (
     list_available_providers,
     generate_text as ai_generate_text,
+    generate_texts as ai_generate_texts,
     generate_shotlist as ai_generate_shotlist,
+    get_cache_stats as ai_get_cache_stats,
 )
 
 bp = Blueprint("ai", __name__, url_prefix="/ai")
@@ -51,7 +53,9 @@ def ai_generate():
             provider=data.get("provider"),
             model=data.get("model"),
             temperature=data.get("temperature", 0.7),
-            max_tokens=data.get("max_tokens", 1000)
+            max_tokens=data.get("max_tokens", 1000),
+            hedge=bool(data.get("hedge", False)),
+            cache=data.get("cache")
         )
 
         return jsonify({
@@ -71,6 +75,75 @@ def ai_generate():
             "msg": f"AI generation failed: {str(e)}"
         }), 500
 
+@bp.route("/generate_batch", methods=["POST"])
+def ai_generate_batch():
+    """
+    AI 批量文本生成接口，多个提示词并发请求（受各提供商并发与速率限制约束）
+
+    入参: {
+        "prompts": ["提示词1", "提示词2", ...],
+        "industry"/"scene"/"platform"/"locale": 同 /generate，作用于每个提示词,
+        "provider": "qwen",
+        "hedge": false,  # 主提供商响应慢时向备用提供商发起对冲请求
+        "cache": null  # 是否使用响应缓存，默认只缓存 temperature 为 0 的请求
+    }
+    """
+    try:
+        data = request.json or {}
+        prompts = data.get("prompts") or []
+        if not isinstance(prompts, list) or not any(isinstance(p, str) and p.strip() for p in prompts):
+            return jsonify({
+                "code": 400,
+                "data": None,
+                "msg": "Prompts are required"
+            }), 400
+
+        indexes = [i for i, p in enumerate(prompts) if isinstance(p, str) and p.strip()]
+        enhanced_prompts = [
+            _build_enhanced_prompt(
+                base_prompt=prompts[i],
+                industry=data.get("industry"),
+                scene=data.get("scene"),
+                platform=data.get("platform"),
+                locale=data.get("locale", "zh-CN")
+            )
+            for i in indexes
+        ]
+
+        outputs = ai_generate_texts(
+            enhanced_prompts,
+            provider=data.get("provider"),
+            model=data.get("model"),
+            temperature=data.get("temperature", 0.7),
+            hedge=bool(data.get("hedge", False)),
+            cache=data.get("cache"),
+            max_tokens=data.get("max_tokens", 1000)
+        )
+
+        results = []
+        for i, output in zip(indexes, outputs):
+            if isinstance(output, BaseException):
+                results.append({"index": i, "prompt": prompts[i], "error": str(output)})
+            else:
+                results.append({"index": i, "prompt": prompts[i], "text": output})
+
+        return jsonify({
+            "code": 200,
+            "data": {
+                "results": results,
+                "total": len(prompts),
+                "success": len([r for r in results if "error" not in r])
+            },
+            "msg": "Batch generation completed"
+        })
+
+    except Exception as e:
+        return jsonify({
+            "code": 500,
+            "data": None,
+            "msg": f"AI batch generation failed: {str(e)}"
+        }), 500
+
 @bp.route("/generate_shotlist", methods=["POST"])
 def generate_shotlist():
     """AI 镜头脚本生成接口"""
@@ -106,7 +179,8 @@ def generate_shotlist():
             prompt,
             provider=data.get("provider"),
             model=data.get("model"),
-            temperature=data.get("temperature", 0.3)
+            temperature=data.get("temperature", 0.3),
+            cache=data.get("cache")
         )
 
         shotlist = _parse_shotlist_response(result, fallback_duration=duration, fallback_script=script)
@@ -124,6 +198,15 @@ def generate_shotlist():
             "msg": f"Shotlist generation failed: {str(e)}"
         }), 500
 
+@bp.route("/cache", methods=["GET"])
+def cache_stats():
+    """AI响应缓存统计"""
+    return jsonify({
+        "code": 200,
+        "data": ai_get_cache_stats(),
+        "msg": "Success"
+    })
+
 def _build_enhanced_prompt(base_prompt, industry=None, scene=None, platform=None, locale="zh-CN"):
     """构建增强的提示词"""
     enhanced_parts = [base_prompt]
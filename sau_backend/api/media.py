@@ -3,11 +3,53 @@ from flask import Blueprint, request, jsonify
 import os
 from ..media.ffmpeg_ops import (
     img_kenburns_to_video, concat_videos, add_watermark, add_subtitle,
-    trim_video, resize_video, get_video_info
+    trim_video, resize_video, get_video_info, get_videos_info,
+    run_pipeline, validate_pipeline
 )
+from ..media.probe_cache import probe_cache
+from ..media.scheduler import media_scheduler, parse_priority, STATUS_SUCCEEDED
 
 bp = Blueprint("media", __name__, url_prefix="/media")
 
+def run_media_job(data, operation, func, kwargs, params, msg):
+    """
+    将媒体操作提交到调度器执行
+
+    所有处理接口均支持以下可选入参:
+        "async": true  立即返回任务ID（202），通过 /media/jobs/<job_id> 查询进度与结果
+        "priority": "high" | "normal" | "low" 或整数（越小越优先）
+    否则等待任务完成后返回结果
+    """
+    def produce():
+        output_path = func(**kwargs)
+        return {
+            "video_path": output_path,
+            "video_info": get_video_info(output_path),
+            "params": params
+        }
+
+    job = media_scheduler.submit(
+        operation, produce, priority=parse_priority(data.get("priority")), params=params
+    )
+
+    if data.get("async"):
+        return jsonify({
+            "code": 202,
+            "data": {
+                "job_id": job.id,
+                "status": job.status,
+                "status_url": f"/media/jobs/{job.id}"
+            },
+            "msg": "Job queued"
+        }), 202
+
+    result = job.wait()
+    return jsonify({
+        "code": 200,
+        "data": {**result, "job_id": job.id},
+        "msg": msg
+    })
+
 @bp.route("/img2video", methods=["POST"])
 def img_to_video():
     """
@@ -54,33 +96,24 @@ def img_to_video():
                 "msg": f"Background music not found: {bgm}"
             }), 400
 
-        # 生成视频
-        output_path = img_kenburns_to_video(
-            images=images,
-            duration=duration,
-            size=size,
-            kenburns=kenburns,
-            bgm=bgm
-        )
-
-        # 获取视频信息
-        video_info = get_video_info(output_path)
-
-        return jsonify({
-            "code": 200,
-            "data": {
-                "video_path": output_path,
-                "video_info": video_info,
-                "params": {
-                    "images_count": len(images),
-                    "duration_per_img": duration,
-                    "size": size,
-                    "kenburns": kenburns,
-                    "with_bgm": bgm is not None
-                }
+        return run_media_job(
+            data, "img2video", img_kenburns_to_video,
+            kwargs={
+                "images": images,
+                "duration": duration,
+                "size": size,
+                "kenburns": kenburns,
+                "bgm": bgm
             },
-            "msg": "Video created successfully"
-        })
+            params={
+                "images_count": len(images),
+                "duration_per_img": duration,
+                "size": size,
+                "kenburns": kenburns,
+                "with_bgm": bgm is not None
+            },
+            msg="Video created successfully"
+        )
 
     except Exception as e:
         return jsonify({
@@ -123,29 +156,20 @@ def concat_videos_api():
         output_size = data.get("output_size")
         transition = data.get("transition")
 
-        # 拼接视频
-        output_path = concat_videos(
-            videos=videos,
-            output_size=output_size,
-            transition=transition
-        )
-
-        # 获取视频信息
-        video_info = get_video_info(output_path)
-
-        return jsonify({
-            "code": 200,
-            "data": {
-                "video_path": output_path,
-                "video_info": video_info,
-                "params": {
-                    "videos_count": len(videos),
-                    "output_size": output_size,
-                    "transition": transition
-                }
+        return run_media_job(
+            data, "concat", concat_videos,
+            kwargs={
+                "videos": videos,
+                "output_size": output_size,
+                "transition": transition
             },
-            "msg": "Videos concatenated successfully"
-        })
+            params={
+                "videos_count": len(videos),
+                "output_size": output_size,
+                "transition": transition
+            },
+            msg="Videos concatenated successfully"
+        )
 
     except Exception as e:
         return jsonify({
@@ -191,32 +215,23 @@ def add_watermark_api():
         font_size = data.get("font_size", 36)
         font_color = data.get("font_color", "white")
 
-        # 添加水印
-        output_path = add_watermark(
-            video=video,
-            text=text,
-            position=position,
-            font_size=font_size,
-            font_color=font_color
-        )
-
-        # 获取视频信息
-        video_info = get_video_info(output_path)
-
-        return jsonify({
-            "code": 200,
-            "data": {
-                "video_path": output_path,
-                "video_info": video_info,
-                "params": {
-                    "text": text,
-                    "position": position,
-                    "font_size": font_size,
-                    "font_color": font_color
-                }
+        return run_media_job(
+            data, "watermark", add_watermark,
+            kwargs={
+                "video": video,
+                "text": text,
+                "position": position,
+                "font_size": font_size,
+                "font_color": font_color
             },
-            "msg": "Watermark added successfully"
-        })
+            params={
+                "text": text,
+                "position": position,
+                "font_size": font_size,
+                "font_color": font_color
+            },
+            msg="Watermark added successfully"
+        )
 
     except Exception as e:
         return jsonify({
@@ -260,30 +275,21 @@ def add_subtitle_api():
         position = data.get("position", "bottom")
         font_size = data.get("font_size", 28)
 
-        # 添加字幕
-        output_path = add_subtitle(
-            video=video,
-            subtitle_text=text,
-            position=position,
-            font_size=font_size
-        )
-
-        # 获取视频信息
-        video_info = get_video_info(output_path)
-
-        return jsonify({
-            "code": 200,
-            "data": {
-                "video_path": output_path,
-                "video_info": video_info,
-                "params": {
-                    "text": text,
-                    "position": position,
-                    "font_size": font_size
-                }
+        return run_media_job(
+            data, "subtitle", add_subtitle,
+            kwargs={
+                "video": video,
+                "subtitle_text": text,
+                "position": position,
+                "font_size": font_size
             },
-            "msg": "Subtitle added successfully"
-        })
+            params={
+                "text": text,
+                "position": position,
+                "font_size": font_size
+            },
+            msg="Subtitle added successfully"
+        )
 
     except Exception as e:
         return jsonify({
@@ -327,30 +333,21 @@ def trim_video_api():
         duration = data.get("duration")
         end_time = data.get("end_time")
 
-        # 截取视频
-        output_path = trim_video(
-            video=video,
-            start_time=start_time,
-            duration=duration,
-            end_time=end_time
-        )
-
-        # 获取视频信息
-        video_info = get_video_info(output_path)
-
-        return jsonify({
-            "code": 200,
-            "data": {
-                "video_path": output_path,
-                "video_info": video_info,
-                "params": {
-                    "start_time": start_time,
-                    "duration": duration,
-                    "end_time": end_time
-                }
+        return run_media_job(
+            data, "trim", trim_video,
+            kwargs={
+                "video": video,
+                "start_time": start_time,
+                "duration": duration,
+                "end_time": end_time
             },
-            "msg": "Video trimmed successfully"
-        })
+            params={
+                "start_time": start_time,
+                "duration": duration,
+                "end_time": end_time
+            },
+            msg="Video trimmed successfully"
+        )
 
     except Exception as e:
         return jsonify({
@@ -392,34 +389,83 @@ def resize_video_api():
 
         maintain_aspect = data.get("maintain_aspect", True)
 
-        # 调整尺寸
-        output_path = resize_video(
-            video=video,
-            size=size,
-            maintain_aspect=maintain_aspect
+        return run_media_job(
+            data, "resize", resize_video,
+            kwargs={
+                "video": video,
+                "size": size,
+                "maintain_aspect": maintain_aspect
+            },
+            params={
+                "size": size,
+                "maintain_aspect": maintain_aspect
+            },
+            msg="Video resized successfully"
         )
 
-        # 获取视频信息
-        video_info = get_video_info(output_path)
-
+    except Exception as e:
         return jsonify({
-            "code": 200,
-            "data": {
-                "video_path": output_path,
-                "video_info": video_info,
-                "params": {
-                    "size": size,
-                    "maintain_aspect": maintain_aspect
-                }
+            "code": 500,
+            "data": None,
+            "msg": f"Failed to resize video: {str(e)}"
+        }), 500
+
+@bp.route("/pipeline", methods=["POST"])
+def run_pipeline_api():
+    """
+    媒体处理流水线接口，多个操作合并为一次编码
+
+    入参: {
+        "inputs": ["input.mp4"],  # 多个输入时先拼接
+        "operations": [
+            {"op": "trim", "start_time": "00:00:05", "duration": 30},
+            {"op": "resize", "size": "1080x1920", "maintain_aspect": true},
+            {"op": "watermark", "text": "水印文字", "position": "bottom-right"},
+            {"op": "subtitle", "text": "字幕文字", "position": "bottom"}
+        ]
+    }
+    """
+    try:
+        data = request.json or {}
+
+        inputs = data.get("inputs") or ([data["video"]] if data.get("video") else [])
+        operations = data.get("operations", [])
+
+        try:
+            validate_pipeline(inputs, operations)
+        except ValueError as e:
+            return jsonify({
+                "code": 400,
+                "data": None,
+                "msg": str(e)
+            }), 400
+
+        for video in inputs:
+            if not os.path.exists(video):
+                return jsonify({
+                    "code": 400,
+                    "data": None,
+                    "msg": f"Video not found: {video}"
+                }), 400
+
+        return run_media_job(
+            data, "pipeline", run_pipeline,
+            kwargs={
+                "inputs": inputs,
+                "operations": operations
             },
-            "msg": "Video resized successfully"
-        })
+            params={
+                "inputs_count": len(inputs),
+                "operations": [op["op"] for op in operations]
+            },
+            msg="Pipeline completed successfully"
+        )
 
     except Exception as e:
         return jsonify({
             "code": 500,
             "data": None,
-            "msg": f"Failed to resize video: {str(e)}"
+            "msg": f"Failed to run pipeline: {str(e)}"
         }), 500
 
 @bp.route("/info", methods=["GET"])
@@ -462,4 +508,110 @@ def get_video_info_api():
             "code": 500,
             "data": None,
             "msg": f"Failed to get video info: {str(e)}"
-        }), 500
\ No newline at end of file
+        }), 500
+
+@bp.route("/info", methods=["POST"])
+def get_videos_info_api():
+    """
+    批量获取视频信息接口，结果带缓存，未命中的文件并行探测
+
+    入参: {
+        "paths": ["video1.mp4", "video2.mp4", ...],
+        "max_workers": 8  # 可选
+    }
+    """
+    try:
+        data = request.json or {}
+
+        paths = data.get("paths", [])
+        if not paths or not isinstance(paths, list):
+            return jsonify({
+                "code": 400,
+                "data": None,
+                "msg": "paths must be a non-empty list"
+            }), 400
+
+        results = get_videos_info(paths, max_workers=data.get("max_workers"))
+        failed = sum(1 for item in results.values() if "error" in item)
+
+        return jsonify({
+            "code": 200,
+            "data": {
+                "results": results,
+                "total": len(results),
+                "failed": failed,
+                "cache": probe_cache.get_stats()
+            },
+            "msg": "Video info retrieved successfully"
+        })
+
+    except Exception as e:
+        return jsonify({
+            "code": 500,
+            "data": None,
+            "msg": f"Failed to get video info: {str(e)}"
+        }), 500
+
+@bp.route("/jobs", methods=["GET"])
+def list_media_jobs():
+    """
+    媒体任务列表接口
+
+    参数: ?status=running&limit=50
+    """
+    status = request.args.get("status")
+    limit = request.args.get("limit", 50, type=int)
+
+    return jsonify({
+        "code": 200,
+        "data": {
+            "jobs": media_scheduler.list_jobs(status=status, limit=limit),
+            "stats": media_scheduler.get_stats()
+        },
+        "msg": "Jobs retrieved successfully"
+    })
+
+@bp.route("/jobs/<job_id>", methods=["GET"])
+def get_media_job(job_id):
+    """
+    媒体任务状态接口，包含进度、结果与耗时
+    """
+    job = media_scheduler.get_job(job_id)
+    if job is None:
+        return jsonify({
+            "code": 404,
+            "data": None,
+            "msg": f"Job not found: {job_id}"
+        }), 404
+
+    return jsonify({
+        "code": 200,
+        "data": job.to_dict(),
+        "msg": "Job completed successfully" if job.status == STATUS_SUCCEEDED else f"Job {job.status}"
+    })
+
+@bp.route("/jobs/<job_id>/cancel", methods=["POST"])
+def cancel_media_job(job_id):
+    """
+    取消排队中或运行中的媒体任务
+    """
+    job = media_scheduler.get_job(job_id)
+    if job is None:
+        return jsonify({
+            "code": 404,
+            "data": None,
+            "msg": f"Job not found: {job_id}"
+        }), 404
+
+    if not media_scheduler.cancel(job_id):
+        return jsonify({
+            "code": 409,
+            "data": job.to_dict(),
+            "msg": f"Job already {job.status}"
+        }), 409
+
+    return jsonify({
+        "code": 200,
+        "data": job.to_dict(),
+        "msg": "Job cancellation requested"
+    })
\ No newline at end of file
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""
+指标导出接口
+注册本蓝图后，应用的所有请求按路由模板记录耗时与状态码，GET /metrics 以 Prometheus 文本格式导出
+进程内全部指标（请求、上传、浏览器池、FFmpeg 任务等）。设置 SAU_METRICS_TOKEN 后需携带
+Authorization: Bearer <token> 访问
+"""
+import hmac
+import os
+import time
+
+from flask import Blueprint, Response, g, request
+
+from ..utils.metrics import CONTENT_TYPE, metrics_registry
+
+bp = Blueprint("metrics", __name__)
+
+METRICS_TOKEN = os.getenv("SAU_METRICS_TOKEN", "")
+
+REQUEST_DURATION = metrics_registry.histogram(
+    "sau_http_request_duration_seconds", "HTTP request latency by route template", ("method", "route"),
+)
+REQUESTS_TOTAL = metrics_registry.counter(
+    "sau_http_requests", "HTTP requests by route template and status code", ("method", "route", "status"),
+)
+REQUESTS_IN_FLIGHT = metrics_registry.gauge(
+    "sau_http_requests_in_flight", "HTTP requests currently being served",
+)
+
+
+def _route() -> str:
+    # 使用路由模板而不是实际路径，避免 ID 等参数造成标签基数膨胀
+    return request.url_rule.rule if request.url_rule is not None else "unmatched"
+
+
+@bp.before_app_request
+def start_timer():
+    g.metrics_started = time.perf_counter()
+    REQUESTS_IN_FLIGHT.inc()
+
+
+@bp.after_app_request
+def record_request(response):
+    started = g.pop("metrics_started", None)
+    if started is not None:
+        REQUESTS_IN_FLIGHT.dec()
+        route = _route()
+        REQUEST_DURATION.labels(method=request.method, route=route).observe(time.perf_counter() - started)
+        REQUESTS_TOTAL.labels(method=request.method, route=route, status=response.status_code).inc()
+    return response
+
+
+@bp.teardown_app_request
+def finish_request(exception=None):
+    # after_request 未能执行（如响应处理途中抛出异常）时在这里补记
+    started = g.pop("metrics_started", None)
+    if started is not None:
+        REQUESTS_IN_FLIGHT.dec()
+        route = _route()
+        REQUEST_DURATION.labels(method=request.method, route=route).observe(time.perf_counter() - started)
+        REQUESTS_TOTAL.labels(method=request.method, route=route, status=500).inc()
+
+
+@bp.route("/metrics", methods=["GET"])
+def export_metrics():
+    """Prometheus 文本格式导出"""
+    if METRICS_TOKEN:
+        supplied = request.headers.get("Authorization", "").removeprefix("Bearer ").strip()
+        if not hmac.compare_digest(supplied, METRICS_TOKEN):
+            return Response("unauthorized\n", status=401, content_type="text/plain; charset=utf-8")
+    return Response(metrics_registry.render(), content_type=CONTENT_TYPE)
@@ -1,17 +1,30 @@
 # -*- coding: utf-8 -*-
-from flask import Blueprint, request, jsonify
-import os
-import uuid
+from flask import Blueprint, request, jsonify, Response, send_file, stream_with_context
 import asyncio
+import json
+import os
+import queue
+import re
+import threading
 import edge_tts
 from pathlib import Path
+from ..media.tts_cache import tts_cache, tts_cache_key
+from ..utils.async_runtime import async_runtime, run_async
 
 bp = Blueprint("tts", __name__, url_prefix="/tts")
 
 # 音频输出目录
-AUDIO_DIR = Path(__file__).parent.parent / "media" / "tts"
+AUDIO_DIR = tts_cache.cache_dir
 AUDIO_DIR.mkdir(parents=True, exist_ok=True)
 
+# 批量合成的默认并发数与上限
+BATCH_CONCURRENCY = int(os.getenv("SAU_TTS_BATCH_CONCURRENCY", 4))
+MAX_BATCH_CONCURRENCY = 16
+
+# 流式合成等待下一个音频块的超时时间（秒）
+STREAM_CHUNK_TIMEOUT = float(os.getenv("SAU_TTS_STREAM_TIMEOUT", 30))
+CACHE_KEY_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
 # 支持的语音列表
 SUPPORTED_VOICES = {
     "zh-CN-XiaoxiaoNeural": "晓晓（女声，标准）",
@@ -35,17 +48,136 @@ SUPPORTED_VOICES = {
     "zh-CN-YangyangNeural": "洋洋（男声，童声）"
 }
 
-async def _synthesize_edge(text, voice="zh-CN-XiaoxiaoNeural", rate="+0%", volume="+0%"):
-    """使用edge-tts合成语音"""
-    output_file = AUDIO_DIR / f"{uuid.uuid4().hex}.mp3"
+def _communicate(text, voice, rate, volume):
+    """创建Communicate对象，新版edge-tts默认只返回句子边界，需要显式请求逐词边界"""
+    try:
+        return edge_tts.Communicate(text, voice, rate=rate, volume=volume, boundary="WordBoundary")
+    except TypeError:
+        return edge_tts.Communicate(text, voice, rate=rate, volume=volume)
+
+async def _synthesize_edge(text, output_file, voice="zh-CN-XiaoxiaoNeural", rate="+0%", volume="+0%",
+                           on_chunk=None):
+    """
+    使用edge-tts合成语音，边接收边写入文件
+
+    Args:
+        on_chunk: 可选回调，依次接收 ("audio", bytes) 与 ("boundary", dict)
+
+    Returns:
+        逐词边界事件列表，offset/duration 单位为秒
+    """
+    communicate = _communicate(text, voice, rate, volume)
+    boundaries = []
+
+    with open(output_file, "wb") as f:
+        async for chunk in communicate.stream():
+            if chunk["type"] == "audio":
+                f.write(chunk["data"])
+                if on_chunk:
+                    on_chunk("audio", chunk["data"])
+            elif chunk["type"] == "WordBoundary":
+                event = {
+                    "text": chunk.get("text"),
+                    "offset": round(chunk["offset"] / 10_000_000, 3),
+                    "duration": round(chunk["duration"] / 10_000_000, 3)
+                }
+                boundaries.append(event)
+                if on_chunk:
+                    on_chunk("boundary", event)
+
+    return boundaries
+
+async def _synthesize_cached(text, voice="zh-CN-XiaoxiaoNeural", rate="+0%", volume="+0%", on_chunk=None):
+    """按 (文本, 语音, 语速, 音量) 复用缓存的音频，未命中时调用edge-tts合成"""
+    return await tts_cache.get_or_synthesize(
+        text, voice, rate, volume,
+        lambda output_file: _synthesize_edge(text, output_file, voice, rate, volume, on_chunk)
+    )
+
+async def _synthesize_batch(texts, voice, rate, volume, concurrency):
+    """在同一事件循环中并发合成多段文本，返回与 texts 等长的结果（跳过的空文本为 None）"""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(text):
+        async with semaphore:
+            return await _synthesize_cached(text, voice, rate, volume)
+
+    tasks = [run(text) if text.strip() else asyncio.sleep(0) for text in texts]
+    return await asyncio.gather(*tasks, return_exceptions=True)
+
+class _LiveStream:
+    """进行中的流式合成：音频块队列与逐词边界事件"""
+
+    def __init__(self, key):
+        self.key = key
+        self.audio = queue.SimpleQueue()
+        self.events = []
+        self.entry = None
+        self.error = None
+        self.done = False
+        self._cond = threading.Condition()
 
-    # 创建Communicate对象
-    communicate = edge_tts.Communicate(text, voice, rate=rate, volume=volume)
+    def on_chunk(self, kind, payload):
+        if kind == "audio":
+            self.audio.put(payload)
+        else:
+            with self._cond:
+                self.events.append(payload)
+                self._cond.notify_all()
+
+    def finish(self, entry=None, error=None):
+        self.entry = entry
+        self.error = error
+        with self._cond:
+            self.done = True
+            self._cond.notify_all()
+        self.audio.put(None)
+
+    def iter_events(self, timeout):
+        """依次产出边界事件，合成结束或超时后停止"""
+        index = 0
+        while True:
+            with self._cond:
+                while index >= len(self.events) and not self.done:
+                    if not self._cond.wait(timeout):
+                        return
+                batch = self.events[index:]
+                index += len(batch)
+                done = self.done
+            yield from batch
+            if done and index >= len(self.events):
+                return
 
-    # 保存音频文件
-    await communicate.save(str(output_file))
+# 正在流式合成的缓存键 -> _LiveStream
+_live_streams = {}
+_live_lock = threading.Lock()
+
+async def _produce_stream(live, text, voice, rate, volume):
+    """在事件循环中合成并写入缓存，音频块通过 live 转交给响应生成器"""
+    try:
+        entry = await _synthesize_cached(text, voice, rate, volume, on_chunk=live.on_chunk)
+    except BaseException as e:
+        live.finish(error=e)
+        if not isinstance(e, Exception):
+            raise
+    else:
+        live.finish(entry=entry)
+    finally:
+        with _live_lock:
+            if _live_streams.get(live.key) is live:
+                del _live_streams[live.key]
 
-    return str(output_file)
+def _iter_file(path, chunk_size=64 * 1024):
+    with open(path, "rb") as f:
+        while True:
+            data = f.read(chunk_size)
+            if not data:
+                return
+            yield data
+
+def _relative_path(output_path):
+    """返回相对路径（用于前端访问）"""
+    return str(Path(output_path).relative_to(Path(__file__).parent.parent.parent))
 
 @bp.route("/voices", methods=["GET"])
 def get_voices():
@@ -102,7 +234,7 @@ def synthesize():
         if engine == "edge":
             # 使用edge-tts
             try:
-                output_path = asyncio.run(_synthesize_edge(text, voice, rate, volume))
+                entry = run_async(_synthesize_cached(text, voice, rate, volume))
             except Exception as e:
                 return jsonify({
                     "code": 500,
@@ -116,16 +248,14 @@ def synthesize():
                 "msg": f"Unsupported engine: {engine}"
             }), 400
 
-        # 返回相对路径（用于前端访问）
-        relative_path = str(Path(output_path).relative_to(Path(__file__).parent.parent.parent))
-
         return jsonify({
             "code": 200,
             "data": {
-                "path": relative_path,
-                "filename": Path(output_path).name,
+                "path": _relative_path(entry["path"]),
+                "filename": Path(entry["path"]).name,
                 "voice": voice,
-                "duration": None  # 可以后续添加音频时长检测
+                "duration": entry["duration"],
+                "cached": entry["cached"]
             },
             "msg": "Success"
         })
@@ -137,6 +267,126 @@ def synthesize():
             "msg": f"TTS synthesis failed: {str(e)}"
         }), 500
 
+@bp.route("/stream", methods=["GET", "POST"])
+def stream():
+    """
+    流式文字转语音接口，音频边合成边以分块传输返回，同时写入缓存
+
+    入参（POST JSON 或 GET 查询参数）: {
+        "text": "要转换的文本",
+        "voice": "zh-CN-XiaoxiaoNeural",
+        "rate": "+0%",
+        "volume": "+0%"
+    }
+
+    响应头 X-TTS-Key 为缓存键，逐词边界事件可通过 /tts/stream/<key>/events 以 SSE 获取
+    """
+    data = (request.get_json(silent=True) or {}) if request.method == "POST" else request.args
+    text = (data.get("text") or "").strip()
+    if not text:
+        return jsonify({
+            "code": 400,
+            "data": None,
+            "msg": "Text is required"
+        }), 400
+
+    voice = data.get("voice", "zh-CN-XiaoxiaoNeural")
+    if voice not in SUPPORTED_VOICES:
+        return jsonify({
+            "code": 400,
+            "data": None,
+            "msg": f"Unsupported voice: {voice}"
+        }), 400
+
+    rate = data.get("rate", "+0%")
+    volume = data.get("volume", "+0%")
+    key = tts_cache_key(text, voice, rate, volume)
+    headers = {
+        "X-TTS-Key": key,
+        "X-TTS-Events": f"{bp.url_prefix}/stream/{key}/events",
+    }
+
+    entry = tts_cache.get(key)
+    if entry is not None:
+        response = send_file(entry["path"], mimetype="audio/mpeg", conditional=True)
+        response.headers.update(headers)
+        response.headers["X-TTS-Cached"] = "true"
+        if entry["duration"]:
+            response.headers["X-TTS-Duration"] = str(entry["duration"])
+        return response
+
+    live = _LiveStream(key)
+    with _live_lock:
+        _live_streams.setdefault(key, live)
+    async_runtime.submit(_produce_stream(live, text, voice, rate, volume))
+
+    # 等到第一个音频块再返回响应，合成失败时仍可返回错误状态码
+    try:
+        first = live.audio.get(timeout=STREAM_CHUNK_TIMEOUT)
+    except queue.Empty:
+        return jsonify({
+            "code": 504,
+            "data": None,
+            "msg": "Edge TTS synthesis timed out"
+        }), 504
+    if first is None and live.entry is None:
+        return jsonify({
+            "code": 500,
+            "data": None,
+            "msg": f"Edge TTS synthesis failed: {live.error}"
+        }), 500
+
+    def generate():
+        chunk = first
+        streamed = False
+        while chunk is not None:
+            streamed = True
+            yield chunk
+            try:
+                chunk = live.audio.get(timeout=STREAM_CHUNK_TIMEOUT)
+            except queue.Empty:
+                return
+        # 同一文本正由其他请求合成，完成后直接读取缓存文件
+        if not streamed and live.entry is not None:
+            yield from _iter_file(live.entry["path"])
+
+    response = Response(stream_with_context(generate()), mimetype="audio/mpeg")
+    response.headers.update(headers)
+    response.headers["X-TTS-Cached"] = "false"
+    response.headers["Cache-Control"] = "no-store"
+    return response
+
+@bp.route("/stream/<key>/events", methods=["GET"])
+def stream_events(key):
+    """逐词边界事件（SSE），合成进行中时实时推送，已缓存时一次性回放"""
+    if not CACHE_KEY_PATTERN.match(key):
+        return jsonify({
+            "code": 400,
+            "data": None,
+            "msg": "Invalid key"
+        }), 400
+
+    live = _live_streams.get(key)
+    if live is not None:
+        events = live.iter_events(STREAM_CHUNK_TIMEOUT)
+    else:
+        boundaries = tts_cache.get_boundaries(key)
+        if boundaries is None:
+            return jsonify({
+                "code": 404,
+                "data": None,
+                "msg": "Stream not found"
+            }), 404
+        events = iter(boundaries)
+
+    def generate():
+        for event in events:
+            yield f"event: boundary\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+        yield "event: end\ndata: {}\n\n"
+
+    return Response(stream_with_context(generate()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache"})
+
 @bp.route("/batch_synthesize", methods=["POST"])
 def batch_synthesize():
     """
@@ -146,7 +396,8 @@ def batch_synthesize():
         "texts": ["文本1", "文本2", ...],
         "voice": "zh-CN-XiaoxiaoNeural",
         "rate": "+0%",
-        "volume": "+0%"
+        "volume": "+0%",
+        "concurrency": 4  # 并发合成数（可选）
     }
     """
     try:
@@ -163,32 +414,41 @@ def batch_synthesize():
         voice = data.get("voice", "zh-CN-XiaoxiaoNeural")
         rate = data.get("rate", "+0%")
         volume = data.get("volume", "+0%")
+        try:
+            concurrency = int(data.get("concurrency", BATCH_CONCURRENCY))
+        except (TypeError, ValueError):
+            concurrency = BATCH_CONCURRENCY
+        concurrency = max(1, min(concurrency, MAX_BATCH_CONCURRENCY))
+
+        entries = run_async(_synthesize_batch(texts, voice, rate, volume, concurrency))
 
         results = []
-        for i, text in enumerate(texts):
-            if text.strip():
-                try:
-                    output_path = asyncio.run(_synthesize_edge(text, voice, rate, volume))
-                    relative_path = str(Path(output_path).relative_to(Path(__file__).parent.parent.parent))
-                    results.append({
-                        "index": i,
-                        "text": text,
-                        "path": relative_path,
-                        "filename": Path(output_path).name
-                    })
-                except Exception as e:
-                    results.append({
-                        "index": i,
-                        "text": text,
-                        "error": str(e)
-                    })
+        for i, (text, entry) in enumerate(zip(texts, entries)):
+            if not text.strip():
+                continue
+            if isinstance(entry, BaseException):
+                results.append({
+                    "index": i,
+                    "text": text,
+                    "error": str(entry)
+                })
+            else:
+                results.append({
+                    "index": i,
+                    "text": text,
+                    "path": _relative_path(entry["path"]),
+                    "filename": Path(entry["path"]).name,
+                    "duration": entry["duration"],
+                    "cached": entry["cached"]
+                })
 
         return jsonify({
             "code": 200,
             "data": {
                 "results": results,
                 "total": len(texts),
-                "success": len([r for r in results if "error" not in r])
+                "success": len([r for r in results if "error" not in r]),
+                "cached": len([r for r in results if r.get("cached")])
             },
             "msg": "Batch synthesis completed"
         })
@@ -198,4 +458,13 @@ def batch_synthesize():
             "code": 500,
             "data": None,
             "msg": f"Batch TTS synthesis failed: {str(e)}"
-        }), 500
\ No newline at end of file
+        }), 500
+
+@bp.route("/cache", methods=["GET"])
+def cache_stats():
+    """TTS缓存统计"""
+    return jsonify({
+        "code": 200,
+        "data": tts_cache.get_stats(),
+        "msg": "Success"
+    })
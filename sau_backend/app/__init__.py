@@ -1,6 +1,8 @@
 """Flask application factory and bootstrap utilities."""
 from __future__ import annotations
 
+import os
+import sys
 from pathlib import Path
 from typing import Any, Dict, Optional
 
@@ -40,6 +42,29 @@ def create_app(config_name: Optional[str] = None, overrides: Optional[Dict[str,
 
     register_blueprints(app)
 
+    # Long-lived event loop shared by Playwright, TTS and the publish queue.
+    from sau_backend.utils.async_runtime import async_runtime
+    from sau_backend.utils.browser_pool import browser_pool
+
+    async_runtime.start()
+    app.extensions["async_runtime"] = async_runtime
+    if os.getenv("SAU_BROWSER_WARMUP", "").lower() in ("1", "true", "yes"):
+        async_runtime.submit(browser_pool.warm_up())
+
+    # Start the publish queue with the app so queued tasks and expired leases left by a
+    # previous process are picked up without waiting for the next submission.
+    if app.config.get("PUBLISH_QUEUE_AUTOSTART", True):
+        sau_dir = str(Path(__file__).resolve().parents[1])
+        if sau_dir not in sys.path:
+            sys.path.append(sau_dir)
+        try:
+            from publish_queue import publish_queue  # same module object the content routes use
+        except ImportError as exc:
+            app.logger.warning("Publish queue unavailable: %s", exc)
+        else:
+            publish_queue.start()
+            app.extensions["publish_queue"] = publish_queue
+
     return app
 
 
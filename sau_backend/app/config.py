@@ -15,6 +15,7 @@ class BaseConfig:
     SECRET_KEY: str = os.getenv("SAU_SECRET_KEY", "change-me")
     MAX_CONTENT_LENGTH: int = 1024 * 1024 * 1024  # 1GB uploads by default
     CORS_ALLOW_ORIGINS: str = os.getenv("SAU_CORS_ALLOW_ORIGINS", "*")
+    PUBLISH_QUEUE_AUTOSTART: bool = True
     RUNTIME_DIRECTORIES = [
         "videoFile",
         "cookiesFile",
@@ -33,6 +34,7 @@ class DevelopmentConfig(BaseConfig):
 class TestingConfig(BaseConfig):
     TESTING: bool = True
     WTF_CSRF_ENABLED: bool = False
+    PUBLISH_QUEUE_AUTOSTART: bool = False
 
 
 PROFILE_MAP = {
@@ -263,22 +263,19 @@ def update_profile():
             return jsonify({"error": "没有有效的更新字段"}), 400
 
         # 执行更新
-        conn = db_manager.get_connection()
-        cursor = conn.cursor()
-
-        set_clause = ", ".join([f"{field} = ?" for field in updates.keys()])
-        values = list(updates.values()) + [user_id]
-
-        cursor.execute(
-            f"""
-            UPDATE users SET {set_clause}, updated_at = CURRENT_TIMESTAMP
-            WHERE id = ?
-        """,
-            values,
-        )
+        with db_manager.session() as conn:
+            cursor = conn.cursor()
+
+            set_clause = ", ".join([f"{field} = ?" for field in updates.keys()])
+            values = list(updates.values()) + [user_id]
 
-        conn.commit()
-        conn.close()
+            cursor.execute(
+                f"""
+                UPDATE users SET {set_clause}, updated_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            """,
+                values,
+            )
 
         return jsonify({"message": "用户信息更新成功"}), 200
 
@@ -322,19 +319,16 @@ def change_password():
         # 更新密码
         new_password_hash = security_manager.hash_password(new_password)
 
-        conn = db_manager.get_connection()
-        cursor = conn.cursor()
-
-        cursor.execute(
-            """
-            UPDATE users SET password_hash = ?, updated_at = CURRENT_TIMESTAMP
-            WHERE id = ?
-        """,
-            (new_password_hash, user_id),
-        )
+        with db_manager.session() as conn:
+            cursor = conn.cursor()
 
-        conn.commit()
-        conn.close()
+            cursor.execute(
+                """
+                UPDATE users SET password_hash = ?, updated_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            """,
+                (new_password_hash, user_id),
+            )
 
         # 撤销所有会话
         db_manager.revoke_all_sessions(user_id)
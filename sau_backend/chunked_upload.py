@@ -0,0 +1,298 @@
+"""
+分片上传模块
+可断点续传的分片上传：初始化会话 -> 按偏移量追加分片 -> 完成合并。
+分片直接流式写入临时文件，同时增量计算大小与 SHA-256，完成时原子重命名，无需二次读取。
+同一会话的操作通过 .part 文件上的 flock 互斥，多个 worker 进程处理同一会话时也不会交错写入
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Iterator, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows 下只做进程内互斥
+    fcntl = None
+
+# 分片上传临时目录
+CHUNKED_UPLOAD_DIR = Path(os.getenv("SAU_CHUNKED_UPLOAD_DIR", "uploads/.chunked"))
+# 建议的分片大小与单次读取缓冲区大小
+DEFAULT_CHUNK_SIZE = 8 * 1024 * 1024  # 8MB
+READ_BUFFER_SIZE = 1024 * 1024  # 1MB
+# 超过该时间未活动的会话会被清理（秒）
+SESSION_EXPIRE_SECONDS = 24 * 60 * 60
+# 过期会话的清理周期（秒），在创建新会话时顺带执行
+CLEANUP_INTERVAL = int(os.getenv("SAU_CHUNKED_CLEANUP_INTERVAL", 60 * 60))
+
+
+class ChunkedUploadError(Exception):
+    """分片上传错误"""
+
+    def __init__(self, message: str, status_code: int = 400, offset: Optional[int] = None):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+        self.offset = offset
+
+
+class ChunkedUploadManager:
+    """分片上传会话管理器"""
+
+    def __init__(self, upload_dir: Path = CHUNKED_UPLOAD_DIR, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        self.upload_dir = Path(upload_dir)
+        self.chunk_size = chunk_size
+        # upload_id -> (增量哈希对象, 已计入哈希的字节数)
+        self._hashers: Dict[str, Tuple[Any, int]] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+        self._last_cleanup = 0.0
+
+    def _meta_path(self, upload_id: str) -> Path:
+        return self.upload_dir / f"{upload_id}.json"
+
+    def _part_path(self, upload_id: str) -> Path:
+        return self.upload_dir / f"{upload_id}.part"
+
+    def _lock(self, upload_id: str) -> threading.Lock:
+        with self._locks_guard:
+            return self._locks.setdefault(upload_id, threading.Lock())
+
+    @staticmethod
+    def _check_id(upload_id: str):
+        # upload_id 由服务端生成，拒绝任何带路径的输入
+        if not upload_id or Path(upload_id).name != upload_id:
+            raise ChunkedUploadError("上传会话不存在", 404)
+
+    @contextmanager
+    def _locked(self, upload_id: str, blocking: bool = True) -> Iterator[bool]:
+        """会话互斥：进程内线程锁 + .part 文件上的 flock，blocking=False 时拿不到锁返回 False"""
+        self._check_id(upload_id)
+        lock = self._lock(upload_id)
+        if not lock.acquire(blocking):
+            yield False
+            return
+        try:
+            try:
+                part = open(self._part_path(upload_id), "rb")
+            except OSError:
+                raise ChunkedUploadError("上传会话不存在", 404)
+            with part:
+                if fcntl is not None:
+                    try:
+                        fcntl.flock(part.fileno(), fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except BlockingIOError:
+                        yield False
+                        return
+                # 关闭文件时释放 flock
+                yield True
+        finally:
+            lock.release()
+
+    def _save_meta(self, meta: Dict[str, Any]):
+        """原子写入会话元数据"""
+        path = self._meta_path(meta["upload_id"])
+        tmp_path = path.with_suffix(".json.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def _load_meta(self, upload_id: str, user_id: Any) -> Dict[str, Any]:
+        self._check_id(upload_id)
+        try:
+            with open(self._meta_path(upload_id), "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            raise ChunkedUploadError("上传会话不存在", 404)
+        if str(meta["user_id"]) != str(user_id):
+            raise ChunkedUploadError("无权访问此上传会话", 403)
+        return meta
+
+    def _hasher(self, meta: Dict[str, Any]):
+        """获取会话的增量哈希对象。缓存的哈希与已确认的偏移量不一致时（进程重启，
+        或分片由其他进程写入）从磁盘上已确认的数据重建"""
+        upload_id = meta["upload_id"]
+        hasher, hashed = self._hashers.get(upload_id, (None, -1))
+        if hasher is None or hashed != meta["offset"]:
+            hasher = hashlib.sha256()
+            part_path = self._part_path(upload_id)
+            if meta["offset"]:
+                with open(part_path, "rb") as f:
+                    remaining = meta["offset"]
+                    while remaining > 0:
+                        data = f.read(min(READ_BUFFER_SIZE, remaining))
+                        if not data:
+                            break
+                        hasher.update(data)
+                        remaining -= len(data)
+                # 截掉上次中断时可能多写入的未确认数据
+                with open(part_path, "r+b") as f:
+                    f.truncate(meta["offset"])
+            self._hashers[upload_id] = (hasher, meta["offset"])
+        return hasher
+
+    def init_upload(self, user_id: Any, filename: str, file_size: int,
+                    sha256: Optional[str] = None, extra: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """创建上传会话"""
+        if file_size < 0:
+            raise ChunkedUploadError("文件大小无效")
+
+        self.upload_dir.mkdir(parents=True, exist_ok=True)
+        if time.time() - self._last_cleanup >= CLEANUP_INTERVAL:
+            self._last_cleanup = time.time()
+            self.cleanup_expired()
+        upload_id = uuid.uuid4().hex
+        meta = {
+            "upload_id": upload_id,
+            "user_id": user_id,
+            "filename": filename,
+            "file_size": file_size,
+            "expected_sha256": sha256.lower() if sha256 else None,
+            "offset": 0,
+            "chunk_size": self.chunk_size,
+            "extra": extra or {},
+            "created_at": time.time(),
+            "updated_at": time.time(),
+        }
+        self._part_path(upload_id).touch()
+        self._save_meta(meta)
+        self._hashers[upload_id] = (hashlib.sha256(), 0)
+        return self._public(meta)
+
+    def get_status(self, upload_id: str, user_id: Any) -> Dict[str, Any]:
+        """获取会话状态，客户端据此从 offset 处续传"""
+        return self._public(self._load_meta(upload_id, user_id))
+
+    def write_chunk(self, upload_id: str, user_id: Any, offset: int, stream: BinaryIO,
+                    length: Optional[int] = None) -> Dict[str, Any]:
+        """从 offset 处追加一个分片，数据按缓冲区大小流式写入磁盘
+
+        Raises:
+            ChunkedUploadError: 偏移量不匹配（409，附带当前偏移量）或超出声明大小
+        """
+        with self._locked(upload_id):
+            meta = self._load_meta(upload_id, user_id)
+            if offset != meta["offset"]:
+                raise ChunkedUploadError("分片偏移量不匹配", 409, offset=meta["offset"])
+
+            hasher = self._hasher(meta)
+            limit = meta["file_size"] - offset
+            written = 0
+            try:
+                with open(self._part_path(upload_id), "r+b") as f:
+                    f.seek(offset)
+                    while length is None or written < length:
+                        to_read = READ_BUFFER_SIZE if length is None else min(READ_BUFFER_SIZE, length - written)
+                        data = stream.read(to_read)
+                        if not data:
+                            break
+                        if written + len(data) > limit:
+                            raise ChunkedUploadError("分片超出声明的文件大小", 413, offset=meta["offset"])
+                        f.write(data)
+                        hasher.update(data)
+                        written += len(data)
+                    # 去掉此前失败写入残留在偏移量之后的数据
+                    f.truncate(offset + written)
+            except Exception:
+                # 丢弃本次分片：哈希状态在下次写入时按已确认的偏移量重建，多写入的数据会被截断
+                self._hashers.pop(upload_id, None)
+                raise
+
+            meta["offset"] = offset + written
+            meta["updated_at"] = time.time()
+            self._save_meta(meta)
+            self._hashers[upload_id] = (hasher, meta["offset"])
+            return self._public(meta)
+
+    def complete_upload(self, upload_id: str, user_id: Any, dest_path: Path) -> Dict[str, Any]:
+        """校验大小与哈希后将临时文件重命名到目标路径"""
+        with self._locked(upload_id):
+            meta = self._load_meta(upload_id, user_id)
+            if meta["offset"] != meta["file_size"]:
+                raise ChunkedUploadError("文件尚未上传完整", 409, offset=meta["offset"])
+
+            digest = self._hasher(meta).hexdigest()
+            if meta["expected_sha256"] and meta["expected_sha256"] != digest:
+                raise ChunkedUploadError("文件校验失败，哈希不一致", 422)
+
+            dest_path = Path(dest_path)
+            dest_path.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(self._part_path(upload_id), dest_path)
+            self._discard(upload_id)
+
+        result = self._public(meta)
+        result.update({"sha256": digest, "file_path": str(dest_path), "extra": meta["extra"]})
+        return result
+
+    def abort_upload(self, upload_id: str, user_id: Any):
+        """取消上传并删除临时文件"""
+        with self._locked(upload_id):
+            self._load_meta(upload_id, user_id)
+            try:
+                self._part_path(upload_id).unlink()
+            except OSError:
+                pass
+            self._discard(upload_id)
+
+    def cleanup_expired(self, max_age: int = SESSION_EXPIRE_SECONDS) -> int:
+        """清理长时间未活动的会话，返回清理数量"""
+        if not self.upload_dir.exists():
+            return 0
+        removed = 0
+        now = time.time()
+        for meta_path in self.upload_dir.glob("*.json"):
+            if not meta_path.exists() or now - self._read_updated_at(meta_path) < max_age:
+                continue
+            upload_id = meta_path.stem
+            try:
+                with self._locked(upload_id, blocking=False) as acquired:
+                    # 正在被写入或刚刚有活动的会话跳过，下个周期再判断
+                    if not acquired or now - self._read_updated_at(meta_path) < max_age:
+                        continue
+                    try:
+                        self._part_path(upload_id).unlink()
+                    except OSError:
+                        pass
+            except ChunkedUploadError:
+                # 临时文件已不存在，只剩元数据
+                pass
+            self._discard(upload_id)
+            removed += 1
+        return removed
+
+    @staticmethod
+    def _read_updated_at(meta_path: Path) -> float:
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                return json.load(f).get("updated_at", 0)
+        except (OSError, ValueError):
+            return 0
+
+    def _discard(self, upload_id: str):
+        try:
+            self._meta_path(upload_id).unlink()
+        except OSError:
+            pass
+        self._hashers.pop(upload_id, None)
+        with self._locks_guard:
+            self._locks.pop(upload_id, None)
+
+    @staticmethod
+    def _public(meta: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "upload_id": meta["upload_id"],
+            "filename": meta["filename"],
+            "file_size": meta["file_size"],
+            "offset": meta["offset"],
+            "chunk_size": meta["chunk_size"],
+            "complete": meta["offset"] == meta["file_size"],
+        }
+
+
+# 创建全局分片上传管理器实例
+chunked_upload_manager = ChunkedUploadManager()
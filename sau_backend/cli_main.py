@@ -12,7 +12,9 @@ from uploader.tk_uploader.main_chrome import tiktok_setup, TiktokVideo
 from utils.base_social_media import get_supported_social_media, get_cli_action, SOCIAL_MEDIA_DOUYIN, \
     SOCIAL_MEDIA_TENCENT, SOCIAL_MEDIA_TIKTOK, SOCIAL_MEDIA_KUAISHOU
 from utils.constant import TencentZoneTypes
+from utils.cookie_validator import cookie_validator, find_cookie_files
 from utils.files_times import get_title_and_hashtags
+from sau_backend.utils.browser_pool import browser_pool
 
 
 def parse_schedule(schedule_raw):
@@ -42,6 +44,11 @@ async def main():
             action_parser.add_argument("-pt", "--publish_type", type=int, choices=[0, 1],
                                        help="0 for immediate, 1 for scheduled", default=0)
             action_parser.add_argument('-t', '--schedule', help='Schedule UTC time in %Y-%m-%d %H:%M format')
+        elif action == 'validate':
+            # account_name 支持逗号分隔的多个账号，或 all 表示该平台全部 cookie
+            action_parser.add_argument("-c", "--concurrency", type=int, default=None,
+                                       help="Number of accounts checked in parallel")
+            action_parser.add_argument("-f", "--force", action="store_true", help="Ignore cached verdicts")
 
     # 解析命令行参数
     args = parser.parse_args()
@@ -66,6 +73,21 @@ async def main():
             await weixin_setup(str(account_file), handle=True)
         elif args.platform == SOCIAL_MEDIA_KUAISHOU:
             await ks_setup(str(account_file), handle=True)
+    elif args.action == 'validate':
+        if args.account_name == 'all':
+            cookie_files = find_cookie_files(BASE_DIR / "cookies", args.platform)
+        else:
+            cookie_files = [str(BASE_DIR / "cookies" / f"{args.platform}_{name.strip()}.json")
+                            for name in args.account_name.split(",") if name.strip()]
+        results = await cookie_validator.validate_many(
+            [(args.platform, f) for f in cookie_files], force=args.force, concurrency=args.concurrency
+        )
+        for result in results:
+            verdict = "valid" if result.valid else ("invalid" if result.valid is False else "error")
+            print(f"{Path(result.cookie_file).stem}\t{verdict}\t{result.latency * 1000:.0f}ms"
+                  + (f"\t{result.error}" if result.error else ""))
+        valid_count = sum(1 for r in results if r.valid)
+        print(f"{valid_count}/{len(results)} cookies valid")
     elif args.action == 'upload':
         title, tags = get_title_and_hashtags(args.video_file)
         video_file = args.video_file
@@ -97,5 +119,11 @@ async def main():
         await app.main()
 
 
+async def run():
+    # 命令行独立运行，退出时关闭本进程启动的浏览器池
+    async with browser_pool.session():
+        await main()
+
+
 if __name__ == "__main__":
-    asyncio.run(main())
+    asyncio.run(run())
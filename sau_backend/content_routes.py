@@ -8,7 +8,6 @@ from datetime import datetime
 import sys
 import os
 import json
-import asyncio
 import threading
 from typing import Dict, Any, List
 from pathlib import Path
@@ -19,22 +18,13 @@ sys.path.append("/Users/sunyouyou/Desktop/projects/bzhi/social-auto-upload/sau_b
 
 from security import security_manager, require_auth
 from models import db_manager
-from platforms.douyin_platform import douyin_platform
+from publish_queue import publish_queue
+from sau_backend.utils.http_cache import cache_response
 
 # 创建内容发布蓝图
 content_bp = Blueprint("content", __name__, url_prefix="/api/content")
 
 
-def run_async_in_thread(coro):
-    """在新线程中运行异步函数"""
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    try:
-        return loop.run_until_complete(coro)
-    finally:
-        loop.close()
-
-
 @content_bp.route("/publish/video", methods=["POST"])
 @require_auth
 def publish_video():
@@ -96,57 +86,20 @@ def publish_video():
             os.remove(video_path)
             return jsonify({"error": "没有找到可用的发布账号"}), 400
 
-        # 执行发布任务
-        results = []
-        for account in target_accounts:
-            try:
-                if account.platform == "douyin":
-                    result = run_async_in_thread(
-                        douyin_platform.upload_video(
-                            account.id, video_path, title, description, tags
-                        )
-                    )
-                    results.append({
-                        "platform": account.platform,
-                        "account_id": account.id,
-                        "account_name": account.account_name,
-                        "success": result["success"],
-                        "message": result["message"]
-                    })
-                else:
-                    results.append({
-                        "platform": account.platform,
-                        "account_id": account.id,
-                        "account_name": account.account_name,
-                        "success": False,
-                        "message": f"暂不支持 {account.platform} 平台的视频发布"
-                    })
-            except Exception as e:
-                results.append({
-                    "platform": account.platform,
-                    "account_id": account.id,
-                    "account_name": account.account_name,
-                    "success": False,
-                    "message": f"发布失败: {str(e)}"
-                })
-
-        # 删除临时文件
-        try:
-            os.remove(video_path)
-        except:
-            pass
-
-        # 统计结果
-        success_count = sum(1 for r in results if r["success"])
-        total_count = len(results)
+        # 提交到发布队列，由后台工作池并发执行，视频文件在作业结束后清理
+        job_id = publish_queue.submit_video_job(
+            user_id, target_accounts, video_path, title, description, tags
+        )
+        job = publish_queue.get_job(job_id)
 
         return jsonify({
-            "message": f"发布完成，成功: {success_count}/{total_count}",
+            "message": "视频发布任务已提交",
+            "task_id": job_id,
             "title": title,
-            "results": results,
-            "success_count": success_count,
-            "total_count": total_count
-        }), 200
+            "status": job["status"],
+            "results": job["tasks"],
+            "total_count": job["total_count"]
+        }), 202
 
     except Exception as e:
         return jsonify({"error": f"发布视频失败: {str(e)}"}), 500
@@ -353,20 +306,34 @@ def get_publish_status(task_id):
     try:
         user_id = g.user_id
 
-        # 这里应该从数据库中查询任务状态
-        # 目前返回模拟数据
-        return jsonify({
-            "task_id": task_id,
-            "status": "completed",
-            "message": "发布任务已完成",
-            "created_at": datetime.utcnow().isoformat(),
-            "updated_at": datetime.utcnow().isoformat()
-        }), 200
+        job = publish_queue.get_job(task_id, user_id)
+        if not job:
+            return jsonify({"error": "发布任务不存在"}), 404
+
+        job["task_id"] = job.pop("id")
+        job["message"] = f"成功: {job['success_count']}/{job['total_count']}"
+        return jsonify(job), 200
 
     except Exception as e:
         return jsonify({"error": f"获取发布状态失败: {str(e)}"}), 500
 
 
+@content_bp.route("/status/<int:task_id>/cancel", methods=["POST"])
+@require_auth
+def cancel_publish_task(task_id):
+    """取消发布任务中尚未开始的部分"""
+    try:
+        user_id = g.user_id
+
+        if not publish_queue.cancel_job(task_id, user_id):
+            return jsonify({"error": "发布任务不存在"}), 404
+
+        return jsonify(publish_queue.get_job(task_id, user_id)), 200
+
+    except Exception as e:
+        return jsonify({"error": f"取消发布任务失败: {str(e)}"}), 500
+
+
 @content_bp.route("/history", methods=["GET"])
 @require_auth
 def get_publish_history():
@@ -377,47 +344,7 @@ def get_publish_history():
         limit = request.args.get("limit", 10, type=int)
         platform = request.args.get("platform", "").strip()
 
-        # 这里应该从数据库中查询发布历史
-        # 目前返回模拟数据
-        mock_history = [
-            {
-                "id": 1,
-                "title": "测试视频发布",
-                "type": "video",
-                "platform": "douyin",
-                "status": "success",
-                "created_at": datetime.utcnow().isoformat(),
-                "account_name": "我的抖音账号"
-            },
-            {
-                "id": 2,
-                "title": "测试文本发布",
-                "type": "text",
-                "platform": "wechat",
-                "status": "pending",
-                "created_at": datetime.utcnow().isoformat(),
-                "account_name": "我的微信账号"
-            }
-        ]
-
-        # 过滤平台
-        if platform:
-            mock_history = [item for item in mock_history if item["platform"] == platform]
-
-        # 分页
-        start = (page - 1) * limit
-        end = start + limit
-        paginated_history = mock_history[start:end]
-
-        return jsonify({
-            "history": paginated_history,
-            "pagination": {
-                "page": page,
-                "limit": limit,
-                "total": len(mock_history),
-                "pages": (len(mock_history) + limit - 1) // limit
-            }
-        }), 200
+        return jsonify(publish_queue.get_history(user_id, page, limit, platform)), 200
 
     except Exception as e:
         return jsonify({"error": f"获取发布历史失败: {str(e)}"}), 500
@@ -425,6 +352,7 @@ def get_publish_history():
 
 @content_bp.route("/templates", methods=["GET"])
 @require_auth
+@cache_response(timeout=3600)
 def get_content_templates():
     """获取内容模板"""
     try:
@@ -8,7 +8,6 @@ from datetime import datetime
 import sys
 import os
 import json
-import asyncio
 import threading
 import base64
 from pathlib import Path
@@ -19,21 +18,13 @@ sys.path.append("/Users/sunyouyou/Desktop/projects/bzhi/social-auto-upload/sau_b
 from security import security_manager, require_auth
 from models import db_manager
 from platforms.douyin_platform import douyin_platform
+from sau_backend.utils.async_runtime import run_async
+from sau_backend.utils.http_cache import cache_response
 
 # 创建抖音平台蓝图
 douyin_bp = Blueprint("douyin", __name__, url_prefix="/api/douyin")
 
 
-def run_async_in_thread(coro):
-    """在新线程中运行异步函数"""
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    try:
-        return loop.run_until_complete(coro)
-    finally:
-        loop.close()
-
-
 @douyin_bp.route("/login/qr/<int:account_id>", methods=["POST"])
 @require_auth
 def generate_qr_code(account_id):
@@ -53,7 +44,7 @@ def generate_qr_code(account_id):
             return jsonify({"error": "不是抖音账号"}), 400
 
         # 生成二维码
-        result = run_async_in_thread(
+        result = run_async(
             douyin_platform.login_with_qr(account_id, account.cookie_path)
         )
 
@@ -85,7 +76,7 @@ def wait_for_login(account_id):
             return jsonify({"error": "不是抖音账号"}), 400
 
         # 等待登录
-        result = run_async_in_thread(
+        result = run_async(
             douyin_platform.wait_for_login(account_id, account.cookie_path)
         )
 
@@ -117,7 +108,7 @@ def check_login_status(account_id):
             return jsonify({"error": "不是抖音账号"}), 400
 
         # 检查登录状态
-        result = run_async_in_thread(
+        result = run_async(
             douyin_platform.check_login_status(account_id, account.cookie_path)
         )
 
@@ -167,7 +158,7 @@ def upload_video(account_id):
             return jsonify({"error": "视频文件不存在"}), 400
 
         # 上传视频
-        result = run_async_in_thread(
+        result = run_async(
             douyin_platform.upload_video(account_id, video_path, title, description, tags)
         )
 
@@ -231,7 +222,7 @@ def upload_video_file(account_id):
         video_file.save(video_path)
 
         # 上传视频到抖音
-        result = run_async_in_thread(
+        result = run_async(
             douyin_platform.upload_video(account_id, video_path, title, description, tags)
         )
 
@@ -303,6 +294,7 @@ def get_qr_image(account_id):
 
 @douyin_bp.route("/accounts/list", methods=["GET"])
 @require_auth
+@cache_response(timeout=60, tags=("accounts",))
 def get_douyin_accounts():
     """获取用户的所有抖音账号"""
     try:
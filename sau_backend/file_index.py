@@ -0,0 +1,136 @@
+"""
+文件索引模块
+维护 files 表与 uploads 目录的一致性，提供从磁盘重建索引的 reconcile 命令：
+    python file_index.py [--user USER_ID] [--root uploads] [--no-hash]
+"""
+
+import argparse
+import json
+import sys
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional
+
+# 添加sau_backend到路径
+sys.path.append("/Users/sunyouyou/Desktop/projects/bzhi/social-auto-upload/sau_backend")
+
+from models import db_manager, FileRecord
+from sau_backend.utils.media_store import media_store
+
+# 上传根目录
+UPLOAD_ROOT = Path("uploads")
+# 目录名与文件类型不一致的情况（图片接口写入 images 目录）
+DIR_FILE_TYPES = {"images": "image"}
+
+
+def file_timestamp(dt: Optional[datetime] = None) -> str:
+    """生成 files.created_at，固定精度保证字符串顺序与时间顺序一致"""
+    return (dt or datetime.utcnow()).isoformat(timespec="microseconds")
+
+
+def index_file(user_id: int, file_id: str, file_type: str, filename: str, file_size: int,
+               file_path: Path, sha256: str = None, description: str = "", tags=None,
+               created_at: str = None) -> FileRecord:
+    """上传完成后登记文件"""
+    record = FileRecord(
+        id=file_id,
+        user_id=user_id,
+        file_type=file_type,
+        filename=filename,
+        file_size=file_size,
+        file_path=str(file_path),
+        created_at=created_at or file_timestamp(),
+        sha256=sha256,
+        description=description,
+        tags=tags or [],
+    )
+    db_manager.create_file_record(record)
+    return record
+
+
+def reconcile_file_index(upload_root: Path = UPLOAD_ROOT, user_id: Optional[int] = None,
+                         compute_hash: bool = True) -> Dict[str, int]:
+    """按磁盘内容重建文件索引
+
+    删除磁盘上已不存在的记录，登记未入索引的文件并刷新大小不一致的记录，
+    最后重新计算用户存储统计
+    """
+    stats = {"scanned": 0, "added": 0, "updated": 0, "removed": 0}
+    upload_root = Path(upload_root)
+
+    with db_manager.session() as conn:
+        cursor = conn.cursor()
+        if user_id is None:
+            cursor.execute("SELECT id, file_path, file_size FROM files")
+        else:
+            cursor.execute("SELECT id, file_path, file_size FROM files WHERE user_id = ?", (user_id,))
+        indexed = {row["file_path"]: row for row in cursor.fetchall()}
+
+        if user_id is not None:
+            user_dirs = [upload_root / str(user_id)]
+        else:
+            user_dirs = list(upload_root.iterdir()) if upload_root.exists() else []
+        seen = set()
+        for user_dir in user_dirs:
+            # 跳过分片上传临时目录等非用户目录
+            if not user_dir.is_dir() or not user_dir.name.isdigit():
+                continue
+            for type_dir in user_dir.iterdir():
+                if not type_dir.is_dir():
+                    continue
+                file_type = DIR_FILE_TYPES.get(type_dir.name, type_dir.name)
+                for file in type_dir.iterdir():
+                    if not file.is_file():
+                        continue
+                    stats["scanned"] += 1
+                    path = str(file)
+                    seen.add(path)
+                    file_stat = file.stat()
+                    row = indexed.get(path)
+                    if row is not None and row["file_size"] == file_stat.st_size:
+                        continue
+
+                    sha256 = media_store.digest(file) if compute_hash else None
+                    if row is not None:
+                        # 保留原有文件名、描述与标签，只刷新大小与哈希
+                        cursor.execute(
+                            "UPDATE files SET file_size = ?, sha256 = ? WHERE id = ?",
+                            (file_stat.st_size, sha256, row["id"]),
+                        )
+                        stats["updated"] += 1
+                        continue
+
+                    cursor.execute(
+                        """
+                        INSERT OR REPLACE INTO files (id, user_id, file_type, filename, file_size, file_path,
+                                                      created_at, sha256, description, tags)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, '', ?)
+                    """,
+                        (file.stem, int(user_dir.name), file_type, file.name, file_stat.st_size, path,
+                         file_timestamp(datetime.utcfromtimestamp(file_stat.st_ctime)), sha256, json.dumps([])),
+                    )
+                    stats["added"] += 1
+
+        for path, row in indexed.items():
+            if path not in seen:
+                cursor.execute("DELETE FROM files WHERE id = ?", (row["id"],))
+                stats["removed"] += 1
+
+    db_manager.rebuild_user_storage(user_id)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild the file index from the uploads directory")
+    parser.add_argument("--user", type=int, default=None, help="Only reconcile this user id")
+    parser.add_argument("--root", default=str(UPLOAD_ROOT), help="Upload root directory")
+    parser.add_argument("--no-hash", action="store_true", help="Skip hashing newly indexed files")
+    args = parser.parse_args()
+
+    stats = reconcile_file_index(Path(args.root), user_id=args.user, compute_hash=not args.no_hash)
+    print(f"✅ 文件索引重建完成: 扫描 {stats['scanned']}，新增 {stats['added']}，"
+          f"更新 {stats['updated']}，移除 {stats['removed']}")
+
+
+if __name__ == "__main__":
+    main()
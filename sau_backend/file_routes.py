@@ -9,6 +9,7 @@ import sys
 import os
 import json
 import uuid
+import base64
 from pathlib import Path
 from werkzeug.utils import secure_filename
 from typing import Dict, Any, List
@@ -16,8 +17,11 @@ from typing import Dict, Any, List
 # 添加sau_backend到路径
 sys.path.append("/Users/sunyouyou/Desktop/projects/bzhi/social-auto-upload/sau_backend")
 
-from security import security_manager, require_auth
+from security import security_manager, require_auth, require_admin
 from models import db_manager
+from chunked_upload import chunked_upload_manager, ChunkedUploadError
+from sau_backend.utils.media_store import media_store
+from file_index import index_file, reconcile_file_index
 
 # 创建文件管理蓝图
 file_bp = Blueprint("file", __name__, url_prefix="/api/file")
@@ -31,6 +35,8 @@ ALLOWED_DOCUMENT_EXTENSIONS = {'pdf', 'doc', 'docx', 'txt', 'rtf'}
 # 文件大小限制（字节）
 MAX_FILE_SIZE = 100 * 1024 * 1024  # 100MB
 MAX_VIDEO_SIZE = 500 * 1024 * 1024  # 500MB
+# 分片上传的视频大小上限，分片按请求写入磁盘，不受单次上传的内存与请求体限制
+MAX_CHUNKED_VIDEO_SIZE = int(os.getenv("SAU_CHUNKED_MAX_SIZE", 8 * 1024 * 1024 * 1024))  # 8GB
 
 
 def allowed_file(filename: str, allowed_extensions: set) -> bool:
@@ -86,7 +92,8 @@ def upload_file():
         # 获取文件信息
         filename = secure_filename(file.filename)
         file_type = get_file_type(filename)
-        file_size = len(file.read())
+        file.seek(0, 2)  # 移动到文件末尾，无需将整个文件读入内存
+        file_size = file.tell()
         file.seek(0)  # 重置文件指针
 
         # 检查文件大小
@@ -109,13 +116,17 @@ def upload_file():
         unique_filename = f"{file_uuid}.{file_ext}"
         file_path = upload_dir / unique_filename
 
-        # 保存文件
-        file.save(str(file_path))
+        # 保存文件（写入内容寻址存储，相同内容只保留一份）
+        stored = media_store.store_stream(file.stream, file_path, owner=user_id, kind=file_type)
 
         # 获取可选参数
         description = request.form.get("description", "").strip()
         tags = request.form.get("tags", "").strip().split(",") if request.form.get("tags") else []
 
+        # 登记文件索引
+        record = index_file(user_id, file_uuid, file_type, filename, stored.size, file_path,
+                            sha256=stored.sha256, description=description, tags=tags)
+
         # 返回文件信息
         file_info = {
             "id": file_uuid,
@@ -125,10 +136,11 @@ def upload_file():
             "file_size": file_size,
             "file_size_human": get_file_size_human(file_size),
             "file_path": str(file_path),
+            "sha256": stored.sha256,
             "url": f"/api/file/download/{file_uuid}",
             "description": description,
             "tags": tags,
-            "created_at": datetime.utcnow().isoformat(),
+            "created_at": record.created_at,
             "created_by": user_id
         }
 
@@ -141,6 +153,169 @@ def upload_file():
         return jsonify({"error": f"文件上传失败: {str(e)}"}), 500
 
 
+def check_upload_limits(file_type: str, file_size: int, max_video_size: int = MAX_VIDEO_SIZE):
+    """检查文件类型与大小限制，返回错误信息或 None"""
+    if file_type == 'unknown':
+        return "不支持的文件类型"
+    if file_type == 'video':
+        if file_size > max_video_size:
+            return f"视频文件过大，最大支持 {get_file_size_human(max_video_size)}"
+    elif file_size > MAX_FILE_SIZE:
+        return f"文件过大，最大支持 {get_file_size_human(MAX_FILE_SIZE)}"
+    return None
+
+
+@file_bp.route("/upload/init", methods=["POST"])
+@require_auth
+def init_chunked_upload():
+    """初始化分片上传会话"""
+    try:
+        user_id = g.user_id
+        data = request.get_json()
+        if not data:
+            return jsonify({"error": "缺少上传参数"}), 400
+
+        filename = secure_filename(data.get("filename", ""))
+        file_size = data.get("file_size")
+        if not filename:
+            return jsonify({"error": "文件名不能为空"}), 400
+        if not isinstance(file_size, int) or file_size <= 0:
+            return jsonify({"error": "文件大小无效"}), 400
+
+        file_type = get_file_type(filename)
+        error = check_upload_limits(file_type, file_size, MAX_CHUNKED_VIDEO_SIZE)
+        if error:
+            return jsonify({"error": error}), 400
+
+        description = data.get("description") or ""
+        tags = data.get("tags") or []
+        if isinstance(tags, str):
+            tags = tags.split(",")
+        if not isinstance(description, str):
+            return jsonify({"error": "文件描述必须是字符串"}), 400
+        if not isinstance(tags, list) or not all(isinstance(tag, str) for tag in tags):
+            return jsonify({"error": "标签必须是字符串列表或逗号分隔的字符串"}), 400
+        tags = [tag.strip() for tag in tags if tag.strip()]
+
+        session = chunked_upload_manager.init_upload(
+            user_id, filename, file_size, sha256=data.get("sha256"),
+            extra={"description": description.strip(), "tags": tags}
+        )
+
+        return jsonify({
+            "message": "上传会话已创建",
+            "upload": session
+        }), 201
+
+    except ChunkedUploadError as e:
+        return jsonify({"error": e.message}), e.status_code
+    except Exception as e:
+        return jsonify({"error": f"创建上传会话失败: {str(e)}"}), 500
+
+
+@file_bp.route("/upload/<upload_id>", methods=["PUT"])
+@require_auth
+def put_upload_chunk(upload_id):
+    """上传分片，请求体为原始字节，偏移量通过 Upload-Offset 头或 offset 参数指定"""
+    try:
+        user_id = g.user_id
+        offset = request.headers.get("Upload-Offset", request.args.get("offset"))
+        if offset is None or not str(offset).isdigit():
+            return jsonify({"error": "缺少有效的分片偏移量"}), 400
+
+        session = chunked_upload_manager.write_chunk(
+            upload_id, user_id, int(offset), request.stream, request.content_length
+        )
+
+        return jsonify({"upload": session}), 200
+
+    except ChunkedUploadError as e:
+        body = {"error": e.message}
+        if e.offset is not None:
+            body["offset"] = e.offset
+        return jsonify(body), e.status_code
+    except Exception as e:
+        return jsonify({"error": f"分片上传失败: {str(e)}"}), 500
+
+
+@file_bp.route("/upload/<upload_id>", methods=["GET"])
+@require_auth
+def get_upload_status(upload_id):
+    """查询分片上传进度，用于断点续传"""
+    try:
+        return jsonify({"upload": chunked_upload_manager.get_status(upload_id, g.user_id)}), 200
+
+    except ChunkedUploadError as e:
+        return jsonify({"error": e.message}), e.status_code
+    except Exception as e:
+        return jsonify({"error": f"获取上传状态失败: {str(e)}"}), 500
+
+
+@file_bp.route("/upload/<upload_id>/complete", methods=["POST"])
+@require_auth
+def complete_chunked_upload(upload_id):
+    """完成分片上传，校验后移动到用户目录"""
+    try:
+        user_id = g.user_id
+        status = chunked_upload_manager.get_status(upload_id, user_id)
+
+        filename = status["filename"]
+        file_type = get_file_type(filename)
+        file_uuid = str(uuid.uuid4())
+        file_ext = filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
+        file_path = Path("uploads") / str(user_id) / file_type / f"{file_uuid}.{file_ext}"
+
+        result = chunked_upload_manager.complete_upload(upload_id, user_id, file_path)
+        # 分片上传时已计算哈希，直接移入存储而不重新读取文件
+        media_store.store_file(file_path, sha256=result["sha256"], owner=user_id, kind=file_type)
+        record = index_file(user_id, file_uuid, file_type, filename, result["file_size"], file_path,
+                            sha256=result["sha256"], description=result["extra"].get("description", ""),
+                            tags=result["extra"].get("tags", []))
+
+        file_info = {
+            "id": file_uuid,
+            "filename": filename,
+            "original_name": filename,
+            "file_type": file_type,
+            "file_size": result["file_size"],
+            "file_size_human": get_file_size_human(result["file_size"]),
+            "file_path": str(file_path),
+            "sha256": result["sha256"],
+            "url": f"/api/file/download/{file_uuid}",
+            "description": result["extra"].get("description", ""),
+            "tags": result["extra"].get("tags", []),
+            "created_at": record.created_at,
+            "created_by": user_id
+        }
+
+        return jsonify({
+            "message": "文件上传成功",
+            "file": file_info
+        }), 200
+
+    except ChunkedUploadError as e:
+        body = {"error": e.message}
+        if e.offset is not None:
+            body["offset"] = e.offset
+        return jsonify(body), e.status_code
+    except Exception as e:
+        return jsonify({"error": f"完成上传失败: {str(e)}"}), 500
+
+
+@file_bp.route("/upload/<upload_id>", methods=["DELETE"])
+@require_auth
+def abort_chunked_upload(upload_id):
+    """取消分片上传"""
+    try:
+        chunked_upload_manager.abort_upload(upload_id, g.user_id)
+        return jsonify({"message": "上传已取消"}), 200
+
+    except ChunkedUploadError as e:
+        return jsonify({"error": e.message}), e.status_code
+    except Exception as e:
+        return jsonify({"error": f"取消上传失败: {str(e)}"}), 500
+
+
 @file_bp.route("/upload/video", methods=["POST"])
 @require_auth
 def upload_video():
@@ -181,7 +356,8 @@ def upload_video():
         video_path = video_dir / unique_filename
 
         # 保存视频文件
-        video_file.save(str(video_path))
+        stored = media_store.store_stream(video_file.stream, video_path, owner=user_id, kind="video")
+        record = index_file(user_id, file_uuid, "video", filename, stored.size, video_path, sha256=stored.sha256)
 
         # 获取视频信息（可选，可以使用ffprobe获取详细视频信息）
         video_info = {
@@ -192,7 +368,7 @@ def upload_video():
             "file_size_human": get_file_size_human(file_size),
             "file_path": str(video_path),
             "url": f"/api/file/download/{file_uuid}",
-            "created_at": datetime.utcnow().isoformat(),
+            "created_at": record.created_at,
             "created_by": user_id,
             "duration": None,  # 可以通过ffprobe获取
             "resolution": None,  # 可以通过ffprobe获取
@@ -248,7 +424,8 @@ def upload_image():
         image_path = image_dir / unique_filename
 
         # 保存图片文件
-        image_file.save(str(image_path))
+        stored = media_store.store_stream(image_file.stream, image_path, owner=user_id, kind="image")
+        record = index_file(user_id, file_uuid, "image", filename, stored.size, image_path, sha256=stored.sha256)
 
         # 获取图片信息
         image_info = {
@@ -259,7 +436,7 @@ def upload_image():
             "file_size_human": get_file_size_human(file_size),
             "file_path": str(image_path),
             "url": f"/api/file/download/{file_uuid}",
-            "created_at": datetime.utcnow().isoformat(),
+            "created_at": record.created_at,
             "created_by": user_id,
             "format": file_ext.upper()
         }
@@ -333,7 +510,9 @@ def upload_multiple_files():
                 file_path = upload_dir / unique_filename
 
                 # 保存文件
-                file.save(str(file_path))
+                stored = media_store.store_stream(file.stream, file_path, owner=user_id, kind=file_type)
+                record = index_file(user_id, file_uuid, file_type, filename, stored.size, file_path,
+                                    sha256=stored.sha256)
 
                 file_info = {
                     "id": file_uuid,
@@ -343,7 +522,7 @@ def upload_multiple_files():
                     "file_size_human": get_file_size_human(file_size),
                     "file_path": str(file_path),
                     "url": f"/api/file/download/{file_uuid}",
-                    "created_at": datetime.utcnow().isoformat(),
+                    "created_at": record.created_at,
                     "created_by": user_id
                 }
                 uploaded_files.append(file_info)
@@ -371,32 +550,14 @@ def download_file(file_id):
     try:
         user_id = g.user_id
 
-        # 在用户目录中查找文件
-        user_upload_dir = Path("uploads") / str(user_id)
-        if not user_upload_dir.exists():
-            return jsonify({"error": "文件不存在"}), 404
-
-        # 搜索文件
-        file_path = None
-        for file_type_dir in user_upload_dir.iterdir():
-            if file_type_dir.is_dir():
-                for file in file_type_dir.iterdir():
-                    if file.stem == file_id:
-                        file_path = file
-                        break
-                if file_path:
-                    break
-
-        if not file_path or not file_path.exists():
+        record = db_manager.get_file_record(user_id, file_id)
+        if not record or not Path(record.file_path).exists():
             return jsonify({"error": "文件不存在"}), 404
 
-        # 获取文件名
-        original_filename = file_path.name.replace(f"{file_id}.", "")
-
         return send_file(
-            str(file_path),
+            record.file_path,
             as_attachment=True,
-            download_name=original_filename
+            download_name=record.filename
         )
 
     except Exception as e:
@@ -410,80 +571,87 @@ def preview_file(file_id):
     try:
         user_id = g.user_id
 
-        # 在用户目录中查找文件
-        user_upload_dir = Path("uploads") / str(user_id) / "images"
-        if not user_upload_dir.exists():
-            return jsonify({"error": "文件不存在"}), 404
-
-        # 搜索图片文件
-        file_path = None
-        for file in user_upload_dir.iterdir():
-            if file.stem == file_id:
-                file_path = file
-                break
-
-        if not file_path or not file_path.exists():
+        record = db_manager.get_file_record(user_id, file_id)
+        if not record or record.file_type != "image" or not Path(record.file_path).exists():
             return jsonify({"error": "图片文件不存在"}), 404
 
-        return send_file(str(file_path))
+        return send_file(record.file_path)
 
     except Exception as e:
         return jsonify({"error": f"文件预览失败: {str(e)}"}), 500
 
 
+def encode_list_cursor(created_at: str, file_id: str) -> str:
+    """生成列表分页游标"""
+    return base64.urlsafe_b64encode(f"{created_at}|{file_id}".encode()).decode()
+
+
+def decode_list_cursor(cursor: str):
+    """解析列表分页游标，无效时返回 None"""
+    try:
+        created_at, file_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|", 1)
+        return created_at, file_id
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
 @file_bp.route("/list", methods=["GET"])
 @require_auth
 def list_files():
-    """列出用户文件"""
+    """列出用户文件
+
+    支持 cursor 键集分页（推荐，响应中的 next_cursor 用于获取下一页），
+    未提供 cursor 时按 page 分页
+    """
     try:
         user_id = g.user_id
         file_type = request.args.get("type", "").strip()
         page = request.args.get("page", 1, type=int)
-        limit = request.args.get("limit", 20, type=int)
-
-        user_upload_dir = Path("uploads") / str(user_id)
-        if not user_upload_dir.exists():
-            return jsonify({
-                "files": [],
-                "total": 0,
-                "page": page,
-                "limit": limit
-            }), 200
-
-        files = []
-        for file_type_dir in user_upload_dir.iterdir():
-            if file_type_dir.is_dir():
-                # 过滤文件类型
-                if file_type and file_type_dir.name != file_type:
-                    continue
+        limit = min(max(request.args.get("limit", 20, type=int), 1), 100)
+        cursor = request.args.get("cursor")
+
+        cursor_key = None
+        if cursor:
+            cursor_key = decode_list_cursor(cursor)
+            if cursor_key is None:
+                return jsonify({"error": "无效的分页游标"}), 400
+
+        records = db_manager.list_file_records(
+            user_id, file_type=file_type or None, limit=limit,
+            cursor_key=cursor_key, offset=(max(page, 1) - 1) * limit
+        )
 
-                for file in file_type_dir.iterdir():
-                    if file.is_file():
-                        file_stat = file.stat()
-                        files.append({
-                            "id": file.stem,
-                            "filename": file.name,
-                            "file_type": file_type_dir.name,
-                            "file_size": file_stat.st_size,
-                            "file_size_human": get_file_size_human(file_stat.st_size),
-                            "created_at": datetime.fromtimestamp(file_stat.st_ctime).isoformat(),
-                            "url": f"/api/file/download/{file.stem}"
-                        })
-
-        # 按创建时间排序
-        files.sort(key=lambda x: x["created_at"], reverse=True)
-
-        # 分页
-        start = (page - 1) * limit
-        end = start + limit
-        paginated_files = files[start:end]
+        files = [{
+            "id": record.id,
+            "filename": record.filename,
+            "file_type": record.file_type,
+            "file_size": record.file_size,
+            "file_size_human": get_file_size_human(record.file_size),
+            "sha256": record.sha256,
+            "description": record.description,
+            "tags": record.tags,
+            "created_at": record.created_at,
+            "url": f"/api/file/download/{record.id}"
+        } for record in records]
+
+        # 总数来自增量维护的存储统计，无需 COUNT(*)
+        storage = db_manager.get_user_storage(user_id)
+        if file_type:
+            total = storage["by_type"].get(file_type, {}).get("file_count", 0)
+        else:
+            total = storage["file_count"]
+
+        next_cursor = None
+        if len(records) == limit:
+            next_cursor = encode_list_cursor(records[-1].created_at, records[-1].id)
 
         return jsonify({
-            "files": paginated_files,
-            "total": len(files),
+            "files": files,
+            "total": total,
             "page": page,
             "limit": limit,
-            "pages": (len(files) + limit - 1) // limit
+            "pages": (total + limit - 1) // limit,
+            "next_cursor": next_cursor
         }), 200
 
     except Exception as e:
@@ -497,27 +665,12 @@ def delete_file(file_id):
     try:
         user_id = g.user_id
 
-        # 在用户目录中查找文件
-        user_upload_dir = Path("uploads") / str(user_id)
-        if not user_upload_dir.exists():
+        record = db_manager.delete_file_record(user_id, file_id)
+        if not record:
             return jsonify({"error": "文件不存在"}), 404
 
-        # 搜索文件
-        file_path = None
-        for file_type_dir in user_upload_dir.iterdir():
-            if file_type_dir.is_dir():
-                for file in file_type_dir.iterdir():
-                    if file.stem == file_id:
-                        file_path = file
-                        break
-                if file_path:
-                    break
-
-        if not file_path or not file_path.exists():
-            return jsonify({"error": "文件不存在"}), 404
-
-        # 删除文件
-        file_path.unlink()
+        # 删除文件引用，数据由存储垃圾回收统一清理
+        media_store.release(record.file_path)
 
         return jsonify({"message": "文件删除成功"}), 200
 
@@ -532,17 +685,9 @@ def get_quota():
     try:
         user_id = g.user_id
 
-        user_upload_dir = Path("uploads") / str(user_id)
-        total_size = 0
-        file_count = 0
-
-        if user_upload_dir.exists():
-            for file_type_dir in user_upload_dir.iterdir():
-                if file_type_dir.is_dir():
-                    for file in file_type_dir.iterdir():
-                        if file.is_file():
-                            file_count += 1
-                            total_size += file.stat().st_size
+        storage = db_manager.get_user_storage(user_id)
+        total_size = storage["total_size"]
+        file_count = storage["file_count"]
 
         # 设置配额（示例：1GB）
         quota_limit = 1 * 1024 * 1024 * 1024  # 1GB
@@ -562,4 +707,46 @@ def get_quota():
         }), 200
 
     except Exception as e:
-        return jsonify({"error": f"获取配额信息失败: {str(e)}"}), 500
\ No newline at end of file
+        return jsonify({"error": f"获取配额信息失败: {str(e)}"}), 500
+
+
+@file_bp.route("/storage/gc", methods=["POST"])
+@require_auth
+@require_admin
+def collect_storage_garbage():
+    """回收无引用的媒体存储数据（管理员）"""
+    try:
+        data = request.get_json(silent=True) or {}
+        grace_seconds = data.get("grace_seconds")
+        if grace_seconds is None:
+            result = media_store.gc()
+        else:
+            result = media_store.gc(grace_seconds=int(grace_seconds))
+
+        return jsonify({
+            "message": "存储回收完成",
+            "result": result,
+            "freed_human": get_file_size_human(result["freed_bytes"]),
+            "stats": media_store.get_stats()
+        }), 200
+
+    except Exception as e:
+        return jsonify({"error": f"存储回收失败: {str(e)}"}), 500
+
+
+@file_bp.route("/index/reconcile", methods=["POST"])
+@require_auth
+@require_admin
+def reconcile_files():
+    """根据磁盘内容重建文件索引（管理员）"""
+    try:
+        data = request.get_json(silent=True) or {}
+        stats = reconcile_file_index(user_id=data.get("user_id"), compute_hash=data.get("compute_hash", True))
+
+        return jsonify({
+            "message": "文件索引重建完成",
+            "result": stats
+        }), 200
+
+    except Exception as e:
+        return jsonify({"error": f"文件索引重建失败: {str(e)}"}), 500
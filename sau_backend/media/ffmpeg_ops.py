@@ -4,25 +4,123 @@ FFmpeg原子操作封装
 包括：图片转视频（Ken Burns效果）、视频拼接、水印、字幕等
 """
 import os
+import json
 import uuid
 import subprocess
 import tempfile
 import shlex
+from fractions import Fraction
 from pathlib import Path
 
+from sau_backend.utils.media_store import media_store
+from sau_backend.media.probe_cache import probe_cache
+from sau_backend.media.scheduler import media_scheduler, JobCancelledError
+
 # 媒体输出目录
 MEDIA_OUT = Path(__file__).parent / "out"
 MEDIA_OUT.mkdir(parents=True, exist_ok=True)
 
 def run_command(cmd: str):
-    """执行FFmpeg命令"""
+    """
+    执行FFmpeg命令
+
+    进程数受调度器全局名额限制；在调度任务中执行时，
+    -progress 输出实时写入任务进度，任务取消时终止进程，并累计子进程CPU时间
+    """
+    args = shlex.split(cmd)
+    if args and os.path.basename(args[0]) == "ffmpeg":
+        args[1:1] = ["-progress", "pipe:1", "-nostats"]
+    job = media_scheduler.current_job()
+
+    with media_scheduler.process_slot(), tempfile.TemporaryFile() as stderr_file:
+        if job is not None and job.cancelled:
+            raise JobCancelledError(f"Media job {job.id} cancelled")
+
+        process = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=stderr_file, text=True)
+        if job is not None:
+            job.attach_process(process)
+        returncode, cpu_time = None, 0.0
+        try:
+            values = {}
+            for line in process.stdout:
+                key, _, value = line.strip().partition("=")
+                if not key:
+                    continue
+                values[key] = value
+                # 每个进度块以 progress=continue/end 结尾
+                if key == "progress":
+                    if job is not None:
+                        job.update_progress(values)
+                    values = {}
+            returncode, cpu_time = wait_process(process)
+        finally:
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+            process.stdout.close()
+            if job is not None:
+                job.detach_process(cpu_time)
+
+        if returncode != 0:
+            if job is not None and job.cancelled:
+                raise JobCancelledError(f"Media job {job.id} cancelled")
+            stderr_file.seek(0)
+            stderr = stderr_file.read().decode("utf-8", errors="replace")[-4000:]
+            print(f"FFmpeg command failed with exit code {returncode}: {cmd}")
+            print(f"Stderr: {stderr}")
+            raise Exception(f"FFmpeg command failed: {stderr}")
+
+def wait_process(process):
+    """等待进程结束，返回 (退出码, 子进程CPU时间)"""
+    if hasattr(os, "wait4"):
+        try:
+            _, status, usage = os.wait4(process.pid, 0)
+            process.returncode = os.waitstatus_to_exitcode(status)
+            return process.returncode, usage.ru_utime + usage.ru_stime
+        except ChildProcessError:
+            pass
+    return process.wait(), 0.0
+
+def estimate_duration(operation: str, params: dict, inputs):
+    """估算输出时长（秒），用于计算任务进度百分比"""
     try:
-        subprocess.run(shlex.split(cmd), check=True, capture_output=True, text=True)
-    except subprocess.CalledProcessError as e:
-        print(f"FFmpeg command failed: {e}")
-        print(f"Stdout: {e.stdout}")
-        print(f"Stderr: {e.stderr}")
-        raise Exception(f"FFmpeg command failed: {e.stderr}")
+        if operation == "img2video":
+            images = len(inputs) - (1 if params.get("with_bgm") else 0)
+            return float(params["duration"]) * images
+        if operation in ("trim", "pipeline") and params.get("duration"):
+            return float(params["duration"])
+        if operation in ("concat", "pipeline"):
+            return sum(get_video_info(path)["duration"] for path in inputs)
+        return get_video_info(inputs[0])["duration"] if inputs else None
+    except Exception:
+        return None
+
+def run_to_store(cmd: str, output_file, operation: str, params: dict, inputs):
+    """
+    执行FFmpeg命令并将输出写入内容寻址存储
+
+    相同输入内容与参数的处理结果直接硬链接复用，不再重复执行FFmpeg；
+    新结果与已有内容相同时也只保留一份数据
+    """
+    input_hashes = [media_store.digest(path) for path in inputs]
+    key = media_store.derivation_key(operation, params, input_hashes)
+    if media_store.link_derived(key, output_file, kind=operation) is not None:
+        print(f"Reusing stored result for {operation}: {output_file}")
+        return str(output_file)
+
+    job = media_scheduler.current_job()
+    if job is not None and job.expected_duration is None:
+        job.expected_duration = estimate_duration(operation, params, list(inputs))
+
+    print(f"Executing: {cmd}")
+    try:
+        run_command(cmd)
+    except BaseException:
+        # 失败或取消时清理不完整的输出文件
+        Path(output_file).unlink(missing_ok=True)
+        raise
+    media_store.store_file(output_file, kind=operation, derivation_key=key)
+    return str(output_file)
 
 def img_kenburns_to_video(images, duration=3, size="1080x1920", kenburns=True, bgm=None):
     """
@@ -84,10 +182,11 @@ def img_kenburns_to_video(images, duration=3, size="1080x1920", kenburns=True, b
                 f"\"{output_file}\""
             )
 
-        print(f"Executing: {cmd}")
-        run_command(cmd)
-
-        return str(output_file)
+        return run_to_store(
+            cmd, output_file, "img2video",
+            {"duration": duration, "size": size, "kenburns": kenburns, "with_bgm": bool(bgm and os.path.exists(bgm))},
+            list(images) + ([bgm] if bgm and os.path.exists(bgm) else [])
+        )
 
     finally:
         # 清理临时文件
@@ -140,10 +239,11 @@ def concat_videos(videos, output_size=None, transition=None):
             cmd += f" -vf \"{vf}\""
         cmd += f" -c:v libx264 -pix_fmt yuv420p -c:a aac -b:a 128k \"{output_file}\""
 
-        print(f"Executing: {cmd}")
-        run_command(cmd)
-
-        return str(output_file)
+        return run_to_store(
+            cmd, output_file, "concat",
+            {"output_size": output_size, "transition": transition},
+            videos
+        )
 
     finally:
         # 清理临时文件
@@ -152,6 +252,56 @@ def concat_videos(videos, output_size=None, transition=None):
         except:
             pass
 
+def watermark_filter(text, position="bottom-right", font_size=36, font_color="white"):
+    """构建文字水印滤镜"""
+    # 计算水印位置
+    position_map = {
+        "top-left": "(10,10)",
+        "top-right": "(w-tw-10,10)",
+        "bottom-left": "(10,h-th-10)",
+        "bottom-right": "(w-tw-10,h-th-10)",
+        "center": "(w/2-tw/2,h/2-th/2)"
+    }
+    pos = position_map.get(position, position_map["bottom-right"])
+
+    return (
+        f"drawtext="
+        f"fontfile=/System/Library/Fonts/Arial.ttf:"  # macOS字体路径
+        f"text='{text}':"
+        f"x={pos}:"
+        f"y=40:"
+        f"fontsize={font_size}:"
+        f"fontcolor={font_color}:"
+        f"box=1:boxcolor=black@0.4:boxborderw=1"
+    )
+
+def subtitle_filter(subtitle_text, position="bottom", font_size=28):
+    """构建字幕滤镜"""
+    # 计算字幕位置
+    if position == "top":
+        y_pos = "50"
+    elif position == "center":
+        y_pos = "h/2"
+    else:  # bottom
+        y_pos = "h-th-50"
+
+    return (
+        f"drawtext="
+        f"fontfile=/System/Library/Fonts/Arial.ttf:"
+        f"text='{subtitle_text}':"
+        f"x=(w-tw)/2:"  # 水平居中
+        f"y={y_pos}:"
+        f"fontsize={font_size}:"
+        f"fontcolor=white:"
+        f"box=1:boxcolor=black@0.8:boxborderw=5"
+    )
+
+def resize_filter(size="1080x1920", maintain_aspect=True):
+    """构建尺寸调整滤镜"""
+    if maintain_aspect:
+        return f"scale={size}:force_original_aspect_ratio=decrease,pad={size}:(ow-iw)/2:(oh-ih)/2"
+    return f"scale={size}"
+
 def add_watermark(video, text, position="bottom-right", font_size=36, font_color="white"):
     """
     添加文字水印
@@ -169,37 +319,18 @@ def add_watermark(video, text, position="bottom-right", font_size=36, font_color
     if not os.path.exists(video):
         raise FileNotFoundError(f"Video not found: {video}")
 
-    # 计算水印位置
-    position_map = {
-        "top-left": "(10,10)",
-        "top-right": "(w-tw-10,10)",
-        "bottom-left": "(10,h-th-10)",
-        "bottom-right": "(w-tw-10,h-th-10)",
-        "center": "(w/2-tw/2,h/2-th/2)"
-    }
-    pos = position_map.get(position, position_map["bottom-right"])
-
     # 生成输出文件名
     output_file = MEDIA_OUT / f"{uuid.uuid4().hex}.mp4"
 
     # 构建FFmpeg命令
-    cmd = (
-        f"ffmpeg -y -i \"{video}\" "
-        f"-vf \"drawtext="
-        f"fontfile=/System/Library/Fonts/Arial.ttf:"  # macOS字体路径
-        f"text='{text}':"
-        f"x={pos}:"
-        f"y=40:"
-        f"fontsize={font_size}:"
-        f"fontcolor={font_color}:"
-        f"box=1:boxcolor=black@0.4:boxborderw=1\" "
-        f"-c:a copy \"{output_file}\""
-    )
-
-    print(f"Executing: {cmd}")
-    run_command(cmd)
+    vf = watermark_filter(text, position, font_size, font_color)
+    cmd = f"ffmpeg -y -i \"{video}\" -vf \"{vf}\" -c:a copy \"{output_file}\""
 
-    return str(output_file)
+    return run_to_store(
+        cmd, output_file, "watermark",
+        {"text": text, "position": position, "font_size": font_size, "font_color": font_color},
+        [video]
+    )
 
 def add_subtitle(video, subtitle_text, position="bottom", font_size=28):
     """
@@ -217,35 +348,18 @@ def add_subtitle(video, subtitle_text, position="bottom", font_size=28):
     if not os.path.exists(video):
         raise FileNotFoundError(f"Video not found: {video}")
 
-    # 计算字幕位置
-    if position == "top":
-        y_pos = "50"
-    elif position == "center":
-        y_pos = "h/2"
-    else:  # bottom
-        y_pos = "h-th-50"
-
     # 生成输出文件名
     output_file = MEDIA_OUT / f"{uuid.uuid4().hex}.mp4"
 
     # 构建FFmpeg命令
-    cmd = (
-        f"ffmpeg -y -i \"{video}\" "
-        f"-vf \"drawtext="
-        f"fontfile=/System/Library/Fonts/Arial.ttf:"
-        f"text='{subtitle_text}':"
-        f"x=(w-tw)/2:"  # 水平居中
-        f"y={y_pos}:"
-        f"fontsize={font_size}:"
-        f"fontcolor=white:"
-        f"box=1:boxcolor=black@0.8:boxborderw=5\" "
-        f"-c:a copy \"{output_file}\""
-    )
+    vf = subtitle_filter(subtitle_text, position, font_size)
+    cmd = f"ffmpeg -y -i \"{video}\" -vf \"{vf}\" -c:a copy \"{output_file}\""
 
-    print(f"Executing: {cmd}")
-    run_command(cmd)
-
-    return str(output_file)
+    return run_to_store(
+        cmd, output_file, "subtitle",
+        {"text": subtitle_text, "position": position, "font_size": font_size},
+        [video]
+    )
 
 def trim_video(video, start_time, duration=None, end_time=None):
     """
@@ -276,10 +390,11 @@ def trim_video(video, start_time, duration=None, end_time=None):
     # 构建FFmpeg命令
     cmd = f"ffmpeg -y -i \"{video}\" {time_params} -c:v libx264 -pix_fmt yuv420p -c:a aac \"{output_file}\""
 
-    print(f"Executing: {cmd}")
-    run_command(cmd)
-
-    return str(output_file)
+    return run_to_store(
+        cmd, output_file, "trim",
+        {"start_time": start_time, "duration": duration, "end_time": end_time},
+        [video]
+    )
 
 def resize_video(video, size="1080x1920", maintain_aspect=True):
     """
@@ -300,22 +415,232 @@ def resize_video(video, size="1080x1920", maintain_aspect=True):
     output_file = MEDIA_OUT / f"{uuid.uuid4().hex}.mp4"
 
     # 构建尺寸滤镜
-    if maintain_aspect:
-        vf = f"scale={size}:force_original_aspect_ratio=decrease,pad={size}:(ow-iw)/2:(oh-ih)/2"
-    else:
-        vf = f"scale={size}"
+    vf = resize_filter(size, maintain_aspect)
 
     # 构建FFmpeg命令
     cmd = f"ffmpeg -y -i \"{video}\" -vf \"{vf}\" -c:v libx264 -pix_fmt yuv420p -c:a aac \"{output_file}\""
 
-    print(f"Executing: {cmd}")
-    run_command(cmd)
+    return run_to_store(
+        cmd, output_file, "resize",
+        {"size": size, "maintain_aspect": maintain_aspect},
+        [video]
+    )
 
-    return str(output_file)
+# 流水线支持的操作
+PIPELINE_OPERATIONS = {"trim", "resize", "watermark", "subtitle"}
+# 判断能否直接流复制拼接时需要一致的流参数
+CONCAT_COPY_KEYS = ("video_codec", "width", "height", "pix_fmt", "fps", "has_audio",
+                    "audio_codec", "audio_sample_rate", "audio_channels")
+
+def parse_time(value):
+    """将 "00:01:02.5"、"01:02" 或秒数转换为秒"""
+    if isinstance(value, (int, float)):
+        return float(value)
+    seconds = 0.0
+    for part in str(value).strip().split(":"):
+        seconds = seconds * 60 + float(part)
+    return seconds
+
+def validate_pipeline(inputs, operations):
+    """
+    校验流水线参数
 
-def get_video_info(video_path):
+    Raises:
+        ValueError: 输入或操作不合法
     """
-    获取视频信息
+    if not inputs:
+        raise ValueError("At least one input video is required")
+    if not isinstance(operations, list):
+        raise ValueError("operations must be a list")
+    if not operations and len(inputs) < 2:
+        raise ValueError("No operations provided")
+
+    trims = 0
+    for op in operations:
+        name = op.get("op") if isinstance(op, dict) else None
+        if name not in PIPELINE_OPERATIONS:
+            raise ValueError(f"Unsupported pipeline operation: {name}")
+        if name == "trim":
+            trims += 1
+            if op.get("start_time") is None:
+                raise ValueError("trim requires start_time")
+            parse_time(op["start_time"])
+        elif name == "resize" and not op.get("size"):
+            raise ValueError("resize requires size")
+        elif name in ("watermark", "subtitle") and not op.get("text"):
+            raise ValueError(f"{name} requires text")
+    if trims > 1:
+        raise ValueError("Only one trim operation is allowed")
+
+def operation_filter(op):
+    """单个操作对应的视频滤镜"""
+    if op["op"] == "resize":
+        return resize_filter(op["size"], op.get("maintain_aspect", True))
+    if op["op"] == "watermark":
+        return watermark_filter(op["text"], op.get("position", "bottom-right"),
+                                op.get("font_size", 36), op.get("font_color", "white"))
+    if op["op"] == "subtitle":
+        return subtitle_filter(op["text"], op.get("position", "bottom"), op.get("font_size", 28))
+    raise ValueError(f"Unsupported filter operation: {op['op']}")
+
+def is_keyframe_aligned(video, start_time, tolerance=0.05):
+    """判断截取起点是否落在关键帧上（流复制截取不会出现开头花屏/黑屏）"""
+    start = parse_time(start_time)
+    if start <= 0:
+        return True
+    cmd = [
+        "ffprobe", "-v", "quiet", "-select_streams", "v:0", "-skip_frame", "nokey",
+        "-show_entries", "frame=pts_time", "-of", "csv=p=0",
+        "-read_intervals", f"{max(start - 2, 0)}%{start + 2}", str(video)
+    ]
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        return False
+    for line in result.stdout.split():
+        try:
+            if abs(float(line.strip(",")) - start) <= tolerance:
+                return True
+        except ValueError:
+            continue
+    return False
+
+def streams_compatible(infos):
+    """多个视频的编码参数是否一致，一致时可用 concat 分离器直接流复制"""
+    first = infos[0]
+    if not first.get("video_codec"):
+        return False
+    return all(info.get(key) == first.get(key) for info in infos[1:] for key in CONCAT_COPY_KEYS)
+
+def trim_args(trim):
+    """截取参数（作为输入选项，解码前定位）"""
+    if trim is None:
+        return ""
+    args = f"-ss {trim['start_time']}"
+    if trim.get("duration"):
+        args += f" -t {trim['duration']}"
+    elif trim.get("end_time"):
+        args += f" -to {trim['end_time']}"
+    return args + " "
+
+def trim_filters(trim):
+    """截取滤镜（多输入拼接后截取）"""
+    start = parse_time(trim["start_time"])
+    bound = ""
+    if trim.get("duration"):
+        bound = f":duration={parse_time(trim['duration'])}"
+    elif trim.get("end_time"):
+        bound = f":end={parse_time(trim['end_time'])}"
+    return (f"trim=start={start}{bound},setpts=PTS-STARTPTS",
+            f"atrim=start={start}{bound},asetpts=PTS-STARTPTS")
+
+def compile_pipeline(inputs, operations, output_file, list_file=None):
+    """
+    将操作序列编译为一条FFmpeg命令
+
+    Returns:
+        (命令, 模式)，模式为 "copy"（流复制，无需编码）或 "encode"（单次滤镜图编码）
+    """
+    trim = next((op for op in operations if op["op"] == "trim"), None)
+    filters = [op for op in operations if op["op"] != "trim"]
+
+    if len(inputs) == 1:
+        video = inputs[0]
+        # 仅截取且起点为关键帧：直接流复制
+        if not filters and is_keyframe_aligned(video, trim["start_time"]):
+            cmd = (f"ffmpeg -y {trim_args(trim)}-i \"{video}\" -map 0 -c copy "
+                   f"-avoid_negative_ts make_zero \"{output_file}\"")
+            return cmd, "copy"
+
+        chain = ",".join([operation_filter(op) for op in filters] + ["format=yuv420p"])
+        cmd = (f"ffmpeg -y {trim_args(trim)}-i \"{video}\" -filter_complex \"[0:v]{chain}[vout]\" "
+               f"-map \"[vout]\" -map 0:a? -c:v libx264 -pix_fmt yuv420p -c:a copy \"{output_file}\"")
+        return cmd, "encode"
+
+    infos = [get_video_info(path) for path in inputs]
+    # 无滤镜且编码参数一致：concat 分离器流复制
+    if not filters and trim is None and streams_compatible(infos) and list_file is not None:
+        for path in inputs:
+            list_file.write(f"file '{os.path.abspath(path)}'\n")
+        list_file.flush()
+        return f"ffmpeg -y -f concat -safe 0 -i {list_file.name} -c copy \"{output_file}\"", "copy"
+
+    # 多输入统一尺寸后拼接，尺寸调整在拼接前对每个输入执行
+    resize = next((op for op in reversed(filters) if op["op"] == "resize"), None)
+    if resize is not None:
+        normalize = operation_filter(resize)
+    else:
+        width, height = infos[0]["width"], infos[0]["height"]
+        normalize = (f"scale={width}:{height}:force_original_aspect_ratio=decrease,"
+                     f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2")
+    with_audio = all(info["has_audio"] for info in infos)
+
+    graph = [f"[{i}:v]{normalize},setsar=1,format=yuv420p[v{i}]" for i in range(len(inputs))]
+    concat_in = "".join(f"[v{i}]" + (f"[{i}:a]" if with_audio else "") for i in range(len(inputs)))
+    graph.append(f"{concat_in}concat=n={len(inputs)}:v=1:a={1 if with_audio else 0}[vc]" +
+                 ("[ac]" if with_audio else ""))
+
+    video_chain = []
+    audio_chain = "anull"
+    if trim is not None:
+        video_trim, audio_trim = trim_filters(trim)
+        video_chain.append(video_trim)
+        audio_chain = audio_trim
+    video_chain += [operation_filter(op) for op in filters if op is not resize]
+    graph.append(f"[vc]{','.join(video_chain) or 'null'}[vout]")
+    if with_audio:
+        graph.append(f"[ac]{audio_chain}[aout]")
+
+    input_args = " ".join(f"-i \"{path}\"" for path in inputs)
+    audio_args = "-map \"[aout]\" -c:a aac -b:a 128k" if with_audio else "-an"
+    cmd = (f"ffmpeg -y {input_args} -filter_complex \"{';'.join(graph)}\" -map \"[vout]\" {audio_args} "
+           f"-c:v libx264 -pix_fmt yuv420p \"{output_file}\"")
+    return cmd, "encode"
+
+def run_pipeline(inputs, operations):
+    """
+    单次编码执行一组有序的媒体操作
+
+    所有滤镜编译进一个 -filter_complex 图，只解码、编码一次；
+    仅截取（起点为关键帧）或编码参数一致的多视频拼接时直接流复制，不重新编码。
+    多个输入时先拼接再依次执行其余操作，resize 在拼接前对每个输入执行
+
+    Args:
+        inputs: 输入视频路径，单个路径或列表
+        operations: 操作列表，如 [{"op": "trim", "start_time": 5, "duration": 30},
+                    {"op": "resize", "size": "1080x1920"}, {"op": "watermark", "text": "..."}]
+
+    Returns:
+        输出视频路径
+    """
+    inputs = [inputs] if isinstance(inputs, (str, Path)) else list(inputs)
+    validate_pipeline(inputs, operations)
+    for video in inputs:
+        if not os.path.exists(video):
+            raise FileNotFoundError(f"Video not found: {video}")
+
+    output_file = MEDIA_OUT / f"{uuid.uuid4().hex}.mp4"
+    list_file = tempfile.NamedTemporaryFile(mode="w", delete=False, suffix=".txt", encoding="utf-8")
+    try:
+        cmd, mode = compile_pipeline(inputs, operations, output_file, list_file)
+        print(f"Pipeline mode: {mode}")
+
+        trim = next((op for op in operations if op["op"] == "trim"), None)
+        return run_to_store(
+            cmd, output_file, "pipeline",
+            {"operations": operations, "duration": trim.get("duration") if trim else None},
+            inputs
+        )
+
+    finally:
+        list_file.close()
+        try:
+            os.unlink(list_file.name)
+        except:
+            pass
+
+def probe_video(video_path):
+    """
+    调用ffprobe探测视频信息（不经过缓存）
 
     Args:
         video_path: 视频文件路径
@@ -323,16 +648,12 @@ def get_video_info(video_path):
     Returns:
         视频信息字典
     """
-    if not os.path.exists(video_path):
-        raise FileNotFoundError(f"Video not found: {video_path}")
-
     cmd = f"ffprobe -v quiet -print_format json -show_format -show_streams \"{video_path}\""
     result = subprocess.run(shlex.split(cmd), capture_output=True, text=True)
 
     if result.returncode != 0:
         raise Exception(f"Failed to get video info: {result.stderr}")
 
-    import json
     probe_data = json.loads(result.stdout)
 
     # 提取关键信息
@@ -350,9 +671,49 @@ def get_video_info(video_path):
         "size": os.path.getsize(video_path),
         "width": video_stream.get("width") if video_stream else None,
         "height": video_stream.get("height") if video_stream else None,
-        "fps": eval(video_stream.get("r_frame_rate", "0/1")) if video_stream else None,
+        "fps": parse_frame_rate(video_stream.get("r_frame_rate", "0/1")) if video_stream else None,
         "has_audio": audio_stream is not None,
-        "format": probe_data.get("format", {}).get("format_name", "unknown")
+        "format": probe_data.get("format", {}).get("format_name", "unknown"),
+        "video_codec": video_stream.get("codec_name") if video_stream else None,
+        "pix_fmt": video_stream.get("pix_fmt") if video_stream else None,
+        "audio_codec": audio_stream.get("codec_name") if audio_stream else None,
+        "audio_sample_rate": audio_stream.get("sample_rate") if audio_stream else None,
+        "audio_channels": audio_stream.get("channels") if audio_stream else None
     }
 
-    return info
\ No newline at end of file
+    return info
+
+def parse_frame_rate(rate: str) -> float:
+    """解析ffprobe帧率（如 "30000/1001"）"""
+    try:
+        return float(Fraction(rate))
+    except (ValueError, ZeroDivisionError):
+        return 0.0
+
+def get_video_info(video_path):
+    """
+    获取视频信息，结果按文件路径、大小、修改时间与inode缓存
+
+    Args:
+        video_path: 视频文件路径
+
+    Returns:
+        视频信息字典
+    """
+    if not os.path.exists(video_path):
+        raise FileNotFoundError(f"Video not found: {video_path}")
+
+    return probe_cache.get_or_probe(video_path, probe_video)
+
+def get_videos_info(video_paths, max_workers=None):
+    """
+    批量获取视频信息，未命中缓存的文件并行探测
+
+    Args:
+        video_paths: 视频文件路径列表
+        max_workers: 最大并发探测数（可选）
+
+    Returns:
+        {路径: {"info": 视频信息} 或 {"error": 错误信息}}
+    """
+    return probe_cache.probe_many(video_paths, probe_video, max_workers=max_workers)
@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+"""
+ffprobe 结果缓存
+内存 LRU + SQLite 持久化两级缓存，以 (路径, 大小, mtime_ns, inode) 判断文件是否变化；
+同一 inode 的硬链接（媒体存储中去重的文件）共享探测结果
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+from sau_backend.conf import BASE_DIR
+from sau_backend.utils.sqlite_pool import get_pool
+
+# 持久化缓存数据库
+PROBE_CACHE_DB = Path(os.getenv("SAU_PROBE_CACHE_DB", BASE_DIR / "db" / "media_probe.db"))
+# 内存 LRU 容量
+PROBE_CACHE_SIZE = int(os.getenv("SAU_PROBE_CACHE_SIZE", 4096))
+# 批量探测的默认并发数
+PROBE_WORKERS = int(os.getenv("SAU_PROBE_WORKERS", min(8, (os.cpu_count() or 2) * 2)))
+
+# (size, mtime_ns, dev, inode)
+Signature = Tuple[int, int, int, int]
+
+
+def file_signature(path: str) -> Signature:
+    """文件签名，任一字段变化即视为文件已变化"""
+    st = os.stat(path)
+    return st.st_size, st.st_mtime_ns, st.st_dev, st.st_ino
+
+
+class ProbeCache:
+    """ffprobe 结果缓存"""
+
+    def __init__(self, db_path: Path = PROBE_CACHE_DB, max_entries: int = PROBE_CACHE_SIZE):
+        self.db_path = Path(db_path)
+        self.max_entries = max_entries
+        self._memory: "OrderedDict[str, Tuple[Signature, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._initialized = False
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "probes": 0, "errors": 0}
+
+    def _connect(self):
+        return get_pool(self.db_path).session(row_factory=sqlite3.Row)
+
+    def _ensure_init(self):
+        if self._initialized:
+            return
+        with self._lock:
+            if self._initialized:
+                return
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            with self._connect() as conn:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.executescript("""
+                    CREATE TABLE IF NOT EXISTS media_probe_cache (
+                        path TEXT PRIMARY KEY,
+                        size INTEGER NOT NULL,
+                        mtime_ns INTEGER NOT NULL,
+                        dev INTEGER NOT NULL,
+                        inode INTEGER NOT NULL,
+                        info TEXT NOT NULL,
+                        probed_at REAL NOT NULL
+                    );
+                    CREATE INDEX IF NOT EXISTS idx_media_probe_inode
+                        ON media_probe_cache(dev, inode, size, mtime_ns);
+                """)
+            self._initialized = True
+
+    def get(self, path: str, signature: Optional[Signature] = None) -> Optional[Dict[str, Any]]:
+        """读取缓存，文件变化或未缓存时返回 None"""
+        self._ensure_init()
+        key = os.path.abspath(path)
+        signature = signature or file_signature(key)
+
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and entry[0] == signature:
+                self._memory.move_to_end(key)
+                self._stats["memory_hits"] += 1
+                return dict(entry[1])
+
+        size, mtime_ns, dev, inode = signature
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT info FROM media_probe_cache WHERE path = ? AND size = ? AND mtime_ns = ? "
+                "AND dev = ? AND inode = ?",
+                (key, size, mtime_ns, dev, inode)
+            ).fetchone()
+            if row is None:
+                # 同一文件的其他硬链接已探测过
+                row = conn.execute(
+                    "SELECT info FROM media_probe_cache WHERE dev = ? AND inode = ? AND size = ? "
+                    "AND mtime_ns = ? LIMIT 1",
+                    (dev, inode, size, mtime_ns)
+                ).fetchone()
+                if row is not None:
+                    self._store_row(conn, key, signature, row["info"])
+        if row is None:
+            self._stats["misses"] += 1
+            return None
+
+        info = json.loads(row["info"])
+        self._remember(key, signature, info)
+        self._stats["disk_hits"] += 1
+        return dict(info)
+
+    def put(self, path: str, signature: Signature, info: Dict[str, Any]):
+        """写入缓存"""
+        self._ensure_init()
+        key = os.path.abspath(path)
+        self._remember(key, signature, info)
+        with self._connect() as conn:
+            self._store_row(conn, key, signature, json.dumps(info, ensure_ascii=False))
+
+    def get_or_probe(self, path: str, probe: Callable[[str], Dict[str, Any]]) -> Dict[str, Any]:
+        """命中缓存直接返回，否则调用 probe 探测并写入缓存"""
+        signature = file_signature(path)
+        info = self.get(path, signature)
+        if info is not None:
+            return info
+
+        self._stats["probes"] += 1
+        info = probe(path)
+        # 探测期间文件被改写时不缓存
+        if file_signature(path) == signature:
+            self.put(path, signature, info)
+        return info
+
+    def probe_many(self, paths: Iterable[str], probe: Callable[[str], Dict[str, Any]],
+                   max_workers: Optional[int] = None) -> Dict[str, Dict[str, Any]]:
+        """并行探测多个文件，返回 {path: {"info": ...} 或 {"error": ...}}"""
+        unique_paths = list(dict.fromkeys(paths))
+
+        def run(path: str) -> Dict[str, Any]:
+            try:
+                return {"info": self.get_or_probe(path, probe)}
+            except FileNotFoundError:
+                return {"error": f"Video not found: {path}"}
+            except Exception as e:
+                self._stats["errors"] += 1
+                return {"error": str(e)}
+
+        if len(unique_paths) <= 1:
+            return {path: run(path) for path in unique_paths}
+
+        workers = max(1, min(max_workers or PROBE_WORKERS, len(unique_paths)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ffprobe") as executor:
+            return dict(zip(unique_paths, executor.map(run, unique_paths)))
+
+    def invalidate(self, path: Optional[str] = None):
+        """清除指定文件（或全部）的缓存"""
+        self._ensure_init()
+        with self._lock:
+            if path is None:
+                self._memory.clear()
+            else:
+                self._memory.pop(os.path.abspath(path), None)
+        with self._connect() as conn:
+            if path is None:
+                conn.execute("DELETE FROM media_probe_cache")
+            else:
+                conn.execute("DELETE FROM media_probe_cache WHERE path = ?", (os.path.abspath(path),))
+
+    def _remember(self, key: str, signature: Signature, info: Dict[str, Any]):
+        with self._lock:
+            self._memory[key] = (signature, info)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    @staticmethod
+    def _store_row(conn: sqlite3.Connection, key: str, signature: Signature, info_json: str):
+        size, mtime_ns, dev, inode = signature
+        conn.execute("""
+            INSERT OR REPLACE INTO media_probe_cache (path, size, mtime_ns, dev, inode, info, probed_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, (key, size, mtime_ns, dev, inode, info_json, time.time()))
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存统计信息"""
+        lookups = self._stats["memory_hits"] + self._stats["disk_hits"] + self._stats["misses"]
+        hits = self._stats["memory_hits"] + self._stats["disk_hits"]
+        with self._lock:
+            memory_size = len(self._memory)
+        return {
+            **self._stats,
+            "memory_size": memory_size,
+            "max_entries": self.max_entries,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+# 全局探测缓存实例
+probe_cache = ProbeCache()
@@ -0,0 +1,307 @@
+# -*- coding: utf-8 -*-
+"""
+FFmpeg 任务调度
+媒体操作以任务形式进入优先级队列，由固定数量的工作线程执行，
+全局并发数受 MediaConfig.max_concurrent_processes 与 CPU 核数约束；
+任务支持取消，执行时解析 FFmpeg -progress 输出更新进度，并记录墙钟时间与子进程 CPU 时间
+"""
+import heapq
+import itertools
+import os
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+from sauce_backend.config import get_config
+from sau_backend.utils.metrics import LONG_DURATION_BUCKETS, metrics_registry
+
+# 优先级，数值越小越先执行
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 5
+PRIORITY_LOW = 10
+PRIORITY_NAMES = {"high": PRIORITY_HIGH, "normal": PRIORITY_NORMAL, "low": PRIORITY_LOW}
+
+# 内存中保留的已结束任务数量
+MAX_FINISHED_JOBS = int(os.getenv("SAU_MEDIA_MAX_FINISHED_JOBS", 500))
+
+# 监控指标
+JOB_DURATION = metrics_registry.histogram(
+    "sau_ffmpeg_job_duration_seconds", "Wall time of media jobs from start to finish",
+    ("operation", "status"), buckets=LONG_DURATION_BUCKETS,
+)
+JOB_QUEUE_WAIT = metrics_registry.histogram(
+    "sau_ffmpeg_job_queue_wait_seconds", "Time media jobs spend queued before a worker picks them up",
+    ("operation",), buckets=LONG_DURATION_BUCKETS,
+)
+
+STATUS_QUEUED = "queued"
+STATUS_RUNNING = "running"
+STATUS_SUCCEEDED = "succeeded"
+STATUS_FAILED = "failed"
+STATUS_CANCELLED = "cancelled"
+FINISHED_STATUSES = {STATUS_SUCCEEDED, STATUS_FAILED, STATUS_CANCELLED}
+
+
+class JobCancelledError(Exception):
+    """任务已取消"""
+
+
+def default_max_processes() -> int:
+    """并发上限：环境变量 > MediaConfig.max_concurrent_processes，且不超过 CPU 核数"""
+    configured = int(os.getenv("SAU_MEDIA_MAX_PROCESSES", get_config().media.max_concurrent_processes))
+    return max(1, min(configured, os.cpu_count() or 1))
+
+
+def parse_priority(value: Any) -> int:
+    """解析优先级，支持 high/normal/low 或整数"""
+    if isinstance(value, str) and value.lower() in PRIORITY_NAMES:
+        return PRIORITY_NAMES[value.lower()]
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return PRIORITY_NORMAL
+
+
+@dataclass
+class MediaJob:
+    """媒体处理任务"""
+
+    id: str
+    operation: str
+    func: Callable[..., Any] = field(repr=False)
+    kwargs: Dict[str, Any] = field(default_factory=dict, repr=False)
+    priority: int = PRIORITY_NORMAL
+    params: Dict[str, Any] = field(default_factory=dict)
+    status: str = STATUS_QUEUED
+    progress: Dict[str, Any] = field(default_factory=dict)
+    result: Any = None
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    cpu_time: float = 0.0
+    processes: int = 0
+    expected_duration: Optional[float] = None
+
+    def __post_init__(self):
+        self._done = threading.Event()
+        self._cancel = threading.Event()
+        self._exception: Optional[BaseException] = None
+        self._process = None
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    @property
+    def wall_time(self) -> Optional[float]:
+        if self.started_at is None:
+            return None
+        return (self.finished_at or time.time()) - self.started_at
+
+    def wait(self, timeout: Optional[float] = None) -> Any:
+        """等待任务结束并返回结果，失败时抛出原异常"""
+        if not self._done.wait(timeout):
+            raise TimeoutError(f"Media job {self.id} did not finish in {timeout}s")
+        if self._exception is not None:
+            raise self._exception
+        return self.result
+
+    def attach_process(self, process):
+        """登记当前运行的 FFmpeg 进程，取消时终止"""
+        with self._lock:
+            self._process = process
+            self.processes += 1
+            cancelled = self.cancelled
+        if cancelled:
+            process.terminate()
+
+    def detach_process(self, cpu_time: float = 0.0):
+        with self._lock:
+            self._process = None
+            self.cpu_time += cpu_time
+
+    def update_progress(self, values: Dict[str, str]):
+        """根据 -progress 输出更新进度"""
+        progress = dict(self.progress)
+        for key in ("frame", "fps", "speed", "out_time", "bitrate"):
+            if key in values:
+                progress[key] = values[key]
+        out_time_us = values.get("out_time_us") or values.get("out_time_ms")
+        if out_time_us and out_time_us.lstrip("-").isdigit():
+            seconds = max(int(out_time_us), 0) / 1_000_000
+            progress["out_time_seconds"] = round(seconds, 3)
+            if self.expected_duration:
+                progress["percent"] = round(min(seconds / self.expected_duration, 1.0) * 100, 1)
+        if values.get("progress") == "end":
+            progress["percent"] = 100.0
+        self.progress = progress
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "operation": self.operation,
+            "status": self.status,
+            "priority": self.priority,
+            "params": self.params,
+            "progress": self.progress,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "queue_time": round((self.started_at or time.time()) - self.created_at, 3),
+            "wall_time": round(self.wall_time, 3) if self.wall_time is not None else None,
+            "cpu_time": round(self.cpu_time, 3),
+            "processes": self.processes,
+        }
+
+
+class MediaJobScheduler:
+    """FFmpeg 任务调度器"""
+
+    def __init__(self, max_workers: Optional[int] = None):
+        self.max_workers = max_workers or default_max_processes()
+        self._queue: List = []
+        self._seq = itertools.count()
+        self._jobs: Dict[str, MediaJob] = {}
+        self._finished: List[str] = []
+        self._cond = threading.Condition()
+        self._workers: List[threading.Thread] = []
+        self._local = threading.local()
+        # 限制所有 FFmpeg 进程（包括不经过队列直接调用的）的并发数
+        self._process_slots = threading.BoundedSemaphore(self.max_workers)
+        self._stats = {"submitted": 0, "succeeded": 0, "failed": 0, "cancelled": 0,
+                       "wall_time": 0.0, "cpu_time": 0.0}
+
+    def _ensure_workers(self):
+        with self._cond:
+            if self._workers:
+                return
+            for i in range(self.max_workers):
+                worker = threading.Thread(target=self._worker_loop, name=f"media-worker-{i}", daemon=True)
+                worker.start()
+                self._workers.append(worker)
+
+    def submit(self, operation: str, func: Callable[..., Any], kwargs: Optional[Dict[str, Any]] = None,
+               priority: int = PRIORITY_NORMAL, params: Optional[Dict[str, Any]] = None) -> MediaJob:
+        """提交任务，返回 MediaJob"""
+        self._ensure_workers()
+        job = MediaJob(id=uuid.uuid4().hex, operation=operation, func=func, kwargs=kwargs or {},
+                       priority=priority, params=params or {})
+        with self._cond:
+            self._jobs[job.id] = job
+            heapq.heappush(self._queue, (job.priority, next(self._seq), job.id))
+            self._stats["submitted"] += 1
+            self._cond.notify()
+        return job
+
+    def get_job(self, job_id: str) -> Optional[MediaJob]:
+        with self._cond:
+            return self._jobs.get(job_id)
+
+    def list_jobs(self, status: Optional[str] = None, limit: int = 50) -> List[Dict[str, Any]]:
+        with self._cond:
+            jobs = list(self._jobs.values())
+        if status:
+            jobs = [job for job in jobs if job.status == status]
+        jobs.sort(key=lambda job: job.created_at, reverse=True)
+        return [job.to_dict() for job in jobs[:limit]]
+
+    def cancel(self, job_id: str) -> bool:
+        """取消排队中或运行中的任务，任务不存在或已结束时返回 False"""
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None or job.status in FINISHED_STATUSES:
+                return False
+            job._cancel.set()
+            if job.status == STATUS_QUEUED:
+                self._finish(job, STATUS_CANCELLED, exception=JobCancelledError(f"Media job {job_id} cancelled"))
+                return True
+        with job._lock:
+            process = job._process
+        if process is not None and process.poll() is None:
+            process.terminate()
+        return True
+
+    def current_job(self) -> Optional[MediaJob]:
+        """当前线程正在执行的任务"""
+        return getattr(self._local, "job", None)
+
+    def process_slot(self):
+        """获取 FFmpeg 进程名额（上下文管理器）"""
+        return self._process_slots
+
+    def _worker_loop(self):
+        while True:
+            with self._cond:
+                while not self._queue:
+                    self._cond.wait()
+                _, _, job_id = heapq.heappop(self._queue)
+                job = self._jobs.get(job_id)
+                if job is None or job.status != STATUS_QUEUED:
+                    continue
+                job.status = STATUS_RUNNING
+                job.started_at = time.time()
+            JOB_QUEUE_WAIT.labels(operation=job.operation).observe(job.started_at - job.created_at)
+            self._run(job)
+
+    def _run(self, job: MediaJob):
+        self._local.job = job
+        try:
+            result = job.func(**job.kwargs)
+        except BaseException as e:
+            with self._cond:
+                status = STATUS_CANCELLED if job.cancelled else STATUS_FAILED
+                if job.cancelled and not isinstance(e, JobCancelledError):
+                    e = JobCancelledError(f"Media job {job.id} cancelled")
+                self._finish(job, status, exception=e)
+        else:
+            with self._cond:
+                job.result = result
+                self._finish(job, STATUS_SUCCEEDED)
+        finally:
+            self._local.job = None
+
+    def _finish(self, job: MediaJob, status: str, exception: Optional[BaseException] = None):
+        """标记任务结束（调用方持有 self._cond）"""
+        job.status = status
+        job.finished_at = time.time()
+        if exception is not None:
+            job._exception = exception
+            job.error = str(exception)
+        self._stats[status] += 1
+        if job.wall_time is not None:
+            self._stats["wall_time"] += job.wall_time
+            JOB_DURATION.labels(operation=job.operation, status=status).observe(job.wall_time)
+        self._stats["cpu_time"] += job.cpu_time
+        job._done.set()
+
+        self._finished.append(job.id)
+        while len(self._finished) > MAX_FINISHED_JOBS:
+            self._jobs.pop(self._finished.pop(0), None)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._cond:
+            running = sum(1 for job in self._jobs.values() if job.status == STATUS_RUNNING)
+            queued = sum(1 for job in self._jobs.values() if job.status == STATUS_QUEUED)
+            return {
+                **{k: round(v, 3) if isinstance(v, float) else v for k, v in self._stats.items()},
+                "max_workers": self.max_workers,
+                "running": running,
+                "queued": queued,
+            }
+
+
+# 全局媒体任务调度器
+media_scheduler = MediaJobScheduler()
+
+metrics_registry.gauge(
+    "sau_ffmpeg_queue_depth", "Media jobs waiting for a worker"
+).set_function(lambda: media_scheduler.get_stats()["queued"])
+metrics_registry.gauge(
+    "sau_ffmpeg_running_jobs", "Media jobs currently running"
+).set_function(lambda: media_scheduler.get_stats()["running"])
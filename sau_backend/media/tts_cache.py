@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+"""
+TTS 结果缓存
+以 (文本, 语音, 语速, 音量, 引擎) 的哈希为键，把合成好的 mp3 保存在 media/tts 目录，
+SQLite 记录元数据（时长、大小、逐词边界、最近使用时间），总大小超过上限时按 LRU 淘汰；
+同一键的并发合成只会执行一次
+"""
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from sau_backend.conf import BASE_DIR
+from sau_backend.utils.sqlite_pool import get_pool
+
+# 缓存目录
+TTS_CACHE_DIR = Path(os.getenv("SAU_TTS_CACHE_DIR", Path(__file__).parent / "tts"))
+# 元数据数据库
+TTS_CACHE_DB = Path(os.getenv("SAU_TTS_CACHE_DB", BASE_DIR / "db" / "tts_cache.db"))
+# 缓存总大小上限（MB）
+TTS_CACHE_MAX_MB = float(os.getenv("SAU_TTS_CACHE_MAX_MB", 1024))
+
+# 合成函数：把音频写入给定路径，可返回逐词边界事件列表
+Synthesizer = Callable[[Path], Awaitable[Optional[List[Dict[str, Any]]]]]
+
+
+def tts_cache_key(text: str, voice: str, rate: str, volume: str, engine: str = "edge") -> str:
+    """缓存键：合成参数的 SHA-256"""
+    payload = json.dumps([engine, voice, rate, volume, text], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def probe_duration(path: Path) -> Optional[float]:
+    """探测音频时长，ffprobe 不可用时返回 None"""
+    from sau_backend.media.ffmpeg_ops import get_video_info
+
+    try:
+        return get_video_info(str(path)).get("duration") or None
+    except Exception:
+        return None
+
+
+class TTSCache:
+    """TTS 合成结果缓存"""
+
+    def __init__(self, cache_dir: Path = TTS_CACHE_DIR, db_path: Path = TTS_CACHE_DB,
+                 max_bytes: int = int(TTS_CACHE_MAX_MB * 1024 * 1024)):
+        self.cache_dir = Path(cache_dir)
+        self.db_path = Path(db_path)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._initialized = False
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._stats = {"hits": 0, "misses": 0, "shared": 0, "evictions": 0, "errors": 0}
+
+    def _connect(self):
+        return get_pool(self.db_path).session(row_factory=sqlite3.Row)
+
+    def _ensure_init(self):
+        if self._initialized:
+            return
+        with self._lock:
+            if self._initialized:
+                return
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            with self._connect() as conn:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.executescript("""
+                    CREATE TABLE IF NOT EXISTS tts_cache (
+                        key TEXT PRIMARY KEY,
+                        engine TEXT NOT NULL,
+                        voice TEXT NOT NULL,
+                        rate TEXT NOT NULL,
+                        volume TEXT NOT NULL,
+                        text TEXT NOT NULL,
+                        size INTEGER NOT NULL,
+                        duration REAL,
+                        boundaries TEXT,
+                        created_at REAL NOT NULL,
+                        last_used REAL NOT NULL,
+                        hits INTEGER NOT NULL DEFAULT 0
+                    );
+                    CREATE INDEX IF NOT EXISTS idx_tts_cache_last_used ON tts_cache(last_used);
+                """)
+                columns = {row["name"] for row in conn.execute("PRAGMA table_info(tts_cache)")}
+                if "boundaries" not in columns:
+                    conn.execute("ALTER TABLE tts_cache ADD COLUMN boundaries TEXT")
+            self._initialized = True
+
+    def path_for(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.mp3"
+
+    def temp_path(self, key: str) -> Path:
+        """合成中的临时文件，提交前不会被读到"""
+        self._ensure_init()
+        return self.cache_dir / f"{key}.{uuid.uuid4().hex}.part"
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """读取缓存条目并刷新最近使用时间，文件丢失时清除记录"""
+        self._ensure_init()
+        path = self.path_for(key)
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM tts_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if not path.exists():
+                conn.execute("DELETE FROM tts_cache WHERE key = ?", (key,))
+                return None
+            conn.execute("UPDATE tts_cache SET last_used = ?, hits = hits + 1 WHERE key = ?",
+                         (time.time(), key))
+        return self._entry(row, path)
+
+    def get_boundaries(self, key: str) -> Optional[List[Dict[str, Any]]]:
+        """读取缓存的逐词边界事件，未缓存时返回 None"""
+        self._ensure_init()
+        with self._connect() as conn:
+            row = conn.execute("SELECT boundaries FROM tts_cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        return json.loads(row["boundaries"]) if row["boundaries"] else []
+
+    def commit(self, key: str, temp_file: Path, text: str, voice: str, rate: str, volume: str,
+               engine: str = "edge", boundaries: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+        """把合成好的临时文件登记进缓存，并按容量淘汰旧条目"""
+        self._ensure_init()
+        path = self.path_for(key)
+        os.replace(temp_file, path)
+        size = path.stat().st_size
+        duration = probe_duration(path)
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("""
+                INSERT OR REPLACE INTO tts_cache (key, engine, voice, rate, volume, text, size, duration,
+                                                  boundaries, created_at, last_used, hits)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 0)
+            """, (key, engine, voice, rate, volume, text, size, duration,
+                  json.dumps(boundaries, ensure_ascii=False) if boundaries is not None else None, now, now))
+            row = conn.execute("SELECT * FROM tts_cache WHERE key = ?", (key,)).fetchone()
+        self.evict()
+        return self._entry(row, path)
+
+    async def get_or_synthesize(self, text: str, voice: str, rate: str, volume: str,
+                                synthesize: Synthesizer, engine: str = "edge") -> Dict[str, Any]:
+        """命中缓存直接返回，否则调用 synthesize 合成并写入缓存
+
+        返回的条目带有 ``cached`` 字段，表示是否复用了已有音频
+        """
+        key = tts_cache_key(text, voice, rate, volume, engine)
+        loop = asyncio.get_running_loop()
+        entry = await loop.run_in_executor(None, self.get, key)
+        if entry is not None:
+            self._stats["hits"] += 1
+            return {**entry, "cached": True}
+
+        # 同一批次或并发请求中的相同文本只合成一次
+        pending = self._inflight.get(key)
+        if pending is not None:
+            self._stats["shared"] += 1
+            return {**await asyncio.shield(pending), "cached": True}
+
+        future = loop.create_future()
+        self._inflight[key] = future
+        self._stats["misses"] += 1
+        temp_file = self.temp_path(key)
+        try:
+            boundaries = await synthesize(temp_file)
+            entry = await loop.run_in_executor(
+                None, self.commit, key, temp_file, text, voice, rate, volume, engine,
+                boundaries if isinstance(boundaries, list) else None
+            )
+        except BaseException as e:
+            self._stats["errors"] += 1
+            temp_file.unlink(missing_ok=True)
+            if isinstance(e, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(e)
+                # 没有其他等待者时避免 "exception was never retrieved" 警告
+                future.exception()
+            raise
+        else:
+            future.set_result(entry)
+            return {**entry, "cached": False}
+        finally:
+            self._inflight.pop(key, None)
+
+    def evict(self, max_bytes: Optional[int] = None) -> int:
+        """按最近使用时间淘汰条目直到总大小不超过上限，返回淘汰数量"""
+        self._ensure_init()
+        limit = self.max_bytes if max_bytes is None else max_bytes
+        evicted = 0
+        with self._connect() as conn:
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM tts_cache").fetchone()[0]
+            if total <= limit:
+                return 0
+            for row in conn.execute("SELECT key, size FROM tts_cache ORDER BY last_used").fetchall():
+                if total <= limit:
+                    break
+                self.path_for(row["key"]).unlink(missing_ok=True)
+                conn.execute("DELETE FROM tts_cache WHERE key = ?", (row["key"],))
+                total -= row["size"]
+                evicted += 1
+        self._stats["evictions"] += evicted
+        return evicted
+
+    def clear(self):
+        """清空缓存"""
+        self.evict(max_bytes=0)
+
+    def _entry(self, row: sqlite3.Row, path: Path) -> Dict[str, Any]:
+        return {
+            "key": row["key"],
+            "path": str(path),
+            "voice": row["voice"],
+            "size": row["size"],
+            "duration": row["duration"],
+        }
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存统计信息"""
+        self._ensure_init()
+        with self._connect() as conn:
+            entries, total = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM tts_cache"
+            ).fetchone()
+        lookups = self._stats["hits"] + self._stats["misses"] + self._stats["shared"]
+        return {
+            **self._stats,
+            "entries": entries,
+            "size": total,
+            "max_bytes": self.max_bytes,
+            "hit_rate": round((self._stats["hits"] + self._stats["shared"]) / lookups, 4) if lookups else 0.0,
+        }
+
+
+# 全局 TTS 缓存实例
+tts_cache = TTSCache()
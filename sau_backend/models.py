@@ -4,12 +4,15 @@
 """
 
 import sqlite3
+import json
 from datetime import datetime
 from typing import Optional, List, Dict, Any
 from dataclasses import dataclass
 from pathlib import Path
 import hashlib
 
+from sau_backend.utils.sqlite_pool import get_pool
+
 
 @dataclass
 class User:
@@ -51,11 +54,47 @@ class SocialMediaAccount:
             self.updated_at = datetime.utcnow()
 
 
+@dataclass
+class FileRecord:
+    """上传文件元数据模型"""
+
+    id: str
+    user_id: int
+    file_type: str
+    filename: str
+    file_size: int
+    file_path: str
+    created_at: str
+    sha256: str = None
+    description: str = ""
+    tags: List[str] = None
+
+    def __post_init__(self):
+        if self.tags is None:
+            self.tags = []
+
+    @classmethod
+    def from_row(cls, row) -> "FileRecord":
+        return cls(
+            id=row["id"],
+            user_id=row["user_id"],
+            file_type=row["file_type"],
+            filename=row["filename"],
+            file_size=row["file_size"],
+            file_path=row["file_path"],
+            created_at=row["created_at"],
+            sha256=row["sha256"],
+            description=row["description"] or "",
+            tags=json.loads(row["tags"]) if row["tags"] else [],
+        )
+
+
 class DatabaseManager:
     """数据库管理器"""
 
     def __init__(self, db_path: str = "db/database.db"):
         self.db_path = db_path
+        self.pool = get_pool(db_path)
         self.init_database()
 
     def init_database(self):
@@ -63,83 +102,141 @@ class DatabaseManager:
         # 创建数据库目录
         Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
 
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        with self.pool.session() as conn:
+            cursor = conn.cursor()
 
-        # 创建用户表
-        cursor.execute(
+            # 创建用户表
+            cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS users (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    username TEXT UNIQUE NOT NULL,
+                    email TEXT UNIQUE NOT NULL,
+                    password_hash TEXT NOT NULL,
+                    role TEXT DEFAULT 'user',
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    is_active BOOLEAN DEFAULT 1
+                )
             """
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                username TEXT UNIQUE NOT NULL,
-                email TEXT UNIQUE NOT NULL,
-                password_hash TEXT NOT NULL,
-                role TEXT DEFAULT 'user',
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                is_active BOOLEAN DEFAULT 1
             )
-        """
-        )
 
-        # 创建社交媒体账号表
-        cursor.execute(
+            # 创建社交媒体账号表
+            cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS social_media_accounts (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id INTEGER NOT NULL,
+                    platform TEXT NOT NULL,
+                    account_name TEXT NOT NULL,
+                    status INTEGER DEFAULT 0,
+                    cookie_path TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (user_id) REFERENCES users (id)
+                )
             """
-            CREATE TABLE IF NOT EXISTS social_media_accounts (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                platform TEXT NOT NULL,
-                account_name TEXT NOT NULL,
-                status INTEGER DEFAULT 0,
-                cookie_path TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users (id)
             )
-        """
-        )
 
-        # 创建会话表
-        cursor.execute(
+            # 创建会话表
+            cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS sessions (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id INTEGER NOT NULL,
+                    token_hash TEXT NOT NULL,
+                    expires_at TIMESTAMP NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (user_id) REFERENCES users (id)
+                )
             """
-            CREATE TABLE IF NOT EXISTS sessions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                token_hash TEXT NOT NULL,
-                expires_at TIMESTAMP NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users (id)
             )
-        """
-        )
 
-        # 创建索引
-        cursor.execute(
-            "CREATE INDEX IF NOT EXISTS idx_users_username ON users(username)"
-        )
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_users_email ON users(email)")
-        cursor.execute(
-            "CREATE INDEX IF NOT EXISTS idx_social_accounts_user ON social_media_accounts(user_id)"
-        )
-        cursor.execute(
-            "CREATE INDEX IF NOT EXISTS idx_sessions_token ON sessions(token_hash)"
-        )
+            # 创建文件元数据表
+            cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS files (
+                    id TEXT PRIMARY KEY,
+                    user_id INTEGER NOT NULL,
+                    file_type TEXT NOT NULL,
+                    filename TEXT NOT NULL,
+                    file_size INTEGER NOT NULL,
+                    file_path TEXT NOT NULL,
+                    created_at TEXT NOT NULL,
+                    sha256 TEXT,
+                    description TEXT,
+                    tags TEXT,
+                    FOREIGN KEY (user_id) REFERENCES users (id)
+                )
+            """
+            )
+
+            # 创建用户存储统计表，由 files 表触发器增量维护
+            cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS user_storage_stats (
+                    user_id INTEGER NOT NULL,
+                    file_type TEXT NOT NULL,
+                    file_count INTEGER NOT NULL DEFAULT 0,
+                    total_size INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (user_id, file_type)
+                )
+            """
+            )
+            cursor.execute(
+                """
+                CREATE TRIGGER IF NOT EXISTS trg_files_insert AFTER INSERT ON files
+                BEGIN
+                    INSERT OR IGNORE INTO user_storage_stats (user_id, file_type) VALUES (NEW.user_id, NEW.file_type);
+                    UPDATE user_storage_stats
+                    SET file_count = file_count + 1, total_size = total_size + NEW.file_size
+                    WHERE user_id = NEW.user_id AND file_type = NEW.file_type;
+                END
+            """
+            )
+            cursor.execute(
+                """
+                CREATE TRIGGER IF NOT EXISTS trg_files_delete AFTER DELETE ON files
+                BEGIN
+                    UPDATE user_storage_stats
+                    SET file_count = file_count - 1, total_size = total_size - OLD.file_size
+                    WHERE user_id = OLD.user_id AND file_type = OLD.file_type;
+                END
+            """
+            )
 
-        conn.commit()
-        conn.close()
+            # 创建索引
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_users_username ON users(username)"
+            )
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_users_email ON users(email)")
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_social_accounts_user ON social_media_accounts(user_id)"
+            )
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_sessions_token ON sessions(token_hash)"
+            )
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_files_user_created ON files(user_id, created_at DESC, id DESC)"
+            )
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_files_user_type_created ON files(user_id, file_type, created_at DESC, id DESC)"
+            )
 
     def get_connection(self):
-        """获取数据库连接"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        return conn
+        """获取数据库连接（当前线程的池化连接，close() 归还）"""
+        return self.pool.connection(row_factory=sqlite3.Row)
+
+    def session(self):
+        """数据库会话：with 块结束时提交（异常时回滚）并归还连接"""
+        return self.pool.session(row_factory=sqlite3.Row)
 
     def create_user(
         self, username: str, email: str, password_hash: str, role: str = "user"
     ) -> Optional[User]:
         """创建用户"""
+        conn = self.get_connection()
         try:
-            conn = self.get_connection()
             cursor = conn.cursor()
 
             cursor.execute(
@@ -152,21 +249,21 @@ class DatabaseManager:
 
             user_id = cursor.lastrowid
             conn.commit()
-            conn.close()
-
-            return self.get_user_by_id(user_id)
 
         except sqlite3.IntegrityError:
             return None
+        finally:
+            conn.close()
+
+        return self.get_user_by_id(user_id)
 
     def get_user_by_id(self, user_id: int) -> Optional[User]:
         """根据ID获取用户"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        with self.session() as conn:
+            cursor = conn.cursor()
 
-        cursor.execute("SELECT * FROM users WHERE id = ?", (user_id,))
-        row = cursor.fetchone()
-        conn.close()
+            cursor.execute("SELECT * FROM users WHERE id = ?", (user_id,))
+            row = cursor.fetchone()
 
         if row:
             return User(
@@ -183,12 +280,11 @@ class DatabaseManager:
 
     def get_user_by_username(self, username: str) -> Optional[User]:
         """根据用户名获取用户"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        with self.session() as conn:
+            cursor = conn.cursor()
 
-        cursor.execute("SELECT * FROM users WHERE username = ?", (username,))
-        row = cursor.fetchone()
-        conn.close()
+            cursor.execute("SELECT * FROM users WHERE username = ?", (username,))
+            row = cursor.fetchone()
 
         if row:
             return User(
@@ -205,12 +301,11 @@ class DatabaseManager:
 
     def get_user_by_email(self, email: str) -> Optional[User]:
         """根据邮箱获取用户"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        with self.session() as conn:
+            cursor = conn.cursor()
 
-        cursor.execute("SELECT * FROM users WHERE email = ?", (email,))
-        row = cursor.fetchone()
-        conn.close()
+            cursor.execute("SELECT * FROM users WHERE email = ?", (email,))
+            row = cursor.fetchone()
 
         if row:
             return User(
@@ -227,19 +322,16 @@ class DatabaseManager:
 
     def update_user_last_login(self, user_id: int):
         """更新用户最后登录时间"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-
-        cursor.execute(
-            """
-            UPDATE users SET updated_at = CURRENT_TIMESTAMP
-            WHERE id = ?
-        """,
-            (user_id,),
-        )
+        with self.session() as conn:
+            cursor = conn.cursor()
 
-        conn.commit()
-        conn.close()
+            cursor.execute(
+                """
+                UPDATE users SET updated_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            """,
+                (user_id,),
+            )
 
     def create_social_account(
         self,
@@ -250,8 +342,8 @@ class DatabaseManager:
         status: int = 0,
     ) -> Optional[SocialMediaAccount]:
         """创建社交媒体账号"""
+        conn = self.get_connection()
         try:
-            conn = self.get_connection()
             cursor = conn.cursor()
 
             cursor.execute(
@@ -264,23 +356,23 @@ class DatabaseManager:
 
             account_id = cursor.lastrowid
             conn.commit()
-            conn.close()
-
-            return self.get_social_account_by_id(account_id)
 
         except sqlite3.IntegrityError:
             return None
+        finally:
+            conn.close()
+
+        return self.get_social_account_by_id(account_id)
 
     def get_social_account_by_id(self, account_id: int) -> Optional[SocialMediaAccount]:
         """根据ID获取社交媒体账号"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        with self.session() as conn:
+            cursor = conn.cursor()
 
-        cursor.execute(
-            "SELECT * FROM social_media_accounts WHERE id = ?", (account_id,)
-        )
-        row = cursor.fetchone()
-        conn.close()
+            cursor.execute(
+                "SELECT * FROM social_media_accounts WHERE id = ?", (account_id,)
+            )
+            row = cursor.fetchone()
 
         if row:
             return SocialMediaAccount(
@@ -297,14 +389,13 @@ class DatabaseManager:
 
     def get_social_accounts_by_user(self, user_id: int) -> List[SocialMediaAccount]:
         """获取用户的所有社交媒体账号"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        with self.session() as conn:
+            cursor = conn.cursor()
 
-        cursor.execute(
-            "SELECT * FROM social_media_accounts WHERE user_id = ?", (user_id,)
-        )
-        rows = cursor.fetchall()
-        conn.close()
+            cursor.execute(
+                "SELECT * FROM social_media_accounts WHERE user_id = ?", (user_id,)
+            )
+            rows = cursor.fetchall()
 
         accounts = []
         for row in rows:
@@ -325,55 +416,48 @@ class DatabaseManager:
 
     def update_social_account_status(self, account_id: int, status: int):
         """更新社交媒体账号状态"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-
-        cursor.execute(
-            """
-            UPDATE social_media_accounts SET status = ?, updated_at = CURRENT_TIMESTAMP
-            WHERE id = ?
-        """,
-            (status, account_id),
-        )
+        with self.session() as conn:
+            cursor = conn.cursor()
 
-        conn.commit()
-        conn.close()
+            cursor.execute(
+                """
+                UPDATE social_media_accounts SET status = ?, updated_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            """,
+                (status, account_id),
+            )
 
     def create_session(self, user_id: int, token: str, expires_at: datetime):
         """创建会话"""
         token_hash = hashlib.sha256(token.encode()).hexdigest()
 
-        conn = self.get_connection()
-        cursor = conn.cursor()
-
-        cursor.execute(
-            """
-            INSERT INTO sessions (user_id, token_hash, expires_at)
-            VALUES (?, ?, ?)
-        """,
-            (user_id, token_hash, expires_at),
-        )
+        with self.session() as conn:
+            cursor = conn.cursor()
 
-        conn.commit()
-        conn.close()
+            cursor.execute(
+                """
+                INSERT INTO sessions (user_id, token_hash, expires_at)
+                VALUES (?, ?, ?)
+            """,
+                (user_id, token_hash, expires_at),
+            )
 
     def validate_session(self, user_id: int, token: str) -> bool:
         """验证会话"""
         token_hash = hashlib.sha256(token.encode()).hexdigest()
 
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        with self.session() as conn:
+            cursor = conn.cursor()
 
-        cursor.execute(
-            """
-            SELECT 1 FROM sessions
-            WHERE user_id = ? AND token_hash = ? AND expires_at > CURRENT_TIMESTAMP
-        """,
-            (user_id, token_hash),
-        )
+            cursor.execute(
+                """
+                SELECT 1 FROM sessions
+                WHERE user_id = ? AND token_hash = ? AND expires_at > CURRENT_TIMESTAMP
+            """,
+                (user_id, token_hash),
+            )
 
-        valid = cursor.fetchone() is not None
-        conn.close()
+            valid = cursor.fetchone() is not None
 
         return valid
 
@@ -381,24 +465,143 @@ class DatabaseManager:
         """撤销会话"""
         token_hash = hashlib.sha256(token.encode()).hexdigest()
 
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        with self.session() as conn:
+            cursor = conn.cursor()
 
-        cursor.execute(
-            "DELETE FROM sessions WHERE user_id = ? AND token_hash = ?",
-            (user_id, token_hash),
-        )
-        conn.commit()
-        conn.close()
+            cursor.execute(
+                "DELETE FROM sessions WHERE user_id = ? AND token_hash = ?",
+                (user_id, token_hash),
+            )
 
     def revoke_all_sessions(self, user_id: int):
         """撤销用户所有会话"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        with self.session() as conn:
+            cursor = conn.cursor()
+
+            cursor.execute("DELETE FROM sessions WHERE user_id = ?", (user_id,))
+
+    def create_file_record(self, record: FileRecord):
+        """登记上传文件"""
+        with self.session() as conn:
+            cursor = conn.cursor()
+
+            cursor.execute(
+                """
+                INSERT INTO files (id, user_id, file_type, filename, file_size, file_path,
+                                   created_at, sha256, description, tags)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+                (record.id, record.user_id, record.file_type, record.filename, record.file_size,
+                 record.file_path, record.created_at, record.sha256, record.description,
+                 json.dumps(record.tags, ensure_ascii=False)),
+            )
+
+    def get_file_record(self, user_id: int, file_id: str) -> Optional[FileRecord]:
+        """根据ID获取用户文件"""
+        with self.session() as conn:
+            cursor = conn.cursor()
+
+            cursor.execute(
+                "SELECT * FROM files WHERE id = ? AND user_id = ?", (file_id, user_id)
+            )
+            row = cursor.fetchone()
+
+        return FileRecord.from_row(row) if row else None
 
-        cursor.execute("DELETE FROM sessions WHERE user_id = ?", (user_id,))
-        conn.commit()
-        conn.close()
+    def delete_file_record(self, user_id: int, file_id: str) -> Optional[FileRecord]:
+        """删除文件记录，返回被删除的记录"""
+        with self.session() as conn:
+            cursor = conn.cursor()
+
+            cursor.execute(
+                "SELECT * FROM files WHERE id = ? AND user_id = ?", (file_id, user_id)
+            )
+            row = cursor.fetchone()
+            if row:
+                cursor.execute("DELETE FROM files WHERE id = ?", (file_id,))
+
+        return FileRecord.from_row(row) if row else None
+
+    def list_file_records(
+        self,
+        user_id: int,
+        file_type: str = None,
+        limit: int = 20,
+        cursor_key: tuple = None,
+        offset: int = 0,
+    ) -> List[FileRecord]:
+        """按创建时间倒序列出用户文件
+
+        传入 cursor_key=(created_at, id) 时使用键集分页，从该记录之后继续；
+        否则退化为 OFFSET 分页
+        """
+        with self.session() as conn:
+            cursor = conn.cursor()
+
+            sql = "SELECT * FROM files WHERE user_id = ?"
+            params: list = [user_id]
+            if file_type:
+                sql += " AND file_type = ?"
+                params.append(file_type)
+            if cursor_key:
+                sql += " AND (created_at, id) < (?, ?)"
+                params.extend(cursor_key)
+            sql += " ORDER BY created_at DESC, id DESC LIMIT ?"
+            params.append(limit)
+            if not cursor_key and offset:
+                sql += " OFFSET ?"
+                params.append(offset)
+
+            cursor.execute(sql, params)
+            rows = cursor.fetchall()
+
+        return [FileRecord.from_row(row) for row in rows]
+
+    def get_user_storage(self, user_id: int) -> Dict[str, Any]:
+        """获取用户存储统计（按文件类型汇总）"""
+        with self.session() as conn:
+            cursor = conn.cursor()
+
+            cursor.execute(
+                "SELECT file_type, file_count, total_size FROM user_storage_stats WHERE user_id = ?",
+                (user_id,),
+            )
+            rows = cursor.fetchall()
+
+        by_type = {
+            row["file_type"]: {"file_count": row["file_count"], "total_size": row["total_size"]}
+            for row in rows
+            if row["file_count"] > 0
+        }
+        return {
+            "file_count": sum(item["file_count"] for item in by_type.values()),
+            "total_size": sum(item["total_size"] for item in by_type.values()),
+            "by_type": by_type,
+        }
+
+    def rebuild_user_storage(self, user_id: int = None):
+        """根据 files 表重新计算存储统计"""
+        with self.session() as conn:
+            cursor = conn.cursor()
+
+            if user_id is None:
+                cursor.execute("DELETE FROM user_storage_stats")
+                cursor.execute(
+                    """
+                    INSERT INTO user_storage_stats (user_id, file_type, file_count, total_size)
+                    SELECT user_id, file_type, COUNT(*), SUM(file_size) FROM files GROUP BY user_id, file_type
+                """
+                )
+            else:
+                cursor.execute("DELETE FROM user_storage_stats WHERE user_id = ?", (user_id,))
+                cursor.execute(
+                    """
+                    INSERT INTO user_storage_stats (user_id, file_type, file_count, total_size)
+                    SELECT user_id, file_type, COUNT(*), SUM(file_size) FROM files
+                    WHERE user_id = ? GROUP BY user_id, file_type
+                """,
+                    (user_id,),
+                )
 
 
 # 创建全局数据库管理器实例
@@ -1,76 +1,137 @@
 """
 抖音平台集成模块
-提供抖音账号登录、内容发布等功能
+提供抖音账号登录、内容发布等功能；每个账号拥有独立的浏览器会话（上下文、页面与 cookie 状态），
+由会话注册表统一管理并发上限与空闲回收，不同账号的扫码登录、状态检查和上传可以并行执行
 """
 
 import asyncio
 import json
 import os
 import time
+from contextlib import AsyncExitStack, asynccontextmanager, nullcontext
 from datetime import datetime
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Callable
 from pathlib import Path
 
-from playwright.async_api import async_playwright, Browser, Page, BrowserContext
+from playwright.async_api import Page, BrowserContext
 import sys
 
 # 添加sau_backend到路径
 sys.path.append("/Users/sunyouyou/Desktop/projects/bzhi/social-auto-upload/sau_backend")
 
 from models import db_manager
-from utils.base_social_media import set_init_script
-
-
-class DouyinPlatform:
-    """抖音平台集成类"""
-
-    def __init__(self):
-        self.browser: Optional[Browser] = None
+from sau_backend.utils.async_runtime import async_runtime
+from sau_backend.utils.base_social_media import SOCIAL_MEDIA_DOUYIN
+from sau_backend.utils.browser_pool import browser_pool
+from sau_backend.utils.cookie_validator import cookie_validator
+from sau_backend.utils.http_cache import invalidate_responses
+from sau_backend.utils.log import douyin_logger
+
+# 同时执行浏览器操作的账号数量上限
+MAX_CONCURRENT_OPERATIONS = int(os.getenv("SAU_DOUYIN_MAX_CONCURRENT", 3))
+# 注册表中保留的会话数量上限，超出时回收最久未使用的空闲会话
+MAX_SESSIONS = int(os.getenv("SAU_DOUYIN_MAX_SESSIONS", 20))
+# 会话空闲多久后关闭（秒）
+SESSION_IDLE_TIMEOUT = float(os.getenv("SAU_DOUYIN_SESSION_IDLE_TIMEOUT", 600))
+
+LAUNCH_ARGS = [
+    '--disable-blink-features=AutomationControlled',
+    '--no-sandbox',
+    '--disable-setuid-sandbox',
+    '--disable-dev-shm-usage',
+    '--disable-accelerated-2d-canvas',
+    '--no-first-run',
+    '--no-zygote',
+    '--disable-gpu'
+]
+VIEWPORT = {'width': 1920, 'height': 1080}
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+
+
+async def check_login_status(account_id: int, cookie_path: str) -> Dict[str, Any]:
+    """通过 cookie_validator 在共享浏览器池中校验登录态，结果按 cookie 文件指纹缓存"""
+    result = await cookie_validator.validate(SOCIAL_MEDIA_DOUYIN, cookie_path)
+    if result.valid:
+        message, status = "登录状态正常", "logged_in"
+    elif result.valid is None:
+        message, status = f"检查登录状态失败: {result.error}", "error"
+    elif result.error:
+        message, status = "未找到登录信息", "not_logged_in"
+    else:
+        message, status = "登录已过期", "expired"
+    return {
+        "success": bool(result.valid),
+        "message": message,
+        "account_id": account_id,
+        "status": status
+    }
+
+
+class DouyinSession:
+    """单个抖音账号的浏览器会话
+
+    上下文从全局浏览器池租借，在扫码登录与等待登录之间保持打开；
+    同一账号的操作通过 ``lock`` 串行执行
+    """
+
+    def __init__(self, account_id: int):
+        self.account_id = account_id
         self.context: Optional[BrowserContext] = None
         self.page: Optional[Page] = None
-        self.playwright = None
+        self.lock = asyncio.Lock()
+        self.created_at = time.time()
+        self.last_used = time.time()
+        self.in_use = 0
+        self.operations = 0
+        self._stack: Optional[AsyncExitStack] = None
 
-    async def initialize(self):
-        """初始化浏览器"""
-        self.playwright = await async_playwright().start()
-
-        # 启动浏览器
-        self.browser = await self.playwright.chromium.launch(
-            headless=True,  # 生产环境使用无头模式
-            args=[
-                '--disable-blink-features=AutomationControlled',
-                '--no-sandbox',
-                '--disable-setuid-sandbox',
-                '--disable-dev-shm-usage',
-                '--disable-accelerated-2d-canvas',
-                '--no-first-run',
-                '--no-zygote',
-                '--disable-gpu'
-            ]
-        )
-
-        # 创建浏览器上下文
-        self.context = await self.browser.new_context(
-            viewport={'width': 1920, 'height': 1080},
-            user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        )
+    @property
+    def is_open(self) -> bool:
+        return self.page is not None and not self.page.is_closed()
 
-        # 创建新页面
-        self.page = await self.context.new_page()
+    async def initialize(self):
+        """租借独立的浏览器上下文并打开页面（会话已打开时直接复用）"""
+        if self.is_open:
+            return
+        await self.close()
 
-        # 注入反检测脚本
-        await set_init_script(self.page)
+        stack = AsyncExitStack()
+        try:
+            # 上下文已注入反检测脚本
+            self.context = await stack.enter_async_context(browser_pool.lease_context(
+                headless=True,  # 生产环境使用无头模式
+                args=LAUNCH_ARGS,
+                viewport=VIEWPORT,
+                user_agent=USER_AGENT,
+            ))
+            self.page = await self.context.new_page()
+        except Exception:
+            self.context = None
+            self.page = None
+            await stack.aclose()
+            raise
+        self._stack = stack
 
     async def close(self):
-        """关闭浏览器"""
-        if self.page:
-            await self.page.close()
-        if self.context:
-            await self.context.close()
-        if self.browser:
-            await self.browser.close()
-        if self.playwright:
-            await self.playwright.stop()
+        """关闭页面并归还浏览器上下文"""
+        stack, self._stack = self._stack, None
+        self.page = None
+        self.context = None
+        if stack is not None:
+            try:
+                await stack.aclose()
+            except Exception as e:
+                douyin_logger.warning(f"[douyin] 关闭账号 {self.account_id} 的会话失败: {e}")
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "account_id": self.account_id,
+            "open": self.is_open,
+            "in_use": self.in_use,
+            "operations": self.operations,
+            "idle_seconds": round(time.time() - self.last_used, 1),
+            "created_at": self.created_at,
+        }
 
     async def login_with_qr(self, account_id: int, cookie_path: str) -> Dict[str, Any]:
         """使用二维码登录抖音"""
@@ -181,6 +242,7 @@ class DouyinPlatform:
 
             # 更新账号状态为等待扫码
             db_manager.update_social_account_status(account_id, 0)
+            invalidate_responses("accounts")
 
             return {
                 "success": True,
@@ -201,6 +263,14 @@ class DouyinPlatform:
 
     async def wait_for_login(self, account_id: int, cookie_path: str, max_wait: int = 300) -> Dict[str, Any]:
         """等待登录完成"""
+        if not self.is_open:
+            return {
+                "success": False,
+                "message": "登录会话已失效，请重新获取二维码",
+                "account_id": account_id,
+                "next_action": "refresh_qr"
+            }
+
         try:
             start_time = time.time()
 
@@ -216,6 +286,7 @@ class DouyinPlatform:
 
                         # 更新账号状态为已连接
                         db_manager.update_social_account_status(account_id, 1)
+                        invalidate_responses("accounts")
 
                         # 获取用户信息
                         user_info = await self._get_user_info()
@@ -369,52 +440,11 @@ class DouyinPlatform:
 
     async def check_login_status(self, account_id: int, cookie_path: str) -> Dict[str, Any]:
         """检查登录状态"""
-        try:
-            await self.initialize()
-
-            # 加载cookies
-            if not await self.load_cookies(cookie_path):
-                await self.close()
-                return {
-                    "success": False,
-                    "message": "未找到登录信息",
-                    "account_id": account_id,
-                    "status": "not_logged_in"
-                }
+        return await check_login_status(account_id, cookie_path)
 
-            # 访问抖音创作者平台
-            await self.page.goto('https://creator.douyin.com/')
-            await self.page.wait_for_timeout(3000)
-
-            # 检查是否登录
-            if await self._check_logged_in():
-                await self.close()
-                return {
-                    "success": True,
-                    "message": "登录状态正常",
-                    "account_id": account_id,
-                    "status": "logged_in"
-                }
-            else:
-                await self.close()
-                return {
-                    "success": False,
-                    "message": "登录已过期",
-                    "account_id": account_id,
-                    "status": "expired"
-                }
-
-        except Exception as e:
-            await self.close()
-            return {
-                "success": False,
-                "message": f"检查登录状态失败: {str(e)}",
-                "account_id": account_id,
-                "status": "error"
-            }
-
-    async def upload_video(self, account_id: int, video_path: str, title: str, description: str = "", tags: List[str] = None) -> Dict[str, Any]:
-        """上传视频到抖音"""
+    async def upload_video(self, account_id: int, video_path: str, title: str, description: str = "", tags: List[str] = None,
+                           on_submit: Optional[Callable[[], None]] = None) -> Dict[str, Any]:
+        """上传视频到抖音，on_submit 在视频文件交给平台之前调用"""
         try:
             await self.initialize()
 
@@ -470,6 +500,8 @@ class DouyinPlatform:
                 }
 
             # 上传视频文件
+            if on_submit is not None:
+                on_submit()
             await upload_button.set_input_files(video_path)
 
             # 等待上传完成
@@ -547,5 +579,159 @@ class DouyinPlatform:
             }
 
 
+class DouyinPlatform:
+    """抖音平台集成类
+
+    按账号维护 DouyinSession 注册表：同一账号的操作串行，不同账号并行，
+    同时进行的浏览器操作数受 ``max_concurrent`` 限制，空闲会话超时后自动关闭
+    """
+
+    def __init__(self,
+                 max_concurrent: int = MAX_CONCURRENT_OPERATIONS,
+                 max_sessions: int = MAX_SESSIONS,
+                 idle_timeout: float = SESSION_IDLE_TIMEOUT):
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_sessions = max(1, max_sessions)
+        self.idle_timeout = idle_timeout
+        self.sessions: Dict[int, DouyinSession] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._evictor: Optional[asyncio.Task] = None
+        self._stats = {"operations": 0, "created": 0, "evicted": 0, "lease_wait": 0.0}
+
+    def _bind_loop(self):
+        """会话中的 Playwright 对象只能在创建它的事件循环中使用"""
+        loop = asyncio.get_running_loop()
+        if self._loop is loop:
+            return
+        if self._loop is not None and self.sessions:
+            douyin_logger.warning("[douyin] 事件循环已变更，丢弃旧循环中的账号会话")
+        self._loop = loop
+        self.sessions = {}
+        self._semaphore = asyncio.Semaphore(self.max_concurrent)
+        self._evictor = loop.create_task(self._evict_loop()) if self.idle_timeout > 0 else None
+
+    def _get_session(self, account_id: int) -> DouyinSession:
+        """获取或创建账号会话，注册表已满时回收最久未使用的空闲会话"""
+        session = self.sessions.get(account_id)
+        if session is not None:
+            return session
+
+        if len(self.sessions) >= self.max_sessions:
+            idle = [s for s in self.sessions.values() if s.in_use == 0]
+            if idle:
+                oldest = min(idle, key=lambda s: s.last_used)
+                self._discard(oldest)
+            else:
+                douyin_logger.warning(f"[douyin] 会话数已达上限 {self.max_sessions} 且均在使用中")
+
+        session = DouyinSession(account_id)
+        self.sessions[account_id] = session
+        self._stats["created"] += 1
+        return session
+
+    def _discard(self, session: DouyinSession):
+        """移出注册表并在后台关闭"""
+        if self.sessions.get(session.account_id) is session:
+            del self.sessions[session.account_id]
+        self._stats["evicted"] += 1
+        if session.context is not None:
+            asyncio.get_running_loop().create_task(session.close())
+
+    async def _evict_loop(self):
+        interval = max(1.0, min(self.idle_timeout / 2, 60.0))
+        while True:
+            await asyncio.sleep(interval)
+            self.evict_idle()
+
+    def evict_idle(self, idle_timeout: Optional[float] = None) -> int:
+        """关闭空闲超时的会话，返回回收数量"""
+        timeout = self.idle_timeout if idle_timeout is None else idle_timeout
+        now = time.time()
+        expired = [s for s in self.sessions.values() if s.in_use == 0 and now - s.last_used >= timeout]
+        for session in expired:
+            douyin_logger.info(f"[douyin] 回收账号 {session.account_id} 的空闲会话")
+            self._discard(session)
+        return len(expired)
+
+    @asynccontextmanager
+    async def account_session(self, account_id: int, limited: bool = True):
+        """独占账号会话执行操作
+
+        Args:
+            account_id: 账号 ID
+            limited: 是否占用全局并发名额
+        """
+        self._bind_loop()
+        session = self._get_session(account_id)
+        session.in_use += 1
+        started = time.perf_counter()
+        try:
+            async with session.lock:
+                async with (self._semaphore if limited else nullcontext()):
+                    self._stats["lease_wait"] += time.perf_counter() - started
+                    self._stats["operations"] += 1
+                    session.operations += 1
+                    session.last_used = time.time()
+                    yield session
+        finally:
+            session.in_use -= 1
+            session.last_used = time.time()
+
+    async def login_with_qr(self, account_id: int, cookie_path: str) -> Dict[str, Any]:
+        """使用二维码登录抖音"""
+        async with self.account_session(account_id) as session:
+            return await session.login_with_qr(account_id, cookie_path)
+
+    async def wait_for_login(self, account_id: int, cookie_path: str, max_wait: int = 300) -> Dict[str, Any]:
+        """等待登录完成（轮询已打开的页面，不占用并发名额）"""
+        async with self.account_session(account_id, limited=False) as session:
+            return await session.wait_for_login(account_id, cookie_path, max_wait)
+
+    async def check_login_status(self, account_id: int, cookie_path: str) -> Dict[str, Any]:
+        """检查登录状态（不占用账号会话）"""
+        return await check_login_status(account_id, cookie_path)
+
+    async def upload_video(self, account_id: int, video_path: str, title: str, description: str = "", tags: List[str] = None,
+                           on_submit: Optional[Callable[[], None]] = None) -> Dict[str, Any]:
+        """上传视频到抖音"""
+        async with self.account_session(account_id) as session:
+            return await session.upload_video(account_id, video_path, title, description, tags, on_submit)
+
+    async def close_session(self, account_id: int):
+        """关闭指定账号的会话"""
+        session = self.sessions.pop(account_id, None)
+        if session is not None:
+            await session.close()
+
+    async def close(self):
+        """关闭所有账号会话"""
+        if self._loop is None or self._loop is not asyncio.get_running_loop():
+            return
+        if self._evictor is not None:
+            self._evictor.cancel()
+            self._evictor = None
+        sessions = list(self.sessions.values())
+        self.sessions = {}
+        for session in sessions:
+            await session.close()
+        self._loop = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取会话注册表统计信息"""
+        sessions = [s.to_dict() for s in list(self.sessions.values())]
+        return {
+            **self._stats,
+            "max_concurrent": self.max_concurrent,
+            "max_sessions": self.max_sessions,
+            "idle_timeout": self.idle_timeout,
+            "sessions": sessions,
+            "open_sessions": sum(1 for s in sessions if s["open"]),
+        }
+
+
 # 创建全局抖音平台实例
-douyin_platform = DouyinPlatform()
\ No newline at end of file
+douyin_platform = DouyinPlatform()
+
+# 事件循环服务关闭时先关闭账号会话，再由浏览器池关闭浏览器
+async_runtime.add_shutdown_hook(douyin_platform.close)
@@ -0,0 +1,788 @@
+"""
+发布任务队列模块
+基于 SQLite 持久化的发布任务队列，使用 asyncio 工作池并发执行上传，
+支持按平台、按账号的并发上限、失败重试以及状态流转记录。
+运行中的任务持有带租约的所有权（owner + lease_expires_at），执行期间定期续约；
+只有租约过期的任务才会被重新排队，多进程部署时不会重复发布
+"""
+
+import asyncio
+import concurrent.futures
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from platforms.douyin_platform import douyin_platform
+from sau_backend.utils.async_runtime import async_runtime
+from sau_backend.utils.metrics import LONG_DURATION_BUCKETS, metrics_registry
+from sau_backend.utils.sqlite_pool import get_pool
+
+
+# 任务状态
+STATUS_QUEUED = "queued"
+STATUS_RUNNING = "running"
+STATUS_SUCCESS = "success"
+STATUS_FAILED = "failed"
+STATUS_CANCELLED = "cancelled"
+
+TERMINAL_STATUSES = (STATUS_SUCCESS, STATUS_FAILED, STATUS_CANCELLED)
+
+# 查询接口返回的字段，视频文件路径、租约所有者等内部字段不对外暴露
+JOB_PUBLIC_FIELDS = ("id", "user_id", "type", "title", "description", "tags", "status",
+                     "created_at", "updated_at", "finished_at")
+TASK_PUBLIC_FIELDS = ("id", "job_id", "account_id", "platform", "account_name", "status",
+                      "attempts", "max_attempts", "message", "result", "created_at",
+                      "updated_at", "started_at", "finished_at", "submitted_at")
+
+# 平台执行器：接收任务字典，返回 {"success": bool, "message": str, ...}。
+# 视频交给平台之前应调用 task["on_submit"]()，此后的异常不再重试
+Executor = Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]]
+
+
+def _parse_limits(raw: str) -> Dict[str, int]:
+    """解析形如 "douyin=1,kuaishou=2" 的并发上限配置"""
+    limits = {}
+    for item in (raw or "").split(","):
+        if "=" not in item:
+            continue
+        name, value = item.split("=", 1)
+        try:
+            limits[name.strip()] = max(1, int(value))
+        except ValueError:
+            continue
+    return limits
+
+
+DEFAULT_WORKERS = int(os.getenv("SAU_PUBLISH_WORKERS", "4"))
+DEFAULT_ACCOUNT_LIMIT = int(os.getenv("SAU_PUBLISH_ACCOUNT_LIMIT", "1"))
+DEFAULT_PLATFORM_LIMIT = int(os.getenv("SAU_PUBLISH_PLATFORM_LIMIT", "2"))
+# 按平台覆盖并发上限，如 "kuaishou=1"。抖音默认取 DouyinPlatform.max_concurrent
+# （每个账号独立会话，同账号由 account_limit 串行），不再额外限制
+DEFAULT_PLATFORM_LIMITS = _parse_limits(os.getenv("SAU_PUBLISH_PLATFORM_LIMITS", ""))
+DEFAULT_MAX_ATTEMPTS = int(os.getenv("SAU_PUBLISH_MAX_ATTEMPTS", "2"))
+RETRY_BACKOFF_SECONDS = 30
+# 运行中任务的租约时长（秒），执行期间每三分之一租约续约一次
+LEASE_SECONDS = float(os.getenv("SAU_PUBLISH_LEASE_SECONDS", "60"))
+
+# 监控指标：outcome 为 success / retry / failed
+UPLOAD_DURATION = metrics_registry.histogram(
+    "sau_upload_duration_seconds", "Duration of publish attempts by platform and outcome",
+    ("platform", "outcome"), buckets=LONG_DURATION_BUCKETS,
+)
+
+
+class UnsupportedPlatformError(Exception):
+    """平台暂不支持发布"""
+
+
+class PartialPublishError(Exception):
+    """视频已提交给平台后失败，平台侧可能已部分发布，不能自动重试"""
+
+
+async def _douyin_executor(task: Dict[str, Any]) -> Dict[str, Any]:
+    """抖音视频发布执行器"""
+    return await douyin_platform.upload_video(
+        task["account_id"], task["video_path"], task["title"],
+        task["description"], task["tags"], on_submit=task.get("on_submit")
+    )
+
+
+class PublishQueue:
+    """持久化发布任务队列"""
+
+    def __init__(self, db_path: str = "db/database.db", workers: int = DEFAULT_WORKERS,
+                 account_limit: int = DEFAULT_ACCOUNT_LIMIT,
+                 platform_limit: int = DEFAULT_PLATFORM_LIMIT,
+                 platform_limits: Optional[Dict[str, int]] = None,
+                 max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+                 lease_seconds: float = LEASE_SECONDS):
+        self.db_path = db_path
+        self.workers = max(1, workers)
+        self.account_limit = max(1, account_limit)
+        self.platform_limit = max(1, platform_limit)
+        if platform_limits is None:
+            platform_limits = {"douyin": douyin_platform.max_concurrent, **DEFAULT_PLATFORM_LIMITS}
+        self.platform_limits = dict(platform_limits)
+        self.max_attempts = max(1, max_attempts)
+        self.lease_seconds = max(3.0, lease_seconds)
+        self.owner: Optional[str] = None
+        self.executors: Dict[str, Executor] = {"douyin": _douyin_executor}
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._future: Optional[concurrent.futures.Future] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._claim_lock: Optional[asyncio.Lock] = None
+        self._stopping = False
+        self._start_lock = threading.Lock()
+        # 运行中的任务计数，用于并发上限判断（仅在事件循环线程内访问）
+        self._running_platforms: Dict[str, int] = {}
+        self._running_accounts: Dict[int, int] = {}
+
+        self.init_database()
+
+    def init_database(self):
+        """初始化任务队列表"""
+        Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+
+        with self.session() as conn:
+            cursor = conn.cursor()
+            cursor.execute("PRAGMA journal_mode=WAL")
+
+            # 发布作业（一次发布请求）
+            cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS publish_jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id INTEGER NOT NULL,
+                    type TEXT NOT NULL DEFAULT 'video',
+                    title TEXT NOT NULL,
+                    description TEXT,
+                    tags TEXT,
+                    video_path TEXT,
+                    cleanup_file BOOLEAN DEFAULT 1,
+                    status TEXT NOT NULL DEFAULT 'queued',
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    finished_at TIMESTAMP
+                )
+            """
+            )
+
+            # 发布任务（作业在单个账号上的执行单元）
+            cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS publish_tasks (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    job_id INTEGER NOT NULL,
+                    account_id INTEGER NOT NULL,
+                    platform TEXT NOT NULL,
+                    account_name TEXT,
+                    status TEXT NOT NULL DEFAULT 'queued',
+                    attempts INTEGER DEFAULT 0,
+                    max_attempts INTEGER DEFAULT 1,
+                    available_at REAL DEFAULT 0,
+                    message TEXT,
+                    result TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    started_at TIMESTAMP,
+                    finished_at TIMESTAMP,
+                    owner TEXT,
+                    lease_expires_at REAL,
+                    submitted_at TIMESTAMP,
+                    FOREIGN KEY (job_id) REFERENCES publish_jobs (id)
+                )
+            """
+            )
+
+            # 旧版本创建的表补充租约相关列
+            cursor.execute("PRAGMA table_info(publish_tasks)")
+            columns = {row[1] for row in cursor.fetchall()}
+            for column, definition in (("owner", "TEXT"), ("lease_expires_at", "REAL"),
+                                       ("submitted_at", "TIMESTAMP")):
+                if column not in columns:
+                    cursor.execute(f"ALTER TABLE publish_tasks ADD COLUMN {column} {definition}")
+
+            # 执行记录（每次尝试一条）
+            cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS publish_attempts (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    task_id INTEGER NOT NULL,
+                    attempt INTEGER NOT NULL,
+                    status TEXT NOT NULL,
+                    message TEXT,
+                    duration REAL,
+                    started_at TIMESTAMP,
+                    finished_at TIMESTAMP,
+                    FOREIGN KEY (task_id) REFERENCES publish_tasks (id)
+                )
+            """
+            )
+
+            # 状态流转记录
+            cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS publish_task_events (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    task_id INTEGER NOT NULL,
+                    from_status TEXT,
+                    to_status TEXT NOT NULL,
+                    message TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (task_id) REFERENCES publish_tasks (id)
+                )
+            """
+            )
+
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_publish_jobs_user ON publish_jobs(user_id, id)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_publish_tasks_job ON publish_tasks(job_id)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_publish_tasks_status ON publish_tasks(status, available_at, id)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_publish_attempts_task ON publish_attempts(task_id)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_publish_events_task ON publish_task_events(task_id)")
+
+    def get_connection(self):
+        """获取数据库连接（当前线程的池化连接，close() 归还）"""
+        return get_pool(self.db_path).connection(row_factory=sqlite3.Row)
+
+    def session(self):
+        """数据库会话：with 块结束时提交（异常时回滚）并归还连接"""
+        return get_pool(self.db_path).session(row_factory=sqlite3.Row)
+
+    def register_executor(self, platform: str, executor: Executor):
+        """注册平台发布执行器"""
+        self.executors[platform] = executor
+
+    # ------------------------------------------------------------------
+    # 提交与查询（可在任意线程调用）
+    # ------------------------------------------------------------------
+    def submit_video_job(self, user_id: int, accounts: List[Any], video_path: str,
+                         title: str, description: str = "", tags: List[str] = None,
+                         cleanup_file: bool = True) -> int:
+        """提交视频发布作业，返回作业ID"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute(
+                """
+                INSERT INTO publish_jobs (user_id, type, title, description, tags, video_path, cleanup_file)
+                VALUES (?, 'video', ?, ?, ?, ?, ?)
+            """,
+                (user_id, title, description, json.dumps(tags or [], ensure_ascii=False),
+                 video_path, int(cleanup_file)),
+            )
+            job_id = cursor.lastrowid
+
+            for account in accounts:
+                # 不支持的平台直接以失败状态入库，保留在历史记录中
+                supported = account.platform in self.executors
+                status = STATUS_QUEUED if supported else STATUS_FAILED
+                message = None if supported else f"暂不支持 {account.platform} 平台的视频发布"
+                cursor.execute(
+                    """
+                    INSERT INTO publish_tasks (job_id, account_id, platform, account_name,
+                                               status, max_attempts, message, finished_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                    (job_id, account.id, account.platform, account.account_name, status,
+                     self.max_attempts, message,
+                     None if supported else datetime.utcnow().isoformat()),
+                )
+                self._record_event(cursor, cursor.lastrowid, None, status, message)
+
+            conn.commit()
+        finally:
+            conn.close()
+
+        self._refresh_job_status(job_id)
+        self.start()
+        self._notify()
+        return job_id
+
+    def get_job(self, job_id: int, user_id: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """获取作业及其各账号任务的状态"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT * FROM publish_jobs WHERE id = ?", (job_id,))
+            row = cursor.fetchone()
+            if not row or (user_id is not None and row["user_id"] != user_id):
+                return None
+
+            cursor.execute("SELECT * FROM publish_tasks WHERE job_id = ? ORDER BY id", (job_id,))
+            tasks = [self._task_to_dict(task) for task in cursor.fetchall()]
+        finally:
+            conn.close()
+
+        job = self._job_to_dict(row)
+        job["tasks"] = tasks
+        job["total_count"] = len(tasks)
+        job["success_count"] = sum(1 for t in tasks if t["status"] == STATUS_SUCCESS)
+        job["failed_count"] = sum(1 for t in tasks if t["status"] == STATUS_FAILED)
+        return job
+
+    def get_task_events(self, task_id: int) -> List[Dict[str, Any]]:
+        """获取任务的状态流转记录"""
+        with self.session() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT from_status, to_status, message, created_at FROM publish_task_events "
+                "WHERE task_id = ? ORDER BY id",
+                (task_id,),
+            )
+            rows = cursor.fetchall()
+        return [dict(row) for row in rows]
+
+    def get_history(self, user_id: int, page: int = 1, limit: int = 10,
+                    platform: str = "") -> Dict[str, Any]:
+        """分页查询用户的发布历史（按账号任务展开）"""
+        page = max(1, page)
+        limit = max(1, min(limit, 100))
+        where = "j.user_id = ?"
+        params: List[Any] = [user_id]
+        if platform:
+            where += " AND t.platform = ?"
+            params.append(platform)
+
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute(
+                f"SELECT COUNT(*) FROM publish_tasks t JOIN publish_jobs j ON j.id = t.job_id WHERE {where}",
+                params,
+            )
+            total = cursor.fetchone()[0]
+
+            cursor.execute(
+                f"""
+                SELECT t.id, t.job_id, j.title, j.type, t.platform, t.status, t.message,
+                       t.attempts, t.created_at, t.finished_at, t.account_id, t.account_name
+                FROM publish_tasks t JOIN publish_jobs j ON j.id = t.job_id
+                WHERE {where}
+                ORDER BY t.id DESC
+                LIMIT ? OFFSET ?
+            """,
+                params + [limit, (page - 1) * limit],
+            )
+            history = [dict(row) for row in cursor.fetchall()]
+        finally:
+            conn.close()
+
+        return {
+            "history": history,
+            "pagination": {
+                "page": page,
+                "limit": limit,
+                "total": total,
+                "pages": (total + limit - 1) // limit
+            }
+        }
+
+    def cancel_job(self, job_id: int, user_id: Optional[int] = None) -> bool:
+        """取消作业中尚未开始执行的任务"""
+        job = self.get_job(job_id, user_id)
+        if not job:
+            return False
+
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute(
+                "SELECT id FROM publish_tasks WHERE job_id = ? AND status = ?",
+                (job_id, STATUS_QUEUED),
+            )
+            for row in cursor.fetchall():
+                self._set_task_status(cursor, row["id"], STATUS_QUEUED, STATUS_CANCELLED, "任务已取消")
+            conn.commit()
+        finally:
+            conn.close()
+
+        self._refresh_job_status(job_id)
+        return True
+
+    # ------------------------------------------------------------------
+    # 工作池
+    # ------------------------------------------------------------------
+    def start(self):
+        """在全局事件循环服务中启动工作池（幂等）"""
+        with self._start_lock:
+            if self._future is not None and not self._future.done():
+                return
+            self._stopping = False
+            # 每个进程（包括 fork 出的 worker）使用独立的所有者标识
+            self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+            self._loop = async_runtime.loop
+            self._future = async_runtime.submit(self._serve())
+            async_runtime.add_shutdown_hook(self._shutdown)
+
+    def stop(self, timeout: float = 30):
+        """停止工作池，等待运行中的任务结束"""
+        with self._start_lock:
+            if self._future is None:
+                return
+            self._stopping = True
+            self._notify()
+            try:
+                self._future.result(timeout)
+            except Exception:
+                pass
+            self._future = None
+
+    async def _shutdown(self):
+        """事件循环服务关闭时停止工作池"""
+        self._stopping = True
+        self._notify()
+        future = self._future
+        if future is not None:
+            await asyncio.wait_for(asyncio.wrap_future(future), timeout=30)
+
+    def _notify(self):
+        """唤醒等待中的工作协程"""
+        loop = self._loop
+        if loop and not loop.is_closed() and self._wakeup is not None:
+            loop.call_soon_threadsafe(self._wakeup.set)
+
+    async def _serve(self):
+        """运行工作协程，并定期回收租约过期的任务"""
+        self._wakeup = asyncio.Event()
+        self._claim_lock = asyncio.Lock()
+        workers = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        reaper = asyncio.create_task(self._reap_expired())
+        try:
+            await asyncio.gather(*workers)
+        finally:
+            reaper.cancel()
+
+    async def _reap_expired(self):
+        """回收其他进程崩溃或失联后遗留的运行中任务"""
+        while not self._stopping:
+            try:
+                if await self._run_db(self._recover_interrupted):
+                    self._wakeup.set()
+            except sqlite3.Error:
+                pass
+            await asyncio.sleep(self.lease_seconds / 3)
+
+    async def _worker(self, index: int):
+        """工作协程：循环领取并执行任务"""
+        while not self._stopping:
+            # 领取串行进行：并发计数只在事件循环线程内修改，传入快照供数据库线程判断上限
+            async with self._claim_lock:
+                task = await self._run_db(self._claim_next, dict(self._running_platforms),
+                                          dict(self._running_accounts))
+                if task is not None:
+                    self._acquire(task)
+            if task is None:
+                self._wakeup.clear()
+                try:
+                    # 有新任务、任务完成或重试到期时被唤醒
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=5)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            try:
+                await self._execute(task)
+            finally:
+                self._release(task)
+                # 释放并发额度后唤醒其他工作协程
+                self._wakeup.set()
+
+    async def _run_db(self, func: Callable[..., Any], *args) -> Any:
+        """在线程池中执行同步数据库操作，避免阻塞共享事件循环"""
+        return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+    def _platform_cap(self, platform: str) -> int:
+        """获取平台并发上限"""
+        return self.platform_limits.get(platform, self.platform_limit)
+
+    def _claim_next(self, running_platforms: Dict[str, int],
+                    running_accounts: Dict[int, int]) -> Optional[Dict[str, Any]]:
+        """领取下一个满足并发上限的排队任务（在数据库线程中执行）"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute(
+                """
+                SELECT t.*, j.title, j.description, j.tags, j.video_path
+                FROM publish_tasks t JOIN publish_jobs j ON j.id = t.job_id
+                WHERE t.status = ? AND t.available_at <= ?
+                ORDER BY t.id
+                LIMIT 200
+            """,
+                (STATUS_QUEUED, time.time()),
+            )
+            for row in cursor.fetchall():
+                platform, account_id = row["platform"], row["account_id"]
+                if running_platforms.get(platform, 0) >= self._platform_cap(platform):
+                    continue
+                if running_accounts.get(account_id, 0) >= self.account_limit:
+                    continue
+
+                # 条件更新，防止重复领取
+                cursor.execute(
+                    """
+                    UPDATE publish_tasks
+                    SET status = ?, attempts = attempts + 1, started_at = ?, updated_at = CURRENT_TIMESTAMP,
+                        owner = ?, lease_expires_at = ?, submitted_at = NULL
+                    WHERE id = ? AND status = ?
+                """,
+                    (STATUS_RUNNING, datetime.utcnow().isoformat(), self.owner,
+                     time.time() + self.lease_seconds, row["id"], STATUS_QUEUED),
+                )
+                if cursor.rowcount != 1:
+                    continue
+                self._record_event(cursor, row["id"], STATUS_QUEUED, STATUS_RUNNING, None)
+                conn.commit()
+
+                task = dict(row)
+                task["attempts"] += 1
+                task["tags"] = json.loads(task["tags"] or "[]")
+                task["submitted"] = False
+                self._refresh_job_status(task["job_id"])
+                return task
+            return None
+        finally:
+            conn.close()
+
+    def _acquire(self, task: Dict[str, Any]):
+        """占用任务的并发额度"""
+        platform, account_id = task["platform"], task["account_id"]
+        self._running_platforms[platform] = self._running_platforms.get(platform, 0) + 1
+        self._running_accounts[account_id] = self._running_accounts.get(account_id, 0) + 1
+
+    def _release(self, task: Dict[str, Any]):
+        """释放任务占用的并发额度"""
+        platform, account_id = task["platform"], task["account_id"]
+        self._running_platforms[platform] = max(0, self._running_platforms.get(platform, 1) - 1)
+        self._running_accounts[account_id] = max(0, self._running_accounts.get(account_id, 1) - 1)
+
+    def _mark_submitted(self, task: Dict[str, Any]):
+        """记录视频已提交给平台，此后失败或中断都不再自动重试"""
+        task["submitted"] = True
+        conn = self.get_connection()
+        try:
+            conn.execute(
+                "UPDATE publish_tasks SET submitted_at = ? WHERE id = ? AND owner = ?",
+                (datetime.utcnow().isoformat(), task["id"], self.owner),
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _renew_lease(self, task: Dict[str, Any]) -> bool:
+        """续约仍由本进程持有的运行中任务"""
+        conn = self.get_connection()
+        try:
+            cursor = conn.execute(
+                "UPDATE publish_tasks SET lease_expires_at = ? WHERE id = ? AND owner = ? AND status = ?",
+                (time.time() + self.lease_seconds, task["id"], self.owner, STATUS_RUNNING),
+            )
+            conn.commit()
+            return cursor.rowcount == 1
+        finally:
+            conn.close()
+
+    async def _heartbeat(self, task: Dict[str, Any]):
+        """执行期间定期续约"""
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                await self._run_db(self._renew_lease, task)
+            except sqlite3.Error:
+                # 续约失败时等待下一轮，租约时长留有两次重试的余量
+                pass
+
+    async def _execute(self, task: Dict[str, Any]):
+        """执行单个发布任务并记录结果"""
+        started = time.time()
+        started_at = datetime.utcnow().isoformat()
+        retryable = True
+        task["on_submit"] = lambda: self._mark_submitted(task)
+        heartbeat = asyncio.create_task(self._heartbeat(task))
+        try:
+            executor = self.executors.get(task["platform"])
+            if executor is None:
+                raise UnsupportedPlatformError(f"暂不支持 {task['platform']} 平台的视频发布")
+            result = await executor(task)
+            success = bool(result.get("success"))
+            message = result.get("message", "")
+            # 平台明确返回的失败（如未登录）重试无意义
+            retryable = False
+        except (UnsupportedPlatformError, PartialPublishError) as e:
+            result, success, message, retryable = {}, False, str(e), False
+        except Exception as e:
+            result, success, message = {}, False, f"发布失败: {str(e)}"
+            if task["submitted"]:
+                # 视频已交给平台，重试可能导致重复发布
+                message += "（视频已提交至平台，可能已部分发布，请人工确认）"
+                retryable = False
+        finally:
+            heartbeat.cancel()
+
+        duration = time.time() - started
+        if success:
+            new_status = STATUS_SUCCESS
+        elif retryable and task["attempts"] < task["max_attempts"]:
+            new_status = STATUS_QUEUED
+        else:
+            new_status = STATUS_FAILED
+        UPLOAD_DURATION.labels(
+            platform=task["platform"], outcome="retry" if new_status == STATUS_QUEUED else new_status
+        ).observe(duration)
+
+        await self._run_db(self._finish, task, new_status, result, message, duration, started_at)
+
+    def _finish(self, task: Dict[str, Any], new_status: str, result: Dict[str, Any],
+                message: str, duration: float, started_at: str):
+        """记录本次执行并写入任务结果（在数据库线程中执行）"""
+        success = new_status == STATUS_SUCCESS
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute(
+                """
+                INSERT INTO publish_attempts (task_id, attempt, status, message, duration, started_at, finished_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """,
+                (task["id"], task["attempts"], STATUS_SUCCESS if success else STATUS_FAILED,
+                 message, duration, started_at, datetime.utcnow().isoformat()),
+            )
+            # 只有仍持有租约时才写入结果，租约已被回收的任务交由新的所有者处理
+            cursor.execute(
+                """
+                UPDATE publish_tasks
+                SET message = ?, result = ?, available_at = ?, finished_at = ?,
+                    owner = NULL, lease_expires_at = NULL
+                WHERE id = ? AND owner = ? AND status = ?
+            """,
+                (message, json.dumps(result, ensure_ascii=False, default=str),
+                 time.time() + RETRY_BACKOFF_SECONDS * task["attempts"] if new_status == STATUS_QUEUED else 0,
+                 None if new_status == STATUS_QUEUED else datetime.utcnow().isoformat(),
+                 task["id"], self.owner, STATUS_RUNNING),
+            )
+            if cursor.rowcount:
+                self._set_task_status(cursor, task["id"], STATUS_RUNNING, new_status, message)
+            conn.commit()
+        finally:
+            conn.close()
+
+        self._refresh_job_status(task["job_id"])
+
+    def _recover_interrupted(self) -> int:
+        """回收租约已过期的运行中任务，返回回收数量。
+        视频尚未提交给平台的任务重新排队，已提交的任务无法确认平台侧状态，标记为失败"""
+        now = time.time()
+        recovered = []
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute(
+                """
+                SELECT id, job_id, submitted_at FROM publish_tasks
+                WHERE status = ? AND (lease_expires_at IS NULL OR lease_expires_at < ?)
+            """,
+                (STATUS_RUNNING, now),
+            )
+            for row in cursor.fetchall():
+                if row["submitted_at"]:
+                    to_status, message = STATUS_FAILED, "执行中断，视频已提交至平台，可能已部分发布，请人工确认"
+                else:
+                    to_status, message = STATUS_QUEUED, "执行中断，任务重新排队"
+                # 条件更新：领取后续约的任务不会被误回收
+                cursor.execute(
+                    """
+                    UPDATE publish_tasks
+                    SET status = ?, message = ?, owner = NULL, lease_expires_at = NULL, available_at = 0,
+                        finished_at = ?, updated_at = CURRENT_TIMESTAMP
+                    WHERE id = ? AND status = ? AND (lease_expires_at IS NULL OR lease_expires_at < ?)
+                """,
+                    (to_status, message, None if to_status == STATUS_QUEUED else datetime.utcnow().isoformat(),
+                     row["id"], STATUS_RUNNING, now),
+                )
+                if cursor.rowcount:
+                    self._record_event(cursor, row["id"], STATUS_RUNNING, to_status, message)
+                    recovered.append(row["job_id"])
+            conn.commit()
+        finally:
+            conn.close()
+
+        for job_id in set(recovered):
+            self._refresh_job_status(job_id)
+        return len(recovered)
+
+    # ------------------------------------------------------------------
+    # 内部工具
+    # ------------------------------------------------------------------
+    def _record_event(self, cursor, task_id: int, from_status: Optional[str],
+                      to_status: str, message: Optional[str]):
+        """记录任务状态流转"""
+        cursor.execute(
+            "INSERT INTO publish_task_events (task_id, from_status, to_status, message) VALUES (?, ?, ?, ?)",
+            (task_id, from_status, to_status, message),
+        )
+
+    def _set_task_status(self, cursor, task_id: int, from_status: str, to_status: str,
+                         message: Optional[str]):
+        """更新任务状态并记录流转"""
+        cursor.execute(
+            "UPDATE publish_tasks SET status = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ? AND status = ?",
+            (to_status, task_id, from_status),
+        )
+        if cursor.rowcount:
+            self._record_event(cursor, task_id, from_status, to_status, message)
+
+    def _refresh_job_status(self, job_id: int):
+        """根据任务状态汇总作业状态，作业结束后清理临时视频文件"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute(
+                "SELECT status, COUNT(*) AS n FROM publish_tasks WHERE job_id = ? GROUP BY status",
+                (job_id,),
+            )
+            counts = {row["status"]: row["n"] for row in cursor.fetchall()}
+            total = sum(counts.values())
+            finished = sum(counts.get(s, 0) for s in TERMINAL_STATUSES)
+
+            if total == 0 or finished < total:
+                status = STATUS_RUNNING if counts.get(STATUS_RUNNING) or finished else STATUS_QUEUED
+            elif counts.get(STATUS_SUCCESS, 0) == total:
+                status = "completed"
+            elif counts.get(STATUS_SUCCESS, 0):
+                status = "partial"
+            elif counts.get(STATUS_CANCELLED, 0) == total:
+                status = STATUS_CANCELLED
+            else:
+                status = STATUS_FAILED
+
+            done = total > 0 and finished == total
+            cursor.execute(
+                """
+                UPDATE publish_jobs
+                SET status = ?, updated_at = CURRENT_TIMESTAMP,
+                    finished_at = CASE WHEN ? THEN COALESCE(finished_at, ?) ELSE NULL END
+                WHERE id = ?
+            """,
+                (status, int(done), datetime.utcnow().isoformat(), job_id),
+            )
+            cursor.execute("SELECT video_path, cleanup_file FROM publish_jobs WHERE id = ?", (job_id,))
+            job = cursor.fetchone()
+            conn.commit()
+        finally:
+            conn.close()
+
+        if done and job and job["cleanup_file"] and job["video_path"]:
+            try:
+                os.remove(job["video_path"])
+            except OSError:
+                pass
+
+    @staticmethod
+    def _job_to_dict(row) -> Dict[str, Any]:
+        """作业行转字典（只保留对外字段）"""
+        job = {key: row[key] for key in JOB_PUBLIC_FIELDS}
+        job["tags"] = json.loads(job["tags"] or "[]")
+        return job
+
+    @staticmethod
+    def _task_to_dict(row) -> Dict[str, Any]:
+        """任务行转字典（只保留对外字段）"""
+        task = {key: row[key] for key in TASK_PUBLIC_FIELDS}
+        task["result"] = json.loads(task["result"]) if task["result"] else None
+        return task
+
+
+# 创建全局发布队列实例
+publish_queue = PublishQueue()
+
+metrics_registry.gauge(
+    "sau_upload_running", "Publish tasks currently running", ("platform",)
+).set_function(lambda: {(platform,): count for platform, count in list(publish_queue._running_platforms.items())})
@@ -14,13 +14,15 @@ from functools import wraps
 from typing import Optional, Dict, Any, List
 from flask import request, jsonify, g
 
+from sau_backend.utils.rate_limiter import RateLimitRule, rate_limiter
+
 
 class SecurityManager:
     """安全管理器"""
 
     def __init__(self, secret_key: str = None):
         self.secret_key = secret_key or "default-secret-key-change-in-production"
-        self.rate_limits = {}  # 简单的内存速率限制
+        self.rate_limits: Dict[str, RateLimitRule] = {}  # 各键最近一次检查使用的规则
 
     def generate_token(
         self, user_id: str, additional_claims: Dict[str, Any] = None
@@ -131,27 +133,18 @@ class SecurityManager:
         return has_upper and has_lower and has_digit and has_special
 
     def rate_limit_check(self, key: str, limit: int, window: int) -> bool:
-        """检查速率限制"""
-        current_time = time.time()
-
-        if key not in self.rate_limits:
-            self.rate_limits[key] = []
-
-        # 清理过期的记录
-        self.rate_limits[key] = [
-            timestamp
-            for timestamp in self.rate_limits[key]
-            if current_time - timestamp < window
-        ]
-
-        return len(self.rate_limits[key]) < limit
+        """检查速率限制（不消耗配额）"""
+        rule = self.rate_limits[key] = RateLimitRule(limit, window)
+        return rate_limiter.peek(f"security:{key}", rule).allowed
 
     def rate_limit_increment(self, key: str):
-        """增加速率限制计数"""
-        current_time = time.time()
-        if key not in self.rate_limits:
-            self.rate_limits[key] = []
-        self.rate_limits[key].append(current_time)
+        """增加速率限制计数（使用该键最近一次检查时的规则）"""
+        rule = self.rate_limits.get(key) or RateLimitRule(100, 60)
+        rate_limiter.hit(f"security:{key}", rule)
+
+    def rate_limit_hit(self, key: str, limit: int, window: int) -> bool:
+        """检查并计数，一次完成"""
+        return rate_limiter.hit(f"security:{key}", RateLimitRule(limit, window)).allowed
 
     def validate_file_type(self, filename: str, allowed_types: List[str]) -> bool:
         """验证文件类型"""
@@ -193,6 +186,11 @@ def require_auth(f):
         g.user_id = payload.get("user_id")
         g.user_payload = payload
 
+        # 按用户限流（仅对配置了用户规则的用户生效）
+        result = rate_limiter.check_user(request.path, g.user_id)
+        if result is not None and not result.allowed:
+            return jsonify({"error": "请求频率超限"}), 429, result.headers()
+
         return f(*args, **kwargs)
 
     return decorated_function
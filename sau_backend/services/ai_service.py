@@ -1,9 +1,14 @@
 """High level orchestration helpers for AI content generation."""
 from __future__ import annotations
 
-from typing import Dict, Optional, Sequence
+from typing import Any, Dict, List, Optional, Sequence
 
 from sau_backend.ai.model_manager import model_manager
+from sau_backend.ai.response_cache import ai_cache_key, ai_response_cache
+
+# Request options that do not change the generated text. Hedged requests may still be served from
+# the cache, but their answers are never stored: the backup provider may have produced them.
+_UNCACHED_OPTIONS = {"hedge"}
 
 
 def list_available_providers() -> Dict[str, Sequence[str]]:
@@ -11,28 +16,89 @@ def list_available_providers() -> Dict[str, Sequence[str]]:
     return model_manager.get_available_providers()
 
 
+def _cache_key(prompt: Any, provider: Optional[str], model: Optional[str], temperature: float,
+               kwargs: Dict[str, Any]) -> tuple:
+    provider_name, model_name = model_manager.resolve(provider, model)
+    params = {k: v for k, v in kwargs.items() if k not in _UNCACHED_OPTIONS}
+    return ai_cache_key(provider_name, model_name, temperature, prompt, params), provider_name, model_name
+
+
+def _cached_chat(prompt: Any, *, provider: Optional[str], model: Optional[str], temperature: float,
+                 cache: Optional[bool], **kwargs) -> str:
+    """Serve repeated deterministic prompts from the persistent response cache."""
+    if not ai_response_cache.should_cache(temperature, cache):
+        ai_response_cache.record_bypass()
+        return model_manager.chat(messages=prompt, provider=provider, model=model,
+                                  temperature=temperature, **kwargs)
+
+    key, provider_name, model_name = _cache_key(prompt, provider, model, temperature, kwargs)
+    cached = ai_response_cache.get(key)
+    if cached is not None:
+        return cached
+
+    result = model_manager.chat(messages=prompt, provider=provider_name, model=model,
+                                temperature=temperature, **kwargs)
+    if not kwargs.get("hedge"):
+        ai_response_cache.set(key, result, provider_name, model_name, temperature)
+    return result
+
+
 def generate_text(prompt: str, *, provider: Optional[str] = None, model: Optional[str] = None,
-                  temperature: float = 0.7, **kwargs) -> str:
-    """Generate text using the configured model manager."""
-    return model_manager.chat(
-        messages=prompt,
+                  temperature: float = 0.7, cache: Optional[bool] = None, **kwargs) -> str:
+    """Generate text using the configured model manager.
+
+    ``cache`` forces the response cache on or off; by default only temperature 0 requests are cached.
+    """
+    return _cached_chat(prompt, provider=provider, model=model, temperature=temperature, cache=cache, **kwargs)
+
+
+def generate_texts(prompts: Sequence[str], *, provider: Optional[str] = None, model: Optional[str] = None,
+                   temperature: float = 0.7, hedge: bool = False, cache: Optional[bool] = None,
+                   **kwargs) -> List[Any]:
+    """Generate text for many prompts concurrently; failed items are returned as exceptions."""
+    results: List[Any] = [None] * len(prompts)
+    keys: Dict[int, str] = {}
+    if ai_response_cache.should_cache(temperature, cache):
+        for index, prompt in enumerate(prompts):
+            key, provider_name, model_name = _cache_key(prompt, provider, model, temperature, kwargs)
+            keys[index] = key
+            results[index] = ai_response_cache.get(key)
+    else:
+        for _ in prompts:
+            ai_response_cache.record_bypass()
+
+    # Identical cacheable prompts within one batch are generated once.
+    pending: Dict[Any, List[int]] = {}
+    for index, result in enumerate(results):
+        if result is None:
+            pending.setdefault(keys.get(index, index), []).append(index)
+    groups = list(pending.values())
+    outputs = model_manager.chat_many(
+        [prompts[group[0]] for group in groups],
         provider=provider,
         model=model,
         temperature=temperature,
+        hedge=hedge,
         **kwargs,
-    )
+    ) if groups else []
+
+    for group, output in zip(groups, outputs):
+        for index in group:
+            results[index] = output
+        if group[0] in keys and not hedge and not isinstance(output, BaseException):
+            ai_response_cache.set(keys[group[0]], output, provider_name, model_name, temperature)
+    return results
 
 
 def generate_shotlist(prompt: str, *, provider: Optional[str] = None, model: Optional[str] = None,
-                       temperature: float = 0.3, **kwargs) -> str:
+                       temperature: float = 0.3, cache: Optional[bool] = None, **kwargs) -> str:
     """Generate a structured shot list using AI."""
-    return model_manager.chat(
-        messages=prompt,
-        provider=provider,
-        model=model,
-        temperature=temperature,
-        **kwargs,
-    )
+    return _cached_chat(prompt, provider=provider, model=model, temperature=temperature, cache=cache, **kwargs)
+
+
+def get_cache_stats() -> Dict[str, Any]:
+    """Return AI response cache statistics."""
+    return ai_response_cache.get_stats()
 
 
-__all__ = ["list_available_providers", "generate_text", "generate_shotlist"]
+__all__ = ["list_available_providers", "generate_text", "generate_texts", "generate_shotlist", "get_cache_stats"]
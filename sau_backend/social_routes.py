@@ -14,13 +14,28 @@ sys.path.append("/Users/sunyouyou/Desktop/projects/bzhi/social-auto-upload/sau_b
 
 from security import security_manager, require_auth
 from models import db_manager
+from sau_backend.utils.cookie_validator import cookie_validator
+from sau_backend.utils.async_runtime import run_async
+from sau_backend.utils.http_cache import cache_response, invalidate_responses
 
 # 创建社交媒体账号蓝图
 social_bp = Blueprint("social", __name__, url_prefix="/api/social")
 
 
+def _apply_validation_result(account, result):
+    """根据校验结果同步账号状态"""
+    if result.valid is None:
+        return
+    status = 1 if result.valid else 0
+    if account.status != status:
+        db_manager.update_social_account_status(account.id, status)
+        account.status = status
+        invalidate_responses(user_id=account.user_id)
+
+
 @social_bp.route("/accounts", methods=["GET"])
 @require_auth
+@cache_response(timeout=60, tags=("accounts",))
 def get_accounts():
     """获取用户的所有社交媒体账号"""
     try:
@@ -91,6 +106,8 @@ def add_account():
         if not account:
             return jsonify({"error": "账号创建失败"}), 500
 
+        invalidate_responses(user_id=user_id)
+
         # 如果是抖音账号，启动登录流程
         if platform == "douyin":
             return jsonify({
@@ -181,22 +198,20 @@ def update_account(account_id):
             return jsonify({"error": "没有有效的更新字段"}), 400
 
         # 执行更新
-        conn = db_manager.get_connection()
-        cursor = conn.cursor()
-
-        set_clause = ", ".join([f"{field} = ?" for field in updates.keys()])
-        values = list(updates.values()) + [account_id]
-
-        cursor.execute(
-            f"""
-            UPDATE social_media_accounts SET {set_clause}, updated_at = CURRENT_TIMESTAMP
-            WHERE id = ?
-            """,
-            values
-        )
+        with db_manager.session() as conn:
+            cursor = conn.cursor()
+
+            set_clause = ", ".join([f"{field} = ?" for field in updates.keys()])
+            values = list(updates.values()) + [account_id]
 
-        conn.commit()
-        conn.close()
+            cursor.execute(
+                f"""
+                UPDATE social_media_accounts SET {set_clause}, updated_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+                """,
+                values
+            )
+        invalidate_responses(user_id=user_id)
 
         return jsonify({"message": "账号信息更新成功"}), 200
 
@@ -224,16 +239,14 @@ def delete_account(account_id):
             os.remove(account.cookie_path)
 
         # 从数据库删除账号
-        conn = db_manager.get_connection()
-        cursor = conn.cursor()
-
-        cursor.execute(
-            "DELETE FROM social_media_accounts WHERE id = ?",
-            (account_id,)
-        )
+        with db_manager.session() as conn:
+            cursor = conn.cursor()
 
-        conn.commit()
-        conn.close()
+            cursor.execute(
+                "DELETE FROM social_media_accounts WHERE id = ?",
+                (account_id,)
+            )
+        invalidate_responses(user_id=user_id)
 
         return jsonify({"message": "账号删除成功"}), 200
 
@@ -256,15 +269,30 @@ def check_account_status(account_id):
         if account.user_id != user_id:
             return jsonify({"error": "无权访问此账号"}), 403
 
-        # 这里可以添加具体的平台状态检查逻辑
-        # 例如检查cookie是否有效，账号是否正常等
+        # 优先使用缓存的 cookie 校验结果，refresh=true 时强制重新校验
+        refresh = request.args.get("refresh", "false").lower() == "true"
+        result = None
+        if account.cookie_path:
+            result = None if refresh else cookie_validator.get_cached(account.platform, account.cookie_path)
+            if result is None:
+                result = run_async(
+                    cookie_validator.validate(account.platform, account.cookie_path, force=refresh)
+                )
+            _apply_validation_result(account, result)
 
         status_info = {
             "platform": account.platform,
             "account_name": account.account_name,
             "status": account.status,
-            "last_check": datetime.utcnow().isoformat()
+            "last_check": datetime.utcfromtimestamp(result.checked_at).isoformat()
+            if result and result.checked_at else datetime.utcnow().isoformat()
         }
+        if result is not None:
+            status_info["cookie_valid"] = result.valid
+            status_info["cached"] = result.cached
+            status_info["latency_ms"] = round(result.latency * 1000, 1)
+            if result.error:
+                status_info["error"] = result.error
 
         # 如果是抖音账号，添加额外状态信息
         if account.platform == "douyin":
@@ -279,8 +307,62 @@ def check_account_status(account_id):
         return jsonify({"error": f"检查账号状态失败: {str(e)}"}), 500
 
 
+@social_bp.route("/accounts/validate", methods=["POST"])
+@require_auth
+def validate_accounts():
+    """批量校验账号 cookie"""
+    try:
+        user_id = g.user_id
+        data = request.get_json(silent=True) or {}
+        account_ids = data.get("account_ids") or []
+        force = bool(data.get("force", False))
+        concurrency = data.get("concurrency")
+
+        accounts = db_manager.get_social_accounts_by_user(user_id)
+        if account_ids:
+            wanted = {int(account_id) for account_id in account_ids}
+            accounts = [acc for acc in accounts if acc.id in wanted]
+        accounts = [acc for acc in accounts if acc.cookie_path]
+
+        if not accounts:
+            return jsonify({"error": "没有可校验的账号"}), 400
+
+        started = datetime.utcnow()
+        results = run_async(
+            cookie_validator.validate_many(
+                [(acc.platform, acc.cookie_path) for acc in accounts],
+                force=force,
+                concurrency=int(concurrency) if concurrency else None
+            )
+        )
+
+        items = []
+        for account, result in zip(accounts, results):
+            _apply_validation_result(account, result)
+            item = result.to_dict()
+            item.update({
+                "account_id": account.id,
+                "account_name": account.account_name,
+                "status": account.status
+            })
+            items.append(item)
+
+        return jsonify({
+            "results": items,
+            "total_count": len(items),
+            "valid_count": sum(1 for r in results if r.valid),
+            "cached_count": sum(1 for r in results if r.cached),
+            "duration": (datetime.utcnow() - started).total_seconds(),
+            "message": "校验完成"
+        }), 200
+
+    except Exception as e:
+        return jsonify({"error": f"批量校验账号失败: {str(e)}"}), 500
+
+
 @social_bp.route("/platforms", methods=["GET"])
 @require_auth
+@cache_response(timeout=3600)
 def get_supported_platforms():
     """获取支持的社交媒体平台"""
     try:
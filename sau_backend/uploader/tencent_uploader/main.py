@@ -1,14 +1,26 @@
 # -*- coding: utf-8 -*-
 from datetime import datetime
 
-from playwright.async_api import Playwright, async_playwright
+from playwright.async_api import async_playwright
 import os
 import asyncio
 
 from sau_backend.conf import LOCAL_CHROME_PATH
 from sau_backend.utils.base_social_media import set_init_script
+from sau_backend.utils.browser_pool import browser_pool
 from sau_backend.utils.files_times import get_absolute_path
 from sau_backend.utils.log import tencent_logger
+from sau_backend.utils.progress_watcher import UploadProgressWatcher, WatchRules
+
+# 上传/发布状态规则：“发表”按钮可用代表上传完毕，跳转到作品列表代表发布成功
+TENCENT_WATCH_RULES = WatchRules(
+    upload_complete=[{"selector": "div.form-btns button", "text": "发表", "not_class": "weui-desktop-btn_disabled"}],
+    # 出错提示与“删除”按钮同时出现才视为上传失败
+    upload_failed=[{"selector": "div.status-msg.error",
+                    "requires": {"selector": "div.media-status-content div.tag-inner", "text": "删除"}}],
+    progress_selector="div.media-status-content",
+    publish_url="https://channels.weixin.qq.com/platform/post/list*",
+)
 
 
 def format_str_for_short_title(origin_title: str) -> str:
@@ -32,21 +44,22 @@ def format_str_for_short_title(origin_title: str) -> str:
 
 
 async def cookie_auth(account_file):
-    async with async_playwright() as playwright:
-        browser = await playwright.chromium.launch(headless=True)
-        context = await browser.new_context(storage_state=account_file)
-        context = await set_init_script(context)
+    async with browser_pool.session(), browser_pool.lease_context(account_file, headless=True) as context:
         # 创建一个新的页面
         page = await context.new_page()
-        # 访问指定的 URL
-        await page.goto("https://channels.weixin.qq.com/platform/post/create")
-        try:
-            await page.wait_for_selector('div.title-name:has-text("微信小店")', timeout=5000)  # 等待5秒
-            tencent_logger.error("[+] 等待5秒 cookie 失效")
-            return False
-        except:
-            tencent_logger.success("[+] cookie 有效")
-            return True
+        return await check_cookie(page)
+
+
+async def check_cookie(page) -> bool:
+    # 访问指定的 URL
+    await page.goto("https://channels.weixin.qq.com/platform/post/create")
+    try:
+        await page.wait_for_selector('div.title-name:has-text("微信小店")', timeout=5000)  # 等待5秒
+        tencent_logger.error("[+] 等待5秒 cookie 失效")
+        return False
+    except:
+        tencent_logger.success("[+] cookie 有效")
+        return True
 
 
 async def get_tencent_cookie(account_file):
@@ -82,7 +95,8 @@ async def weixin_setup(account_file, handle=False):
 
 
 class TencentVideo(object):
-    def __init__(self, title, file_path, tags, publish_date: datetime, account_file, category=None):
+    def __init__(self, title, file_path, tags, publish_date: datetime, account_file, category=None,
+                 progress_callback=None):
         self.title = title  # 视频标题
         self.file_path = file_path
         self.tags = tags
@@ -90,6 +104,8 @@ class TencentVideo(object):
         self.account_file = account_file
         self.category = category
         self.local_executable_path = LOCAL_CHROME_PATH
+        self.progress_callback = progress_callback
+        self.watcher = None
 
     async def set_schedule_time_tencent(self, page, publish_date):
         label_element = page.locator("label").filter(has_text="定时").nth(1)
@@ -133,46 +149,45 @@ class TencentVideo(object):
         file_input = page.locator('input[type="file"]')
         await file_input.set_input_files(self.file_path)
 
-    async def upload(self, playwright: Playwright) -> None:
-        # 使用 Chromium (这里使用系统内浏览器，用chromium 会造成h264错误
-        browser = await playwright.chromium.launch(headless=False, executable_path=self.local_executable_path)
-        # 创建一个浏览器上下文，使用指定的 cookie 文件
-        context = await browser.new_context(storage_state=f"{self.account_file}")
-        context = await set_init_script(context)
-
-        # 创建一个新的页面
-        page = await context.new_page()
-        # 访问指定的 URL
-        await page.goto("https://channels.weixin.qq.com/platform/post/create")
-        tencent_logger.info(f'[+]正在上传-------{self.title}.mp4')
-        # 等待页面跳转到指定的 URL，没进入，则自动等待到超时
-        await page.wait_for_url("https://channels.weixin.qq.com/platform/post/create")
-        # await page.wait_for_selector('input[type="file"]', timeout=10000)
-        file_input = page.locator('input[type="file"]')
-        await file_input.set_input_files(self.file_path)
-        # 填充标题和话题
-        await self.add_title_tags(page)
-        # 添加商品
-        # await self.add_product(page)
-        # 合集功能
-        await self.add_collection(page)
-        # 原创选择
-        await self.add_original(page)
-        # 检测上传状态
-        await self.detect_upload_status(page)
-        if self.publish_date != 0:
-            await self.set_schedule_time_tencent(page, self.publish_date)
-        # 添加短标题
-        await self.add_short_title(page)
-
-        await self.click_publish(page)
-
-        await context.storage_state(path=f"{self.account_file}")  # 保存cookie
-        tencent_logger.success('  [-]cookie更新完毕！')
-        await asyncio.sleep(2)  # 这里延迟是为了方便眼睛直观的观看
-        # 关闭浏览器上下文和浏览器实例
-        await context.close()
-        await browser.close()
+    async def upload(self) -> None:
+        # 使用系统内浏览器（用 chromium 会造成h264错误），从浏览器池租借加载了 cookie 的上下文
+        async with browser_pool.lease_context(
+                self.account_file, headless=False, executable_path=self.local_executable_path) as context:
+            # 创建一个新的页面
+            page = await context.new_page()
+            # 在打开页面前开始监听上传状态
+            self.watcher = UploadProgressWatcher(page, "tencent", TENCENT_WATCH_RULES,
+                                                 callback=self.progress_callback, logger=tencent_logger)
+            await self.watcher.start()
+            # 访问指定的 URL
+            await page.goto("https://channels.weixin.qq.com/platform/post/create")
+            tencent_logger.info(f'[+]正在上传-------{self.title}.mp4')
+            # 等待页面跳转到指定的 URL，没进入，则自动等待到超时
+            await page.wait_for_url("https://channels.weixin.qq.com/platform/post/create")
+            # await page.wait_for_selector('input[type="file"]', timeout=10000)
+            file_input = page.locator('input[type="file"]')
+            await file_input.set_input_files(self.file_path)
+            # 填充标题和话题
+            await self.add_title_tags(page)
+            # 添加商品
+            # await self.add_product(page)
+            # 合集功能
+            await self.add_collection(page)
+            # 原创选择
+            await self.add_original(page)
+            # 检测上传状态
+            await self.detect_upload_status(page)
+            if self.publish_date != 0:
+                await self.set_schedule_time_tencent(page, self.publish_date)
+            # 添加短标题
+            await self.add_short_title(page)
+
+            await self.click_publish(page)
+            await self.watcher.stop()
+
+            await context.storage_state(path=f"{self.account_file}")  # 保存cookie
+            tencent_logger.success('  [-]cookie更新完毕！')
+            await asyncio.sleep(2)  # 这里延迟是为了方便眼睛直观的观看
 
     async def add_short_title(self, page):
         short_title_element = page.get_by_text("短标题", exact=True).locator("..").locator(
@@ -183,44 +198,18 @@ class TencentVideo(object):
             await short_title_element.fill(short_title)
 
     async def click_publish(self, page):
-        while True:
-            try:
-                publish_buttion = page.locator('div.form-btns button:has-text("发表")')
-                if await publish_buttion.count():
-                    await publish_buttion.click()
-                await page.wait_for_url("https://channels.weixin.qq.com/platform/post/list", timeout=1500)
-                tencent_logger.success("  [-]视频发布成功")
-                break
-            except Exception as e:
-                current_url = page.url
-                if "https://channels.weixin.qq.com/platform/post/list" in current_url:
-                    tencent_logger.success("  [-]视频发布成功")
-                    break
-                else:
-                    tencent_logger.exception(f"  [-] Exception: {e}")
-                    tencent_logger.info("  [-] 视频正在发布中...")
-                    await asyncio.sleep(0.5)
+        async def click():
+            publish_buttion = page.locator('div.form-btns button:has-text("发表")')
+            if await publish_buttion.count():
+                await publish_buttion.click()
+
+        await self.watcher.wait_for_publish(click)
+        tencent_logger.success("  [-]视频发布成功")
 
     async def detect_upload_status(self, page):
-        while True:
-            # 匹配删除按钮，代表视频上传完毕，如果不存在，代表视频正在上传，则等待
-            try:
-                # 匹配删除按钮，代表视频上传完毕
-                if "weui-desktop-btn_disabled" not in await page.get_by_role("button", name="发表").get_attribute(
-                        'class'):
-                    tencent_logger.info("  [-]视频上传完毕")
-                    break
-                else:
-                    tencent_logger.info("  [-] 正在上传视频中...")
-                    await asyncio.sleep(2)
-                    # 出错了视频出错
-                    if await page.locator('div.status-msg.error').count() and await page.locator(
-                            'div.media-status-content div.tag-inner:has-text("删除")').count():
-                        tencent_logger.error("  [-] 发现上传出错了...准备重试")
-                        await self.handle_upload_error(page)
-            except:
-                tencent_logger.info("  [-] 正在上传视频中...")
-                await asyncio.sleep(2)
+        # 等待“发表”按钮变为可用，出错时删除并重新上传
+        await self.watcher.wait_for_upload(on_failed=lambda: self.handle_upload_error(page))
+        tencent_logger.info("  [-]视频上传完毕")
 
     async def add_title_tags(self, page):
         await page.locator("div.input-editor").click()
@@ -263,5 +252,5 @@ class TencentVideo(object):
                 await page.locator('button:has-text("声明原创"):visible').click()
 
     async def main(self):
-        async with async_playwright() as playwright:
-            await self.upload(playwright)
+        async with browser_pool.session():
+            await self.upload()
@@ -2,39 +2,49 @@
 import re
 from datetime import datetime
 
-from playwright.async_api import Playwright, async_playwright
+from playwright.async_api import async_playwright
 import os
 import asyncio
 from sau_backend.uploader.tk_uploader.tk_config import Tk_Locator
 from sau_backend.utils.base_social_media import set_init_script
+from sau_backend.utils.browser_pool import browser_pool
 from sau_backend.utils.files_times import get_absolute_path
 from sau_backend.utils.log import tiktok_logger
+from sau_backend.utils.progress_watcher import UploadProgressWatcher, WatchRules
+
+# 上传/发布状态规则，页面可能位于 iframe 中，观察脚本会注入到所有 frame
+TIKTOK_WATCH_RULES = WatchRules(
+    upload_complete=[{"selector": "div.btn-post > button", "no_attr": "disabled"}],
+    upload_failed=[{"selector": 'button[aria-label="Select file"]'}],
+    published=[{"selector": "#\\:r9\\:"}],
+)
 
 
 async def cookie_auth(account_file):
-    async with async_playwright() as playwright:
-        browser = await playwright.firefox.launch(headless=True)
-        context = await browser.new_context(storage_state=account_file)
-        context = await set_init_script(context)
+    async with browser_pool.session(), browser_pool.lease_context(account_file, headless=True, browser_type="firefox") as context:
         # 创建一个新的页面
         page = await context.new_page()
-        # 访问指定的 URL
-        await page.goto("https://www.tiktok.com/tiktokstudio/upload?lang=en")
-        await page.wait_for_load_state('networkidle')
-        try:
-            # 选择所有的 select 元素
-            select_elements = await page.query_selector_all('select')
-            for element in select_elements:
-                class_name = await element.get_attribute('class')
-                # 使用正则表达式匹配特定模式的 class 名称
-                if re.match(r'tiktok-.*-SelectFormContainer.*', class_name):
-                    tiktok_logger.error("[+] cookie expired")
-                    return False
-            tiktok_logger.success("[+] cookie valid")
-            return True
-        except:
-            tiktok_logger.success("[+] cookie valid")
-            return True
+        return await check_cookie(page)
+
+
+async def check_cookie(page) -> bool:
+    # 访问指定的 URL
+    await page.goto("https://www.tiktok.com/tiktokstudio/upload?lang=en")
+    await page.wait_for_load_state('networkidle')
+    try:
+        # 选择所有的 select 元素
+        select_elements = await page.query_selector_all('select')
+        for element in select_elements:
+            class_name = await element.get_attribute('class')
+            # 使用正则表达式匹配特定模式的 class 名称
+            if re.match(r'tiktok-.*-SelectFormContainer.*', class_name):
+                tiktok_logger.error("[+] cookie expired")
+                return False
+        tiktok_logger.success("[+] cookie valid")
+        return True
+    except:
+        tiktok_logger.success("[+] cookie valid")
+        return True
 
 
 async def tiktok_setup(account_file, handle=False):
@@ -69,13 +79,15 @@ async def get_tiktok_cookie(account_file):
 
 
 class TiktokVideo(object):
-    def __init__(self, title, file_path, tags, publish_date, account_file):
+    def __init__(self, title, file_path, tags, publish_date, account_file, progress_callback=None):
         self.title = title
         self.file_path = file_path
         self.tags = tags
         self.publish_date = publish_date
         self.account_file = account_file
         self.locator_base = None
+        self.progress_callback = progress_callback
+        self.watcher = None
 
 
     async def set_schedule_time(self, page, publish_date):
@@ -139,48 +151,47 @@ class TiktokVideo(object):
         file_chooser = await fc_info.value
         await file_chooser.set_files(self.file_path)
 
-    async def upload(self, playwright: Playwright) -> None:
-        browser = await playwright.firefox.launch(headless=False)
-        context = await browser.new_context(storage_state=f"{self.account_file}")
-        context = await set_init_script(context)
-        page = await context.new_page()
+    async def upload(self) -> None:
+        async with browser_pool.lease_context(self.account_file, browser_type="firefox", headless=False) as context:
+            page = await context.new_page()
+            self.watcher = UploadProgressWatcher(page, "tiktok", TIKTOK_WATCH_RULES,
+                                                 callback=self.progress_callback, logger=tiktok_logger)
+            await self.watcher.start()
 
-        await page.goto("https://www.tiktok.com/creator-center/upload")
-        tiktok_logger.info(f'[+]Uploading-------{self.title}.mp4')
+            await page.goto("https://www.tiktok.com/creator-center/upload")
+            tiktok_logger.info(f'[+]Uploading-------{self.title}.mp4')
 
-        await page.wait_for_url("https://www.tiktok.com/tiktokstudio/upload", timeout=10000)
+            await page.wait_for_url("https://www.tiktok.com/tiktokstudio/upload", timeout=10000)
 
-        try:
-            await page.wait_for_selector('iframe[data-tt="Upload_index_iframe"], div.upload-container', timeout=10000)
-            tiktok_logger.info("Either iframe or div appeared.")
-        except Exception as e:
-            tiktok_logger.error("Neither iframe nor div appeared within the timeout.")
+            try:
+                await page.wait_for_selector('iframe[data-tt="Upload_index_iframe"], div.upload-container', timeout=10000)
+                tiktok_logger.info("Either iframe or div appeared.")
+            except Exception as e:
+                tiktok_logger.error("Neither iframe nor div appeared within the timeout.")
 
-        await self.choose_base_locator(page)
+            await self.choose_base_locator(page)
 
-        upload_button = self.locator_base.locator(
-            'button:has-text("Select video"):visible')
-        await upload_button.wait_for(state='visible')  # 确保按钮可见
+            upload_button = self.locator_base.locator(
+                'button:has-text("Select video"):visible')
+            await upload_button.wait_for(state='visible')  # 确保按钮可见
 
-        async with page.expect_file_chooser() as fc_info:
-            await upload_button.click()
-        file_chooser = await fc_info.value
-        await file_chooser.set_files(self.file_path)
+            async with page.expect_file_chooser() as fc_info:
+                await upload_button.click()
+            file_chooser = await fc_info.value
+            await file_chooser.set_files(self.file_path)
 
-        await self.add_title_tags(page)
-        # detact upload status
-        await self.detect_upload_status(page)
-        if self.publish_date != 0:
-            await self.set_schedule_time(page, self.publish_date)
+            await self.add_title_tags(page)
+            # detact upload status
+            await self.detect_upload_status(page)
+            if self.publish_date != 0:
+                await self.set_schedule_time(page, self.publish_date)
 
-        await self.click_publish(page)
+            await self.click_publish(page)
+            await self.watcher.stop()
 
-        await context.storage_state(path=f"{self.account_file}")  # save cookie
-        tiktok_logger.info('  [-] update cookie！')
-        await asyncio.sleep(2)  # close delay for look the video status
-        # close all
-        await context.close()
-        await browser.close()
+            await context.storage_state(path=f"{self.account_file}")  # save cookie
+            tiktok_logger.info('  [-] update cookie！')
+            await asyncio.sleep(2)  # close delay for look the video status
 
     async def add_title_tags(self, page):
 
@@ -216,41 +227,18 @@ class TiktokVideo(object):
             await page.keyboard.press("End")
 
     async def click_publish(self, page):
-        success_flag_div = '#\\:r9\\:'
-        while True:
-            try:
-                publish_button = self.locator_base.locator('div.btn-post')
-                if await publish_button.count():
-                    await publish_button.click()
+        async def click():
+            publish_button = self.locator_base.locator('div.btn-post')
+            if await publish_button.count():
+                await publish_button.click()
 
-                await self.locator_base.locator(success_flag_div).wait_for(state="visible", timeout=3000)
-                tiktok_logger.success("  [-] video published success")
-                break
-            except Exception as e:
-                if await self.locator_base.locator(success_flag_div).count():
-                    tiktok_logger.success("  [-]video published success")
-                    break
-                else:
-                    tiktok_logger.exception(f"  [-] Exception: {e}")
-                    tiktok_logger.info("  [-] video publishing")
-                    await page.screenshot(full_page=True)
-                    await asyncio.sleep(0.5)
+        await self.watcher.wait_for_publish(click)
+        tiktok_logger.success("  [-] video published success")
 
     async def detect_upload_status(self, page):
-        while True:
-            try:
-                if await self.locator_base.locator('div.btn-post > button').get_attribute("disabled") is None:
-                    tiktok_logger.info("  [-]video uploaded.")
-                    break
-                else:
-                    tiktok_logger.info("  [-] video uploading...")
-                    await asyncio.sleep(2)
-                    if await self.locator_base.locator('button[aria-label="Select file"]').count():
-                        tiktok_logger.info("  [-] found some error while uploading now retry...")
-                        await self.handle_upload_error(page)
-            except:
-                tiktok_logger.info("  [-] video uploading...")
-                await asyncio.sleep(2)
+        # the Post button is enabled once uploaded; the file selector reappears on error
+        await self.watcher.wait_for_upload(on_failed=lambda: self.handle_upload_error(page))
+        tiktok_logger.info("  [-]video uploaded.")
 
     async def choose_base_locator(self, page):
         # await page.wait_for_selector('div.upload-container')
@@ -260,6 +248,6 @@ class TiktokVideo(object):
             self.locator_base = page.locator(Tk_Locator.default) 
 
     async def main(self):
-        async with async_playwright() as playwright:
-            await self.upload(playwright)
+        async with browser_pool.session():
+            await self.upload()
 
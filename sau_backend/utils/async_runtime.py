@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+"""
+后台事件循环服务
+进程内常驻一个事件循环线程，Flask 同步视图通过 run()/submit() 线程安全地提交协程；
+Playwright 浏览器池、发布队列等异步资源都绑定在这个循环上，可在请求之间复用，
+进程退出或 shutdown() 时按注册的逆序优雅关闭
+"""
+import asyncio
+import atexit
+import concurrent.futures
+import threading
+import time
+from typing import Any, Awaitable, Callable, Coroutine, Dict, List, Optional
+
+from sau_backend.utils.log import browser_logger
+
+ShutdownHook = Callable[[], Awaitable[Any]]
+
+
+class AsyncRuntime:
+    """常驻事件循环"""
+
+    def __init__(self, name: str = "sau-async-runtime"):
+        self.name = name
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._shutdown_hooks: List[ShutdownHook] = []
+        self._started_at: Optional[float] = None
+        self._stats = {"submitted": 0, "completed": 0, "failed": 0}
+        self._atexit_registered = False
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        """运行中的事件循环（未启动时自动启动）"""
+        self.start()
+        return self._loop
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def in_runtime_thread(self) -> bool:
+        return self._thread is not None and threading.current_thread() is self._thread
+
+    def start(self):
+        """启动事件循环线程（幂等）"""
+        if self.running:
+            return
+        with self._lock:
+            if self.running:
+                return
+            ready = threading.Event()
+            self._thread = threading.Thread(target=self._run, args=(ready,), name=self.name, daemon=True)
+            self._thread.start()
+            ready.wait()
+            self._started_at = time.time()
+            if not self._atexit_registered:
+                atexit.register(self.shutdown)
+                self._atexit_registered = True
+        browser_logger.info(f"[async_runtime] 事件循环已启动: {self.name}")
+
+    def _run(self, ready: threading.Event):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        self._loop = loop
+        loop.call_soon(ready.set)
+        try:
+            loop.run_forever()
+        finally:
+            loop.run_until_complete(loop.shutdown_asyncgens())
+            loop.close()
+
+    def submit(self, coro: Coroutine) -> concurrent.futures.Future:
+        """提交协程到事件循环，返回 concurrent.futures.Future"""
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        self._stats["submitted"] += 1
+        future.add_done_callback(self._on_done)
+        return future
+
+    def run(self, coro: Coroutine, timeout: Optional[float] = None) -> Any:
+        """在事件循环中执行协程并阻塞等待结果，供同步代码（Flask 视图）调用
+
+        Raises:
+            RuntimeError: 在事件循环线程内调用（会造成死锁）
+            concurrent.futures.TimeoutError: 超时，协程会被取消
+        """
+        if self.in_runtime_thread():
+            coro.close()
+            raise RuntimeError("AsyncRuntime.run() cannot be called from the runtime loop thread")
+        future = self.submit(coro)
+        try:
+            return future.result(timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise
+
+    def _on_done(self, future: concurrent.futures.Future):
+        if future.cancelled() or future.exception() is not None:
+            self._stats["failed"] += 1
+        else:
+            self._stats["completed"] += 1
+
+    def add_shutdown_hook(self, hook: ShutdownHook):
+        """注册关闭回调（协程函数），关闭时按注册的逆序在事件循环中执行"""
+        if hook not in self._shutdown_hooks:
+            self._shutdown_hooks.append(hook)
+
+    def shutdown(self, timeout: float = 30):
+        """执行关闭回调、取消剩余任务并停止事件循环"""
+        with self._lock:
+            if not self.running:
+                return
+            loop = self._loop
+            try:
+                asyncio.run_coroutine_threadsafe(self._shutdown(), loop).result(timeout)
+            except Exception as e:
+                browser_logger.warning(f"[async_runtime] 优雅关闭未完成: {e}")
+            loop.call_soon_threadsafe(loop.stop)
+            self._thread.join(timeout)
+            self._thread = None
+            self._loop = None
+        browser_logger.info(f"[async_runtime] 事件循环已停止: {self.name}")
+
+    async def _shutdown(self):
+        for hook in reversed(self._shutdown_hooks):
+            try:
+                await hook()
+            except Exception as e:
+                browser_logger.warning(f"[async_runtime] 关闭回调执行失败 {hook}: {e}")
+
+        current = asyncio.current_task()
+        pending = [task for task in asyncio.all_tasks() if task is not current and not task.done()]
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取运行状态"""
+        loop = self._loop
+        tasks = 0
+        if loop is not None and self.running:
+            try:
+                tasks = asyncio.run_coroutine_threadsafe(self._count_tasks(), loop).result(1)
+            except Exception:
+                tasks = -1
+        return {
+            **self._stats,
+            "running": self.running,
+            "uptime": time.time() - self._started_at if self._started_at and self.running else 0.0,
+            "pending_tasks": tasks,
+        }
+
+    @staticmethod
+    async def _count_tasks() -> int:
+        return len(asyncio.all_tasks()) - 1
+
+
+# 全局事件循环服务
+async_runtime = AsyncRuntime()
+
+
+def run_async(coro: Coroutine, timeout: Optional[float] = None) -> Any:
+    """在全局事件循环中执行协程并等待结果"""
+    return async_runtime.run(coro, timeout)
@@ -15,7 +15,7 @@ def get_supported_social_media() -> List[str]:
 
 
 def get_cli_action() -> List[str]:
-    return ["upload", "login", "watch"]
+    return ["upload", "login", "watch", "validate"]
 
 
 async def set_init_script(context):
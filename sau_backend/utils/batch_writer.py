@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+"""
+批量写入器
+访问日志、上传日志、监控指标等只追加的记录先进入内存队列，由后台线程按条数或时间阈值
+合并成多行事务写入 SQLite，请求线程不再为每条记录单独提交。队列满时按调用方选择
+丢弃（计数）或限时等待；进程退出时同步刷盘
+"""
+import atexit
+import os
+import queue
+import re
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from sau_backend.utils.sqlite_pool import get_pool
+
+# 单个事务最多写入的记录数
+BATCH_SIZE = int(os.getenv("SAU_LOG_BATCH_SIZE", 500))
+# 记录在队列中最多停留的时间（秒）
+FLUSH_INTERVAL = float(os.getenv("SAU_LOG_FLUSH_INTERVAL", 1.0))
+# 队列容量，超过后新记录被丢弃或等待
+MAX_QUEUE = int(os.getenv("SAU_LOG_QUEUE_SIZE", 10000))
+
+_IDENTIFIER = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+class _Flush:
+    """队列中的刷盘请求，写完之前的记录后置位"""
+
+    def __init__(self, stop: bool = False):
+        self.done = threading.Event()
+        self.stop = stop
+
+
+class BatchWriter:
+    """单个数据库的后台批量写入器"""
+
+    def __init__(self, db_path: Union[str, Path], batch_size: int = BATCH_SIZE,
+                 flush_interval: float = FLUSH_INTERVAL, max_queue: int = MAX_QUEUE):
+        self.db_path = Path(db_path)
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._closed = False
+        self._stats = {"submitted": 0, "written": 0, "dropped": 0, "failed": 0, "batches": 0,
+                       "max_batch": 0, "flush_time": 0.0}
+        self._dropped_by_table: Dict[str, int] = defaultdict(int)
+        self._last_error: Optional[str] = None
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=f"sau-batch-writer-{self.db_path.stem}",
+                                                daemon=True)
+                self._thread.start()
+                atexit.register(self.close)
+
+    def submit(self, table: str, row: Dict[str, Any], block: bool = False,
+               timeout: Optional[float] = None) -> bool:
+        """提交一条记录，队列已满且不等待（或等待超时）时丢弃并返回 False"""
+        if not _IDENTIFIER.match(table) or not all(_IDENTIFIER.match(column) for column in row):
+            raise ValueError(f"Invalid table or column name for {table}")
+        if self._closed:
+            self._drop(table)
+            return False
+        self._ensure_started()
+        try:
+            self._queue.put((table, tuple(row), tuple(row.values())), block=block, timeout=timeout)
+        except queue.Full:
+            self._drop(table)
+            return False
+        self._stats["submitted"] += 1
+        return True
+
+    def _drop(self, table: str):
+        self._stats["dropped"] += 1
+        self._dropped_by_table[table] += 1
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """同步刷盘：等待此前提交的记录全部写入"""
+        if self._thread is None or not self._thread.is_alive():
+            return True
+        request = _Flush()
+        try:
+            self._queue.put(request, timeout=timeout)
+        except queue.Full:
+            return False
+        return request.done.wait(timeout)
+
+    def close(self, timeout: float = 5.0):
+        """刷盘并停止后台线程"""
+        if self._closed:
+            return
+        self._closed = True
+        if self._thread is None or not self._thread.is_alive():
+            return
+        request = _Flush(stop=True)
+        try:
+            self._queue.put(request, timeout=timeout)
+        except queue.Full:
+            return
+        request.done.wait(timeout)
+
+    def _run(self):
+        batch: List[Tuple[str, tuple, tuple]] = []
+        deadline = None
+        while True:
+            wait = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                item = self._queue.get(timeout=wait)
+            except queue.Empty:
+                item = None
+
+            if isinstance(item, _Flush):
+                self._write(batch)
+                batch, deadline = [], None
+                item.done.set()
+                if item.stop:
+                    return
+                continue
+            if item is not None:
+                batch.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+            if batch and (len(batch) >= self.batch_size or time.monotonic() >= deadline):
+                self._write(batch)
+                batch, deadline = [], None
+
+    def _write(self, batch: List[Tuple[str, tuple, tuple]]):
+        if not batch:
+            return
+        groups: Dict[Tuple[str, tuple], List[tuple]] = defaultdict(list)
+        for table, columns, values in batch:
+            groups[(table, columns)].append(values)
+
+        started = time.perf_counter()
+        try:
+            with get_pool(self.db_path).session() as conn:
+                for (table, columns), rows in groups.items():
+                    placeholders = ", ".join("?" * len(columns))
+                    conn.executemany(
+                        f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})", rows
+                    )
+        except Exception as e:
+            self._stats["failed"] += len(batch)
+            self._last_error = f"{type(e).__name__}: {e}"
+            return
+        finally:
+            self._stats["flush_time"] += time.perf_counter() - started
+        self._stats["written"] += len(batch)
+        self._stats["batches"] += 1
+        self._stats["max_batch"] = max(self._stats["max_batch"], len(batch))
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取写入统计信息"""
+        batches = self._stats["batches"]
+        return {
+            **self._stats,
+            "flush_time": round(self._stats["flush_time"], 4),
+            "avg_batch": round(self._stats["written"] / batches, 1) if batches else 0.0,
+            "queue_size": self._queue.qsize(),
+            "queue_capacity": self._queue.maxsize,
+            "dropped_by_table": dict(self._dropped_by_table),
+            "last_error": self._last_error,
+        }
+
+
+_writers: Dict[Path, BatchWriter] = {}
+_writers_lock = threading.Lock()
+
+
+def get_batch_writer(db_path: Union[str, Path]) -> BatchWriter:
+    """按数据库文件获取（或创建）批量写入器"""
+    resolved = Path(db_path).resolve()
+    writer = _writers.get(resolved)
+    if writer is None:
+        with _writers_lock:
+            writer = _writers.get(resolved)
+            if writer is None:
+                writer = _writers[resolved] = BatchWriter(resolved)
+    return writer
+
+
+def flush_all(timeout: float = 5.0):
+    """同步刷写所有写入器"""
+    for writer in list(_writers.values()):
+        writer.flush(timeout)
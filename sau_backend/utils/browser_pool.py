@@ -0,0 +1,431 @@
+# -*- coding: utf-8 -*-
+"""
+浏览器池模块
+进程内共享若干个预热的 Playwright 浏览器实例，按需租借相互隔离的 BrowserContext
+（预先加载 storage_state 并注入反检测脚本），避免每次上传/校验都冷启动浏览器
+"""
+import asyncio
+import os
+import signal
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from playwright.async_api import Browser, Playwright, async_playwright
+
+from sau_backend.utils.async_runtime import async_runtime
+from sau_backend.utils.base_social_media import set_init_script
+from sau_backend.utils.log import browser_logger
+from sau_backend.utils.metrics import LONG_DURATION_BUCKETS, metrics_registry
+
+# 每种启动配置保留的浏览器数量
+DEFAULT_POOL_SIZE = int(os.getenv("SAU_BROWSER_POOL_SIZE", 2))
+# 单个浏览器累计租借次数达到上限后回收重启，避免内存泄漏
+DEFAULT_MAX_USES = int(os.getenv("SAU_BROWSER_MAX_USES", 50))
+# 单个浏览器同时承载的上下文数量上限
+DEFAULT_MAX_CONTEXTS = int(os.getenv("SAU_BROWSER_MAX_CONTEXTS", 4))
+
+# 监控指标
+LAUNCH_DURATION = metrics_registry.histogram(
+    "sau_browser_launch_seconds", "Time to launch a pooled browser", ("browser_type",),
+    buckets=LONG_DURATION_BUCKETS,
+)
+LEASE_WAIT = metrics_registry.histogram(
+    "sau_browser_lease_wait_seconds", "Time spent waiting for a pooled browser, including launches",
+    ("browser_type",),
+)
+LEASE_DURATION = metrics_registry.histogram(
+    "sau_browser_lease_seconds", "How long a browser context stays leased", ("browser_type",),
+    buckets=LONG_DURATION_BUCKETS,
+)
+
+LaunchKey = Tuple[str, bool, Optional[str], Optional[Tuple], Tuple[str, ...]]
+
+
+@dataclass
+class PooledBrowser:
+    """池中的浏览器实例"""
+
+    browser: Browser
+    launch_key: LaunchKey
+    launched_at: float = field(default_factory=time.time)
+    uses: int = 0
+    active: int = 0
+    retiring: bool = False
+
+    def is_healthy(self) -> bool:
+        """浏览器进程仍然连接且未被标记回收"""
+        return not self.retiring and self.browser.is_connected()
+
+
+@dataclass
+class PoolMetrics:
+    """浏览器池指标"""
+
+    leases: int = 0
+    total_wait: float = 0.0
+    max_wait: float = 0.0
+    last_wait: float = 0.0
+    launches: int = 0
+    total_launch_time: float = 0.0
+    recycles: int = 0
+    unhealthy: int = 0
+    failures: int = 0
+
+    def record_wait(self, wait: float):
+        self.leases += 1
+        self.total_wait += wait
+        self.last_wait = wait
+        self.max_wait = max(self.max_wait, wait)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "leases": self.leases,
+            "avg_lease_wait": self.total_wait / self.leases if self.leases else 0.0,
+            "max_lease_wait": self.max_wait,
+            "last_lease_wait": self.last_wait,
+            "launches": self.launches,
+            "avg_launch_time": self.total_launch_time / self.launches if self.launches else 0.0,
+            "recycles": self.recycles,
+            "unhealthy": self.unhealthy,
+            "failures": self.failures,
+        }
+
+
+class BrowserPool:
+    """Playwright 浏览器池
+
+    按启动配置（浏览器类型、是否无头、可执行文件、代理、启动参数）分组维护浏览器，
+    每组最多 ``size`` 个实例；``lease_context`` 返回一个独立的 BrowserContext，
+    退出时自动关闭上下文并归还浏览器。
+    """
+
+    def __init__(self,
+                 size: int = DEFAULT_POOL_SIZE,
+                 max_uses: int = DEFAULT_MAX_USES,
+                 max_contexts_per_browser: int = DEFAULT_MAX_CONTEXTS):
+        self.size = max(1, size)
+        self.max_uses = max(1, max_uses)
+        self.max_contexts_per_browser = max(1, max_contexts_per_browser)
+        self.metrics = PoolMetrics()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._playwright: Optional[Playwright] = None
+        self._browsers: Dict[LaunchKey, List[PooledBrowser]] = {}
+        self._pending: Dict[LaunchKey, int] = {}
+        self._condition: Optional[asyncio.Condition] = None
+        self._sessions = 0
+        # 当前 Playwright 是否由最外层 session() 期间启动
+        self._owns_playwright = False
+
+    def _bind_loop(self):
+        """将池绑定到当前事件循环，Playwright 对象无法跨事件循环使用，旧循环中的浏览器会被关闭"""
+        loop = asyncio.get_running_loop()
+        if self._loop is loop:
+            return
+        if self._loop is not None and (self._browsers or self._playwright is not None):
+            browser_logger.warning("[browser_pool] 事件循环已变更，关闭旧循环中的浏览器实例")
+            self._release_detached(self._loop, [b for pool in self._browsers.values() for b in pool],
+                                   self._playwright)
+        self._loop = loop
+        self._playwright = None
+        self._browsers = {}
+        self._pending = {}
+        self._condition = asyncio.Condition()
+        self._sessions = 0
+        self._owns_playwright = False
+
+    def _release_detached(self, loop: asyncio.AbstractEventLoop, browsers: List[PooledBrowser],
+                          playwright: Optional[Playwright]):
+        """释放绑定在其他事件循环上的浏览器与 Playwright 驱动"""
+        if loop.is_running() and not loop.is_closed():
+            # 旧循环仍在其他线程运行：交给它自己关闭
+            asyncio.run_coroutine_threadsafe(self._shutdown(browsers, playwright), loop)
+            return
+        # 旧循环已结束，无法再 await 其中的对象：直接结束驱动进程，
+        # 驱动启动的浏览器通过管道与其相连，管道断开后随之退出
+        transport = getattr(getattr(playwright, "_connection", None), "_transport", None)
+        pid = getattr(getattr(transport, "_proc", None), "pid", None)
+        if pid:
+            try:
+                os.kill(pid, getattr(signal, "SIGKILL", signal.SIGTERM))
+            except OSError:
+                pass
+
+    @staticmethod
+    def _launch_key(browser_type: str, headless: bool, executable_path: Optional[str],
+                    proxy: Optional[Dict[str, str]], args: Optional[List[str]]) -> LaunchKey:
+        proxy_key = tuple(sorted(proxy.items())) if proxy else None
+        return browser_type, bool(headless), executable_path or None, proxy_key, tuple(args or ())
+
+    async def _ensure_playwright(self) -> Playwright:
+        if self._playwright is None:
+            self._playwright = await async_playwright().start()
+            self._owns_playwright = self._sessions > 0
+        return self._playwright
+
+    async def _launch(self, key: LaunchKey) -> PooledBrowser:
+        browser_type, headless, executable_path, proxy_key, args = key
+        options: Dict[str, Any] = {"headless": headless}
+        if executable_path:
+            options["executable_path"] = executable_path
+        if proxy_key:
+            options["proxy"] = dict(proxy_key)
+        if args:
+            options["args"] = list(args)
+
+        playwright = await self._ensure_playwright()
+        started = time.perf_counter()
+        browser = await getattr(playwright, browser_type).launch(**options)
+        elapsed = time.perf_counter() - started
+        self.metrics.launches += 1
+        self.metrics.total_launch_time += elapsed
+        LAUNCH_DURATION.labels(browser_type=browser_type).observe(elapsed)
+        browser_logger.info(f"[browser_pool] 启动 {browser_type} (headless={headless}) 耗时 {elapsed:.2f}s")
+        return PooledBrowser(browser=browser, launch_key=key)
+
+    def _prune(self, key: LaunchKey) -> List[PooledBrowser]:
+        """健康检查：移除已断开的浏览器"""
+        pool = self._browsers.setdefault(key, [])
+        for pooled in [b for b in pool if not b.browser.is_connected()]:
+            pool.remove(pooled)
+            self.metrics.unhealthy += 1
+            browser_logger.warning("[browser_pool] 发现已断开的浏览器实例，已移出浏览器池")
+        return pool
+
+    async def _acquire(self, key: LaunchKey) -> PooledBrowser:
+        started = time.perf_counter()
+        async with self._condition:
+            while True:
+                pool = self._prune(key)
+                candidates = [b for b in pool if b.is_healthy() and b.active < self.max_contexts_per_browser]
+                idle = [b for b in candidates if b.active == 0]
+                if idle:
+                    chosen = idle[0]
+                elif len(pool) + self._pending.get(key, 0) < self.size:
+                    # 还有空位，释放锁后启动新的浏览器
+                    self._pending[key] = self._pending.get(key, 0) + 1
+                    break
+                elif candidates:
+                    chosen = min(candidates, key=lambda b: b.active)
+                else:
+                    await self._condition.wait()
+                    continue
+                chosen.active += 1
+                self._record_wait(key, time.perf_counter() - started)
+                return chosen
+
+        try:
+            pooled = await self._launch(key)
+        except Exception:
+            async with self._condition:
+                self._pending[key] -= 1
+                self.metrics.failures += 1
+                self._condition.notify_all()
+            raise
+
+        async with self._condition:
+            self._pending[key] -= 1
+            pooled.active += 1
+            self._browsers.setdefault(key, []).append(pooled)
+        self._record_wait(key, time.perf_counter() - started)
+        return pooled
+
+    def _record_wait(self, key: LaunchKey, wait: float):
+        self.metrics.record_wait(wait)
+        LEASE_WAIT.labels(browser_type=key[0]).observe(wait)
+
+    async def _release(self, pooled: PooledBrowser):
+        retired = False
+        async with self._condition:
+            pooled.active -= 1
+            pooled.uses += 1
+            if pooled.uses >= self.max_uses or not pooled.browser.is_connected():
+                pooled.retiring = True
+            if pooled.retiring and pooled.active == 0:
+                pool = self._browsers.get(pooled.launch_key, [])
+                if pooled in pool:
+                    pool.remove(pooled)
+                retired = True
+            self._condition.notify_all()
+
+        if retired:
+            self.metrics.recycles += 1
+            browser_logger.info(f"[browser_pool] 回收浏览器实例，累计使用 {pooled.uses} 次")
+            await self._close_browser(pooled)
+
+    @staticmethod
+    async def _close_browser(pooled: PooledBrowser):
+        try:
+            await pooled.browser.close()
+        except Exception as e:
+            browser_logger.warning(f"[browser_pool] 关闭浏览器失败: {e}")
+
+    @asynccontextmanager
+    async def lease_context(self,
+                            storage_state=None,
+                            *,
+                            browser_type: str = "chromium",
+                            headless: bool = True,
+                            executable_path: Optional[str] = None,
+                            proxy: Optional[Dict[str, str]] = None,
+                            args: Optional[List[str]] = None,
+                            stealth: bool = True,
+                            **context_options):
+        """租借一个隔离的浏览器上下文
+
+        Args:
+            storage_state: cookie 文件路径或 storage_state 字典（可选）
+            browser_type: chromium / firefox / webkit
+            headless: 是否无头模式
+            executable_path: 本地浏览器路径（可选）
+            proxy: 代理设置（可选）
+            args: 浏览器启动参数（可选）
+            stealth: 是否注入反检测脚本
+            **context_options: 透传给 ``browser.new_context`` 的其他参数
+
+        Yields:
+            BrowserContext，退出时自动关闭
+        """
+        self._bind_loop()
+        key = self._launch_key(browser_type, headless, executable_path, proxy, args)
+        pooled = await self._acquire(key)
+        leased_at = time.perf_counter()
+        context = None
+        try:
+            if storage_state is not None:
+                context_options["storage_state"] = storage_state if isinstance(storage_state, dict) else str(storage_state)
+            try:
+                context = await pooled.browser.new_context(**context_options)
+            except Exception:
+                if not pooled.browser.is_connected():
+                    pooled.retiring = True
+                raise
+            if stealth:
+                context = await set_init_script(context)
+            yield context
+        finally:
+            if context is not None:
+                try:
+                    await context.close()
+                except Exception:
+                    pass
+            await self._release(pooled)
+            LEASE_DURATION.labels(browser_type=browser_type).observe(time.perf_counter() - leased_at)
+
+    async def warm_up(self, count: Optional[int] = None, *, browser_type: str = "chromium",
+                      headless: bool = True, executable_path: Optional[str] = None,
+                      proxy: Optional[Dict[str, str]] = None, args: Optional[List[str]] = None):
+        """预先启动浏览器，使首个任务无需等待冷启动"""
+        self._bind_loop()
+        key = self._launch_key(browser_type, headless, executable_path, proxy, args)
+        target = min(count or self.size, self.size)
+        async with self._condition:
+            missing = target - len(self._prune(key)) - self._pending.get(key, 0)
+            if missing <= 0:
+                return
+            self._pending[key] = self._pending.get(key, 0) + missing
+
+        results = await asyncio.gather(*(self._launch(key) for _ in range(missing)), return_exceptions=True)
+        async with self._condition:
+            self._pending[key] -= missing
+            for result in results:
+                if isinstance(result, Exception):
+                    self.metrics.failures += 1
+                    browser_logger.error(f"[browser_pool] 预热浏览器失败: {result}")
+                else:
+                    self._browsers.setdefault(key, []).append(result)
+            self._condition.notify_all()
+
+    async def health_check(self) -> Dict[str, Any]:
+        """检查所有浏览器实例，移除已断开的实例并返回统计信息"""
+        self._bind_loop()
+        async with self._condition:
+            for key in list(self._browsers.keys()):
+                self._prune(key)
+            self._condition.notify_all()
+        return self.get_stats()
+
+    @asynccontextmanager
+    async def session(self):
+        """独立运行（CLI/脚本）时的生命周期范围。
+
+        最外层的 session 退出时，仅当 Playwright 是在 session 期间启动的、且没有其他租借或
+        正在启动的浏览器时才关闭浏览器池；服务端共享的浏览器池由 async_runtime 的关闭钩子释放
+        """
+        self._bind_loop()
+        self._sessions += 1
+        try:
+            yield self
+        finally:
+            self._sessions -= 1
+            if self._sessions == 0 and self._owns_playwright and self._idle():
+                await self.close()
+
+    def _idle(self) -> bool:
+        """没有租借中的上下文，也没有正在启动的浏览器"""
+        return (not any(b.active for pool in self._browsers.values() for b in pool)
+                and not any(self._pending.values()))
+
+    async def close(self):
+        """关闭所有浏览器并停止 Playwright"""
+        if self._loop is None or self._loop is not asyncio.get_running_loop():
+            return
+        async with self._condition:
+            browsers = [b for pool in self._browsers.values() for b in pool]
+            self._browsers = {}
+        playwright, self._playwright = self._playwright, None
+        self._owns_playwright = False
+        await self._shutdown(browsers, playwright)
+
+    async def _shutdown(self, browsers: List[PooledBrowser], playwright: Optional[Playwright]):
+        for pooled in browsers:
+            await self._close_browser(pooled)
+        if playwright is not None:
+            try:
+                await playwright.stop()
+            except Exception as e:
+                browser_logger.warning(f"[browser_pool] 停止 Playwright 失败: {e}")
+
+    def count_by_type(self, measure) -> Dict[Tuple[str], int]:
+        """按浏览器类型汇总 measure(PooledBrowser) 的值（供指标导出）"""
+        counts: Dict[Tuple[str], int] = {}
+        for key, pool in list(self._browsers.items()):
+            counts[(key[0],)] = counts.get((key[0],), 0) + sum(measure(pooled) for pooled in pool)
+        return counts
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取浏览器池统计信息"""
+        profiles = []
+        for key, pool in self._browsers.items():
+            browser_type, headless, executable_path, proxy_key, _ = key
+            profiles.append({
+                "browser_type": browser_type,
+                "headless": headless,
+                "executable_path": executable_path,
+                "proxy": bool(proxy_key),
+                "browsers": len(pool),
+                "active_contexts": sum(b.active for b in pool),
+                "uses": [b.uses for b in pool],
+            })
+        return {
+            "size": self.size,
+            "max_uses": self.max_uses,
+            "max_contexts_per_browser": self.max_contexts_per_browser,
+            "profiles": profiles,
+            "metrics": self.metrics.to_dict(),
+        }
+
+
+# 全局浏览器池实例
+browser_pool = BrowserPool()
+
+# 事件循环服务关闭时释放浏览器
+async_runtime.add_shutdown_hook(browser_pool.close)
+
+metrics_registry.gauge(
+    "sau_browser_instances", "Browsers currently held by the pool", ("browser_type",)
+).set_function(lambda: browser_pool.count_by_type(lambda pooled: 1))
+metrics_registry.gauge(
+    "sau_browser_active_contexts", "Browser contexts currently leased", ("browser_type",)
+).set_function(lambda: browser_pool.count_by_type(lambda pooled: pooled.active))
@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+"""
+Cookie 批量校验模块
+在共享浏览器池中以有限并发为多个账号的 cookie 文件校验登录态，
+校验结果按 cookie 文件指纹（mtime/大小/内容哈希）缓存并设置 TTL
+"""
+import asyncio
+import hashlib
+import importlib
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+from sau_backend.utils.base_social_media import SOCIAL_MEDIA_DOUYIN, SOCIAL_MEDIA_TENCENT, \
+    SOCIAL_MEDIA_TIKTOK, SOCIAL_MEDIA_KUAISHOU
+from sau_backend.utils.browser_pool import browser_pool
+from sau_backend.utils.log import browser_logger
+
+# 校验结果缓存时间（秒）
+DEFAULT_TTL = int(os.getenv("SAU_COOKIE_CACHE_TTL", 600))
+# 同时进行校验的上下文数量
+DEFAULT_CONCURRENCY = int(os.getenv("SAU_COOKIE_CHECK_CONCURRENCY", 8))
+
+# 平台 -> (校验函数所在模块, 浏览器类型)。模块需提供 check_cookie(page) -> bool：
+# 在已加载 cookie 的页面上校验登录态，各上传器自身的 cookie_auth 也复用该函数
+PLATFORM_CHECKERS: Dict[str, Tuple[str, str]] = {
+    SOCIAL_MEDIA_DOUYIN: ("sau_backend.uploader.douyin_uploader.main", "chromium"),
+    SOCIAL_MEDIA_TENCENT: ("sau_backend.uploader.tencent_uploader.main", "chromium"),
+    SOCIAL_MEDIA_TIKTOK: ("sau_backend.uploader.tk_uploader.main_chrome", "chromium"),
+    SOCIAL_MEDIA_KUAISHOU: ("sau_backend.uploader.ks_uploader.main", "chromium"),
+    "baijiahao": ("sau_backend.uploader.baijiahao_uploader.main", "chromium"),
+}
+
+Fingerprint = Tuple[int, int, str]
+CookieEntry = Union[Tuple[str, str], Dict[str, Any]]
+
+
+@dataclass
+class CookieCheckResult:
+    """单个 cookie 文件的校验结果"""
+
+    platform: str
+    cookie_file: str
+    valid: Optional[bool]
+    cached: bool = False
+    latency: float = 0.0
+    checked_at: float = 0.0
+    error: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data["latency_ms"] = round(self.latency * 1000, 1)
+        return data
+
+
+@dataclass
+class _CacheEntry:
+    fingerprint: Fingerprint
+    result: CookieCheckResult
+    expires_at: float
+
+
+class CookieValidator:
+    """Cookie 批量校验器"""
+
+    def __init__(self, ttl: int = DEFAULT_TTL, concurrency: int = DEFAULT_CONCURRENCY):
+        self.ttl = ttl
+        self.concurrency = max(1, concurrency)
+        self._cache: Dict[Tuple[str, str], _CacheEntry] = {}
+        # 缓存可能被 Flask 工作线程与事件循环线程同时访问
+        self._lock = threading.Lock()
+        self._stats = {"checks": 0, "hits": 0, "misses": 0, "errors": 0}
+
+    @staticmethod
+    def fingerprint(cookie_file: str) -> Optional[Fingerprint]:
+        """计算 cookie 文件指纹，文件不存在时返回 None"""
+        try:
+            stat = os.stat(cookie_file)
+            with open(cookie_file, "rb") as f:
+                digest = hashlib.sha256(f.read()).hexdigest()
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size, digest
+
+    def get_cached(self, platform: str, cookie_file: str) -> Optional[CookieCheckResult]:
+        """返回仍然有效的缓存结果；cookie 文件变化或过期时返回 None"""
+        key = (platform, str(cookie_file))
+        with self._lock:
+            entry = self._cache.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at < time.time() or entry.fingerprint != self.fingerprint(str(cookie_file)):
+            with self._lock:
+                self._cache.pop(key, None)
+            return None
+        return CookieCheckResult(**{**asdict(entry.result), "cached": True})
+
+    def invalidate(self, cookie_file: Optional[str] = None):
+        """清除指定 cookie 文件（或全部）的缓存"""
+        with self._lock:
+            if cookie_file is None:
+                self._cache.clear()
+            else:
+                for key in [k for k in self._cache if k[1] == str(cookie_file)]:
+                    del self._cache[key]
+
+    async def validate(self, platform: str, cookie_file: str, force: bool = False) -> CookieCheckResult:
+        """校验单个 cookie 文件"""
+        results = await self.validate_many([(platform, cookie_file)], force=force)
+        return results[0]
+
+    async def validate_many(self, entries: Iterable[CookieEntry], force: bool = False,
+                            concurrency: Optional[int] = None) -> List[CookieCheckResult]:
+        """批量校验 cookie 文件，结果顺序与输入一致
+
+        Args:
+            entries: (platform, cookie_file) 元组，或包含 platform / cookiesFile 字段的字典
+            force: 忽略缓存强制重新校验
+            concurrency: 并发上限，默认使用实例配置
+        """
+        entries = [self._normalize(entry) for entry in entries]
+        semaphore = asyncio.Semaphore(max(1, concurrency or self.concurrency))
+
+        async def run(platform: str, cookie_file: str) -> CookieCheckResult:
+            if not force:
+                cached = self.get_cached(platform, cookie_file)
+                if cached is not None:
+                    self._stats["hits"] += 1
+                    return cached
+            self._stats["misses"] += 1
+            async with semaphore:
+                return await self._check(platform, cookie_file)
+
+        # 浏览器池的生命周期由调用方负责：服务端由 async_runtime 关闭钩子释放，CLI 在最外层套 session()
+        return list(await asyncio.gather(*(run(p, f) for p, f in entries)))
+
+    async def _check(self, platform: str, cookie_file: str) -> CookieCheckResult:
+        """在浏览器池的上下文中执行一次校验并写入缓存"""
+        started = time.time()
+        result = CookieCheckResult(platform=platform, cookie_file=cookie_file, valid=None, checked_at=started)
+
+        checker = PLATFORM_CHECKERS.get(platform)
+        fingerprint = self.fingerprint(cookie_file)
+        if checker is None:
+            result.error = f"暂不支持 {platform} 平台的 cookie 校验"
+            return result
+        if fingerprint is None:
+            result.valid = False
+            result.error = "cookie 文件不存在"
+            return result
+
+        module_name, browser_type = checker
+        self._stats["checks"] += 1
+        try:
+            check_cookie = importlib.import_module(module_name).check_cookie
+            async with browser_pool.lease_context(self._storage_state(cookie_file), browser_type=browser_type,
+                                                  headless=True) as context:
+                page = await context.new_page()
+                result.valid = bool(await check_cookie(page))
+        except Exception as e:
+            self._stats["errors"] += 1
+            result.error = str(e)
+            browser_logger.warning(f"[cookie_validator] {platform} {cookie_file} 校验失败: {e}")
+        result.latency = time.time() - started
+
+        # 校验出错时不缓存，下次重新校验
+        if result.valid is not None:
+            with self._lock:
+                self._cache[(platform, cookie_file)] = _CacheEntry(
+                    fingerprint=fingerprint, result=result, expires_at=time.time() + self.ttl
+                )
+        return result
+
+    @staticmethod
+    def _storage_state(cookie_file: str) -> Union[str, Dict[str, Any]]:
+        """cookie 文件可以是 storage_state，也可以是 context.cookies() 导出的 cookie 列表"""
+        try:
+            with open(cookie_file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return cookie_file
+        if isinstance(data, list):
+            return {"cookies": data, "origins": []}
+        return cookie_file
+
+    @staticmethod
+    def _normalize(entry: CookieEntry) -> Tuple[str, str]:
+        if isinstance(entry, dict):
+            cookie_file = entry.get("cookiesFile") or entry.get("cookie_file") or entry.get("cookie_path")
+            return entry["platform"], str(cookie_file)
+        platform, cookie_file = entry
+        return platform, str(cookie_file)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取校验统计信息"""
+        with self._lock:
+            cached = len(self._cache)
+        return {**self._stats, "cached": cached, "ttl": self.ttl, "concurrency": self.concurrency}
+
+
+def find_cookie_files(cookies_dir: Union[str, Path], platform: str) -> List[str]:
+    """列出 cookies 目录下指定平台的全部 cookie 文件（{platform}_{account}.json）"""
+    return sorted(str(p) for p in Path(cookies_dir).glob(f"{platform}_*.json"))
+
+
+# 全局校验器实例
+cookie_validator = CookieValidator()
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+"""
+HTTP 响应缓存
+缓存 GET 接口序列化后的响应体，键由路由、规范化的查询参数与认证主体（用户）组成，
+不同用户之间不会串数据；条目存放在共享缓存后端（sauce_backend.cache），多进程共用。
+响应带 ETag/Last-Modified，客户端携带 If-None-Match/If-Modified-Since 时返回 304，
+前端轮询账号列表、平台列表、模板等接口时只需传输响应头
+"""
+import hashlib
+import os
+import time
+from functools import wraps
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from flask import g, make_response, request
+
+# 是否启用响应缓存
+HTTP_CACHE_ENABLED = os.getenv("SAU_HTTP_CACHE_ENABLED", "1").lower() not in ("0", "false", "no")
+
+# 可缓存的响应类型
+_CACHEABLE_MIMETYPES = ("application/json", "text/plain", "text/html", "text/csv")
+
+
+def request_principal() -> str:
+    """当前请求的认证主体：已认证用户 ID，其次为认证头摘要，否则为匿名"""
+    user_id = getattr(g, "user_id", None)
+    if user_id is not None:
+        return str(user_id)
+    auth = request.headers.get("Authorization")
+    if auth:
+        return "auth-" + hashlib.sha256(auth.encode("utf-8")).hexdigest()[:16]
+    return "anonymous"
+
+
+def _query_digest() -> str:
+    """规范化查询参数：按键与值排序后取摘要，参数顺序不同的请求共用缓存"""
+    items = sorted((key, value) for key in request.args for value in request.args.getlist(key))
+    if not items:
+        return "-"
+    raw = "&".join(f"{key}={value}" for key, value in items)
+    return hashlib.md5(raw.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """HTTP 响应缓存"""
+
+    def __init__(self, backend=None, enabled: bool = HTTP_CACHE_ENABLED):
+        self._backend = backend
+        self.enabled = enabled
+        self._stats = {"hits": 0, "misses": 0, "not_modified": 0, "stores": 0, "uncacheable": 0}
+
+    @property
+    def backend(self):
+        """共享缓存后端，首次使用时按 CacheConfig 创建"""
+        if self._backend is None:
+            from sauce_backend.cache import cache_manager
+            self._backend = cache_manager.backend
+        return self._backend
+
+    def cache_key(self, principal: str) -> str:
+        return f"http:{request.endpoint or request.path}:{principal}:{_query_digest()}"
+
+    def _serialize(self, response) -> Optional[Dict[str, Any]]:
+        """序列化可缓存的响应，不可缓存时返回 None"""
+        if response.status_code != 200 or response.is_streamed or response.direct_passthrough:
+            return None
+        if response.mimetype not in _CACHEABLE_MIMETYPES or "Set-Cookie" in response.headers:
+            return None
+        try:
+            body = response.get_data().decode("utf-8")
+        except UnicodeDecodeError:
+            return None
+        return {
+            "body": body,
+            "mimetype": response.mimetype,
+            "etag": hashlib.sha1(body.encode("utf-8")).hexdigest(),
+            "last_modified": int(time.time()),
+        }
+
+    def _build(self, entry: Dict[str, Any]):
+        response = make_response(entry["body"], 200)
+        response.mimetype = entry["mimetype"]
+        return response
+
+    def _finalize(self, response, entry: Optional[Dict[str, Any]], cache_status: str):
+        """补充校验头并按条件请求转换为 304"""
+        response.headers["X-Cache"] = cache_status
+        response.vary.add("Authorization")
+        # 内容因用户而异：只允许浏览器私有缓存，且每次使用前都要重新校验
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+        if entry is not None:
+            response.set_etag(entry["etag"])
+            response.last_modified = entry["last_modified"]
+            response.make_conditional(request)
+            if response.status_code == 304:
+                self._stats["not_modified"] += 1
+        return response
+
+    def cached(self, timeout: int = 300, tags: Iterable[str] = ()):
+        """响应缓存装饰器，放在 require_auth 之后使用以便按用户区分缓存"""
+        tags = tuple(tags)
+
+        def decorator(f: Callable) -> Callable:
+            @wraps(f)
+            def decorated_function(*args, **kwargs):
+                if not self.enabled or request.method not in ("GET", "HEAD"):
+                    return f(*args, **kwargs)
+
+                principal = request_principal()
+                live = {}
+
+                def load():
+                    live["response"] = make_response(f(*args, **kwargs))
+                    entry = self._serialize(live["response"])
+                    if entry is None:
+                        self._stats["uncacheable"] += 1
+                    else:
+                        self._stats["stores"] += 1
+                    return entry
+
+                entry = self.backend.get_or_set(
+                    self.cache_key(principal), load, timeout,
+                    tags=[f"http_user:{principal}", *(f"http:{tag}" for tag in tags)]
+                )
+                if "response" in live:
+                    self._stats["misses"] += 1
+                    return self._finalize(live["response"], entry, "MISS")
+                self._stats["hits"] += 1
+                return self._finalize(self._build(entry), entry, "HIT")
+
+            return decorated_function
+        return decorator
+
+    def invalidate(self, tag: Optional[str] = None, user_id: Any = None) -> int:
+        """按资源标签（如 "accounts"）或用户清除缓存的响应，都不指定时全部清除，返回删除数量"""
+        if tag is None and user_id is None:
+            return self.backend.invalidate_prefix("http:")
+        removed = 0
+        if tag is not None:
+            removed += self.backend.invalidate_tag(f"http:{tag}")
+        if user_id is not None:
+            removed += self.backend.invalidate_tag(f"http_user:{user_id}")
+        return removed
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取响应缓存统计信息"""
+        lookups = self._stats["hits"] + self._stats["misses"]
+        return {
+            **self._stats,
+            "enabled": self.enabled,
+            "hit_rate": round(self._stats["hits"] / lookups, 4) if lookups else 0.0,
+        }
+
+
+# 全局响应缓存实例
+response_cache = ResponseCache()
+
+
+def cache_response(timeout: int = 300, tags: Iterable[str] = ()):
+    """响应缓存装饰器"""
+    return response_cache.cached(timeout, tags)
+
+
+def invalidate_responses(tag: Optional[str] = None, user_id: Any = None) -> int:
+    """清除缓存的响应"""
+    return response_cache.invalidate(tag, user_id)
@@ -50,3 +50,4 @@ tiktok_logger = create_logger('tiktok', 'logs/tiktok.log')
 bilibili_logger = create_logger('bilibili', 'logs/bilibili.log')
 kuaishou_logger = create_logger('kuaishou', 'logs/kuaishou.log')
 baijiahao_logger = create_logger('baijiahao', 'logs/baijiahao.log')
+browser_logger = create_logger('browser', 'logs/browser.log')
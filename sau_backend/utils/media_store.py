@@ -0,0 +1,357 @@
+# -*- coding: utf-8 -*-
+"""
+内容寻址媒体存储模块
+上传文件与 FFmpeg 产物按 SHA-256 存为只读 blob，业务路径通过硬链接指向 blob，
+相同内容只占用一份磁盘空间；SQLite 索引记录 blob、引用路径与 FFmpeg 派生关系，
+无引用的 blob 由 gc() 回收
+"""
+import hashlib
+import os
+import shutil
+import sqlite3
+import stat
+import tempfile
+import threading
+import time
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Iterable, Optional, Union
+
+from sau_backend.conf import BASE_DIR
+from sau_backend.utils.sqlite_pool import get_pool
+
+# blob 存储目录，需与 uploads / media/out 位于同一文件系统才能使用硬链接
+MEDIA_STORE_DIR = Path(os.getenv("SAU_MEDIA_STORE_DIR", BASE_DIR / "media_store"))
+# 索引数据库
+MEDIA_STORE_DB = Path(os.getenv("SAU_MEDIA_STORE_DB", BASE_DIR / "db" / "media_store.db"))
+# 无引用 blob 的保留时间（秒），避免回收刚写入、尚未建立引用的 blob
+GC_GRACE_SECONDS = int(os.getenv("SAU_MEDIA_STORE_GC_GRACE", 3600))
+READ_BUFFER_SIZE = 1024 * 1024  # 1MB
+
+PathLike = Union[str, Path]
+
+
+@dataclass
+class StoredFile:
+    """一次写入存储的结果"""
+
+    sha256: str
+    size: int
+    path: str
+    deduplicated: bool = False
+    linked: bool = True
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+class MediaStore:
+    """内容寻址媒体存储"""
+
+    def __init__(self, root: PathLike = MEDIA_STORE_DIR, db_path: PathLike = MEDIA_STORE_DB):
+        self.root = Path(root)
+        self.objects_dir = self.root / "objects"
+        self.tmp_dir = self.root / "tmp"
+        self.db_path = Path(db_path)
+        self._lock = threading.Lock()
+        self._initialized = False
+
+    def _connect(self):
+        return get_pool(self.db_path).session(row_factory=sqlite3.Row)
+
+    def _ensure_init(self):
+        if self._initialized:
+            return
+        with self._lock:
+            if self._initialized:
+                return
+            self.objects_dir.mkdir(parents=True, exist_ok=True)
+            self.tmp_dir.mkdir(parents=True, exist_ok=True)
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            with self._connect() as conn:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.executescript("""
+                    CREATE TABLE IF NOT EXISTS media_blobs (
+                        sha256 TEXT PRIMARY KEY,
+                        size INTEGER NOT NULL,
+                        refcount INTEGER NOT NULL DEFAULT 0,
+                        created_at REAL NOT NULL,
+                        last_used_at REAL NOT NULL
+                    );
+                    CREATE TABLE IF NOT EXISTS media_refs (
+                        path TEXT PRIMARY KEY,
+                        sha256 TEXT NOT NULL,
+                        owner TEXT,
+                        kind TEXT,
+                        inode INTEGER,
+                        created_at REAL NOT NULL
+                    );
+                    CREATE INDEX IF NOT EXISTS idx_media_refs_sha256 ON media_refs(sha256);
+                    CREATE INDEX IF NOT EXISTS idx_media_blobs_refcount ON media_blobs(refcount);
+                    CREATE TABLE IF NOT EXISTS media_derivations (
+                        derivation_key TEXT PRIMARY KEY,
+                        sha256 TEXT NOT NULL,
+                        created_at REAL NOT NULL
+                    );
+                """)
+            self._initialized = True
+
+    def blob_path(self, sha256: str) -> Path:
+        return self.objects_dir / sha256[:2] / sha256[2:]
+
+    @staticmethod
+    def _key(path: PathLike) -> str:
+        return str(Path(path).resolve())
+
+    # ---------- 写入 ----------
+
+    def store_stream(self, stream: BinaryIO, dest_path: PathLike, owner: Any = None,
+                     kind: Optional[str] = None) -> StoredFile:
+        """将数据流写入存储并在 dest_path 建立引用，写入时增量计算哈希，数据只落盘一次"""
+        self._ensure_init()
+        hasher = hashlib.sha256()
+        fd, tmp_name = tempfile.mkstemp(dir=self.tmp_dir, suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                while True:
+                    data = stream.read(READ_BUFFER_SIZE)
+                    if not data:
+                        break
+                    f.write(data)
+                    hasher.update(data)
+            return self._commit(Path(tmp_name), dest_path, hasher.hexdigest(), owner, kind)
+        finally:
+            if os.path.exists(tmp_name):
+                os.unlink(tmp_name)
+
+    def store_file(self, src_path: PathLike, dest_path: Optional[PathLike] = None, sha256: Optional[str] = None,
+                   owner: Any = None, kind: Optional[str] = None,
+                   derivation_key: Optional[str] = None) -> StoredFile:
+        """将已有文件移入存储，并在 dest_path（默认原路径）建立引用
+
+        Args:
+            src_path: 源文件，写入后由存储接管
+            dest_path: 引用路径，默认与源文件相同
+            sha256: 已知的内容哈希（如分片上传时已增量计算），提供时不再重新读取文件
+            derivation_key: FFmpeg 派生键，记录后相同处理可直接复用结果
+        """
+        self._ensure_init()
+        src_path = Path(src_path)
+        digest = sha256 or self.hash_file(src_path)
+        # 先移入存储临时目录，源路径可能就是 dest_path
+        fd, tmp_name = tempfile.mkstemp(dir=self.tmp_dir, suffix=".part")
+        os.close(fd)
+        try:
+            try:
+                os.replace(src_path, tmp_name)
+            except OSError:
+                # 跨文件系统时退化为复制
+                shutil.copyfile(src_path, tmp_name)
+                src_path.unlink()
+            stored = self._commit(Path(tmp_name), dest_path or src_path, digest, owner, kind)
+        finally:
+            if os.path.exists(tmp_name):
+                os.unlink(tmp_name)
+        if derivation_key:
+            self.record_derivation(derivation_key, digest)
+        return stored
+
+    def _commit(self, tmp_path: Path, dest_path: PathLike, sha256: str, owner: Any,
+                kind: Optional[str]) -> StoredFile:
+        """将临时文件落为 blob（已存在则丢弃），并链接到 dest_path"""
+        blob = self.blob_path(sha256)
+        now = time.time()
+        with self._lock:
+            deduplicated = blob.exists()
+            if not deduplicated:
+                blob.parent.mkdir(parents=True, exist_ok=True)
+                os.chmod(tmp_path, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+                os.replace(tmp_path, blob)
+            size = blob.stat().st_size
+            with self._connect() as conn:
+                conn.execute("""
+                    INSERT INTO media_blobs (sha256, size, refcount, created_at, last_used_at)
+                    VALUES (?, ?, 0, ?, ?)
+                    ON CONFLICT(sha256) DO UPDATE SET last_used_at = excluded.last_used_at
+                """, (sha256, size, now, now))
+        return self._link(sha256, dest_path, owner, kind, deduplicated)
+
+    def _link(self, sha256: str, dest_path: PathLike, owner: Any, kind: Optional[str],
+              deduplicated: bool) -> StoredFile:
+        """在 dest_path 建立指向 blob 的硬链接并登记引用"""
+        blob = self.blob_path(sha256)
+        dest_path = Path(dest_path)
+        dest_path.parent.mkdir(parents=True, exist_ok=True)
+        key = self._key(dest_path)
+        with self._lock:
+            # dest_path 原有的引用（覆盖写入）先解除
+            self._drop_ref(key)
+            if dest_path.exists() or dest_path.is_symlink():
+                dest_path.unlink()
+            linked = True
+            try:
+                os.link(blob, dest_path)
+            except OSError:
+                # 不支持硬链接（跨设备等）时复制，失去去重效果但保证可用
+                shutil.copyfile(blob, dest_path)
+                linked = False
+            with self._connect() as conn:
+                conn.execute("""
+                    INSERT INTO media_refs (path, sha256, owner, kind, inode, created_at)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                """, (key, sha256, None if owner is None else str(owner), kind,
+                      dest_path.stat().st_ino, time.time()))
+                conn.execute("UPDATE media_blobs SET refcount = refcount + 1, last_used_at = ? WHERE sha256 = ?",
+                             (time.time(), sha256))
+                size = conn.execute("SELECT size FROM media_blobs WHERE sha256 = ?", (sha256,)).fetchone()["size"]
+        return StoredFile(sha256=sha256, size=size, path=str(dest_path), deduplicated=deduplicated, linked=linked)
+
+    # ---------- 派生结果复用 ----------
+
+    @staticmethod
+    def derivation_key(operation: str, params: Dict[str, Any], input_hashes: Iterable[str]) -> str:
+        """由操作名、参数和输入内容哈希计算派生键"""
+        parts = [operation, repr(sorted(params.items())), *input_hashes]
+        return hashlib.sha256("\0".join(parts).encode("utf-8")).hexdigest()
+
+    def record_derivation(self, derivation_key: str, sha256: str):
+        self._ensure_init()
+        with self._connect() as conn:
+            conn.execute("""
+                INSERT OR REPLACE INTO media_derivations (derivation_key, sha256, created_at)
+                VALUES (?, ?, ?)
+            """, (derivation_key, sha256, time.time()))
+
+    def link_derived(self, derivation_key: str, dest_path: PathLike, owner: Any = None,
+                     kind: Optional[str] = None) -> Optional[StoredFile]:
+        """相同输入与参数的处理结果已存在时直接链接到 dest_path，否则返回 None"""
+        self._ensure_init()
+        with self._connect() as conn:
+            row = conn.execute("SELECT sha256 FROM media_derivations WHERE derivation_key = ?",
+                               (derivation_key,)).fetchone()
+        if row is None:
+            return None
+        if not self.blob_path(row["sha256"]).exists():
+            with self._connect() as conn:
+                conn.execute("DELETE FROM media_derivations WHERE derivation_key = ?", (derivation_key,))
+            return None
+        return self._link(row["sha256"], dest_path, owner, kind, deduplicated=True)
+
+    # ---------- 查询与释放 ----------
+
+    @staticmethod
+    def hash_file(path: PathLike) -> str:
+        hasher = hashlib.sha256()
+        with open(path, "rb") as f:
+            while True:
+                data = f.read(READ_BUFFER_SIZE)
+                if not data:
+                    break
+                hasher.update(data)
+        return hasher.hexdigest()
+
+    def digest(self, path: PathLike) -> str:
+        """获取文件内容哈希；已登记且 inode 未变的引用直接读取索引，无需重新读取文件"""
+        self._ensure_init()
+        path = Path(path)
+        with self._connect() as conn:
+            row = conn.execute("SELECT sha256, inode FROM media_refs WHERE path = ?",
+                               (self._key(path),)).fetchone()
+        if row is not None:
+            try:
+                st = path.stat()
+                blob_st = self.blob_path(row["sha256"]).stat()
+                if st.st_ino == row["inode"] and st.st_ino == blob_st.st_ino:
+                    return row["sha256"]
+            except OSError:
+                pass
+        return self.hash_file(path)
+
+    def release(self, path: PathLike) -> bool:
+        """删除引用路径并减少 blob 引用计数；路径不受存储管理时直接删除文件"""
+        self._ensure_init()
+        path = Path(path)
+        with self._lock:
+            dropped = self._drop_ref(self._key(path))
+            if path.exists():
+                path.unlink()
+        return dropped
+
+    def _drop_ref(self, key: str) -> bool:
+        with self._connect() as conn:
+            row = conn.execute("SELECT sha256 FROM media_refs WHERE path = ?", (key,)).fetchone()
+            if row is None:
+                return False
+            conn.execute("DELETE FROM media_refs WHERE path = ?", (key,))
+            conn.execute("UPDATE media_blobs SET refcount = MAX(refcount - 1, 0), last_used_at = ? WHERE sha256 = ?",
+                         (time.time(), row["sha256"]))
+        return True
+
+    def gc(self, grace_seconds: int = GC_GRACE_SECONDS) -> Dict[str, int]:
+        """回收无引用的 blob
+
+        先清理已在磁盘上被删除或替换的引用，再删除引用计数为 0 且超过保留时间的 blob
+        """
+        self._ensure_init()
+        stats = {"stale_refs": 0, "removed_blobs": 0, "freed_bytes": 0}
+        cutoff = time.time() - grace_seconds
+        with self._lock:
+            with self._connect() as conn:
+                for row in conn.execute("SELECT path, sha256, inode FROM media_refs").fetchall():
+                    try:
+                        alive = os.stat(row["path"]).st_ino == row["inode"]
+                    except OSError:
+                        alive = False
+                    if not alive:
+                        conn.execute("DELETE FROM media_refs WHERE path = ?", (row["path"],))
+                        conn.execute("UPDATE media_blobs SET refcount = MAX(refcount - 1, 0) WHERE sha256 = ?",
+                                     (row["sha256"],))
+                        stats["stale_refs"] += 1
+
+                candidates = conn.execute(
+                    "SELECT sha256, size FROM media_blobs WHERE refcount = 0 AND last_used_at < ?", (cutoff,)
+                ).fetchall()
+                for row in candidates:
+                    blob = self.blob_path(row["sha256"])
+                    try:
+                        blob.unlink()
+                    except FileNotFoundError:
+                        pass
+                    conn.execute("DELETE FROM media_blobs WHERE sha256 = ?", (row["sha256"],))
+                    conn.execute("DELETE FROM media_derivations WHERE sha256 = ?", (row["sha256"],))
+                    stats["removed_blobs"] += 1
+                    stats["freed_bytes"] += row["size"]
+
+            # 清理异常中断遗留的临时文件
+            for tmp in self.tmp_dir.glob("*.part"):
+                try:
+                    if tmp.stat().st_mtime < cutoff:
+                        tmp.unlink()
+                except OSError:
+                    pass
+        return stats
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取存储统计：物理占用与逻辑占用（按引用计算）"""
+        self._ensure_init()
+        with self._connect() as conn:
+            blobs = conn.execute(
+                "SELECT COUNT(*) AS count, COALESCE(SUM(size), 0) AS bytes FROM media_blobs"
+            ).fetchone()
+            logical = conn.execute("""
+                SELECT COUNT(*) AS count, COALESCE(SUM(b.size), 0) AS bytes
+                FROM media_refs r JOIN media_blobs b ON b.sha256 = r.sha256
+            """).fetchone()
+            unreferenced = conn.execute("SELECT COUNT(*) FROM media_blobs WHERE refcount = 0").fetchone()[0]
+        return {
+            "blobs": blobs["count"],
+            "stored_bytes": blobs["bytes"],
+            "refs": logical["count"],
+            "logical_bytes": logical["bytes"],
+            "saved_bytes": logical["bytes"] - blobs["bytes"],
+            "unreferenced_blobs": unreferenced,
+        }
+
+
+# 全局媒体存储实例
+media_store = MediaStore()
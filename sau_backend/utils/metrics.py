@@ -0,0 +1,325 @@
+# -*- coding: utf-8 -*-
+"""
+进程内指标注册表
+提供计数器（Counter）、仪表（Gauge）与固定分桶直方图（Histogram），以 Prometheus 文本格式导出。
+计数器与直方图按线程累加：每个线程写自己的累加单元，热路径不加锁，导出时再汇总；
+线程退出后其累加值在下次导出或新建分片时并入公共部分，不再持有已退出的线程对象。仪表支持直接赋值或在导出时回调取值
+（队列深度、活跃上下文数等）
+"""
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sau_backend.utils.metrics_rollup import LATENCY_BOUNDS
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# 上传、FFmpeg 任务、浏览器启动等长耗时操作的分桶上界（秒）
+LONG_DURATION_BUCKETS = (0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0)
+
+# 每新增多少个分片顺带合并一次已退出线程的分片，避免线程频繁创建时分片列表无限增长
+FOLD_EVERY = 64
+
+LabelValues = Tuple[str, ...]
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if value == -math.inf:
+        return "-Inf"
+    if math.isnan(value):
+        return "NaN"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class _Shard:
+    """单个线程对某组标签的累加单元"""
+
+    __slots__ = ("values", "thread")
+
+    def __init__(self, size: int):
+        self.values = [0.0] * size
+        self.thread = threading.current_thread()
+
+
+class _Metric:
+    """指标基类：名称、说明与标签"""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[LabelValues, "_Child"] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, object]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def labels(self, **labels) -> "_Child":
+        """按标签取子指标（结果会缓存，热路径可以预先取好）"""
+        key = self._key(labels)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, _Child(self, key))
+        return child
+
+    def _default(self) -> "_Child":
+        if self.labelnames:
+            raise ValueError(f"{self.name} requires labels {self.labelnames}")
+        return self.labels()
+
+    def samples(self) -> List[Tuple[str, LabelValues, Tuple[Tuple[str, str], ...], float]]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {_escape(self.documentation)}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, values, extra, value in self.samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(self.labelnames, values, extra)} {_format_value(value)}")
+        return lines
+
+
+class _Child:
+    """绑定了标签值的子指标"""
+
+    __slots__ = ("metric", "key")
+
+    def __init__(self, metric: _Metric, key: LabelValues):
+        self.metric = metric
+        self.key = key
+
+    def inc(self, amount: float = 1.0):
+        self.metric._inc(self.key, amount)
+
+    def dec(self, amount: float = 1.0):
+        self.metric._inc(self.key, -amount)
+
+    def set(self, value: float):
+        self.metric._set(self.key, value)
+
+    def observe(self, value: float):
+        self.metric._observe(self.key, value)
+
+    @contextmanager
+    def time(self):
+        """计时上下文，退出时记录耗时（秒）"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started)
+
+
+class _ShardedMetric(_Metric):
+    """按线程分片累加的指标"""
+
+    size = 1
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._local = threading.local()
+        self._shards: List[Tuple[LabelValues, _Shard]] = []
+        self._retired: Dict[LabelValues, List[float]] = {}
+        self._appended = 0
+
+    def _values(self, key: LabelValues) -> List[float]:
+        cells = getattr(self._local, "cells", None)
+        if cells is None:
+            cells = self._local.cells = {}
+        shard = cells.get(key)
+        if shard is None:
+            shard = cells[key] = _Shard(self.size)
+            with self._lock:
+                self._shards.append((key, shard))
+                self._appended += 1
+                if self._appended % FOLD_EVERY == 0:
+                    self._fold_dead()
+        return shard.values
+
+    def _fold_dead(self) -> List[Tuple[LabelValues, _Shard]]:
+        """把已退出线程的分片并入公共部分，返回仍存活的分片（调用方持有 self._lock）"""
+        live = []
+        for key, shard in self._shards:
+            if shard.thread.is_alive():
+                live.append((key, shard))
+            else:
+                retired = self._retired.setdefault(key, [0.0] * self.size)
+                for index, value in enumerate(shard.values):
+                    retired[index] += value
+        self._shards = live
+        return live
+
+    def _totals(self) -> Dict[LabelValues, List[float]]:
+        """汇总所有线程的累加值，已退出线程的分片并入公共部分"""
+        with self._lock:
+            live = self._fold_dead()
+            totals = {key: list(values) for key, values in self._retired.items()}
+            keys = list(self._children)
+        for key, shard in live:
+            total = totals.setdefault(key, [0.0] * self.size)
+            for index, value in enumerate(shard.values):
+                total[index] += value
+        for key in keys:
+            totals.setdefault(key, [0.0] * self.size)
+        return totals
+
+
+class Counter(_ShardedMetric):
+    """单调递增计数器"""
+
+    kind = "counter"
+
+    def _inc(self, key: LabelValues, amount: float):
+        if amount < 0:
+            raise ValueError("Counters can only be incremented")
+        self._values(key)[0] += amount
+
+    def inc(self, amount: float = 1.0):
+        self._default().inc(amount)
+
+    def samples(self):
+        return [("_total", key, (), values[0]) for key, values in sorted(self._totals().items())]
+
+
+class Histogram(_ShardedMetric):
+    """固定分桶直方图（累积桶 + _sum + _count）"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Sequence[float] = LATENCY_BOUNDS):
+        self.buckets = tuple(sorted(float(bound) for bound in buckets if bound != math.inf))
+        # 每个分片：各桶计数、+Inf 桶计数、总和
+        self.size = len(self.buckets) + 2
+        super().__init__(name, documentation, labelnames)
+
+    def _observe(self, key: LabelValues, value: float):
+        values = self._values(key)
+        values[bisect.bisect_left(self.buckets, value)] += 1
+        values[-1] += value
+
+    def observe(self, value: float):
+        self._default().observe(value)
+
+    def time(self):
+        return self._default().time()
+
+    def samples(self):
+        result = []
+        for key, values in sorted(self._totals().items()):
+            cumulative = 0.0
+            for bound, count in zip((*self.buckets, math.inf), values[:-1]):
+                cumulative += count
+                result.append(("_bucket", key, (("le", _format_value(bound)),), cumulative))
+            result.append(("_sum", key, (), values[-1]))
+            result.append(("_count", key, (), cumulative))
+        return result
+
+
+class Gauge(_Metric):
+    """可增可减的瞬时值，也可以注册回调在导出时取值"""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values_by_key: Dict[LabelValues, float] = {}
+        self._callback: Optional[Callable[[], object]] = None
+
+    def _inc(self, key: LabelValues, amount: float):
+        with self._lock:
+            self._values_by_key[key] = self._values_by_key.get(key, 0.0) + amount
+
+    def _set(self, key: LabelValues, value: float):
+        with self._lock:
+            self._values_by_key[key] = float(value)
+
+    def inc(self, amount: float = 1.0):
+        self._default().inc(amount)
+
+    def dec(self, amount: float = 1.0):
+        self._default().dec(amount)
+
+    def set(self, value: float):
+        self._default().set(value)
+
+    def set_function(self, callback: Callable[[], object]):
+        """导出时调用 callback 取值：无标签时返回数值，有标签时返回 {标签值元组: 数值}"""
+        self._callback = callback
+
+    def samples(self):
+        if self._callback is not None:
+            try:
+                value = self._callback()
+            except Exception:
+                return []
+            if not self.labelnames:
+                return [("", (), (), float(value))]
+            return [("", tuple(str(v) for v in key), (), float(v)) for key, v in sorted(value.items())]
+        with self._lock:
+            items = sorted(self._values_by_key.items())
+        return [("", key, (), value) for key, value in items]
+
+
+class MetricsRegistry:
+    """指标注册表，同名指标重复注册时返回已有实例"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, cls, name: str, documentation: str, labelnames: Iterable[str], **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, documentation, labelnames, **kwargs)
+            elif not isinstance(metric, cls) or metric.labelnames != tuple(labelnames):
+                raise ValueError(f"Metric {name} already registered with a different type or labels")
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self._register(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Gauge:
+        return self._register(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                  buckets: Sequence[float] = LATENCY_BOUNDS) -> Histogram:
+        return self._register(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def get(self, name: str) -> Optional[_Metric]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        """导出 Prometheus 文本格式"""
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda metric: metric.name)
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# 全局指标注册表
+metrics_registry = MetricsRegistry()
@@ -0,0 +1,420 @@
+# -*- coding: utf-8 -*-
+"""
+监控指标时序汇总
+请求耗时、上传、系统指标等记录到达时先在内存中按 1 分钟 / 15 分钟 / 1 小时桶累加
+（次数、总和、最小/最大值、错误数、耗时直方图），由后台线程定期以 UPSERT 合并进汇总表，
+多进程各自累加后相加即可。时间戳统一为整数 epoch 秒，表以 (series, bucket) 为主键，
+看板查询只扫描桶而不是原始记录。汇总表按时间分区（1 分钟粒度按天、15 分钟按周、
+1 小时按月各建一张表），过期数据整表 DROP，不做逐行 DELETE
+"""
+import atexit
+import math
+import os
+import re
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from sau_backend.utils.sqlite_pool import get_pool
+
+# 汇总写入间隔（秒）
+FLUSH_INTERVAL = float(os.getenv("SAU_ROLLUP_FLUSH_INTERVAL", 10))
+
+# 耗时直方图上界（秒），最后一个桶为 +Inf
+LATENCY_BOUNDS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+_HIST_COLUMNS = tuple(f"h{i}" for i in range(len(LATENCY_BOUNDS) + 1))
+
+
+class Resolution:
+    """汇总粒度：桶宽、分区跨度与保留时长（秒）"""
+
+    def __init__(self, label: str, width: int, partition_span: int, retention: int):
+        self.label = label
+        self.width = width
+        self.partition_span = partition_span
+        self.retention = retention
+
+    def bucket(self, ts: float) -> int:
+        return int(ts) - int(ts) % self.width
+
+    def partition(self, bucket: int) -> int:
+        return bucket // self.partition_span
+
+    def table(self, partition: int) -> str:
+        return f"rollup_{self.label}_p{partition}"
+
+    def members_table(self, partition: int) -> str:
+        return f"rollup_members_{self.label}_p{partition}"
+
+
+_DAY = 86400
+RESOLUTIONS = (
+    Resolution("1m", 60, _DAY, int(os.getenv("SAU_ROLLUP_RETENTION_1M", 2 * _DAY))),
+    Resolution("15m", 900, 7 * _DAY, int(os.getenv("SAU_ROLLUP_RETENTION_15M", 14 * _DAY))),
+    Resolution("1h", 3600, 30 * _DAY, int(os.getenv("SAU_ROLLUP_RETENTION_1H", 90 * _DAY))),
+)
+_BY_LABEL = {resolution.label: resolution for resolution in RESOLUTIONS}
+_PARTITION_NAME = re.compile(r"^rollup_(?:members_)?(\w+?)_p(\d+)$")
+
+
+class _Aggregate:
+    """单个 (series, bucket) 的内存累加值"""
+
+    __slots__ = ("count", "total", "min", "max", "errors", "hist")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.errors = 0
+        self.hist = [0] * len(_HIST_COLUMNS)
+
+    def add(self, value: float, error: bool, hist_index: Optional[int]):
+        self.count += 1
+        self.total += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        if error:
+            self.errors += 1
+        if hist_index is not None:
+            self.hist[hist_index] += 1
+
+    def merge(self, other: "_Aggregate"):
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.errors += other.errors
+        for index, count in enumerate(other.hist):
+            self.hist[index] += count
+
+    def row(self, series: str, bucket: int) -> tuple:
+        return (series, bucket, self.count, self.total, self.min, self.max, self.errors, *self.hist)
+
+
+def _hist_index(value: float) -> int:
+    for index, bound in enumerate(LATENCY_BOUNDS):
+        if value <= bound:
+            return index
+    return len(LATENCY_BOUNDS)
+
+
+def estimate_percentile(hist: List[int], q: float) -> Optional[float]:
+    """按直方图估算分位数（桶内线性插值），没有数据时返回 None"""
+    total = sum(hist)
+    if not total:
+        return None
+    rank = q * total
+    seen = 0
+    for index, count in enumerate(hist):
+        if count and seen + count >= rank:
+            lower = LATENCY_BOUNDS[index - 1] if index > 0 else 0.0
+            if index >= len(LATENCY_BOUNDS):
+                return lower
+            return lower + (LATENCY_BOUNDS[index] - lower) * (rank - seen) / count
+        seen += count
+    return LATENCY_BOUNDS[-1]
+
+
+class RollupStore:
+    """单个数据库的时序汇总存储"""
+
+    def __init__(self, db_path: Union[str, Path], flush_interval: float = FLUSH_INTERVAL):
+        self.db_path = Path(db_path)
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending: Dict[Tuple[str, str, int], _Aggregate] = {}
+        self._pending_members: Dict[Tuple[str, str, int], set] = defaultdict(set)
+        self._known_tables: set = set()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._stats = {"records": 0, "flushes": 0, "rows_written": 0, "partitions_dropped": 0, "failed": 0}
+        self._last_error: Optional[str] = None
+
+    # ---------- 写入 ----------
+
+    def observe(self, series: str, seconds: float, error: bool = False, member: Optional[str] = None,
+                ts: Optional[float] = None):
+        """记录一次耗时（计入直方图），member 用于统计去重数量（如活跃 IP）"""
+        self._add(series, float(seconds), error, _hist_index(seconds), member, ts)
+
+    def record(self, series: str, value: float, ts: Optional[float] = None):
+        """记录一个数值样本（CPU、内存等），只汇总次数、总和与最值"""
+        self._add(series, float(value), False, None, None, ts)
+
+    def _add(self, series: str, value: float, error: bool, hist_index: Optional[int],
+             member: Optional[str], ts: Optional[float]):
+        ts = time.time() if ts is None else ts
+        with self._lock:
+            for resolution in RESOLUTIONS:
+                key = (resolution.label, series, resolution.bucket(ts))
+                aggregate = self._pending.get(key)
+                if aggregate is None:
+                    aggregate = self._pending[key] = _Aggregate()
+                aggregate.add(value, error, hist_index)
+                if member:
+                    self._pending_members[key].add(member)
+            self._stats["records"] += 1
+        self._ensure_started()
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._flush_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=f"sau-rollup-{self.db_path.stem}",
+                                                daemon=True)
+                self._thread.start()
+                atexit.register(self.close)
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def close(self):
+        """停止后台线程并写入剩余数据"""
+        self._stop.set()
+        self.flush()
+
+    def _ensure_partition(self, conn, resolution: Resolution, partition: int):
+        table = resolution.table(partition)
+        if table in self._known_tables:
+            return
+        hist_columns = ", ".join(f"{column} INTEGER NOT NULL DEFAULT 0" for column in _HIST_COLUMNS)
+        conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                series TEXT NOT NULL,
+                bucket INTEGER NOT NULL,
+                count INTEGER NOT NULL,
+                sum REAL NOT NULL,
+                min REAL NOT NULL,
+                max REAL NOT NULL,
+                errors INTEGER NOT NULL,
+                {hist_columns},
+                PRIMARY KEY (series, bucket)
+            ) WITHOUT ROWID
+        """)
+        conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {resolution.members_table(partition)} (
+                series TEXT NOT NULL,
+                bucket INTEGER NOT NULL,
+                member TEXT NOT NULL,
+                PRIMARY KEY (series, bucket, member)
+            ) WITHOUT ROWID
+        """)
+        self._known_tables.add(table)
+
+    def flush(self) -> int:
+        """把内存中的累加值合并进汇总表，返回写入的行数"""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                members, self._pending_members = self._pending_members, defaultdict(set)
+            if not pending:
+                return 0
+
+            hist_updates = ", ".join(f"{column} = {column} + excluded.{column}" for column in _HIST_COLUMNS)
+            placeholders = ", ".join("?" * (7 + len(_HIST_COLUMNS)))
+            grouped: Dict[Tuple[str, int], List[tuple]] = defaultdict(list)
+            grouped_members: Dict[Tuple[str, int], List[tuple]] = defaultdict(list)
+            for (label, series, bucket), aggregate in pending.items():
+                resolution = _BY_LABEL[label]
+                partition = resolution.partition(bucket)
+                grouped[(label, partition)].append(aggregate.row(series, bucket))
+                for member in members.get((label, series, bucket), ()):
+                    grouped_members[(label, partition)].append((series, bucket, member))
+
+            try:
+                with get_pool(self.db_path).session() as conn:
+                    for (label, partition), rows in grouped.items():
+                        resolution = _BY_LABEL[label]
+                        self._ensure_partition(conn, resolution, partition)
+                        conn.executemany(f"""
+                            INSERT INTO {resolution.table(partition)}
+                                (series, bucket, count, sum, min, max, errors, {", ".join(_HIST_COLUMNS)})
+                            VALUES ({placeholders})
+                            ON CONFLICT (series, bucket) DO UPDATE SET
+                                count = count + excluded.count,
+                                sum = sum + excluded.sum,
+                                min = MIN(min, excluded.min),
+                                max = MAX(max, excluded.max),
+                                errors = errors + excluded.errors,
+                                {hist_updates}
+                        """, rows)
+                    for (label, partition), rows in grouped_members.items():
+                        conn.executemany(
+                            f"INSERT OR IGNORE INTO {_BY_LABEL[label].members_table(partition)} "
+                            f"(series, bucket, member) VALUES (?, ?, ?)", rows
+                        )
+            except Exception as e:
+                # 分区可能已被其他进程按保留策略删除，下次写入时重新建表；
+                # 事务已回滚，本批累加值并回内存，留到下次 flush 重试
+                self._known_tables.clear()
+                self._restore(pending, members)
+                self._stats["failed"] += 1
+                self._last_error = f"{type(e).__name__}: {e}"
+                return 0
+
+            written = sum(len(rows) for rows in grouped.values())
+            self._stats["flushes"] += 1
+            self._stats["rows_written"] += written
+            return written
+
+    def _restore(self, pending: Dict[Tuple[str, str, int], _Aggregate], members: Dict[Tuple[str, str, int], set]):
+        """写入失败时把取出的累加值与去重成员合并回待写入队列"""
+        with self._lock:
+            for key, aggregate in pending.items():
+                current = self._pending.get(key)
+                if current is None:
+                    self._pending[key] = aggregate
+                else:
+                    current.merge(aggregate)
+            for key, values in members.items():
+                self._pending_members[key].update(values)
+
+    # ---------- 查询 ----------
+
+    @staticmethod
+    def choose_resolution(window: int, max_points: int = 400) -> Resolution:
+        """选择桶数不超过 max_points 的最细粒度"""
+        for resolution in RESOLUTIONS:
+            if window / resolution.width <= max_points and window <= resolution.retention:
+                return resolution
+        return RESOLUTIONS[-1]
+
+    def _existing_partitions(self, conn, resolution: Resolution, since: int, until: int,
+                             members: bool = False) -> List[str]:
+        names = []
+        for partition in range(resolution.partition(resolution.bucket(since)), resolution.partition(until) + 1):
+            names.append(resolution.members_table(partition) if members else resolution.table(partition))
+        existing = {row[0] for row in conn.execute(
+            f"SELECT name FROM sqlite_master WHERE type = 'table' AND name IN ({', '.join('?' * len(names))})",
+            names
+        )}
+        return [name for name in names if name in existing]
+
+    def buckets(self, series: str, window: int, resolution: Optional[Resolution] = None,
+                until: Optional[float] = None) -> List[Dict[str, Any]]:
+        """按桶返回最近 window 秒的汇总（时间升序）"""
+        self.flush()
+        resolution = resolution or self.choose_resolution(window)
+        until = int(time.time() if until is None else until)
+        since = resolution.bucket(until - window)
+        with get_pool(self.db_path).session() as conn:
+            tables = self._existing_partitions(conn, resolution, since, until)
+            member_tables = self._existing_partitions(conn, resolution, since, until, members=True)
+            if not tables:
+                return []
+            union = " UNION ALL ".join(
+                f"SELECT * FROM {table} WHERE series = ? AND bucket >= ? AND bucket <= ?" for table in tables
+            )
+            rows = conn.execute(f"{union} ORDER BY bucket", [v for _ in tables for v in (series, since, until)])
+            result = [self._bucket_dict(row) for row in rows.fetchall()]
+            if member_tables and result:
+                union = " UNION ALL ".join(
+                    f"SELECT bucket, COUNT(*) FROM {table} WHERE series = ? AND bucket >= ? AND bucket <= ? "
+                    f"GROUP BY bucket" for table in member_tables
+                )
+                distinct = dict(conn.execute(union, [v for _ in member_tables for v in (series, since, until)]))
+                for item in result:
+                    item["distinct"] = distinct.get(item["bucket"], 0)
+        return result
+
+    @staticmethod
+    def _bucket_dict(row) -> Dict[str, Any]:
+        count = row[2]
+        hist = list(row[7:])
+        return {
+            "bucket": row[1],
+            "count": count,
+            "sum": row[3],
+            "avg": row[3] / count if count else 0.0,
+            "min": row[4],
+            "max": row[5],
+            "errors": row[6],
+            "histogram": hist,
+        }
+
+    def summary(self, series: str, window: int, resolution: Optional[Resolution] = None) -> Dict[str, Any]:
+        """最近 window 秒的合计：次数、错误数、平均值、最值、p50/p95/p99 与去重数量"""
+        resolution = resolution or self.choose_resolution(window)
+        items = self.buckets(series, window, resolution)
+        count = sum(item["count"] for item in items)
+        hist = [sum(column) for column in zip(*(item["histogram"] for item in items))] or [0] * len(_HIST_COLUMNS)
+        return {
+            "count": count,
+            "errors": sum(item["errors"] for item in items),
+            "avg": sum(item["sum"] for item in items) / count if count else 0.0,
+            "min": min((item["min"] for item in items), default=None),
+            "max": max((item["max"] for item in items), default=None),
+            "p50": estimate_percentile(hist, 0.50),
+            "p95": estimate_percentile(hist, 0.95),
+            "p99": estimate_percentile(hist, 0.99),
+            "distinct": self.distinct(series, window, resolution),
+        }
+
+    def distinct(self, series: str, window: int, resolution: Optional[Resolution] = None) -> int:
+        """最近 window 秒内的去重成员数（如活跃 IP）"""
+        resolution = resolution or self.choose_resolution(window)
+        until = int(time.time())
+        since = resolution.bucket(until - window)
+        with get_pool(self.db_path).session() as conn:
+            tables = self._existing_partitions(conn, resolution, since, until, members=True)
+            if not tables:
+                return 0
+            union = " UNION ALL ".join(
+                f"SELECT member FROM {table} WHERE series = ? AND bucket >= ? AND bucket <= ?" for table in tables
+            )
+            return conn.execute(f"SELECT COUNT(DISTINCT member) FROM ({union})",
+                                [v for _ in tables for v in (series, since, until)]).fetchone()[0]
+
+    # ---------- 保留策略 ----------
+
+    def drop_expired(self, now: Optional[float] = None) -> List[str]:
+        """整表删除已超出保留时长的分区，返回被删除的表名"""
+        now = time.time() if now is None else now
+        dropped = []
+        with get_pool(self.db_path).session() as conn:
+            names = [row[0] for row in conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE 'rollup\\_%' ESCAPE '\\'"
+            )]
+            for name in names:
+                match = _PARTITION_NAME.match(name)
+                resolution = _BY_LABEL.get(match.group(1)) if match else None
+                if resolution is None:
+                    continue
+                partition_end = (int(match.group(2)) + 1) * resolution.partition_span
+                if partition_end <= now - resolution.retention:
+                    conn.execute(f"DROP TABLE IF EXISTS {name}")
+                    self._known_tables.discard(name)
+                    dropped.append(name)
+        self._stats["partitions_dropped"] += len(dropped)
+        return dropped
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取汇总统计信息"""
+        return {
+            **self._stats,
+            "pending_buckets": len(self._pending),
+            "last_error": self._last_error,
+        }
+
+
+_stores: Dict[Path, RollupStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_rollup_store(db_path: Union[str, Path]) -> RollupStore:
+    """按数据库文件获取（或创建）时序汇总存储"""
+    resolved = Path(db_path).resolve()
+    store = _stores.get(resolved)
+    if store is None:
+        with _stores_lock:
+            store = _stores.get(resolved)
+            if store is None:
+                store = _stores[resolved] = RollupStore(resolved)
+    return store
@@ -0,0 +1,371 @@
+# -*- coding: utf-8 -*-
+"""
+上传进度监听模块
+通过 page.on("response") 与注入页面的 MutationObserver 事件驱动地感知
+上传完成、上传失败、发布跳转等状态，替代定时轮询 locator 与截图
+"""
+import asyncio
+import fnmatch
+import inspect
+import itertools
+import json
+import os
+import re
+import time
+from dataclasses import dataclass, field, asdict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Union
+
+from playwright.async_api import Page, Response, Frame
+
+# 上传与发布的默认超时时间（秒）
+DEFAULT_UPLOAD_TIMEOUT = float(os.getenv("SAU_UPLOAD_TIMEOUT", 1800))
+DEFAULT_PUBLISH_TIMEOUT = float(os.getenv("SAU_PUBLISH_TIMEOUT", 300))
+
+# 事件类型
+EVENT_PROGRESS = "progress"
+EVENT_UPLOAD_CHUNK = "upload_chunk"
+EVENT_UPLOAD_COMPLETE = "upload_complete"
+EVENT_UPLOAD_FAILED = "upload_failed"
+EVENT_UPLOAD_RETRY = "upload_retry"
+EVENT_PUBLISHED = "published"
+EVENT_PUBLISH_REDIRECT = "publish_redirect"
+EVENT_TIMEOUT = "timeout"
+
+# 注入到每个 frame 的观察脚本：DOM 变化后（200ms 节流）按规则检查页面状态，
+# 状态由无到有时通过暴露的 binding 回调 Python
+_OBSERVER_JS = """
+([rules, binding]) => {
+  const existing = window.__sauWatchers && window.__sauWatchers[binding];
+  if (existing) { existing.rules = rules; existing.schedule(); return; }
+  const state = { rules, last: {}, observer: null };
+  const report = (payload) => { try { window[binding](payload); } catch (e) {} };
+  const matches = (r) => Array.from(document.querySelectorAll(r.selector)).some(el =>
+    (!r.text || (el.textContent || '').includes(r.text)) &&
+    (!r.not_class || !String(el.className || '').includes(r.not_class)) &&
+    (!r.no_attr || !el.hasAttribute(r.no_attr))) && (!r.requires || matches(r.requires));
+  state.check = () => {
+    for (const r of state.rules) {
+      if (r.kind === 'progress') {
+        const el = document.querySelector(r.selector);
+        const m = el && (el.textContent || '').match(/(\\d+(?:\\.\\d+)?)\\s*%/);
+        if (m && state.last.progress !== m[1]) {
+          state.last.progress = m[1];
+          report({ kind: 'progress', percent: parseFloat(m[1]) });
+        }
+        continue;
+      }
+      const hit = r.absent ? !matches(r) : matches(r);
+      if (hit && !state.last[r.kind]) report({ kind: r.kind, selector: r.selector });
+      state.last[r.kind] = hit;
+    }
+  };
+  let pending = false;
+  state.schedule = () => {
+    if (pending) return;
+    pending = true;
+    setTimeout(() => { pending = false; try { state.check(); } catch (e) {} }, 200);
+  };
+  state.reset = () => { state.last = {}; state.schedule(); };
+  state.stop = () => { if (state.observer) state.observer.disconnect(); };
+  const start = () => {
+    state.observer = new MutationObserver(state.schedule);
+    state.observer.observe(document.documentElement, {
+      subtree: true, childList: true, attributes: true, characterData: true
+    });
+    state.schedule();
+  };
+  window.__sauWatchers = window.__sauWatchers || {};
+  window.__sauWatchers[binding] = state;
+  if (document.documentElement) start(); else document.addEventListener('DOMContentLoaded', start);
+}
+"""
+
+_binding_ids = itertools.count(1)
+
+
+class UploadTimeoutError(TimeoutError):
+    """等待上传或发布超时"""
+
+
+@dataclass
+class WatchRules:
+    """平台页面状态规则
+
+    DOM 规则为字典：selector 为 CSS 选择器，可选 text（包含文本）、
+    not_class（className 不包含）、no_attr（不存在的属性）、absent（元素不存在时命中）、
+    requires（同时需要命中的另一条规则，格式相同）
+    """
+
+    upload_complete: List[Dict[str, str]] = field(default_factory=list)
+    upload_failed: List[Dict[str, str]] = field(default_factory=list)
+    published: List[Dict[str, str]] = field(default_factory=list)
+    # 显示百分比进度的元素
+    progress_selector: Optional[str] = None
+    # 发布成功后跳转的地址（支持 * 通配符）
+    publish_url: Optional[str] = None
+    # 上传分片请求地址（正则），用于进度与失败检测
+    upload_url_pattern: Optional[str] = None
+    # 上传提交请求地址（正则），成功响应即视为上传完成
+    commit_url_pattern: Optional[str] = None
+
+    def dom_rules(self) -> List[Dict[str, str]]:
+        rules = []
+        for kind, items in ((EVENT_UPLOAD_COMPLETE, self.upload_complete),
+                            (EVENT_UPLOAD_FAILED, self.upload_failed),
+                            (EVENT_PUBLISHED, self.published)):
+            rules.extend({**item, "kind": kind} for item in items)
+        if self.progress_selector:
+            rules.append({"kind": EVENT_PROGRESS, "selector": self.progress_selector})
+        return rules
+
+
+@dataclass
+class ProgressEvent:
+    """结构化进度事件"""
+
+    platform: str
+    kind: str
+    percent: Optional[float] = None
+    elapsed: float = 0.0
+    timestamp: float = field(default_factory=time.time)
+    detail: Dict[str, Any] = field(default_factory=dict)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+ProgressCallback = Callable[[ProgressEvent], Union[None, Awaitable[None]]]
+
+
+class UploadProgressWatcher:
+    """页面上传进度监听器"""
+
+    def __init__(self, page: Page, platform: str, rules: WatchRules,
+                 callback: Optional[ProgressCallback] = None, logger=None):
+        self.page = page
+        self.platform = platform
+        self.rules = rules
+        self.callback = callback
+        self.logger = logger
+        self.percent: Optional[float] = None
+        self.chunks = 0
+        self.started_at = time.time()
+        self._binding = f"__sauProgress{next(_binding_ids)}"
+        self._events = {kind: asyncio.Event() for kind in
+                        (EVENT_UPLOAD_COMPLETE, EVENT_UPLOAD_FAILED, EVENT_PUBLISHED)}
+        self._publish_regex = self._compile_url(rules.publish_url)
+        self._upload_regex = re.compile(rules.upload_url_pattern) if rules.upload_url_pattern else None
+        self._commit_regex = re.compile(rules.commit_url_pattern) if rules.commit_url_pattern else None
+        self._started = False
+        self._tasks: set = set()
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.stop()
+
+    @staticmethod
+    def _compile_url(pattern: Optional[str]):
+        if not pattern:
+            return None
+        return re.compile(fnmatch.translate(pattern.replace("**", "*")))
+
+    async def start(self):
+        """注册网络监听并向所有 frame 注入 DOM 观察脚本"""
+        if self._started:
+            return
+        self._started = True
+        self.started_at = time.time()
+        self.page.on("response", self._on_response)
+        self.page.on("framenavigated", self._on_navigated)
+
+        rules = self.rules.dom_rules()
+        if not rules:
+            return
+        await self.page.expose_binding(self._binding, self._on_binding)
+        args = json.dumps([rules, self._binding], ensure_ascii=False)
+        # 之后导航的文档与新 frame 同样生效
+        await self.page.add_init_script(script=f"({_OBSERVER_JS})({args})")
+        for frame in self.page.frames:
+            await self._inject(frame, rules)
+
+    async def _inject(self, frame: Frame, rules: List[Dict[str, str]]):
+        try:
+            await frame.evaluate(_OBSERVER_JS, [rules, self._binding])
+        except Exception:
+            # frame 可能已经分离或正在导航，由 init script 兜底
+            pass
+
+    async def stop(self):
+        """移除监听并断开 DOM 观察"""
+        if not self._started:
+            return
+        self._started = False
+        self.page.remove_listener("response", self._on_response)
+        self.page.remove_listener("framenavigated", self._on_navigated)
+        for frame in self.page.frames:
+            try:
+                await frame.evaluate(
+                    "b => window.__sauWatchers && window.__sauWatchers[b] && window.__sauWatchers[b].stop()",
+                    self._binding)
+            except Exception:
+                pass
+        for task in list(self._tasks):
+            task.cancel()
+
+    async def recheck(self):
+        """重置页面侧状态并立即重新检查，已满足的规则会再次上报"""
+        for frame in self.page.frames:
+            try:
+                await frame.evaluate(
+                    "b => window.__sauWatchers && window.__sauWatchers[b] && window.__sauWatchers[b].reset()",
+                    self._binding)
+            except Exception:
+                pass
+
+    # ------------------------------------------------------------------
+    # 事件来源
+    # ------------------------------------------------------------------
+    def _on_binding(self, source, payload: Dict[str, Any]):
+        kind = payload.get("kind")
+        if kind == EVENT_PROGRESS:
+            self.percent = payload.get("percent")
+            self._emit(EVENT_PROGRESS)
+        elif kind in self._events:
+            self._events[kind].set()
+            self._emit(kind, selector=payload.get("selector"))
+
+    def _on_response(self, response: Response):
+        url = response.url
+        if self._commit_regex and self._commit_regex.search(url):
+            if response.ok:
+                self._events[EVENT_UPLOAD_COMPLETE].set()
+                self._emit(EVENT_UPLOAD_COMPLETE, url=url, source="network")
+            else:
+                self._events[EVENT_UPLOAD_FAILED].set()
+                self._emit(EVENT_UPLOAD_FAILED, url=url, status=response.status, source="network")
+        elif self._upload_regex and self._upload_regex.search(url):
+            # 单个分片失败通常由页面自行重试，仅上报不触发整体重传
+            if response.ok:
+                self.chunks += 1
+            self._emit(EVENT_UPLOAD_CHUNK, chunks=self.chunks, status=response.status)
+
+    def _on_navigated(self, frame: Frame):
+        if frame is not self.page.main_frame:
+            return
+        if self._publish_regex and self._publish_regex.match(frame.url):
+            self._events[EVENT_PUBLISHED].set()
+            self._emit(EVENT_PUBLISH_REDIRECT, url=frame.url)
+
+    def _emit(self, kind: str, **detail):
+        event = ProgressEvent(platform=self.platform, kind=kind, percent=self.percent,
+                              elapsed=time.time() - self.started_at, detail=detail)
+        if self.logger is not None and kind != EVENT_UPLOAD_CHUNK:
+            self.logger.info(f"  [-] {kind}" + (f" {self.percent:.0f}%" if kind == EVENT_PROGRESS else ""))
+        if self.callback is None:
+            return
+        try:
+            result = self.callback(event)
+            if inspect.isawaitable(result):
+                task = asyncio.ensure_future(result)
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+        except Exception as e:
+            if self.logger is not None:
+                self.logger.warning(f"  [-] progress callback error: {e}")
+
+    # ------------------------------------------------------------------
+    # 等待
+    # ------------------------------------------------------------------
+    async def _wait_any(self, kinds: List[str], timeout: float) -> Optional[str]:
+        """等待任一事件，返回事件类型，超时返回 None"""
+        for kind in kinds:
+            if self._events[kind].is_set():
+                return kind
+        waiters = {asyncio.ensure_future(self._events[k].wait()): k for k in kinds}
+        try:
+            done, _ = await asyncio.wait(waiters.keys(), timeout=max(0.0, timeout),
+                                         return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for waiter in waiters:
+                waiter.cancel()
+        for kind in kinds:
+            if self._events[kind].is_set():
+                return kind
+        return None
+
+    async def wait_for_upload(self, timeout: float = DEFAULT_UPLOAD_TIMEOUT,
+                              on_failed: Optional[Callable[[], Awaitable[Any]]] = None,
+                              failure_grace: float = 2.0) -> bool:
+        """等待视频上传完成
+
+        Args:
+            timeout: 总超时时间（秒）
+            on_failed: 检测到上传失败时调用的重试函数，未提供时直接返回 False
+            failure_grace: 开始或重试后忽略失败信号的时间，避免页面尚未刷新时误判
+
+        Raises:
+            UploadTimeoutError: 超时仍未完成
+        """
+        deadline = time.time() + timeout
+        armed_at = time.time()
+        # 丢弃开始等待前的旧信号，由页面按当前 DOM 状态重新上报
+        if self.rules.dom_rules():
+            self._events[EVENT_UPLOAD_COMPLETE].clear()
+            self._events[EVENT_UPLOAD_FAILED].clear()
+            await self.recheck()
+        while True:
+            kind = await self._wait_any([EVENT_UPLOAD_COMPLETE, EVENT_UPLOAD_FAILED], deadline - time.time())
+            if kind == EVENT_UPLOAD_COMPLETE:
+                return True
+            if kind is None:
+                self._emit(EVENT_TIMEOUT, stage="upload")
+                raise UploadTimeoutError(f"{self.platform} 视频上传超时（{timeout:.0f}s）")
+
+            self._events[EVENT_UPLOAD_FAILED].clear()
+            grace_left = armed_at + failure_grace - time.time()
+            if grace_left > 0:
+                # 失败信号出现得太早，等待页面稳定后重新评估
+                await asyncio.sleep(grace_left)
+                await self.recheck()
+                continue
+            if on_failed is None:
+                return False
+            self._emit(EVENT_UPLOAD_RETRY)
+            self._events[EVENT_UPLOAD_COMPLETE].clear()
+            await on_failed()
+            armed_at = time.time()
+            await self.recheck()
+
+    async def wait_for_publish(self, click: Optional[Callable[[], Awaitable[Any]]] = None,
+                               timeout: float = DEFAULT_PUBLISH_TIMEOUT,
+                               retry_interval: float = 3.0) -> bool:
+        """点击发布并等待跳转或发布成功标记
+
+        Args:
+            click: 触发发布的函数，未成功时每隔 retry_interval 重新调用
+            timeout: 总超时时间（秒）
+
+        Raises:
+            UploadTimeoutError: 超时仍未发布成功
+        """
+        deadline = time.time() + timeout
+        while True:
+            if self._publish_regex and self._publish_regex.match(self.page.url):
+                self._events[EVENT_PUBLISHED].set()
+            if self._events[EVENT_PUBLISHED].is_set():
+                return True
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                self._emit(EVENT_TIMEOUT, stage="publish")
+                raise UploadTimeoutError(f"{self.platform} 视频发布超时（{timeout:.0f}s）")
+            if click is not None:
+                try:
+                    await click()
+                except Exception as e:
+                    if self.logger is not None:
+                        self.logger.info(f"  [-] 发布按钮点击失败，稍后重试: {e}")
+            if await self._wait_any([EVENT_PUBLISHED], min(retry_interval, remaining)):
+                return True
@@ -0,0 +1,406 @@
+# -*- coding: utf-8 -*-
+"""
+统一请求限流
+每个键只保存常数大小的状态：滑动窗口计数（上一窗口计数 + 当前窗口计数，按时间加权估算）
+或令牌桶（剩余令牌 + 上次补充时间）。默认使用进程内分片内存存储；配置 Redis 后
+多进程/多实例共享同一份计数（Lua 脚本原子执行），Redis 不可用时回退到本地存储。
+规则可按路由前缀与用户单独配置
+"""
+import math
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+SLIDING_WINDOW = "sliding_window"
+TOKEN_BUCKET = "token_bucket"
+
+_UNITS = {"s": 1, "sec": 1, "m": 60, "min": 60, "h": 3600, "hour": 3600, "d": 86400, "day": 86400}
+
+
+@dataclass(frozen=True)
+class RateLimitRule:
+    """限流规则：window 秒内最多 limit 次；令牌桶的 burst 为桶容量（默认等于 limit）"""
+    limit: int
+    window: float
+    algorithm: str = SLIDING_WINDOW
+    burst: Optional[int] = None
+
+    @property
+    def capacity(self) -> float:
+        return float(self.burst or self.limit)
+
+    @property
+    def rate(self) -> float:
+        return self.limit / self.window
+
+    def __str__(self):
+        spec = f"{self.limit}/{self.window:g}"
+        if self.algorithm != SLIDING_WINDOW:
+            spec += f":{self.algorithm}"
+        if self.burst:
+            spec += f":{self.burst}"
+        return spec
+
+
+@dataclass
+class RateLimitResult:
+    """一次限流判定的结果"""
+    allowed: bool
+    limit: int
+    remaining: int
+    retry_after: float = 0.0
+
+    def headers(self) -> Dict[str, str]:
+        headers = {
+            "X-RateLimit-Limit": str(self.limit),
+            "X-RateLimit-Remaining": str(max(0, self.remaining)),
+        }
+        if not self.allowed:
+            headers["Retry-After"] = str(max(1, math.ceil(self.retry_after)))
+        return headers
+
+
+def parse_rule(spec: str) -> RateLimitRule:
+    """解析形如 "100/60"、"10/s"、"30/min:token_bucket"、"30/60:token_bucket:60" 的规则"""
+    parts = spec.strip().split(":")
+    limit, _, period = parts[0].partition("/")
+    period = period.strip().lower() or "60"
+    window = float(_UNITS[period]) if period in _UNITS else float(period)
+    algorithm = parts[1].strip() if len(parts) > 1 and parts[1].strip() else SLIDING_WINDOW
+    if algorithm not in (SLIDING_WINDOW, TOKEN_BUCKET):
+        raise ValueError(f"Unknown rate limit algorithm: {algorithm}")
+    burst = int(parts[2]) if len(parts) > 2 and parts[2].strip() else None
+    if int(limit) <= 0 or window <= 0:
+        raise ValueError(f"Invalid rate limit rule: {spec}")
+    return RateLimitRule(int(limit), window, algorithm, burst)
+
+
+def _parse_rules(raw: str) -> Dict[str, RateLimitRule]:
+    """解析形如 "/api/auth/login=10/60,/api/ai=30/60:token_bucket" 的规则表"""
+    rules = {}
+    for item in (raw or "").split(","):
+        if "=" not in item:
+            continue
+        name, spec = item.split("=", 1)
+        try:
+            rules[name.strip()] = parse_rule(spec)
+        except (KeyError, ValueError):
+            continue
+    return rules
+
+
+def _sliding_window(state: Optional[list], rule: RateLimitRule, now: float,
+                    cost: int) -> Tuple[bool, int, float, list]:
+    """滑动窗口计数：估算值 = 上一窗口计数 × 上一窗口仍在滑动窗口内的比例 + 当前窗口计数"""
+    index = int(now // rule.window)
+    if state is None or state[0] < index - 1:
+        previous, current = 0, 0
+    elif state[0] == index - 1:
+        previous, current = state[2], 0
+    else:
+        previous, current = state[1], state[2]
+    elapsed = now - index * rule.window
+    estimated = previous * (1 - elapsed / rule.window) + current
+    if estimated + cost <= rule.limit:
+        current += cost
+        return True, int(rule.limit - estimated - cost), 0.0, [index, previous, current]
+
+    # 上一窗口的权重随时间线性衰减，当前窗口结束后整体滚动
+    until_rollover = rule.window - elapsed
+    excess = estimated + cost - rule.limit
+    retry_after = min(until_rollover, excess * rule.window / previous) if previous else until_rollover
+    return False, max(0, int(rule.limit - estimated)), retry_after, [index, previous, current]
+
+
+def _token_bucket(state: Optional[list], rule: RateLimitRule, now: float,
+                  cost: int) -> Tuple[bool, int, float, list]:
+    """令牌桶：按 limit/window 的速率补充令牌，最多积攒 capacity 个"""
+    tokens, updated = (rule.capacity, now) if state is None else state
+    tokens = min(rule.capacity, tokens + max(0.0, now - updated) * rule.rate)
+    if tokens >= cost:
+        tokens -= cost
+        return True, int(tokens), 0.0, [tokens, now]
+    return False, int(tokens), (cost - tokens) / rule.rate, [tokens, now]
+
+
+_ALGORITHMS = {SLIDING_WINDOW: _sliding_window, TOKEN_BUCKET: _token_bucket}
+
+
+def _state_ttl(rule: RateLimitRule) -> float:
+    """状态保留时间：超过后状态与初始状态等价，可以丢弃"""
+    if rule.algorithm == TOKEN_BUCKET:
+        return rule.capacity / rule.rate + 1
+    return rule.window * 2
+
+
+class MemoryRateLimitStore:
+    """进程内限流状态存储：分片加锁，空闲状态定期清理，总键数有上限"""
+
+    name = "memory"
+
+    def __init__(self, shards: int = 16, max_keys: int = 100000, sweep_interval: int = 1024):
+        self._shards = [({}, threading.Lock()) for _ in range(max(1, shards))]
+        self.max_keys_per_shard = max(1, max_keys // len(self._shards))
+        self.sweep_interval = sweep_interval
+        self._ops = [0] * len(self._shards)
+
+    def apply(self, key: str, rule: RateLimitRule, cost: int = 1,
+              peek: bool = False) -> Tuple[bool, int, float]:
+        index = hash(key) % len(self._shards)
+        entries, lock = self._shards[index]
+        now = time.monotonic()
+        with lock:
+            entry = entries.get(key)
+            state = entry[0] if entry is not None and entry[1] > now else None
+            allowed, remaining, retry_after, new_state = _ALGORITHMS[rule.algorithm](state, rule, now, cost)
+            if peek:
+                return allowed, remaining, retry_after
+            entries.pop(key, None)
+            entries[key] = (new_state, now + _state_ttl(rule))
+            self._ops[index] += 1
+            if self._ops[index] >= self.sweep_interval or len(entries) > self.max_keys_per_shard:
+                self._ops[index] = 0
+                self._sweep(entries, now)
+        return allowed, remaining, retry_after
+
+    def _sweep(self, entries: dict, now: float):
+        for key in [key for key, (_, expires_at) in entries.items() if expires_at <= now]:
+            del entries[key]
+        # 仍超过上限时丢弃最久未更新的键（dict 按写入顺序排列）
+        while len(entries) > self.max_keys_per_shard:
+            del entries[next(iter(entries))]
+
+    def reset(self, key: Optional[str] = None):
+        for entries, lock in self._shards:
+            with lock:
+                if key is None:
+                    entries.clear()
+                else:
+                    entries.pop(key, None)
+
+    def __len__(self):
+        return sum(len(entries) for entries, _ in self._shards)
+
+
+class RedisRateLimitStore:
+    """Redis 限流状态存储，多个进程/实例共享计数；算法与内存存储一致，以 Lua 脚本原子执行"""
+
+    name = "redis"
+
+    _SLIDING_WINDOW_SCRIPT = """
+        local now, window, limit = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+        local cost, peek = tonumber(ARGV[4]), ARGV[5] == '1'
+        local index = math.floor(now / window)
+        local state = redis.call('HMGET', KEYS[1], 'index', 'previous', 'current')
+        local last = tonumber(state[1])
+        local previous, current = 0, 0
+        if last == index - 1 then
+            previous = tonumber(state[3]) or 0
+        elseif last == index then
+            previous, current = tonumber(state[2]) or 0, tonumber(state[3]) or 0
+        end
+        local elapsed = now - index * window
+        local estimated = previous * (1 - elapsed / window) + current
+        if estimated + cost <= limit then
+            if not peek then
+                redis.call('HSET', KEYS[1], 'index', index, 'previous', previous, 'current', current + cost)
+                redis.call('PEXPIRE', KEYS[1], math.ceil(window * 2000))
+            end
+            return {1, tostring(limit - estimated - cost), '0'}
+        end
+        local retry_after = window - elapsed
+        if previous > 0 then
+            retry_after = math.min(retry_after, (estimated + cost - limit) * window / previous)
+        end
+        return {0, tostring(limit - estimated), tostring(retry_after)}
+    """
+
+    _TOKEN_BUCKET_SCRIPT = """
+        local now, rate, capacity = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+        local cost, peek = tonumber(ARGV[4]), ARGV[5] == '1'
+        local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+        local tokens = tonumber(state[1]) or capacity
+        local updated = tonumber(state[2]) or now
+        tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+        local allowed, retry_after = 0, 0
+        if tokens >= cost then
+            allowed, tokens = 1, tokens - cost
+        else
+            retry_after = (cost - tokens) / rate
+        end
+        if not peek then
+            redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+            redis.call('PEXPIRE', KEYS[1], math.ceil((capacity / rate + 1) * 1000))
+        end
+        return {allowed, tostring(tokens), tostring(retry_after)}
+    """
+
+    def __init__(self, url: str = "redis://localhost:6379/0", key_prefix: str = "sau:ratelimit:", client=None):
+        if client is None:
+            import redis
+
+            client = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5,
+                                          health_check_interval=30)
+        self.client = client
+        self.key_prefix = key_prefix
+        self._scripts = {
+            SLIDING_WINDOW: client.register_script(self._SLIDING_WINDOW_SCRIPT),
+            TOKEN_BUCKET: client.register_script(self._TOKEN_BUCKET_SCRIPT),
+        }
+
+    def apply(self, key: str, rule: RateLimitRule, cost: int = 1,
+              peek: bool = False) -> Tuple[bool, int, float]:
+        # 多实例共享状态，使用墙上时间
+        if rule.algorithm == TOKEN_BUCKET:
+            args = [time.time(), rule.rate, rule.capacity, cost, int(peek)]
+        else:
+            args = [time.time(), rule.window, rule.limit, cost, int(peek)]
+        allowed, remaining, retry_after = self._scripts[rule.algorithm](
+            keys=[f"{self.key_prefix}{key}"], args=args
+        )
+        return bool(int(allowed)), max(0, int(float(remaining))), float(retry_after)
+
+    def reset(self, key: Optional[str] = None):
+        if key is not None:
+            self.client.delete(f"{self.key_prefix}{key}")
+            return
+        batch = []
+        for name in self.client.scan_iter(match=f"{self.key_prefix}*", count=500):
+            batch.append(name)
+            if len(batch) >= 500:
+                self.client.delete(*batch)
+                batch = []
+        if batch:
+            self.client.delete(*batch)
+
+    def __len__(self):
+        return sum(1 for _ in self.client.scan_iter(match=f"{self.key_prefix}*", count=500))
+
+
+class RateLimiter:
+    """限流器
+
+    - 按 IP：路由前缀规则（最长前缀匹配）优先，否则使用默认规则，每条规则独立计数
+    - 按用户：认证后按用户单独规则（或全部用户的默认规则）计数
+    - 任意键：hit()/peek() 供业务代码自行限流
+    """
+
+    def __init__(self, default_rule: Optional[RateLimitRule] = None, store=None,
+                 route_rules: Optional[Dict[str, RateLimitRule]] = None,
+                 user_rules: Optional[Dict[str, RateLimitRule]] = None,
+                 user_default_rule: Optional[RateLimitRule] = None,
+                 enabled: bool = True):
+        self.default_rule = default_rule or RateLimitRule(100, 60)
+        self.store = store or MemoryRateLimitStore()
+        self._fallback = self.store if isinstance(self.store, MemoryRateLimitStore) else MemoryRateLimitStore()
+        self._route_rules: List[Tuple[str, RateLimitRule]] = []
+        for prefix, rule in (route_rules or {}).items():
+            self.add_route_rule(prefix, rule)
+        self._user_rules: Dict[str, RateLimitRule] = dict(user_rules or {})
+        self.user_default_rule = user_default_rule
+        self.enabled = enabled
+        self._stats = {"allowed": 0, "denied": 0, "backend_errors": 0}
+
+    @classmethod
+    def from_env(cls) -> "RateLimiter":
+        """按环境变量创建：SAU_RATE_LIMIT_DEFAULT / _ROUTES / _USERS / _USER_DEFAULT / _REDIS_URL / _ENABLED"""
+        store = None
+        redis_url = os.getenv("SAU_RATE_LIMIT_REDIS_URL", "")
+        if redis_url:
+            try:
+                store = RedisRateLimitStore(redis_url)
+            except ImportError:
+                store = None
+        user_default = os.getenv("SAU_RATE_LIMIT_USER_DEFAULT", "")
+        return cls(
+            default_rule=parse_rule(os.getenv("SAU_RATE_LIMIT_DEFAULT", "100/60")),
+            store=store,
+            route_rules=_parse_rules(os.getenv("SAU_RATE_LIMIT_ROUTES", "")),
+            user_rules=_parse_rules(os.getenv("SAU_RATE_LIMIT_USERS", "")),
+            user_default_rule=parse_rule(user_default) if user_default else None,
+            enabled=os.getenv("SAU_RATE_LIMIT_ENABLED", "1").lower() not in ("0", "false", "no"),
+        )
+
+    def add_route_rule(self, prefix: str, rule: RateLimitRule):
+        """为路由前缀设置规则，匹配时取最长前缀"""
+        self._route_rules = [(p, r) for p, r in self._route_rules if p != prefix]
+        self._route_rules.append((prefix, rule))
+        self._route_rules.sort(key=lambda item: len(item[0]), reverse=True)
+
+    def set_user_rule(self, user_id: Any, rule: Optional[RateLimitRule]):
+        """为单个用户设置规则，rule 为 None 时恢复默认"""
+        if rule is None:
+            self._user_rules.pop(str(user_id), None)
+        else:
+            self._user_rules[str(user_id)] = rule
+
+    def route_rule(self, path: str) -> Tuple[str, RateLimitRule]:
+        """返回匹配的路由前缀（未匹配时为 "*"）与规则"""
+        for prefix, rule in self._route_rules:
+            if path.startswith(prefix):
+                return prefix, rule
+        return "*", self.default_rule
+
+    def _apply(self, key: str, rule: RateLimitRule, cost: int, peek: bool) -> RateLimitResult:
+        try:
+            allowed, remaining, retry_after = self.store.apply(key, rule, cost, peek)
+        except Exception:
+            # 共享存储不可用时退化为进程内限流，不阻断请求
+            self._stats["backend_errors"] += 1
+            allowed, remaining, retry_after = self._fallback.apply(key, rule, cost, peek)
+        if not peek:
+            self._stats["allowed" if allowed else "denied"] += 1
+        return RateLimitResult(allowed, rule.limit, remaining, retry_after)
+
+    def hit(self, key: str, rule: RateLimitRule, cost: int = 1) -> RateLimitResult:
+        """消耗一次配额并返回判定结果"""
+        if not self.enabled:
+            return RateLimitResult(True, rule.limit, rule.limit)
+        return self._apply(key, rule, cost, peek=False)
+
+    def peek(self, key: str, rule: RateLimitRule, cost: int = 1) -> RateLimitResult:
+        """只判定不消耗配额"""
+        if not self.enabled:
+            return RateLimitResult(True, rule.limit, rule.limit)
+        return self._apply(key, rule, cost, peek=True)
+
+    def check_ip(self, path: str, ip: str) -> RateLimitResult:
+        """按客户端 IP 与路由规则限流"""
+        prefix, rule = self.route_rule(path)
+        return self.hit(f"ip:{ip}:{prefix}", rule)
+
+    def check_user(self, path: str, user_id: Any) -> Optional[RateLimitResult]:
+        """按用户限流，该用户没有适用规则时返回 None"""
+        rule = self._user_rules.get(str(user_id), self.user_default_rule)
+        if rule is None:
+            return None
+        return self.hit(f"user:{user_id}", rule)
+
+    def reset(self, key: Optional[str] = None):
+        """清除某个键（或全部）的限流状态"""
+        self.store.reset(key)
+        if self._fallback is not self.store:
+            self._fallback.reset(key)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取限流统计信息"""
+        try:
+            keys = len(self.store)
+        except Exception:
+            keys = None
+        return {
+            **self._stats,
+            "enabled": self.enabled,
+            "backend": self.store.name,
+            "keys": keys,
+            "default_rule": str(self.default_rule),
+            "route_rules": {prefix: str(rule) for prefix, rule in self._route_rules},
+            "user_rules": len(self._user_rules),
+            "user_default_rule": str(self.user_default_rule) if self.user_default_rule else None,
+        }
+
+
+# 全局限流器实例
+rate_limiter = RateLimiter.from_env()
@@ -0,0 +1,297 @@
+# -*- coding: utf-8 -*-
+"""
+SQLite 连接池
+每个线程复用同一个已调优的连接（WAL、synchronous=NORMAL、mmap、页缓存、语句缓存、busy_timeout），
+调用方拿到的是一次租用（ConnectionLease），close() 只是归还而不真正关闭，推荐使用 session()。
+SQLite 同一时刻只允许一个写事务：进程内的写语句先排队获取该数据库的写锁，
+提交/回滚后释放，避免多个线程同时升级写锁触发 "database is locked"。
+调用方异常退出而未归还的租用在被回收时回滚遗留事务并释放写锁，不会一直占住数据库
+"""
+import os
+import re
+import sqlite3
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional, Union
+
+# 主数据库（相对路径按当前工作目录解析，与 DatabaseManager 的默认值一致）
+DEFAULT_DB_PATH = os.getenv("SAU_DB_PATH", "db/database.db")
+# 等待数据库锁的最长时间（秒）
+BUSY_TIMEOUT = float(os.getenv("SAU_DB_BUSY_TIMEOUT", 30))
+# mmap 大小（字节）与页缓存大小（KB）
+MMAP_SIZE = int(os.getenv("SAU_DB_MMAP_SIZE", 256 * 1024 * 1024))
+CACHE_SIZE_KB = int(os.getenv("SAU_DB_CACHE_SIZE_KB", 16 * 1024))
+# 每个连接缓存的预编译语句数量
+CACHED_STATEMENTS = int(os.getenv("SAU_DB_CACHED_STATEMENTS", 256))
+
+_WRITE_STATEMENT = re.compile(r"^\s*(INSERT|UPDATE|DELETE|REPLACE|CREATE|DROP|ALTER|BEGIN)\b", re.IGNORECASE)
+
+
+class PooledCursor(sqlite3.Cursor):
+    """写语句执行前先获取写锁的游标"""
+
+    def execute(self, sql, parameters=()):
+        self.connection._before_statement(sql)
+        return super().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        self.connection._before_statement(sql)
+        return super().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        self.connection._before_statement(sql_script, write=True)
+        return super().executescript(sql_script)
+
+
+class PooledConnection(sqlite3.Connection):
+    """池化连接：close() 归还给连接池，commit()/rollback() 释放写锁"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pool: Optional["SQLitePool"] = None
+        self._leases = 0
+        self._holds_write_lock = False
+        self._thread_id = threading.get_ident()
+
+    def _before_statement(self, sql: str, write: bool = False):
+        if self.pool is not None and not self._holds_write_lock and (write or _WRITE_STATEMENT.match(sql)):
+            self._holds_write_lock = self.pool._acquire_write_lock(self)
+
+    def _release_write_lock(self):
+        if self._holds_write_lock:
+            self._holds_write_lock = False
+            self.pool._release_write_lock()
+
+    def cursor(self, factory=PooledCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self.cursor().executescript(sql_script)
+
+    def commit(self):
+        try:
+            super().commit()
+        finally:
+            if not self.in_transaction:
+                self._release_write_lock()
+
+    def rollback(self):
+        try:
+            super().rollback()
+        finally:
+            self._release_write_lock()
+
+    def close(self):
+        """归还连接；最后一个租用归还时未提交的事务会被回滚"""
+        if self.pool is None:
+            super().close()
+            return
+        self._leases = max(0, self._leases - 1)
+        if self._leases == 0:
+            self._reset()
+
+    def _reset(self) -> bool:
+        """回滚遗留事务并释放写锁，返回是否有需要清理的状态"""
+        dirty = self.in_transaction or self._holds_write_lock
+        try:
+            if self.in_transaction:
+                super().rollback()
+        finally:
+            self._release_write_lock()
+        return dirty
+
+    def _abandon(self):
+        """租用未归还就被回收：计数照常归还，能在所属线程清理时立即清理，否则留给下次租用"""
+        self._leases = max(0, self._leases - 1)
+        if self._leases == 0 and self.pool is not None and threading.get_ident() == self._thread_id:
+            try:
+                if self._reset():
+                    self.pool._stats["abandoned"] += 1
+            except sqlite3.Error:
+                pass
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        result = super().__exit__(exc_type, exc_value, traceback)
+        if not self.in_transaction:
+            self._release_write_lock()
+        return result
+
+
+class ConnectionLease:
+    """一次连接租用，其余属性与方法转发给池化连接。
+    close() 或 with 块结束后归还；调用方抛出异常未能归还时，租用对象被回收即视为归还"""
+
+    __slots__ = ("_conn", "_returned")
+
+    def __init__(self, conn: PooledConnection):
+        object.__setattr__(self, "_conn", conn)
+        object.__setattr__(self, "_returned", False)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._conn, name, value)
+
+    def __enter__(self):
+        self._conn.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return self._conn.__exit__(exc_type, exc_value, traceback)
+
+    def close(self):
+        if not self._returned:
+            object.__setattr__(self, "_returned", True)
+            self._conn.close()
+
+    def __del__(self):
+        if not self._returned:
+            object.__setattr__(self, "_returned", True)
+            self._conn._abandon()
+
+
+class SQLitePool:
+    """单个数据库文件的连接池（每线程一个连接）"""
+
+    def __init__(self, path: Union[str, Path] = DEFAULT_DB_PATH, busy_timeout: float = BUSY_TIMEOUT,
+                 mmap_size: int = MMAP_SIZE, cache_size_kb: int = CACHE_SIZE_KB,
+                 cached_statements: int = CACHED_STATEMENTS):
+        self.path = Path(path).resolve()
+        self.busy_timeout = busy_timeout
+        self.mmap_size = mmap_size
+        self.cache_size_kb = cache_size_kb
+        self.cached_statements = cached_statements
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self._write_owner: Optional[weakref.ref] = None
+        self._connections = weakref.WeakSet()
+        self._registry_lock = threading.Lock()
+        self._wal_enabled = False
+        self._stats = {"created": 0, "leases": 0, "writes": 0, "write_waits": 0,
+                       "write_wait_time": 0.0, "write_lock_timeouts": 0, "abandoned": 0}
+
+    def _create(self) -> PooledConnection:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=self.busy_timeout, factory=PooledConnection,
+                               cached_statements=self.cached_statements)
+        if not self._wal_enabled:
+            # journal_mode 持久化在数据库文件中，只需设置一次
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._wal_enabled = True
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA mmap_size={int(self.mmap_size)}")
+        conn.execute(f"PRAGMA cache_size=-{int(self.cache_size_kb)}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.pool = self
+        with self._registry_lock:
+            self._connections.add(conn)
+            self._stats["created"] += 1
+        return conn
+
+    def connection(self, row_factory=None) -> ConnectionLease:
+        """租用当前线程的连接，用完调用 close() 归还"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._create()
+        if conn._leases == 0:
+            # 上一个租用被其他线程回收时留下的事务与写锁在这里清理
+            if conn._reset():
+                self._stats["abandoned"] += 1
+            conn.row_factory = row_factory
+        conn._leases += 1
+        self._stats["leases"] += 1
+        return ConnectionLease(conn)
+
+    @contextmanager
+    def session(self, row_factory=None) -> Iterator[ConnectionLease]:
+        """with 块结束时提交（异常时回滚）并归还连接"""
+        conn = self.connection(row_factory)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _acquire_write_lock(self, conn: PooledConnection) -> bool:
+        self._stats["writes"] += 1
+        acquired = self._write_lock.acquire(blocking=False)
+        if not acquired:
+            started = time.perf_counter()
+            acquired = self._write_lock.acquire(timeout=self.busy_timeout)
+            self._stats["write_waits"] += 1
+            self._stats["write_wait_time"] += time.perf_counter() - started
+        if not acquired:
+            # 持锁线程迟迟不提交时不再排队，交给 SQLite 自身的 busy 处理
+            self._stats["write_lock_timeouts"] += 1
+            return False
+        # 持锁连接随线程退出被回收时自动释放写锁
+        self._write_owner = weakref.ref(conn, self._owner_lost)
+        return True
+
+    def _owner_lost(self, ref: weakref.ref):
+        if self._write_owner is ref:
+            self._write_owner = None
+            self._write_lock.release()
+
+    def _release_write_lock(self):
+        self._write_owner = None
+        self._write_lock.release()
+
+    def close_all(self):
+        """关闭所有线程的连接（进程退出或测试时使用）"""
+        with self._registry_lock:
+            connections = list(self._connections)
+            self._connections = weakref.WeakSet()
+        for conn in connections:
+            conn.pool = None
+            try:
+                sqlite3.Connection.close(conn)
+            except sqlite3.ProgrammingError:
+                # 其他线程创建的连接只能在所属线程关闭，交给垃圾回收
+                pass
+        self._local = threading.local()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取连接池统计信息"""
+        return {
+            **self._stats,
+            "path": str(self.path),
+            "connections": len(self._connections),
+            "write_wait_time": round(self._stats["write_wait_time"], 4),
+        }
+
+
+_pools: Dict[Path, SQLitePool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(path: Union[str, Path] = DEFAULT_DB_PATH) -> SQLitePool:
+    """按数据库文件获取（或创建）连接池，同一文件共用一个池"""
+    resolved = Path(path).resolve()
+    pool = _pools.get(resolved)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(resolved)
+            if pool is None:
+                pool = _pools[resolved] = SQLitePool(resolved)
+    return pool
+
+
+def connect(path: Union[str, Path] = DEFAULT_DB_PATH) -> ConnectionLease:
+    """sqlite3.connect 的池化替代，用完调用 close() 归还"""
+    return get_pool(path).connection()
+
+
+def get_pool_stats() -> Dict[str, Dict[str, Any]]:
+    """所有连接池的统计信息"""
+    return {str(path): pool.get_stats() for path, pool in list(_pools.items())}
@@ -0,0 +1,299 @@
+# -*- coding: utf-8 -*-
+"""
+系统指标采样器
+后台线程按秒采样，CPU 使用 psutil 的非阻塞增量（cpu_percent(interval=None)），
+网络按计数器差值换算速率，同时读取后端进程及其 Chromium、FFmpeg 子进程的 CPU 与内存。
+子进程列表每次采样都刷新，短命的 FFmpeg 任务也能计入；磁盘与连接数等较贵的数据按更长的周期刷新。
+样本写入定长的列式环形缓冲区（array），均值、分位数直接在列上计算，不保存对象列表
+"""
+import array
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import psutil
+
+# 采样间隔（秒）
+SAMPLE_INTERVAL = float(os.getenv("SAU_SAMPLER_INTERVAL", 1.0))
+# 环形缓冲区容量（样本数），默认按秒保留一小时
+SAMPLE_CAPACITY = int(os.getenv("SAU_SAMPLER_CAPACITY", 3600))
+# 磁盘使用率、连接数的刷新周期（秒）
+SLOW_INTERVAL = float(os.getenv("SAU_SAMPLER_SLOW_INTERVAL", 15.0))
+
+# 子进程分组：按进程名匹配
+PROCESS_GROUPS = {
+    "chromium": ("chrome", "chromium", "headless_shell"),
+    "ffmpeg": ("ffmpeg", "ffprobe"),
+}
+
+FIELDS = (
+    "timestamp",
+    "cpu_percent", "memory_percent", "disk_percent",
+    "net_sent_rate", "net_recv_rate", "connections",
+    "backend_cpu", "backend_rss",
+    "chromium_cpu", "chromium_rss", "chromium_count",
+    "ffmpeg_cpu", "ffmpeg_rss", "ffmpeg_count",
+)
+
+
+def _percentile(ordered: List[float], q: float) -> float:
+    """已排序序列的分位数（线性插值）"""
+    if len(ordered) == 1:
+        return ordered[0]
+    position = (len(ordered) - 1) * q
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+class RingBuffer:
+    """定长列式环形缓冲区，每个字段一段连续的 double 数组"""
+
+    def __init__(self, fields=FIELDS, capacity: int = SAMPLE_CAPACITY):
+        self.fields = tuple(fields)
+        self.capacity = max(1, capacity)
+        self._columns = {field: array.array("d", bytes(8 * self.capacity)) for field in self.fields}
+        self._head = 0
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._size
+
+    def append(self, sample: Dict[str, float]):
+        with self._lock:
+            for field in self.fields:
+                self._columns[field][self._head] = sample.get(field, 0.0)
+            self._head = (self._head + 1) % self.capacity
+            self._size = min(self._size + 1, self.capacity)
+
+    def _ordered(self, column: array.array) -> array.array:
+        if self._size < self.capacity:
+            return column[:self._size]
+        return column[self._head:] + column[:self._head]
+
+    def latest(self) -> Optional[Dict[str, float]]:
+        with self._lock:
+            if not self._size:
+                return None
+            index = (self._head - 1) % self.capacity
+            return {field: self._columns[field][index] for field in self.fields}
+
+    def window(self, field: str, seconds: Optional[float] = None) -> array.array:
+        """最近 seconds 秒（不指定时为全部）某字段的样本，时间升序"""
+        with self._lock:
+            values = self._ordered(self._columns[field])
+            if seconds is None or not self._size:
+                return values
+            timestamps = self._ordered(self._columns["timestamp"])
+        cutoff = timestamps[-1] - seconds
+        # 时间戳单调递增，二分查找起点
+        low, high = 0, len(timestamps)
+        while low < high:
+            middle = (low + high) // 2
+            if timestamps[middle] < cutoff:
+                low = middle + 1
+            else:
+                high = middle
+        return values[low:]
+
+    def stats(self, field: str, seconds: Optional[float] = None) -> Dict[str, float]:
+        """某字段的均值、最值与 p50/p95/p99"""
+        values = self.window(field, seconds)
+        if not values:
+            return {"mean": 0.0, "min": 0.0, "max": 0.0, "p50": 0.0, "p95": 0.0, "p99": 0.0, "samples": 0}
+        ordered = sorted(values)
+        return {
+            "mean": sum(values) / len(values),
+            "min": ordered[0],
+            "max": ordered[-1],
+            "p50": _percentile(ordered, 0.50),
+            "p95": _percentile(ordered, 0.95),
+            "p99": _percentile(ordered, 0.99),
+            "samples": len(values),
+        }
+
+
+class SystemSampler:
+    """后台系统指标采样器"""
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL, capacity: int = SAMPLE_CAPACITY,
+                 slow_interval: float = SLOW_INTERVAL, disk_path: str = "/"):
+        self.interval = interval
+        self.slow_interval = slow_interval
+        self.disk_path = disk_path
+        self.buffer = RingBuffer(FIELDS, capacity)
+        self._process = psutil.Process()
+        self._children: Dict[int, psutil.Process] = {}
+        self._slow: Dict[str, float] = {"disk_percent": 0.0, "connections": 0.0}
+        self._last_slow = 0.0
+        self._last_net = None
+        self._last_net_time = 0.0
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._sample_count = 0
+        self._sample_cost = 0.0
+        # 建立 CPU 增量基线，此后每次读取得到的是与上次读取之间的使用率
+        psutil.cpu_percent(interval=None)
+        self._process.cpu_percent(interval=None)
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="sau-system-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        next_tick = time.monotonic()
+        while not self._stop.is_set():
+            try:
+                self.sample()
+            except Exception:
+                # 采样失败不影响下一轮
+                pass
+            next_tick += self.interval
+            delay = next_tick - time.monotonic()
+            if delay < 0:
+                # 落后时跳过错过的周期，不连续补采
+                next_tick = time.monotonic()
+                delay = 0
+            self._stop.wait(delay)
+
+    def _refresh_children(self):
+        """刷新子进程列表，新进程建立 CPU 增量基线"""
+        try:
+            children = {child.pid: child for child in self._process.children(recursive=True)}
+        except psutil.Error:
+            children = {}
+        for pid, child in children.items():
+            if pid not in self._children:
+                try:
+                    child.cpu_percent(interval=None)
+                except psutil.Error:
+                    continue
+                self._children[pid] = child
+        for pid in list(self._children):
+            if pid not in children:
+                del self._children[pid]
+
+    def _refresh_slow(self, now: float):
+        """刷新磁盘使用率与连接数"""
+        self._last_slow = now
+        try:
+            self._slow["disk_percent"] = psutil.disk_usage(self.disk_path).percent
+        except OSError:
+            pass
+        # 只统计本进程树的连接，避免 psutil.net_connections() 扫描整机
+        connections = 0
+        for process in (self._process, *self._children.values()):
+            try:
+                # psutil 6 起 connections() 更名为 net_connections()
+                list_connections = getattr(process, "net_connections", None) or process.connections
+                connections += len(list_connections(kind="inet"))
+            except psutil.Error:
+                continue
+        self._slow["connections"] = connections
+
+    @staticmethod
+    def _group_of(name: str) -> Optional[str]:
+        name = name.lower()
+        for group, patterns in PROCESS_GROUPS.items():
+            if any(pattern in name for pattern in patterns):
+                return group
+        return None
+
+    def sample(self) -> Dict[str, float]:
+        """采集一个样本并写入缓冲区"""
+        started = time.perf_counter()
+        now = time.time()
+        self._refresh_children()
+        if now - self._last_slow >= self.slow_interval:
+            self._refresh_slow(now)
+
+        sample = {
+            "timestamp": now,
+            "cpu_percent": psutil.cpu_percent(interval=None),
+            "memory_percent": psutil.virtual_memory().percent,
+            **self._slow,
+        }
+
+        network = psutil.net_io_counters()
+        if self._last_net is not None and now > self._last_net_time:
+            elapsed = now - self._last_net_time
+            sample["net_sent_rate"] = max(0, network.bytes_sent - self._last_net.bytes_sent) / elapsed
+            sample["net_recv_rate"] = max(0, network.bytes_recv - self._last_net.bytes_recv) / elapsed
+        self._last_net, self._last_net_time = network, now
+
+        with self._process.oneshot():
+            sample["backend_cpu"] = self._process.cpu_percent(interval=None)
+            sample["backend_rss"] = self._process.memory_info().rss
+
+        for pid, child in list(self._children.items()):
+            try:
+                with child.oneshot():
+                    group = self._group_of(child.name())
+                    if group is None:
+                        continue
+                    sample[f"{group}_cpu"] = sample.get(f"{group}_cpu", 0.0) + child.cpu_percent(interval=None)
+                    sample[f"{group}_rss"] = sample.get(f"{group}_rss", 0.0) + child.memory_info().rss
+                    sample[f"{group}_count"] = sample.get(f"{group}_count", 0.0) + 1
+            except psutil.Error:
+                self._children.pop(pid, None)
+
+        self.buffer.append(sample)
+        self._sample_count += 1
+        self._sample_cost += time.perf_counter() - started
+        return sample
+
+    def latest(self) -> Dict[str, float]:
+        """最近一个样本，尚未采样时立即采集一次"""
+        return self.buffer.latest() or self.sample()
+
+    def summary(self, seconds: float = 300) -> Dict[str, Any]:
+        """最近 seconds 秒的统计"""
+        latest = self.buffer.latest() or {}
+        processes = {
+            "backend": {
+                "cpu_percent": self.buffer.stats("backend_cpu", seconds),
+                "rss": self.buffer.stats("backend_rss", seconds),
+            }
+        }
+        for group in PROCESS_GROUPS:
+            processes[group] = {
+                "count": int(latest.get(f"{group}_count", 0)),
+                "cpu_percent": self.buffer.stats(f"{group}_cpu", seconds),
+                "rss": self.buffer.stats(f"{group}_rss", seconds),
+            }
+        return {
+            "window": seconds,
+            "cpu_percent": self.buffer.stats("cpu_percent", seconds),
+            "memory_percent": self.buffer.stats("memory_percent", seconds),
+            "net_sent_rate": self.buffer.stats("net_sent_rate", seconds),
+            "net_recv_rate": self.buffer.stats("net_recv_rate", seconds),
+            "processes": processes,
+        }
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取采样器自身的统计信息"""
+        return {
+            "running": self.running,
+            "interval": self.interval,
+            "samples": self._sample_count,
+            "buffered": len(self.buffer),
+            "capacity": self.buffer.capacity,
+            "tracked_children": len(self._children),
+            "avg_sample_cost": round(self._sample_cost / self._sample_count, 6) if self._sample_count else 0.0,
+        }
+
+
+# 全局系统采样器实例
+system_sampler = SystemSampler()
@@ -2,102 +2,297 @@
 缓存模块 - 提供多层缓存功能
 """
 
+import heapq
 import json
+import math
+import os
 import time
 import threading
-from typing import Any, Optional, Dict, Callable
+from typing import Any, Optional, Dict, Callable, Iterable, List, Set, Tuple
 from functools import wraps
-from collections import defaultdict
+from collections import OrderedDict, defaultdict
 import hashlib
 
-class MemoryCache:
-    """内存缓存"""
+from sauce_backend.cache_backends import CacheBackend, RedisCache, SQLiteCache, TieredCache
 
-    def __init__(self, max_size: int = 1000, default_ttl: int = 3600):
-        self.max_size = max_size
-        self.default_ttl = default_ttl
-        self.cache = {}
-        self.access_times = {}
-        self.lock = threading.RLock()
+class _CacheEntry:
+    """缓存条目"""
 
-    def _get_key(self, key: str) -> str:
-        """生成缓存键"""
-        return hashlib.md5(key.encode('utf-8')).hexdigest()
+    __slots__ = ("value", "expiry", "namespace", "tags")
 
-    def _evict_if_needed(self):
-        """如果需要，清理最久未使用的缓存"""
-        if len(self.cache) >= self.max_size:
-            oldest_key = min(self.access_times.keys(), key=lambda k: self.access_times[k])
-            del self.cache[oldest_key]
-            del self.access_times[oldest_key]
+    def __init__(self, value: Any, expiry: float, namespace: str, tags: Tuple[str, ...]):
+        self.value = value
+        self.expiry = expiry
+        self.namespace = namespace
+        self.tags = tags
 
-    def get(self, key: str) -> Optional[Any]:
-        """获取缓存值"""
-        cache_key = self._get_key(key)
-        with self.lock:
-            if cache_key in self.cache:
-                data, expiry = self.cache[cache_key]
-                if time.time() < expiry:
-                    self.access_times[cache_key] = time.time()
-                    return data
-                else:
-                    # 过期清理
-                    del self.cache[cache_key]
-                    del self.access_times[cache_key]
+
+class _CacheShard:
+    """缓存分片：独立的锁、LRU 顺序、命名空间/标签索引与过期堆"""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.lock = threading.Lock()
+        self.entries: "OrderedDict[str, _CacheEntry]" = OrderedDict()
+        self.namespaces: Dict[str, "OrderedDict[str, None]"] = {}
+        self.tags: Dict[str, Set[str]] = {}
+        self.expiry_heap: List[Tuple[float, str]] = []
+        self.stats: Dict[str, int] = defaultdict(int)
+
+
+class MemoryCache(CacheBackend):
+    """内存缓存
+
+    按键哈希分成多个分片，每个分片用 OrderedDict 维护 LRU 顺序，读写与淘汰均为 O(1)；
+    过期条目在读取时惰性删除，并按 ``sweep_interval`` 周期性地从过期堆中清理。
+    键中第一个 ":" 之前的部分为命名空间（如 ``ai_response``），可分别限制条目数；
+    写入时可附带标签，按标签或前缀失效只访问相关条目。
+    """
+
+    def __init__(self, max_size: int = 1000, default_ttl: int = 3600, shards: int = 8,
+                 namespace_limits: Optional[Dict[str, int]] = None, sweep_interval: float = 60):
+        super().__init__()
+        self.max_size = max_size
+        self.default_ttl = default_ttl
+        self.namespace_limits = dict(namespace_limits or {})
+        self.sweep_interval = sweep_interval
+        shard_count = max(1, min(shards, max_size))
+        capacity = math.ceil(max_size / shard_count)
+        self._shards = [_CacheShard(capacity) for _ in range(shard_count)]
+        self._last_sweep = time.time()
+
+    @staticmethod
+    def _namespace(key: str) -> str:
+        return key.split(":", 1)[0] if ":" in key else ""
+
+    def _shard(self, key: str) -> _CacheShard:
+        return self._shards[hash(key) % len(self._shards)]
+
+    def _namespace_capacity(self, namespace: str) -> Optional[int]:
+        limit = self.namespace_limits.get(namespace)
+        if limit is None:
             return None
+        return max(1, math.ceil(limit / len(self._shards)))
+
+    @staticmethod
+    def _remove(shard: _CacheShard, key: str, reason: Optional[str] = None):
+        """移除条目并维护索引（调用方持有分片锁）"""
+        entry = shard.entries.pop(key)
+        keys = shard.namespaces.get(entry.namespace)
+        if keys is not None:
+            keys.pop(key, None)
+            if not keys:
+                del shard.namespaces[entry.namespace]
+        for tag in entry.tags:
+            tagged = shard.tags.get(tag)
+            if tagged is not None:
+                tagged.discard(key)
+                if not tagged:
+                    del shard.tags[tag]
+        if reason:
+            shard.stats[reason] += 1
 
-    def set(self, key: str, value: Any, ttl: Optional[int] = None) -> bool:
-        """设置缓存值"""
-        cache_key = self._get_key(key)
-        expiry = time.time() + (ttl or self.default_ttl)
-        with self.lock:
-            self._evict_if_needed()
-            self.cache[cache_key] = (value, expiry)
-            self.access_times[cache_key] = time.time()
-            return True
+    def get(self, key: str) -> Optional[Any]:
+        """获取缓存值"""
+        shard = self._shard(key)
+        now = time.time()
+        with shard.lock:
+            entry = shard.entries.get(key)
+            if entry is None:
+                shard.stats["misses"] += 1
+                value = None
+            elif entry.expiry <= now:
+                # 过期清理
+                self._remove(shard, key, "expirations")
+                shard.stats["misses"] += 1
+                value = None
+            else:
+                shard.entries.move_to_end(key)
+                shard.namespaces[entry.namespace].move_to_end(key)
+                shard.stats["hits"] += 1
+                value = entry.value
+        self._maybe_sweep(now)
+        return value
+
+    def set(self, key: str, value: Any, ttl: Optional[int] = None, tags: Optional[Iterable[str]] = None) -> bool:
+        """设置缓存值，tags 用于按标签批量失效"""
+        shard = self._shard(key)
+        now = time.time()
+        expiry = now + (ttl or self.default_ttl)
+        namespace = self._namespace(key)
+        namespace_capacity = self._namespace_capacity(namespace)
+        with shard.lock:
+            if key in shard.entries:
+                self._remove(shard, key)
+            entry = _CacheEntry(value, expiry, namespace, tuple(tags or ()))
+            shard.entries[key] = entry
+            shard.namespaces.setdefault(namespace, OrderedDict())[key] = None
+            for tag in entry.tags:
+                shard.tags.setdefault(tag, set()).add(key)
+            heapq.heappush(shard.expiry_heap, (expiry, key))
+            shard.stats["sets"] += 1
+
+            if namespace_capacity is not None:
+                keys = shard.namespaces[namespace]
+                while len(keys) > namespace_capacity:
+                    self._remove(shard, next(iter(keys)), "evictions")
+            while len(shard.entries) > shard.capacity:
+                self._remove(shard, next(iter(shard.entries)), "evictions")
+        self._maybe_sweep(now)
+        return True
 
     def delete(self, key: str) -> bool:
         """删除缓存值"""
-        cache_key = self._get_key(key)
-        with self.lock:
-            if cache_key in self.cache:
-                del self.cache[cache_key]
-                del self.access_times[cache_key]
+        shard = self._shard(key)
+        with shard.lock:
+            if key in shard.entries:
+                self._remove(shard, key)
                 return True
             return False
 
+    def invalidate_tag(self, tag: str) -> int:
+        """删除带有指定标签的全部条目，返回删除数量"""
+        removed = 0
+        for shard in self._shards:
+            with shard.lock:
+                for key in list(shard.tags.get(tag, ())):
+                    self._remove(shard, key, "invalidations")
+                    removed += 1
+        return removed
+
+    def invalidate_prefix(self, prefix: str) -> int:
+        """删除以 prefix 开头的全部条目（只遍历该命名空间），返回删除数量"""
+        namespace = self._namespace(prefix)
+        removed = 0
+        for shard in self._shards:
+            with shard.lock:
+                if namespace:
+                    candidates = list(shard.namespaces.get(namespace, ()))
+                else:
+                    candidates = list(shard.entries)
+                for key in candidates:
+                    if key.startswith(prefix):
+                        self._remove(shard, key, "invalidations")
+                        removed += 1
+        return removed
+
+    def _maybe_sweep(self, now: float):
+        if now - self._last_sweep >= self.sweep_interval:
+            self._last_sweep = now
+            self.sweep(now)
+
+    def sweep(self, now: Optional[float] = None) -> int:
+        """清理所有已过期条目，返回清理数量"""
+        now = now or time.time()
+        removed = 0
+        for shard in self._shards:
+            with shard.lock:
+                heap = shard.expiry_heap
+                while heap and heap[0][0] <= now:
+                    expiry, key = heapq.heappop(heap)
+                    entry = shard.entries.get(key)
+                    # 堆中可能残留已被覆盖或删除的旧记录
+                    if entry is not None and entry.expiry == expiry:
+                        self._remove(shard, key, "expirations")
+                        removed += 1
+                if len(heap) > 2 * len(shard.entries) + 64:
+                    shard.expiry_heap = [(entry.expiry, key) for key, entry in shard.entries.items()]
+                    heapq.heapify(shard.expiry_heap)
+        return removed
+
     def clear(self):
         """清空缓存"""
-        with self.lock:
-            self.cache.clear()
-            self.access_times.clear()
+        for shard in self._shards:
+            with shard.lock:
+                shard.entries.clear()
+                shard.namespaces.clear()
+                shard.tags.clear()
+                shard.expiry_heap.clear()
+
+    def __len__(self) -> int:
+        return sum(len(shard.entries) for shard in self._shards)
 
     def get_stats(self) -> Dict[str, Any]:
         """获取缓存统计信息"""
-        with self.lock:
-            return {
-                'size': len(self.cache),
-                'max_size': self.max_size,
-                'hit_rate': getattr(self, '_hit_rate', 0.0)
-            }
+        totals: Dict[str, int] = defaultdict(int)
+        namespaces: Dict[str, int] = defaultdict(int)
+        size = 0
+        for shard in self._shards:
+            with shard.lock:
+                size += len(shard.entries)
+                for name, value in shard.stats.items():
+                    totals[name] += value
+                for name, keys in shard.namespaces.items():
+                    namespaces[name] += len(keys)
+        lookups = totals["hits"] + totals["misses"]
+        return {
+            'backend': 'memory',
+            'size': size,
+            'max_size': self.max_size,
+            'shards': len(self._shards),
+            'hits': totals["hits"],
+            'misses': totals["misses"],
+            'sets': totals["sets"],
+            'evictions': totals["evictions"],
+            'expirations': totals["expirations"],
+            'invalidations': totals["invalidations"],
+            'hit_rate': totals["hits"] / lookups if lookups else 0.0,
+            'namespaces': dict(namespaces),
+        }
+
+def create_cache_backend(cache_config=None) -> CacheBackend:
+    """按 CacheConfig.type 创建缓存后端
+
+    type 取值 memory / sqlite / redis；sqlite 与 redis 在 tiered 为 True 时前置进程内 L1
+    """
+    if cache_config is None:
+        from sauce_backend.config import get_config
+        cache_config = get_config().cache
+
+    backend_type = (cache_config.type or 'memory').lower()
+    if backend_type == 'memory':
+        return MemoryCache(max_size=cache_config.max_size, default_ttl=cache_config.default_ttl,
+                           shards=cache_config.shards, namespace_limits=cache_config.namespace_limits)
+    if backend_type == 'sqlite':
+        shared = SQLiteCache(path=cache_config.sqlite_path, max_size=cache_config.max_size,
+                             default_ttl=cache_config.default_ttl, mmap_size=cache_config.sqlite_mmap_size)
+    elif backend_type == 'redis':
+        shared = RedisCache(host=cache_config.redis_host, port=cache_config.redis_port,
+                            db=cache_config.redis_db, password=cache_config.redis_password,
+                            default_ttl=cache_config.default_ttl)
+    else:
+        raise ValueError(f"Unsupported cache type: {cache_config.type}")
+
+    shared.lock_timeout = cache_config.lock_timeout
+    if not cache_config.tiered:
+        return shared
+    l1 = MemoryCache(max_size=cache_config.l1_max_size, default_ttl=cache_config.l1_ttl,
+                     shards=cache_config.shards, namespace_limits=cache_config.namespace_limits)
+    return TieredCache(l1, shared, l1_ttl=cache_config.l1_ttl)
+
 
 class CacheManager:
     """缓存管理器"""
 
-    def __init__(self):
-        self.memory_cache = MemoryCache()
+    def __init__(self, backend: Optional[CacheBackend] = None):
+        self.backend = backend or create_cache_backend()
         self.cache_stats = defaultdict(int)
 
+    @property
+    def memory_cache(self) -> CacheBackend:
+        """兼容旧名称"""
+        return self.backend
+
     def cache_result(self, ttl: int = 3600, key_prefix: str = ''):
         """缓存装饰器"""
         def decorator(func: Callable) -> Callable:
             @wraps(func)
             def wrapper(*args, **kwargs):
-                # 生成缓存键
-                cache_key = f"{key_prefix}{func.__name__}:{hash(str(args) + str(sorted(kwargs.items())))}"
+                # 生成缓存键：内置 hash() 每个进程随机加盐，共享后端下必须使用稳定摘要
+                cache_key = f"{key_prefix}{func.__name__}:{self._args_digest(args, kwargs)}"
 
                 # 尝试从缓存获取
-                result = self.memory_cache.get(cache_key)
+                result = self.backend.get(cache_key)
                 if result is not None:
                     self.cache_stats['hits'] += 1
                     return result
@@ -105,70 +300,86 @@ class CacheManager:
                 # 执行函数并缓存结果
                 self.cache_stats['misses'] += 1
                 result = func(*args, **kwargs)
-                self.memory_cache.set(cache_key, result, ttl)
+                self.backend.set(cache_key, result, ttl)
                 return result
             return wrapper
         return decorator
 
+    @staticmethod
+    def _args_digest(args: tuple, kwargs: Dict[str, Any]) -> str:
+        """参数的规范化序列化（键排序的 JSON，无法序列化的对象取 repr）的 SHA-256"""
+        payload = json.dumps([args, kwargs], sort_keys=True, default=repr, ensure_ascii=False,
+                             separators=(',', ':'))
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
     def get_ai_response_cache(self, model: str, prompt: str) -> Optional[str]:
         """获取AI响应缓存"""
         cache_key = f"ai_response:{model}:{hashlib.md5(prompt.encode('utf-8')).hexdigest()}"
-        return self.memory_cache.get(cache_key)
+        return self.backend.get(cache_key)
 
     def set_ai_response_cache(self, model: str, prompt: str, response: str, ttl: int = 1800):
         """设置AI响应缓存"""
         cache_key = f"ai_response:{model}:{hashlib.md5(prompt.encode('utf-8')).hexdigest()}"
-        self.memory_cache.set(cache_key, response, ttl)
+        self.backend.set(cache_key, response, ttl)
+
+    @staticmethod
+    def _media_info_key(file_path: str) -> Optional[str]:
+        """媒体信息缓存键，包含文件大小、修改时间与inode，文件被覆盖后自动失效"""
+        try:
+            st = os.stat(file_path)
+        except OSError:
+            return None
+        signature = f"{file_path}:{st.st_size}:{st.st_mtime_ns}:{st.st_ino}"
+        return f"media_info:{hashlib.md5(signature.encode('utf-8')).hexdigest()}"
 
     def get_media_info_cache(self, file_path: str) -> Optional[Dict]:
         """获取媒体信息缓存"""
-        cache_key = f"media_info:{hashlib.md5(file_path.encode('utf-8')).hexdigest()}"
-        return self.memory_cache.get(cache_key)
+        cache_key = self._media_info_key(file_path)
+        return self.backend.get(cache_key) if cache_key else None
 
     def set_media_info_cache(self, file_path: str, info: Dict, ttl: int = 3600):
         """设置媒体信息缓存"""
-        cache_key = f"media_info:{hashlib.md5(file_path.encode('utf-8')).hexdigest()}"
-        self.memory_cache.set(cache_key, info, ttl)
+        cache_key = self._media_info_key(file_path)
+        if cache_key:
+            self.backend.set(cache_key, info, ttl)
 
     def get_user_session_cache(self, user_id: str) -> Optional[Dict]:
         """获取用户会话缓存"""
         cache_key = f"user_session:{user_id}"
-        return self.memory_cache.get(cache_key)
+        return self.backend.get(cache_key)
 
     def set_user_session_cache(self, user_id: str, session_data: Dict, ttl: int = 3600):
         """设置用户会话缓存"""
         cache_key = f"user_session:{user_id}"
-        self.memory_cache.set(cache_key, session_data, ttl)
-
-    def invalidate_user_cache(self, user_id: str):
-        """清除用户相关缓存"""
-        patterns = [
-            f"user_session:{user_id}",
-            f"user_data:{user_id}",
-            f"user_permissions:{user_id}"
-        ]
-        for pattern in patterns:
-            # 简单的键匹配清理
-            keys_to_delete = [key for key in self.memory_cache.cache.keys() if pattern in key]
-            for key in keys_to_delete:
-                self.memory_cache.delete(key)
+        self.backend.set(cache_key, session_data, ttl, tags=[f"user:{user_id}"])
+
+    def invalidate_user_cache(self, user_id: str) -> int:
+        """清除用户相关缓存（带 user 标签的条目与用户命名空间下的键），返回删除数量"""
+        removed = self.backend.invalidate_tag(f"user:{user_id}")
+        for namespace in ("user_session", "user_data", "user_permissions"):
+            removed += int(self.backend.delete(f"{namespace}:{user_id}"))
+            removed += self.backend.invalidate_prefix(f"{namespace}:{user_id}:")
+        return removed
 
     def get_stats(self) -> Dict[str, Any]:
         """获取缓存统计信息"""
-        total_requests = self.cache_stats['hits'] + self.cache_stats['misses']
-        hit_rate = self.cache_stats['hits'] / total_requests if total_requests > 0 else 0.0
+        backend_stats = self.backend.get_stats()
+        total_requests = backend_stats['hits'] + backend_stats['misses']
 
         return {
-            'memory_cache': self.memory_cache.get_stats(),
-            'hit_rate': hit_rate,
+            'backend': backend_stats,
+            'hit_rate': backend_stats['hit_rate'],
             'total_requests': total_requests,
-            'hits': self.cache_stats['hits'],
-            'misses': self.cache_stats['misses']
+            'hits': backend_stats['hits'],
+            'misses': backend_stats['misses'],
+            'evictions': backend_stats.get('evictions', 0),
+            'decorator_hits': self.cache_stats['hits'],
+            'decorator_misses': self.cache_stats['misses']
         }
 
     def clear_all(self):
         """清空所有缓存"""
-        self.memory_cache.clear()
+        self.backend.clear()
         self.cache_stats.clear()
 
 # 全局缓存管理器实例
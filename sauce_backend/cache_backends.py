@@ -0,0 +1,531 @@
+"""
+缓存后端模块 - 统一的缓存后端接口与共享实现
+
+- CacheBackend: 后端接口，提供带防击穿（single-flight + 分布式锁）的 get_or_set
+- SQLiteCache: 多进程共享的 SQLite 缓存（WAL + mmap）
+- RedisCache: Redis 协议缓存
+- TieredCache: 进程内 L1 + 共享 L2 的两级缓存
+"""
+
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+def dumps(value: Any) -> str:
+    """共享后端以 JSON 存储值，不使用 pickle 以免反序列化不可信数据"""
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+
+
+def loads(raw) -> Any:
+    if isinstance(raw, bytes):
+        raw = raw.decode('utf-8')
+    return json.loads(raw)
+
+
+class CacheBackend(ABC):
+    """缓存后端接口"""
+
+    # 防击穿：等待其他进程加载同一键的最长时间（秒）
+    lock_timeout: float = 10.0
+
+    def __init__(self):
+        self._flight_lock = threading.Lock()
+        self._flights: Dict[str, list] = {}
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[Any]:
+        """获取缓存值，未命中返回 None"""
+
+    @abstractmethod
+    def set(self, key: str, value: Any, ttl: Optional[int] = None, tags: Optional[Iterable[str]] = None) -> bool:
+        """设置缓存值"""
+
+    @abstractmethod
+    def delete(self, key: str) -> bool:
+        """删除缓存值"""
+
+    @abstractmethod
+    def invalidate_tag(self, tag: str) -> int:
+        """按标签失效，返回删除数量"""
+
+    @abstractmethod
+    def invalidate_prefix(self, prefix: str) -> int:
+        """按前缀失效，返回删除数量"""
+
+    @abstractmethod
+    def clear(self):
+        """清空缓存"""
+
+    @abstractmethod
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存统计信息"""
+
+    def keys_for_tag(self, tag: str) -> List[str]:
+        """带有指定标签的键（用于两级缓存同步失效 L1）"""
+        return []
+
+    def acquire_lock(self, key: str, ttl: float) -> Optional[str]:
+        """获取跨进程加载锁，返回锁令牌；进程内后端无需跨进程锁"""
+        return 'local'
+
+    def release_lock(self, key: str, token: str):
+        """释放跨进程加载锁"""
+
+    def get_or_set(self, key: str, loader: Callable[[], Any], ttl: Optional[int] = None,
+                   tags: Optional[Iterable[str]] = None) -> Any:
+        """读取缓存，未命中时调用 loader 加载并写入
+
+        同一进程内同一键只有一个线程执行 loader（single-flight），
+        共享后端再通过分布式锁保证多个进程中只有一个加载，其余进程等待结果
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        with self._flight_lock:
+            flight = self._flights.get(key)
+            if flight is None:
+                flight = self._flights[key] = [threading.Lock(), 0]
+            flight[1] += 1
+        try:
+            with flight[0]:
+                value = self.get(key)
+                if value is not None:
+                    return value
+                return self._load_shared(key, loader, ttl, tags)
+        finally:
+            with self._flight_lock:
+                flight[1] -= 1
+                if flight[1] == 0:
+                    self._flights.pop(key, None)
+
+    def _load_shared(self, key: str, loader: Callable[[], Any], ttl: Optional[int],
+                     tags: Optional[Iterable[str]]) -> Any:
+        token = self.acquire_lock(key, self.lock_timeout)
+        if token is None:
+            # 其他进程正在加载，等待其写入结果
+            deadline = time.monotonic() + self.lock_timeout
+            delay = 0.01
+            while time.monotonic() < deadline:
+                time.sleep(delay)
+                delay = min(delay * 2, 0.2)
+                value = self.get(key)
+                if value is not None:
+                    return value
+                token = self.acquire_lock(key, self.lock_timeout)
+                if token is not None:
+                    break
+        try:
+            value = loader()
+            if value is not None:
+                self.set(key, value, ttl, tags)
+            return value
+        finally:
+            if token is not None:
+                self.release_lock(key, token)
+
+
+class SQLiteCache(CacheBackend):
+    """SQLite 共享缓存
+
+    同一台机器上的多个 worker 进程共享同一个数据库文件；WAL 模式下读写互不阻塞，
+    mmap 减少读取时的系统调用。每个线程使用独立连接。
+    """
+
+    def __init__(self, path: str = 'db/cache.db', max_size: int = 100000, default_ttl: int = 3600,
+                 mmap_size: int = 256 * 1024 * 1024, sweep_interval: float = 60):
+        super().__init__()
+        self.path = Path(path)
+        self.max_size = max_size
+        self.default_ttl = default_ttl
+        self.mmap_size = mmap_size
+        self.sweep_interval = sweep_interval
+        self._local = threading.local()
+        self._stats = defaultdict(int)
+        self._writes_since_trim = 0
+        self._last_sweep = 0.0
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._conn() as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS cache_entries (
+                    key TEXT PRIMARY KEY,
+                    namespace TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    expiry REAL NOT NULL,
+                    last_used REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_cache_entries_expiry ON cache_entries(expiry);
+                CREATE INDEX IF NOT EXISTS idx_cache_entries_last_used ON cache_entries(last_used);
+                CREATE TABLE IF NOT EXISTS cache_tags (
+                    tag TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    PRIMARY KEY (tag, key)
+                ) WITHOUT ROWID;
+                CREATE INDEX IF NOT EXISTS idx_cache_tags_key ON cache_tags(key);
+                CREATE TABLE IF NOT EXISTS cache_locks (
+                    key TEXT PRIMARY KEY,
+                    token TEXT NOT NULL,
+                    expiry REAL NOT NULL
+                );
+            """)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"PRAGMA mmap_size={int(self.mmap_size)}")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _namespace(key: str) -> str:
+        return key.split(":", 1)[0] if ":" in key else ""
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        conn = self._conn()
+        row = conn.execute("SELECT value, expiry, last_used FROM cache_entries WHERE key = ?", (key,)).fetchone()
+        if row is None or row[1] <= now:
+            if row is not None:
+                self._delete_keys(conn, [key])
+                self._stats['expirations'] += 1
+            self._stats['misses'] += 1
+            return None
+        # 降低写放大：最近使用时间只按分钟粒度刷新
+        if now - row[2] > 60:
+            conn.execute("UPDATE cache_entries SET last_used = ? WHERE key = ?", (now, key))
+        self._stats['hits'] += 1
+        self._maybe_sweep(now)
+        return loads(row[0])
+
+    def set(self, key: str, value: Any, ttl: Optional[int] = None, tags: Optional[Iterable[str]] = None) -> bool:
+        try:
+            payload = dumps(value)
+        except (TypeError, ValueError):
+            return False
+        now = time.time()
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "INSERT OR REPLACE INTO cache_entries (key, namespace, value, expiry, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, self._namespace(key), payload, now + (ttl or self.default_ttl), now)
+            )
+            conn.execute("DELETE FROM cache_tags WHERE key = ?", (key,))
+            if tags:
+                conn.executemany("INSERT OR IGNORE INTO cache_tags (tag, key) VALUES (?, ?)",
+                                 [(tag, key) for tag in tags])
+        self._stats['sets'] += 1
+        self._writes_since_trim += 1
+        if self._writes_since_trim >= 64:
+            self._writes_since_trim = 0
+            self._trim(conn)
+        self._maybe_sweep(now)
+        return True
+
+    def _delete_keys(self, conn: sqlite3.Connection, keys) -> int:
+        keys = list(keys)
+        if not keys:
+            return 0
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            removed = 0
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                marks = ",".join("?" * len(batch))
+                removed += conn.execute(f"DELETE FROM cache_entries WHERE key IN ({marks})", batch).rowcount
+                conn.execute(f"DELETE FROM cache_tags WHERE key IN ({marks})", batch)
+        return removed
+
+    def _trim(self, conn: sqlite3.Connection):
+        """超出条目上限时淘汰最久未使用的条目"""
+        count = conn.execute("SELECT COUNT(*) FROM cache_entries").fetchone()[0]
+        excess = count - self.max_size
+        if excess > 0:
+            keys = [row[0] for row in conn.execute(
+                "SELECT key FROM cache_entries ORDER BY last_used LIMIT ?", (excess,))]
+            self._stats['evictions'] += self._delete_keys(conn, keys)
+
+    def _maybe_sweep(self, now: float):
+        if now - self._last_sweep >= self.sweep_interval:
+            self._last_sweep = now
+            self.sweep(now)
+
+    def sweep(self, now: Optional[float] = None) -> int:
+        """清理过期条目与过期锁"""
+        now = now or time.time()
+        conn = self._conn()
+        keys = [row[0] for row in conn.execute("SELECT key FROM cache_entries WHERE expiry <= ?", (now,))]
+        removed = self._delete_keys(conn, keys)
+        conn.execute("DELETE FROM cache_locks WHERE expiry <= ?", (now,))
+        self._stats['expirations'] += removed
+        return removed
+
+    def delete(self, key: str) -> bool:
+        return self._delete_keys(self._conn(), [key]) > 0
+
+    def keys_for_tag(self, tag: str) -> List[str]:
+        """带有指定标签的键"""
+        return [row[0] for row in self._conn().execute("SELECT key FROM cache_tags WHERE tag = ?", (tag,))]
+
+    def invalidate_tag(self, tag: str) -> int:
+        conn = self._conn()
+        keys = self.keys_for_tag(tag)
+        removed = self._delete_keys(conn, keys)
+        self._stats['invalidations'] += removed
+        return removed
+
+    def invalidate_prefix(self, prefix: str) -> int:
+        conn = self._conn()
+        # 主键范围查询，只访问匹配前缀的条目
+        keys = [row[0] for row in conn.execute(
+            "SELECT key FROM cache_entries WHERE key >= ? AND key < ?", (prefix, prefix + "\U0010ffff"))]
+        removed = self._delete_keys(conn, keys)
+        self._stats['invalidations'] += removed
+        return removed
+
+    def clear(self):
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DELETE FROM cache_entries")
+            conn.execute("DELETE FROM cache_tags")
+
+    def acquire_lock(self, key: str, ttl: float) -> Optional[str]:
+        token = uuid.uuid4().hex
+        now = time.time()
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DELETE FROM cache_locks WHERE key = ? AND expiry <= ?", (key, now))
+            acquired = conn.execute("INSERT OR IGNORE INTO cache_locks (key, token, expiry) VALUES (?, ?, ?)",
+                                    (key, token, now + ttl)).rowcount
+        return token if acquired else None
+
+    def release_lock(self, key: str, token: str):
+        self._conn().execute("DELETE FROM cache_locks WHERE key = ? AND token = ?", (key, token))
+
+    def get_stats(self) -> Dict[str, Any]:
+        conn = self._conn()
+        size = conn.execute("SELECT COUNT(*) FROM cache_entries").fetchone()[0]
+        namespaces = dict(conn.execute("SELECT namespace, COUNT(*) FROM cache_entries GROUP BY namespace").fetchall())
+        lookups = self._stats['hits'] + self._stats['misses']
+        return {
+            'backend': 'sqlite',
+            'path': str(self.path),
+            'size': size,
+            'max_size': self.max_size,
+            **{name: self._stats[name] for name in
+               ('hits', 'misses', 'sets', 'evictions', 'expirations', 'invalidations')},
+            'hit_rate': self._stats['hits'] / lookups if lookups else 0.0,
+            'namespaces': namespaces,
+        }
+
+
+class RedisCache(CacheBackend):
+    """Redis 协议缓存（redis-py 客户端，兼容 Redis/KeyDB/Dragonfly 等服务端）
+
+    条目数上限与淘汰由服务端的 maxmemory-policy 负责；标签以集合保存键名
+    """
+
+    # 释放锁时校验令牌，避免删除其他进程在锁过期后重新获取的锁
+    _RELEASE_SCRIPT = """
+        if redis.call('get', KEYS[1]) == ARGV[1] then
+            return redis.call('del', KEYS[1])
+        end
+        return 0
+    """
+
+    def __init__(self, host: str = 'localhost', port: int = 6379, db: int = 0, password: str = '',
+                 default_ttl: int = 3600, key_prefix: str = 'sau:', client=None, tag_ttl: int = 86400):
+        super().__init__()
+        if client is None:
+            import redis
+
+            client = redis.Redis(host=host, port=port, db=db, password=password or None,
+                                 socket_timeout=5, socket_connect_timeout=5, health_check_interval=30)
+        self.client = client
+        self.default_ttl = default_ttl
+        self.key_prefix = key_prefix
+        self.tag_ttl = tag_ttl
+        self._stats = defaultdict(int)
+
+    def _key(self, key: str) -> str:
+        return f"{self.key_prefix}{key}"
+
+    def _tag_key(self, tag: str) -> str:
+        return f"{self.key_prefix}__tag__:{tag}"
+
+    def get(self, key: str) -> Optional[Any]:
+        raw = self.client.get(self._key(key))
+        if raw is None:
+            self._stats['misses'] += 1
+            return None
+        self._stats['hits'] += 1
+        return loads(raw)
+
+    def set(self, key: str, value: Any, ttl: Optional[int] = None, tags: Optional[Iterable[str]] = None) -> bool:
+        try:
+            payload = dumps(value)
+        except (TypeError, ValueError):
+            return False
+        ttl = int(ttl or self.default_ttl)
+        pipe = self.client.pipeline()
+        pipe.set(self._key(key), payload, ex=ttl)
+        for tag in tags or ():
+            tag_key = self._tag_key(tag)
+            pipe.sadd(tag_key, key)
+            # 标签集合只用于失效，多保留一段时间，避免早于其中的条目过期
+            pipe.expire(tag_key, max(ttl, self.tag_ttl))
+        pipe.execute()
+        self._stats['sets'] += 1
+        return True
+
+    def delete(self, key: str) -> bool:
+        return bool(self.client.delete(self._key(key)))
+
+    def keys_for_tag(self, tag: str) -> List[str]:
+        """带有指定标签的键"""
+        return [m.decode('utf-8') if isinstance(m, bytes) else m for m in self.client.smembers(self._tag_key(tag))]
+
+    def invalidate_tag(self, tag: str) -> int:
+        tag_key = self._tag_key(tag)
+        members = self.keys_for_tag(tag)
+        removed = self.client.delete(*[self._key(m) for m in members]) if members else 0
+        self.client.delete(tag_key)
+        self._stats['invalidations'] += removed
+        return removed
+
+    def invalidate_prefix(self, prefix: str) -> int:
+        pattern = self._key(_escape_glob(prefix)) + '*'
+        removed = 0
+        batch = []
+        for key in self.client.scan_iter(match=pattern, count=500):
+            batch.append(key)
+            if len(batch) >= 500:
+                removed += self.client.delete(*batch)
+                batch = []
+        if batch:
+            removed += self.client.delete(*batch)
+        self._stats['invalidations'] += removed
+        return removed
+
+    def clear(self):
+        batch = []
+        for key in self.client.scan_iter(match=_escape_glob(self.key_prefix) + '*', count=500):
+            batch.append(key)
+            if len(batch) >= 500:
+                self.client.delete(*batch)
+                batch = []
+        if batch:
+            self.client.delete(*batch)
+
+    def acquire_lock(self, key: str, ttl: float) -> Optional[str]:
+        token = uuid.uuid4().hex
+        acquired = self.client.set(f"{self.key_prefix}__lock__:{key}", token, nx=True, px=int(ttl * 1000))
+        return token if acquired else None
+
+    def release_lock(self, key: str, token: str):
+        self.client.eval(self._RELEASE_SCRIPT, 1, f"{self.key_prefix}__lock__:{key}", token)
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self._stats['hits'] + self._stats['misses']
+        try:
+            size = self.client.dbsize()
+        except Exception:
+            size = None
+        return {
+            'backend': 'redis',
+            'size': size,
+            **{name: self._stats[name] for name in ('hits', 'misses', 'sets', 'invalidations')},
+            'hit_rate': self._stats['hits'] / lookups if lookups else 0.0,
+        }
+
+
+def _escape_glob(value: str) -> str:
+    """转义 Redis SCAN MATCH 中的通配符"""
+    return ''.join('\\' + ch if ch in '*?[]\\' else ch for ch in value)
+
+
+class TieredCache(CacheBackend):
+    """两级缓存：进程内 L1 在前，共享 L2 在后
+
+    L1 条目的有效期不超过 ``l1_ttl``，其他进程写入或失效 L2 后，本进程最多在 l1_ttl 内读到旧值
+    """
+
+    def __init__(self, l1: CacheBackend, l2: CacheBackend, l1_ttl: int = 60):
+        super().__init__()
+        self.l1 = l1
+        self.l2 = l2
+        self.l1_ttl = l1_ttl
+        self.lock_timeout = l2.lock_timeout
+        self._stats = defaultdict(int)
+
+    def get(self, key: str) -> Optional[Any]:
+        value = self.l1.get(key)
+        if value is not None:
+            self._stats['l1_hits'] += 1
+            return value
+        value = self.l2.get(key)
+        if value is not None:
+            self._stats['l2_hits'] += 1
+            self.l1.set(key, value, self.l1_ttl)
+            return value
+        self._stats['misses'] += 1
+        return None
+
+    def set(self, key: str, value: Any, ttl: Optional[int] = None, tags: Optional[Iterable[str]] = None) -> bool:
+        tags = list(tags or ())
+        stored = self.l2.set(key, value, ttl, tags)
+        # L2 拒绝的值（无法序列化）也不写入 L1，避免只在本进程可见
+        if stored:
+            self.l1.set(key, value, min(ttl or self.l1_ttl, self.l1_ttl), tags)
+        return stored
+
+    def delete(self, key: str) -> bool:
+        local = self.l1.delete(key)
+        return self.l2.delete(key) or local
+
+    def invalidate_tag(self, tag: str) -> int:
+        # 从 L2 回填到 L1 的条目不带标签，按 L2 的标签索引逐个删除
+        for key in self.l2.keys_for_tag(tag):
+            self.l1.delete(key)
+        self.l1.invalidate_tag(tag)
+        return self.l2.invalidate_tag(tag)
+
+    def invalidate_prefix(self, prefix: str) -> int:
+        self.l1.invalidate_prefix(prefix)
+        return self.l2.invalidate_prefix(prefix)
+
+    def clear(self):
+        self.l1.clear()
+        self.l2.clear()
+
+    def acquire_lock(self, key: str, ttl: float) -> Optional[str]:
+        return self.l2.acquire_lock(key, ttl)
+
+    def release_lock(self, key: str, token: str):
+        self.l2.release_lock(key, token)
+
+    def get_stats(self) -> Dict[str, Any]:
+        l1_hits, l2_hits, misses = self._stats['l1_hits'], self._stats['l2_hits'], self._stats['misses']
+        lookups = l1_hits + l2_hits + misses
+        return {
+            'backend': 'tiered',
+            'l1_hits': l1_hits,
+            'l2_hits': l2_hits,
+            'hits': l1_hits + l2_hits,
+            'misses': misses,
+            'hit_rate': (l1_hits + l2_hits) / lookups if lookups else 0.0,
+            'l1': self.l1.get_stats(),
+            'l2': self.l2.get_stats(),
+        }
@@ -48,6 +48,21 @@ class CacheConfig:
     redis_port: int = 6379
     redis_db: int = 0
     redis_password: str = ''
+    # sqlite 后端的数据库文件与 mmap 大小
+    sqlite_path: str = 'db/cache.db'
+    sqlite_mmap_size: int = 256 * 1024 * 1024
+    # 共享后端（sqlite/redis）前是否加进程内 L1
+    tiered: bool = False
+    l1_max_size: int = 1000
+    l1_ttl: int = 60
+    shards: int = 8
+    namespace_limits: dict = None
+    # 防击穿：等待其他进程加载同一键的最长时间（秒）
+    lock_timeout: float = 10.0
+
+    def __post_init__(self):
+        if self.namespace_limits is None:
+            self.namespace_limits = {}
 
 @dataclass
 class MediaConfig:
@@ -150,6 +165,15 @@ class Config:
         self.database.user = os.getenv('DB_USER', '')
         self.database.password = os.getenv('DB_PASSWORD', '')
 
+        # 缓存配置
+        self.cache.type = os.getenv('CACHE_TYPE', self.cache.type)
+        self.cache.tiered = os.getenv('CACHE_TIERED', 'False').lower() == 'true'
+        self.cache.sqlite_path = os.getenv('CACHE_SQLITE_PATH', self.cache.sqlite_path)
+        self.cache.redis_host = os.getenv('REDIS_HOST', self.cache.redis_host)
+        self.cache.redis_port = int(os.getenv('REDIS_PORT', self.cache.redis_port))
+        self.cache.redis_db = int(os.getenv('REDIS_DB', self.cache.redis_db))
+        self.cache.redis_password = os.getenv('REDIS_PASSWORD', self.cache.redis_password)
+
         # 服务器配置
         self.server.host = os.getenv('SERVER_HOST', '0.0.0.0')
         self.server.port = int(os.getenv('SERVER_PORT', 5409))
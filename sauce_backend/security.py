@@ -14,6 +14,9 @@ from flask import request, jsonify, g
 import sqlite3
 import re
 
+from sau_backend.utils.rate_limiter import RateLimitRule, rate_limiter
+from sau_backend.utils.sqlite_pool import get_pool
+
 class SecurityManager:
     """安全管理器"""
 
@@ -21,7 +24,7 @@ class SecurityManager:
         self.app = app
         self.secret_key = None
         self.token_expiry = 24 * 60 * 60  # 24小时
-        self.rate_limits = {}
+        self.rate_limits: Dict[str, RateLimitRule] = {}
         if app:
             self.init_app(app)
 
@@ -96,26 +99,19 @@ class SecurityManager:
         return file_size <= max_size
 
     def rate_limit_check(self, key: str, limit: int, window: int) -> bool:
-        """速率限制检查"""
-        now = datetime.utcnow()
-        window_start = now - timedelta(seconds=window)
-
-        if key not in self.rate_limits:
-            self.rate_limits[key] = []
-
-        # 清理过期记录
-        self.rate_limits[key] = [
-            timestamp for timestamp in self.rate_limits[key]
-            if timestamp > window_start
-        ]
-
-        return len(self.rate_limits[key]) < limit
+        """速率限制检查（不消耗配额）"""
+        rule = self.rate_limits[key] = RateLimitRule(limit, window)
+        return rate_limiter.peek(f"security:{key}", rule).allowed
 
     def rate_limit_increment(self, key: str):
         """增加速率限制计数"""
-        if key not in self.rate_limits:
-            self.rate_limits[key] = []
-        self.rate_limits[key].append(datetime.utcnow())
+        rule = self.rate_limits.get(key) or RateLimitRule(
+            SECURITY_CONFIG['RATE_LIMIT_REQUESTS'], SECURITY_CONFIG['RATE_LIMIT_WINDOW'])
+        rate_limiter.hit(f"security:{key}", rule)
+
+    def rate_limit_hit(self, key: str, limit: int, window: int) -> bool:
+        """速率限制检查并计数"""
+        return rate_limiter.hit(f"security:{key}", RateLimitRule(limit, window)).allowed
 
 def require_auth(f):
     """认证装饰器"""
@@ -145,11 +141,10 @@ def require_admin(f):
             return jsonify({'error': 'Authentication required'}), 401
 
         # 检查用户是否为管理员
-        conn = sqlite3.connect('social_upload.db')
-        cursor = conn.cursor()
-        cursor.execute("SELECT is_admin FROM users WHERE id = ?", (g.user_id,))
-        result = cursor.fetchone()
-        conn.close()
+        with get_pool('social_upload.db').session() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT is_admin FROM users WHERE id = ?", (g.user_id,))
+            result = cursor.fetchone()
 
         if not result or not result[0]:
             return jsonify({'error': 'Admin privileges required'}), 403
@@ -0,0 +1,101 @@
+"""
+单元测试公共桩对象
+桩 Playwright：不启动真实浏览器，记录启动、上下文与关闭情况
+"""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+
+class StubPage:
+    def __init__(self, context):
+        self.context = context
+
+
+class StubContext:
+    def __init__(self, browser, options):
+        self.browser = browser
+        self.options = options
+        self.closed = False
+        self.init_scripts = []
+
+    async def add_init_script(self, path=None, script=None):
+        self.init_scripts.append(path or script)
+
+    async def new_page(self):
+        return StubPage(self)
+
+    async def close(self):
+        self.closed = True
+        self.browser.contexts.remove(self)
+
+
+class StubBrowser:
+    def __init__(self, options):
+        self.options = options
+        self.connected = True
+        self.closed = False
+        self.crash_on_context = False
+        self.contexts = []
+
+    def is_connected(self):
+        return self.connected
+
+    async def new_context(self, **options):
+        if self.crash_on_context:
+            self.connected = False
+        if not self.connected:
+            raise RuntimeError("Browser has been closed")
+        context = StubContext(self, options)
+        self.contexts.append(context)
+        return context
+
+    async def close(self):
+        self.closed = True
+        self.connected = False
+
+
+class StubBrowserType:
+    def __init__(self, playwright):
+        self.playwright = playwright
+
+    async def launch(self, **options):
+        await asyncio.sleep(0)
+        if self.playwright.fail_launches:
+            self.playwright.fail_launches -= 1
+            raise RuntimeError("launch failed")
+        browser = StubBrowser(options)
+        self.playwright.launched.append(browser)
+        return browser
+
+
+class StubPlaywright:
+    def __init__(self):
+        self.launched = []
+        self.fail_launches = 0
+        self.starts = 0
+        self.stopped = False
+        self.chromium = StubBrowserType(self)
+        self.firefox = StubBrowserType(self)
+        # 与真实 Playwright 一致的驱动进程句柄位置（playwright._connection._transport._proc）
+        self._connection = SimpleNamespace(_transport=SimpleNamespace(_proc=None))
+
+    async def start(self):
+        self.starts += 1
+        self.stopped = False
+        return self
+
+    async def stop(self):
+        self.stopped = True
+
+
+@pytest.fixture
+def playwright(monkeypatch):
+    pytest.importorskip("playwright.async_api")
+    from sau_backend.utils import browser_pool as browser_pool_module
+
+    stub = StubPlaywright()
+    monkeypatch.setattr(browser_pool_module, "async_playwright", lambda: stub)
+    return stub
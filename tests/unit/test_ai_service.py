@@ -0,0 +1,66 @@
+"""
+AI 生成服务单元测试
+确定性请求走响应缓存；对冲请求的结果可能来自备用提供商，不写入主提供商的缓存键
+"""
+
+import pytest
+
+from sau_backend.ai.response_cache import AIResponseCache
+from sau_backend.services import ai_service
+
+
+class StubModelManager:
+    """主提供商 qwen；answer_from 模拟对冲时实际作答的提供商"""
+
+    def __init__(self):
+        self.calls = []
+        self.answer_from = "qwen"
+
+    def resolve(self, provider=None, model=None):
+        return provider or "qwen", model or "qwen-plus"
+
+    def chat(self, messages, provider=None, model=None, temperature=0.7, hedge=False, **kwargs):
+        self.calls.append(messages)
+        return f"{self.answer_from if hedge else provider}:{messages}"
+
+    def chat_many(self, prompts, provider=None, model=None, temperature=0.7, hedge=False, **kwargs):
+        return [self.chat(prompt, provider or "qwen", model, temperature, hedge) for prompt in prompts]
+
+
+@pytest.fixture
+def manager(monkeypatch, tmp_path):
+    manager = StubModelManager()
+    monkeypatch.setattr(ai_service, "model_manager", manager)
+    monkeypatch.setattr(ai_service, "ai_response_cache", AIResponseCache(tmp_path / "ai_cache.db"))
+    return manager
+
+
+def test_deterministic_requests_are_cached(manager):
+    assert ai_service.generate_text("标题", temperature=0) == "qwen:标题"
+    assert ai_service.generate_text("标题 ", temperature=0) == "qwen:标题"
+    assert manager.calls == ["标题"]
+    # 温度大于 0 默认不缓存
+    ai_service.generate_text("标题", temperature=0.7)
+    assert len(manager.calls) == 2
+
+
+def test_hedged_answer_not_cached_under_primary(manager):
+    manager.answer_from = "zhipu"
+    assert ai_service.generate_text("标题", temperature=0, hedge=True) == "zhipu:标题"
+
+    # 之后的非对冲确定性请求仍由主提供商生成
+    assert ai_service.generate_text("标题", temperature=0) == "qwen:标题"
+    assert len(manager.calls) == 2
+    # 主提供商的缓存结果可以直接服务对冲请求
+    assert ai_service.generate_text("标题", temperature=0, hedge=True) == "qwen:标题"
+    assert len(manager.calls) == 2
+
+
+def test_hedged_batch_not_cached(manager):
+    manager.answer_from = "zhipu"
+    assert ai_service.generate_texts(["a", "b", "a"], temperature=0, hedge=True) == ["zhipu:a", "zhipu:b", "zhipu:a"]
+    assert manager.calls == ["a", "b"]
+
+    assert ai_service.generate_texts(["a", "b"], temperature=0) == ["qwen:a", "qwen:b"]
+    assert ai_service.generate_texts(["a", "b"], temperature=0) == ["qwen:a", "qwen:b"]
+    assert manager.calls == ["a", "b", "a", "b"]
@@ -0,0 +1,255 @@
+"""
+浏览器池单元测试
+使用桩浏览器（不启动真实 Playwright）：租借与复用、容量上限与排队、按使用次数回收、
+断开实例的健康检查，以及启动失败与会话生命周期
+"""
+
+import asyncio
+import subprocess
+import sys
+import threading
+
+import pytest
+
+pytest.importorskip("playwright.async_api")
+
+from sau_backend.utils.browser_pool import BrowserPool
+
+
+def test_lease_reuses_warm_browser(playwright):
+    pool = BrowserPool(size=2, max_uses=10)
+
+    async def scenario():
+        async with pool.lease_context({"cookies": []}, locale="zh-CN") as context:
+            assert context.options == {"storage_state": {"cookies": []}, "locale": "zh-CN"}
+            # 默认注入反检测脚本
+            assert context.init_scripts
+            first = context
+        assert first.closed
+        async with pool.lease_context(stealth=False) as context:
+            assert context.browser is first.browser
+            assert context.init_scripts == []
+
+    asyncio.run(scenario())
+    assert len(playwright.launched) == 1
+    stats = pool.get_stats()
+    assert stats["profiles"][0]["uses"] == [2]
+    assert stats["profiles"][0]["active_contexts"] == 0
+    assert stats["metrics"]["leases"] == 2
+
+
+def test_launch_profiles_are_separate(playwright):
+    pool = BrowserPool(size=1)
+
+    async def scenario():
+        async with pool.lease_context(headless=True):
+            pass
+        async with pool.lease_context(headless=False, proxy={"server": "http://proxy:8080"}):
+            pass
+        async with pool.lease_context(browser_type="firefox"):
+            pass
+
+    asyncio.run(scenario())
+    assert len(playwright.launched) == 3
+    assert playwright.launched[1].options == {"headless": False, "proxy": {"server": "http://proxy:8080"}}
+
+
+def test_size_and_context_limits(playwright):
+    """并发租借先占满 size 个浏览器，再按上下文上限共享，超出时排队等待归还"""
+    pool = BrowserPool(size=2, max_contexts_per_browser=2)
+    peak = {"active": 0, "max": 0}
+
+    async def lease():
+        async with pool.lease_context():
+            peak["active"] += 1
+            peak["max"] = max(peak["max"], peak["active"])
+            await asyncio.sleep(0.01)
+            peak["active"] -= 1
+
+    async def scenario():
+        await asyncio.gather(*(lease() for _ in range(10)))
+
+    asyncio.run(scenario())
+    assert len(playwright.launched) == 2
+    assert peak["max"] == 4
+    assert pool.metrics.leases == 10
+
+
+def test_browser_retired_after_max_uses(playwright):
+    pool = BrowserPool(size=1, max_uses=2)
+
+    async def scenario():
+        for _ in range(3):
+            async with pool.lease_context():
+                pass
+
+    asyncio.run(scenario())
+    assert len(playwright.launched) == 2
+    assert playwright.launched[0].closed
+    assert not playwright.launched[1].closed
+    assert pool.metrics.recycles == 1
+
+
+def test_disconnected_browser_replaced(playwright):
+    pool = BrowserPool(size=1)
+
+    async def scenario():
+        async with pool.lease_context():
+            pass
+        playwright.launched[0].connected = False
+        stats = await pool.health_check()
+        assert stats["profiles"][0]["browsers"] == 0
+        async with pool.lease_context():
+            pass
+
+    asyncio.run(scenario())
+    assert len(playwright.launched) == 2
+    assert pool.metrics.unhealthy == 1
+
+
+def test_context_error_retires_dead_browser(playwright):
+    """租借到浏览器后、创建上下文时进程崩溃：归还时回收该实例，下次租借重新启动"""
+    pool = BrowserPool(size=1)
+
+    async def scenario():
+        async with pool.lease_context():
+            pass
+        playwright.launched[0].crash_on_context = True
+        with pytest.raises(RuntimeError):
+            async with pool.lease_context():
+                pass
+        assert pool.get_stats()["profiles"][0]["browsers"] == 0
+        async with pool.lease_context():
+            pass
+
+    asyncio.run(scenario())
+    assert len(playwright.launched) == 2
+    assert pool.metrics.recycles == 1
+
+
+def test_launch_failure_frees_slot(playwright):
+    pool = BrowserPool(size=1)
+    playwright.fail_launches = 1
+
+    async def scenario():
+        with pytest.raises(RuntimeError):
+            async with pool.lease_context():
+                pass
+        async with pool.lease_context():
+            pass
+
+    asyncio.run(scenario())
+    assert pool.metrics.failures == 1
+    assert len(playwright.launched) == 1
+
+
+def test_warm_up_and_session_close(playwright):
+    pool = BrowserPool(size=3)
+
+    async def scenario():
+        async with pool.session():
+            await pool.warm_up(2)
+            assert len(playwright.launched) == 2
+            async with pool.session():
+                async with pool.lease_context():
+                    pass
+            # 内层 session 退出不关闭浏览器池
+            assert not playwright.stopped
+        assert playwright.stopped
+
+    asyncio.run(scenario())
+    assert all(browser.closed for browser in playwright.launched)
+    assert pool.metrics.launches == 2
+
+
+def test_session_keeps_pool_with_outstanding_lease(playwright):
+    """最外层 session 退出时仍有其他任务的租借：不关闭浏览器池"""
+    pool = BrowserPool(size=2)
+
+    async def scenario():
+        held, release = asyncio.Event(), asyncio.Event()
+
+        async def long_lease():
+            async with pool.lease_context():
+                held.set()
+                await release.wait()
+
+        async with pool.session():
+            async with pool.lease_context():
+                pass
+            task = asyncio.create_task(long_lease())
+            await held.wait()
+        assert not playwright.stopped
+        assert not any(browser.closed for browser in playwright.launched)
+
+        release.set()
+        await task
+        # 没有租借后，最外层 session 退出时关闭 session 期间启动的浏览器池
+        async with pool.session():
+            pass
+        assert playwright.stopped
+
+    asyncio.run(scenario())
+
+
+def test_session_does_not_close_pool_started_outside(playwright):
+    """浏览器池由服务端（session 之外）启动时，session 退出不关闭其他任务的浏览器"""
+    pool = BrowserPool(size=1)
+
+    async def scenario():
+        async with pool.lease_context():
+            pass
+        async with pool.session():
+            async with pool.lease_context():
+                pass
+        assert not playwright.stopped
+        assert not playwright.launched[0].closed
+        await pool.close()
+        assert playwright.stopped
+
+    asyncio.run(scenario())
+
+
+def test_new_event_loop_releases_old_driver(playwright):
+    """事件循环变更时结束旧循环中的 Playwright 驱动进程，不遗留浏览器进程"""
+    pool = BrowserPool(size=1)
+    driver = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(60)"])
+    playwright._connection._transport._proc = driver
+
+    async def lease():
+        async with pool.lease_context():
+            pass
+
+    try:
+        asyncio.run(lease())
+        asyncio.run(lease())
+        assert driver.wait(timeout=10) is not None
+    finally:
+        if driver.poll() is None:
+            driver.kill()
+    # Playwright 对象不能跨事件循环使用，新循环中重新启动
+    assert playwright.starts == 2
+    assert len(playwright.launched) == 2
+
+
+def test_new_event_loop_closes_browsers_on_running_loop(playwright):
+    """旧循环仍在其他线程运行时，由旧循环关闭其中的浏览器"""
+    pool = BrowserPool(size=1)
+    old_loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=old_loop.run_forever, daemon=True)
+    thread.start()
+
+    async def lease():
+        async with pool.lease_context():
+            pass
+
+    try:
+        asyncio.run_coroutine_threadsafe(lease(), old_loop).result(10)
+        asyncio.run(lease())
+        first = playwright.launched[0]
+        asyncio.run_coroutine_threadsafe(asyncio.sleep(0.05), old_loop).result(10)
+        assert first.closed
+    finally:
+        old_loop.call_soon_threadsafe(old_loop.stop)
+        thread.join(5)
+        old_loop.close()
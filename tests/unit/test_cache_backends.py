@@ -0,0 +1,210 @@
+"""
+缓存后端单元测试
+SQLite、Redis（fakeredis 模拟，无需真实服务）、两级缓存，以及 get_or_set 的防击穿
+"""
+
+import threading
+import time
+
+import pytest
+
+from sauce_backend.cache import CacheManager, MemoryCache
+from sauce_backend.cache_backends import RedisCache, SQLiteCache, TieredCache
+
+
+@pytest.fixture
+def sqlite_cache(tmp_path):
+    return SQLiteCache(path=str(tmp_path / "cache.db"), max_size=100, sweep_interval=3600)
+
+
+@pytest.fixture
+def redis_cache():
+    fakeredis = pytest.importorskip("fakeredis")
+    return RedisCache(client=fakeredis.FakeRedis(), key_prefix="test:")
+
+
+@pytest.fixture(params=["sqlite", "redis", "tiered"])
+def backend(request, tmp_path):
+    """三种共享后端跑同一组用例"""
+    if request.param == "sqlite":
+        return SQLiteCache(path=str(tmp_path / "cache.db"), max_size=100, sweep_interval=3600)
+    if request.param == "redis":
+        fakeredis = pytest.importorskip("fakeredis")
+        return RedisCache(client=fakeredis.FakeRedis(), key_prefix="test:")
+    l2 = SQLiteCache(path=str(tmp_path / "l2.db"), max_size=100, sweep_interval=3600)
+    return TieredCache(MemoryCache(max_size=50), l2, l1_ttl=60)
+
+
+def test_set_get_delete(backend):
+    assert backend.get("user:1") is None
+    assert backend.set("user:1", {"name": "张三", "tags": [1, 2]})
+    assert backend.get("user:1") == {"name": "张三", "tags": [1, 2]}
+    assert backend.delete("user:1")
+    assert backend.get("user:1") is None
+
+
+def test_unserializable_value_is_rejected(backend):
+    assert backend.set("obj:1", object()) is False
+    assert backend.get("obj:1") is None
+
+
+def test_invalidate_tag(backend):
+    backend.set("video:1", 1, tags=["user:7"])
+    backend.set("video:2", 2, tags=["user:7", "hot"])
+    backend.set("video:3", 3, tags=["user:8"])
+
+    assert backend.invalidate_tag("user:7") == 2
+    assert backend.get("video:1") is None
+    assert backend.get("video:2") is None
+    assert backend.get("video:3") == 3
+
+
+def test_invalidate_prefix(backend):
+    backend.set("media_info:a", 1)
+    backend.set("media_info:b", 2)
+    backend.set("media:c", 3)
+
+    assert backend.invalidate_prefix("media_info:") == 2
+    assert backend.get("media_info:a") is None
+    assert backend.get("media:c") == 3
+
+
+def test_clear(backend):
+    backend.set("a:1", 1)
+    backend.set("b:1", 2)
+    backend.clear()
+    assert backend.get("a:1") is None
+    assert backend.get("b:1") is None
+
+
+def test_sqlite_expiry(sqlite_cache):
+    sqlite_cache.set("short:1", "x", ttl=1)
+    sqlite_cache._conn().execute("UPDATE cache_entries SET expiry = ? WHERE key = ?",
+                                 (time.time() - 1, "short:1"))
+    assert sqlite_cache.get("short:1") is None
+    assert sqlite_cache.get_stats()["expirations"] == 1
+
+
+def test_sqlite_lru_trim(tmp_path):
+    cache = SQLiteCache(path=str(tmp_path / "cache.db"), max_size=10, sweep_interval=3600)
+    for i in range(64):
+        cache.set(f"item:{i}", i)
+    # 每 64 次写入检查一次上限，淘汰最久未使用的条目
+    assert cache.get_stats()["size"] == 10
+    assert cache.get("item:63") == 63
+    assert cache.get("item:0") is None
+
+
+def test_sqlite_shared_between_instances(tmp_path):
+    """同一数据库文件的两个实例（模拟两个 worker 进程）看到相同的数据与锁"""
+    path = str(tmp_path / "cache.db")
+    first, second = SQLiteCache(path=path), SQLiteCache(path=path)
+    first.set("shared:1", [1, 2, 3])
+    assert second.get("shared:1") == [1, 2, 3]
+
+    token = first.acquire_lock("shared:2", ttl=5)
+    assert token is not None
+    assert second.acquire_lock("shared:2", ttl=5) is None
+    first.release_lock("shared:2", token)
+    assert second.acquire_lock("shared:2", ttl=5) is not None
+
+
+def test_redis_lock_checks_token(redis_cache):
+    token = redis_cache.acquire_lock("k", ttl=5)
+    assert token is not None
+    assert redis_cache.acquire_lock("k", ttl=5) is None
+    # 令牌不匹配时不释放
+    redis_cache.release_lock("k", "other-token")
+    assert redis_cache.acquire_lock("k", ttl=5) is None
+    redis_cache.release_lock("k", token)
+    assert redis_cache.acquire_lock("k", ttl=5) is not None
+
+
+def test_redis_prefix_escapes_glob(redis_cache):
+    redis_cache.set("a*b:1", 1)
+    redis_cache.set("axb:1", 2)
+    assert redis_cache.invalidate_prefix("a*b:") == 1
+    assert redis_cache.get("axb:1") == 2
+
+
+def test_tiered_backfills_l1_and_invalidates_both(tmp_path):
+    l1 = MemoryCache(max_size=50)
+    l2 = SQLiteCache(path=str(tmp_path / "l2.db"), sweep_interval=3600)
+    cache = TieredCache(l1, l2, l1_ttl=60)
+
+    # 其他进程写入 L2 后，本进程首次读取回填 L1
+    l2.set("post:1", "v1", tags=["user:1"])
+    assert cache.get("post:1") == "v1"
+    assert l1.get("post:1") == "v1"
+    assert cache.get("post:1") == "v1"
+    stats = cache.get_stats()
+    assert (stats["l1_hits"], stats["l2_hits"]) == (1, 1)
+
+    # 回填到 L1 的条目不带标签，按 L2 的标签索引失效
+    assert cache.invalidate_tag("user:1") == 1
+    assert l1.get("post:1") is None
+    assert cache.get("post:1") is None
+
+
+def test_get_or_set_single_flight(backend):
+    calls = []
+    started = threading.Barrier(8)
+
+    def loader():
+        calls.append(1)
+        time.sleep(0.2)
+        return {"value": 42}
+
+    results = []
+
+    def worker():
+        started.wait()
+        results.append(backend.get_or_set("flight:1", loader, ttl=60))
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert results == [{"value": 42}] * 8
+    assert backend._flights == {}
+
+
+def test_get_or_set_waits_for_other_process(tmp_path):
+    """另一个实例持有加载锁时，等待其写入结果而不是重复加载"""
+    path = str(tmp_path / "cache.db")
+    loading, waiting = SQLiteCache(path=path), SQLiteCache(path=path)
+    token = loading.acquire_lock("report:1", ttl=5)
+
+    def finish():
+        time.sleep(0.2)
+        loading.set("report:1", "done")
+        loading.release_lock("report:1", token)
+
+    thread = threading.Thread(target=finish)
+    thread.start()
+    assert waiting.get_or_set("report:1", lambda: pytest.fail("loader should not run")) == "done"
+    thread.join()
+
+
+def test_cache_result_key_is_stable(tmp_path):
+    """cache_result 的键不依赖进程随机的 hash()，两个管理器对同样的参数得到同一个键"""
+    path = str(tmp_path / "cache.db")
+    first, second = CacheManager(SQLiteCache(path=path)), CacheManager(SQLiteCache(path=path))
+    calls = []
+
+    def compute(x, y=0, **options):
+        calls.append((x, y))
+        return x + y
+
+    cached_first = first.cache_result(key_prefix="calc:")(compute)
+    cached_second = second.cache_result(key_prefix="calc:")(compute)
+
+    assert cached_first(1, y=2, mode="a", flag=True) == 3
+    # 关键字参数顺序不同也命中
+    assert cached_second(1, flag=True, mode="a", y=2) == 3
+    assert calls == [(1, 2)]
+    assert CacheManager._args_digest((1,), {"y": 2}) == CacheManager._args_digest((1,), {"y": 2})
+    assert CacheManager._args_digest((1,), {"y": 2}) != CacheManager._args_digest((2,), {"y": 1})
@@ -0,0 +1,147 @@
+"""
+分片上传单元测试
+按偏移量续传、增量 SHA-256、进程重启/多进程交替写入时的哈希重建，以及过期会话清理
+"""
+
+import hashlib
+import io
+import json
+import os
+import time
+
+import pytest
+
+from sau_backend.chunked_upload import ChunkedUploadError, ChunkedUploadManager
+
+PAYLOAD = os.urandom(300 * 1024)
+DIGEST = hashlib.sha256(PAYLOAD).hexdigest()
+
+
+@pytest.fixture
+def upload_dir(tmp_path):
+    return tmp_path / "chunked"
+
+
+@pytest.fixture
+def manager(upload_dir):
+    return ChunkedUploadManager(upload_dir, chunk_size=100 * 1024)
+
+
+def _upload(manager, upload_id, start, end, user_id=1):
+    return manager.write_chunk(upload_id, user_id, start, io.BytesIO(PAYLOAD[start:end]))
+
+
+def test_upload_in_chunks(manager, tmp_path):
+    session = manager.init_upload(1, "video.mp4", len(PAYLOAD), sha256=DIGEST.upper())
+    upload_id = session["upload_id"]
+    for start in range(0, len(PAYLOAD), manager.chunk_size):
+        status = _upload(manager, upload_id, start, start + manager.chunk_size)
+    assert status["complete"]
+
+    result = manager.complete_upload(upload_id, 1, tmp_path / "out" / "video.mp4")
+    assert result["sha256"] == DIGEST
+    assert (tmp_path / "out" / "video.mp4").read_bytes() == PAYLOAD
+    # 会话文件全部清理
+    assert list(manager.upload_dir.iterdir()) == []
+
+
+def test_resume_reports_offset(manager):
+    upload_id = manager.init_upload(1, "video.mp4", len(PAYLOAD))["upload_id"]
+    _upload(manager, upload_id, 0, 1000)
+
+    with pytest.raises(ChunkedUploadError) as excinfo:
+        _upload(manager, upload_id, 5000, 6000)
+    assert (excinfo.value.status_code, excinfo.value.offset) == (409, 1000)
+    # 客户端按查询到的偏移量续传
+    assert manager.get_status(upload_id, 1)["offset"] == 1000
+
+
+def test_length_limits_chunk(manager):
+    upload_id = manager.init_upload(1, "video.mp4", len(PAYLOAD))["upload_id"]
+    status = manager.write_chunk(upload_id, 1, 0, io.BytesIO(PAYLOAD), length=4096)
+    assert status["offset"] == 4096
+
+
+def test_restart_rebuilds_hash(manager, upload_dir, tmp_path):
+    """进程重启后新的管理器从磁盘已确认的数据重建哈希"""
+    upload_id = manager.init_upload(1, "video.mp4", len(PAYLOAD), sha256=DIGEST)["upload_id"]
+    _upload(manager, upload_id, 0, 100 * 1024)
+
+    restarted = ChunkedUploadManager(upload_dir)
+    _upload(restarted, upload_id, 100 * 1024, len(PAYLOAD))
+    assert restarted.complete_upload(upload_id, 1, tmp_path / "video.mp4")["sha256"] == DIGEST
+
+
+def test_alternating_managers_keep_hash_consistent(upload_dir, tmp_path):
+    """两个 worker 进程交替处理同一会话的分片，最终哈希仍与文件内容一致"""
+    first, second = ChunkedUploadManager(upload_dir), ChunkedUploadManager(upload_dir)
+    upload_id = first.init_upload(1, "video.mp4", len(PAYLOAD), sha256=DIGEST)["upload_id"]
+    step = 50 * 1024
+    for index, start in enumerate(range(0, len(PAYLOAD), step)):
+        _upload((first, second)[index % 2], upload_id, start, start + step)
+    assert first.complete_upload(upload_id, 1, tmp_path / "video.mp4")["sha256"] == DIGEST
+
+
+def test_oversized_chunk_is_discarded(manager, tmp_path):
+    upload_id = manager.init_upload(1, "video.mp4", len(PAYLOAD), sha256=DIGEST)["upload_id"]
+    _upload(manager, upload_id, 0, 1000)
+
+    with pytest.raises(ChunkedUploadError) as excinfo:
+        manager.write_chunk(upload_id, 1, 1000, io.BytesIO(PAYLOAD[1000:] + b"extra"))
+    assert (excinfo.value.status_code, excinfo.value.offset) == (413, 1000)
+    assert manager.get_status(upload_id, 1)["offset"] == 1000
+
+    # 失败分片写入的数据不影响续传后的内容与哈希
+    _upload(manager, upload_id, 1000, len(PAYLOAD))
+    result = manager.complete_upload(upload_id, 1, tmp_path / "video.mp4")
+    assert result["sha256"] == DIGEST
+    assert (tmp_path / "video.mp4").read_bytes() == PAYLOAD
+
+
+def test_hash_mismatch_rejected(manager, tmp_path):
+    upload_id = manager.init_upload(1, "video.mp4", 4, sha256="0" * 64)["upload_id"]
+    manager.write_chunk(upload_id, 1, 0, io.BytesIO(b"data"))
+    with pytest.raises(ChunkedUploadError) as excinfo:
+        manager.complete_upload(upload_id, 1, tmp_path / "video.mp4")
+    assert excinfo.value.status_code == 422
+
+
+def test_incomplete_upload_cannot_complete(manager, tmp_path):
+    upload_id = manager.init_upload(1, "video.mp4", len(PAYLOAD))["upload_id"]
+    _upload(manager, upload_id, 0, 1000)
+    with pytest.raises(ChunkedUploadError) as excinfo:
+        manager.complete_upload(upload_id, 1, tmp_path / "video.mp4")
+    assert (excinfo.value.status_code, excinfo.value.offset) == (409, 1000)
+
+
+def test_access_checks(manager):
+    upload_id = manager.init_upload(1, "video.mp4", len(PAYLOAD))["upload_id"]
+    with pytest.raises(ChunkedUploadError) as excinfo:
+        manager.get_status(upload_id, 2)
+    assert excinfo.value.status_code == 403
+    for bad_id in ("missing", "../" + upload_id, ""):
+        with pytest.raises(ChunkedUploadError) as excinfo:
+            manager.get_status(bad_id, 1)
+        assert excinfo.value.status_code == 404
+
+
+def test_abort_removes_session(manager):
+    upload_id = manager.init_upload(1, "video.mp4", len(PAYLOAD))["upload_id"]
+    _upload(manager, upload_id, 0, 1000)
+    manager.abort_upload(upload_id, 1)
+    assert list(manager.upload_dir.iterdir()) == []
+    with pytest.raises(ChunkedUploadError):
+        manager.get_status(upload_id, 1)
+
+
+def test_cleanup_expired(manager):
+    stale = manager.init_upload(1, "old.mp4", len(PAYLOAD))["upload_id"]
+    fresh = manager.init_upload(1, "new.mp4", len(PAYLOAD))["upload_id"]
+    meta_path = manager.upload_dir / f"{stale}.json"
+    meta = json.loads(meta_path.read_text(encoding="utf-8"))
+    meta["updated_at"] = time.time() - 7200
+    meta_path.write_text(json.dumps(meta), encoding="utf-8")
+
+    assert manager.cleanup_expired(max_age=3600) == 1
+    assert not (manager.upload_dir / f"{stale}.part").exists()
+    assert manager.get_status(fresh, 1)["offset"] == 0
@@ -0,0 +1,93 @@
+"""
+Cookie 校验单元测试
+使用桩浏览器：校验结果缓存、cookie 列表格式的文件，以及校验不会关闭服务端共享的浏览器池
+"""
+
+import asyncio
+import json
+import sys
+from types import ModuleType
+
+import pytest
+
+pytest.importorskip("playwright.async_api")
+
+from sau_backend.utils import cookie_validator as cookie_validator_module
+from sau_backend.utils.browser_pool import BrowserPool
+from sau_backend.utils.cookie_validator import CookieValidator
+
+
+@pytest.fixture
+def pool(playwright, monkeypatch):
+    pool = BrowserPool(size=2)
+    monkeypatch.setattr(cookie_validator_module, "browser_pool", pool)
+    return pool
+
+
+@pytest.fixture
+def checker(monkeypatch):
+    """注册一个桩平台：cookie 中带 sessionid 即视为已登录"""
+    module = ModuleType("stub_checker")
+
+    async def check_cookie(page):
+        state = page.context.options["storage_state"]
+        if isinstance(state, str):
+            with open(state, encoding="utf-8") as f:
+                state = json.load(f)
+        return any(cookie["name"] == "sessionid" for cookie in state["cookies"])
+
+    module.check_cookie = check_cookie
+    monkeypatch.setitem(sys.modules, "stub_checker", module)
+    monkeypatch.setitem(cookie_validator_module.PLATFORM_CHECKERS, "stub", ("stub_checker", "chromium"))
+    return module
+
+
+def _write(path, data):
+    path.write_text(json.dumps(data), encoding="utf-8")
+    return str(path)
+
+
+def test_validate_and_cache(pool, checker, tmp_path):
+    valid = _write(tmp_path / "stub_a.json", {"cookies": [{"name": "sessionid"}], "origins": []})
+    # context.cookies() 导出的列表格式
+    expired = _write(tmp_path / "stub_b.json", [{"name": "other"}])
+    validator = CookieValidator(ttl=60)
+
+    async def scenario():
+        missing = str(tmp_path / "stub_c.json")
+        first = await validator.validate_many([("stub", valid), ("stub", expired), ("stub", missing)])
+        second = await validator.validate("stub", valid)
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert [result.valid for result in first] == [True, False, False]
+    assert first[2].error == "cookie 文件不存在"
+    assert second.valid and second.cached
+    assert validator.get_stats()["hits"] == 1
+
+
+def test_validation_keeps_shared_pool_alive(pool, checker, playwright, tmp_path):
+    """服务端校验时其他任务正在使用浏览器（如抖音上传），校验结束不关闭浏览器池"""
+    cookie_file = _write(tmp_path / "stub_a.json", {"cookies": [{"name": "sessionid"}], "origins": []})
+    validator = CookieValidator(ttl=60)
+
+    async def scenario():
+        held, release = asyncio.Event(), asyncio.Event()
+
+        async def upload():
+            async with pool.lease_context():
+                held.set()
+                await release.wait()
+
+        task = asyncio.create_task(upload())
+        await held.wait()
+        assert (await validator.validate("stub", cookie_file, force=True)).valid
+        # 完全命中缓存的校验同样不影响浏览器池
+        assert (await validator.validate("stub", cookie_file)).cached
+        assert not playwright.stopped
+        assert not any(browser.closed for browser in playwright.launched)
+        release.set()
+        await task
+        await pool.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,131 @@
+"""
+FFmpeg 流水线编译单元测试
+按输入与操作选择流复制或单次编码，不实际调用 ffmpeg/ffprobe
+"""
+
+import pytest
+
+from sau_backend.media import ffmpeg_ops
+
+
+def _info(**overrides):
+    info = {
+        "width": 1080, "height": 1920, "fps": 30.0, "has_audio": True,
+        "video_codec": "h264", "pix_fmt": "yuv420p",
+        "audio_codec": "aac", "audio_sample_rate": "44100", "audio_channels": 2,
+    }
+    info.update(overrides)
+    return info
+
+
+@pytest.fixture
+def probe(monkeypatch):
+    """按路径返回预设的视频信息与关键帧判定"""
+    infos = {}
+    keyframe = {"aligned": True}
+    monkeypatch.setattr(ffmpeg_ops, "get_video_info", lambda path: infos[path])
+    monkeypatch.setattr(ffmpeg_ops, "is_keyframe_aligned", lambda video, start: keyframe["aligned"])
+    return infos, keyframe
+
+
+def test_trim_on_keyframe_is_stream_copied(probe):
+    cmd, mode = ffmpeg_ops.compile_pipeline(
+        ["a.mp4"], [{"op": "trim", "start_time": 5, "duration": 10}], "out.mp4"
+    )
+    assert mode == "copy"
+    assert "-ss 5 -t 10 -i \"a.mp4\"" in cmd
+    assert "-c copy" in cmd and "-filter_complex" not in cmd
+
+
+def test_trim_off_keyframe_is_encoded(probe):
+    _, keyframe = probe
+    keyframe["aligned"] = False
+    cmd, mode = ffmpeg_ops.compile_pipeline(
+        ["a.mp4"], [{"op": "trim", "start_time": 5, "end_time": 20}], "out.mp4"
+    )
+    assert mode == "encode"
+    assert "-ss 5 -to 20 -i \"a.mp4\"" in cmd
+    assert "[0:v]format=yuv420p[vout]" in cmd
+
+
+def test_single_input_filters_in_one_encode(probe):
+    cmd, mode = ffmpeg_ops.compile_pipeline(["a.mp4"], [
+        {"op": "trim", "start_time": 5},
+        {"op": "resize", "size": "720x1280"},
+        {"op": "watermark", "text": "sau"},
+        {"op": "subtitle", "text": "hello"},
+    ], "out.mp4")
+    assert mode == "encode"
+    # 所有滤镜串在同一个滤镜图中，只编码一次
+    assert cmd.count("-filter_complex") == 1 and cmd.count("libx264") == 1
+    chain = cmd.split("[0:v]", 1)[1].split("[vout]", 1)[0]
+    assert chain.index("scale=720x1280") < chain.index("text='sau'") < chain.index("text='hello'")
+    assert chain.endswith("format=yuv420p")
+    assert "-map 0:a? " in cmd and "-c:a copy" in cmd
+
+
+def test_compatible_concat_uses_demuxer_copy(probe, tmp_path):
+    infos, _ = probe
+    infos.update({"a.mp4": _info(), "b.mp4": _info()})
+    with open(tmp_path / "list.txt", "w", encoding="utf-8") as list_file:
+        cmd, mode = ffmpeg_ops.compile_pipeline(["a.mp4", "b.mp4"], [], "out.mp4", list_file)
+    assert mode == "copy"
+    assert "-f concat -safe 0" in cmd and "-c copy" in cmd
+    assert (tmp_path / "list.txt").read_text(encoding="utf-8").count("file '") == 2
+
+
+@pytest.mark.parametrize("key, value", [("video_codec", "hevc"), ("width", 720), ("has_audio", False)])
+def test_incompatible_concat_is_encoded(probe, tmp_path, key, value):
+    infos, _ = probe
+    infos.update({"a.mp4": _info(), "b.mp4": _info(**{key: value})})
+    with open(tmp_path / "list.txt", "w", encoding="utf-8") as list_file:
+        cmd, mode = ffmpeg_ops.compile_pipeline(["a.mp4", "b.mp4"], [], "out.mp4", list_file)
+    assert mode == "encode"
+    assert "concat=n=2" in cmd
+    # 未指定 resize 时按第一个输入的尺寸对齐
+    assert "scale=1080:1920:force_original_aspect_ratio=decrease" in cmd
+    assert (tmp_path / "list.txt").read_text(encoding="utf-8") == ""
+
+
+def test_concat_with_operations_is_encoded(probe):
+    infos, _ = probe
+    infos.update({"a.mp4": _info(), "b.mp4": _info()})
+    cmd, mode = ffmpeg_ops.compile_pipeline(["a.mp4", "b.mp4"], [
+        {"op": "resize", "size": "720x1280"},
+        {"op": "trim", "start_time": "00:00:02", "duration": 8},
+        {"op": "watermark", "text": "sau"},
+    ], "out.mp4", None)
+    assert mode == "encode"
+    # resize 在拼接前对每个输入执行，截取与水印在拼接后执行
+    assert cmd.count("scale=720x1280") == 2
+    assert "[vc]trim=start=2.0:duration=8.0,setpts=PTS-STARTPTS,drawtext=" in cmd
+    assert "[ac]atrim=start=2.0:duration=8.0,asetpts=PTS-STARTPTS[aout]" in cmd
+    assert "-c:a aac" in cmd
+
+
+def test_concat_without_audio_drops_audio(probe):
+    infos, _ = probe
+    infos.update({"a.mp4": _info(has_audio=False), "b.mp4": _info()})
+    cmd, mode = ffmpeg_ops.compile_pipeline(["a.mp4", "b.mp4"], [{"op": "watermark", "text": "x"}],
+                                            "out.mp4")
+    assert mode == "encode"
+    assert "concat=n=2:v=1:a=0[vc]" in cmd and "-an" in cmd
+
+
+@pytest.mark.parametrize("inputs, operations", [
+    ([], [{"op": "resize", "size": "720x1280"}]),
+    (["a.mp4"], []),
+    (["a.mp4"], [{"op": "blur"}]),
+    (["a.mp4"], [{"op": "trim"}]),
+    (["a.mp4"], [{"op": "trim", "start_time": 1}, {"op": "trim", "start_time": 2}]),
+    (["a.mp4"], [{"op": "watermark"}]),
+])
+def test_validate_pipeline_rejects(inputs, operations):
+    with pytest.raises(ValueError):
+        ffmpeg_ops.validate_pipeline(inputs, operations)
+
+
+def test_parse_time():
+    assert ffmpeg_ops.parse_time(5) == 5.0
+    assert ffmpeg_ops.parse_time("01:02") == 62.0
+    assert ffmpeg_ops.parse_time("00:01:02.5") == 62.5
@@ -0,0 +1,117 @@
+"""
+内容寻址媒体存储单元测试
+相同内容去重为一个 blob 并通过硬链接引用、引用计数、释放与 gc 回收，以及 FFmpeg 派生结果复用
+"""
+
+import hashlib
+import io
+import os
+import time
+
+import pytest
+
+from sau_backend.utils.media_store import MediaStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return MediaStore(tmp_path / "store", tmp_path / "media_store.db")
+
+
+def _write(path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+    return path
+
+
+def _refcount(store, sha256):
+    with store._connect() as conn:
+        row = conn.execute("SELECT refcount FROM media_blobs WHERE sha256 = ?", (sha256,)).fetchone()
+    return None if row is None else row["refcount"]
+
+
+def test_same_content_shares_one_blob(store, tmp_path):
+    first = store.store_stream(io.BytesIO(b"video"), tmp_path / "uploads" / "a.mp4", owner=1, kind="video")
+    second = store.store_file(_write(tmp_path / "uploads" / "b.mp4", b"video"), owner=2)
+
+    assert first.sha256 == second.sha256
+    assert not first.deduplicated and second.deduplicated
+    assert first.linked and second.linked
+    blob = store.blob_path(first.sha256)
+    assert os.stat(first.path).st_ino == os.stat(second.path).st_ino == blob.stat().st_ino
+    assert (tmp_path / "uploads" / "b.mp4").read_bytes() == b"video"
+    assert _refcount(store, first.sha256) == 2
+
+    stats = store.get_stats()
+    assert (stats["blobs"], stats["refs"], stats["saved_bytes"]) == (1, 2, 5)
+
+
+def test_store_file_with_known_hash_and_overwrite(store, tmp_path):
+    dest = tmp_path / "uploads" / "a.mp4"
+    old = store.store_stream(io.BytesIO(b"old"), dest)
+    # 分片上传已增量计算哈希，写入时直接使用
+    digest = hashlib.sha256(b"new").hexdigest()
+    new = store.store_file(_write(tmp_path / "chunked.part", b"new"), dest, sha256=digest)
+
+    # 覆盖写入同一路径时解除原有引用
+    assert dest.read_bytes() == b"new"
+    assert _refcount(store, old.sha256) == 0
+    assert (new.sha256, _refcount(store, new.sha256)) == (digest, 1)
+    assert not (tmp_path / "chunked.part").exists()
+    assert store.digest(dest) == digest
+
+
+def test_release_and_gc(store, tmp_path):
+    first = store.store_stream(io.BytesIO(b"video"), tmp_path / "a.mp4")
+    store.store_stream(io.BytesIO(b"video"), tmp_path / "b.mp4")
+    blob = store.blob_path(first.sha256)
+
+    assert store.release(tmp_path / "a.mp4")
+    assert not (tmp_path / "a.mp4").exists()
+    assert _refcount(store, first.sha256) == 1
+    # 仍有引用的 blob 不回收
+    assert store.gc(grace_seconds=0)["removed_blobs"] == 0
+    assert blob.exists()
+
+    # 绕过存储直接删除的引用由 gc 识别为失效引用
+    os.unlink(tmp_path / "b.mp4")
+    time.sleep(0.01)
+    stats = store.gc(grace_seconds=0)
+    assert stats == {"stale_refs": 1, "removed_blobs": 1, "freed_bytes": 5}
+    assert not blob.exists()
+    assert store.get_stats()["blobs"] == 0
+
+
+def test_gc_keeps_recent_unreferenced_blob(store, tmp_path):
+    stored = store.store_stream(io.BytesIO(b"video"), tmp_path / "a.mp4")
+    store.release(tmp_path / "a.mp4")
+    # 保留时间内的无引用 blob 不回收，避免删除刚写入、尚未建立引用的内容
+    assert store.gc()["removed_blobs"] == 0
+    assert store.blob_path(stored.sha256).exists()
+
+
+def test_release_unmanaged_file(store, tmp_path):
+    path = _write(tmp_path / "plain.mp4", b"data")
+    assert not store.release(path)
+    assert not path.exists()
+
+
+def test_derived_result_reused(store, tmp_path):
+    source = store.store_stream(io.BytesIO(b"source"), tmp_path / "in.mp4")
+    key = MediaStore.derivation_key("transcode", {"crf": 23, "preset": "fast"}, [source.sha256])
+    assert key == MediaStore.derivation_key("transcode", {"preset": "fast", "crf": 23}, [source.sha256])
+    assert key != MediaStore.derivation_key("transcode", {"crf": 28, "preset": "fast"}, [source.sha256])
+    assert store.link_derived(key, tmp_path / "out1.mp4") is None
+
+    output = store.store_file(_write(tmp_path / "out1.mp4", b"output"), derivation_key=key)
+    reused = store.link_derived(key, tmp_path / "out2.mp4", kind="video")
+    assert reused.sha256 == output.sha256 and reused.deduplicated
+    assert (tmp_path / "out2.mp4").read_bytes() == b"output"
+    assert _refcount(store, output.sha256) == 2
+
+    # 派生结果的 blob 被回收后派生记录一并失效
+    store.release(tmp_path / "out1.mp4")
+    store.release(tmp_path / "out2.mp4")
+    time.sleep(0.01)
+    store.gc(grace_seconds=0)
+    assert store.link_derived(key, tmp_path / "out3.mp4") is None
@@ -0,0 +1,142 @@
+"""
+内存缓存单元测试
+分片 LRU 淘汰、命名空间上限、按标签/前缀失效，以及过期条目的惰性删除与周期清理
+"""
+
+import pytest
+
+from sauce_backend import cache as cache_module
+from sauce_backend.cache import MemoryCache
+
+
+class FakeClock:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(cache_module.time, "time", clock)
+    return clock
+
+
+def test_lru_eviction_keeps_recently_used():
+    cache = MemoryCache(max_size=3, shards=1)
+    for key in ("a", "b", "c"):
+        cache.set(key, key)
+    # 读取 a 后 b 成为最久未使用
+    assert cache.get("a") == "a"
+    cache.set("d", "d")
+
+    assert cache.get("b") is None
+    assert [cache.get(key) for key in ("a", "c", "d")] == ["a", "c", "d"]
+    assert cache.get_stats()["evictions"] == 1
+
+
+def test_overwrite_does_not_evict():
+    cache = MemoryCache(max_size=2, shards=1)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.set("a", 3)
+    assert len(cache) == 2
+    assert (cache.get("a"), cache.get("b")) == (3, 2)
+
+
+def test_sharded_capacity_is_bounded():
+    cache = MemoryCache(max_size=64, shards=8)
+    for i in range(1000):
+        cache.set(f"item:{i}", i)
+    assert len(cache) <= 64
+    assert cache.get("item:999") == 999
+
+
+def test_namespace_limit_evicts_within_namespace():
+    cache = MemoryCache(max_size=100, shards=1, namespace_limits={"ai_response": 2})
+    cache.set("user:1", "u")
+    for i in range(5):
+        cache.set(f"ai_response:{i}", i)
+
+    # 超出命名空间上限只淘汰该命名空间内最久未使用的条目
+    assert cache.get("user:1") == "u"
+    assert [cache.get(f"ai_response:{i}") for i in range(5)] == [None, None, None, 3, 4]
+    assert cache.get_stats()["namespaces"] == {"user": 1, "ai_response": 2}
+
+
+def test_invalidate_tag():
+    cache = MemoryCache(max_size=100, shards=4)
+    cache.set("video:1", 1, tags=["user:7"])
+    cache.set("video:2", 2, tags=["user:7", "hot"])
+    cache.set("video:3", 3, tags=["hot"])
+
+    assert cache.invalidate_tag("user:7") == 2
+    assert cache.get("video:3") == 3
+    # 标签索引随条目删除同步清理
+    assert cache.invalidate_tag("hot") == 1
+    assert all(not shard.tags for shard in cache._shards)
+
+
+def test_overwrite_replaces_tags():
+    cache = MemoryCache(max_size=100, shards=1)
+    cache.set("video:1", 1, tags=["old"])
+    cache.set("video:1", 2, tags=["new"])
+    assert cache.invalidate_tag("old") == 0
+    assert cache.invalidate_tag("new") == 1
+
+
+def test_invalidate_prefix():
+    cache = MemoryCache(max_size=100, shards=4)
+    cache.set("media_info:a", 1)
+    cache.set("media_info:b", 2)
+    cache.set("media:c", 3)
+    cache.set("plain", 4)
+
+    assert cache.invalidate_prefix("media_info:") == 2
+    assert cache.invalidate_prefix("pla") == 1
+    assert cache.get("media:c") == 3
+    assert cache.get_stats()["invalidations"] == 3
+
+
+def test_expired_entry_removed_on_read(clock):
+    cache = MemoryCache(max_size=10, shards=1, sweep_interval=3600)
+    cache.set("short:1", "x", ttl=5)
+    clock.now += 4
+    assert cache.get("short:1") == "x"
+    clock.now += 2
+    assert cache.get("short:1") is None
+    assert len(cache) == 0
+    assert cache.get_stats()["expirations"] == 1
+
+
+def test_sweep_removes_expired_and_ignores_stale_heap_entries(clock):
+    cache = MemoryCache(max_size=10, shards=1, sweep_interval=3600)
+    cache.set("a", 1, ttl=5)
+    cache.set("b", 2, ttl=5)
+    # 覆盖后堆中残留 a 的旧过期时间，不应删除新写入的值
+    cache.set("a", 3, ttl=100)
+
+    assert cache.sweep(clock.now + 10) == 1
+    assert cache.get("a") == 3
+    assert cache.get("b") is None
+
+
+def test_periodic_sweep_on_access(clock):
+    cache = MemoryCache(max_size=10, shards=1, sweep_interval=60)
+    cache.set("a", 1, ttl=5)
+    clock.now += 61
+    cache.get("other")
+    assert len(cache) == 0
+
+
+def test_stats_hit_rate():
+    cache = MemoryCache(max_size=10)
+    cache.set("a", 1)
+    cache.get("a")
+    cache.get("missing")
+    stats = cache.get_stats()
+    assert (stats["hits"], stats["misses"], stats["hit_rate"]) == (1, 1, 0.5)
+    cache.clear()
+    assert cache.get_stats()["size"] == 0
@@ -0,0 +1,118 @@
+"""
+指标注册表单元测试
+Prometheus 文本导出格式、按线程分片累加的汇总，以及已退出线程分片的合并
+"""
+
+import threading
+
+import pytest
+
+from sau_backend.utils import metrics
+from sau_backend.utils.metrics import MetricsRegistry
+
+
+@pytest.fixture
+def registry():
+    return MetricsRegistry()
+
+
+def test_counter_exposition(registry):
+    counter = registry.counter("sau_uploads", "Uploads by platform", ("platform",))
+    counter.labels(platform="douyin").inc()
+    counter.labels(platform="douyin").inc(2)
+    counter.labels(platform='we"ird\\').inc(0.5)
+
+    lines = counter.render()
+    assert lines[0] == "# HELP sau_uploads Uploads by platform"
+    assert lines[1] == "# TYPE sau_uploads counter"
+    assert 'sau_uploads_total{platform="douyin"} 3' in lines
+    # 标签值中的引号与反斜杠需要转义
+    assert 'sau_uploads_total{platform="we\\"ird\\\\"} 0.5' in lines
+
+
+def test_counter_rejects_negative_and_wrong_labels(registry):
+    counter = registry.counter("sau_events", "Events", ("kind",))
+    with pytest.raises(ValueError):
+        counter.labels(kind="a").inc(-1)
+    with pytest.raises(ValueError):
+        counter.labels(other="a")
+    with pytest.raises(ValueError):
+        counter.inc()
+
+
+def test_histogram_exposition(registry):
+    histogram = registry.histogram("sau_task_seconds", "Task duration", buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 3.0):
+        histogram.observe(value)
+
+    assert histogram.render()[1:] == [
+        "# TYPE sau_task_seconds histogram",
+        'sau_task_seconds_bucket{le="0.1"} 1',
+        'sau_task_seconds_bucket{le="1"} 3',
+        'sau_task_seconds_bucket{le="+Inf"} 4',
+        "sau_task_seconds_sum 4.05",
+        "sau_task_seconds_count 4",
+    ]
+
+
+def test_gauge_value_and_callback(registry):
+    gauge = registry.gauge("sau_queue_depth", "Queue depth")
+    gauge.inc(3)
+    gauge.dec()
+    assert gauge.render()[-1] == "sau_queue_depth 2"
+
+    labelled = registry.gauge("sau_pool_size", "Pool size", ("pool",))
+    labelled.set_function(lambda: {("browser",): 4, ("ffmpeg",): 1.5})
+    assert labelled.render()[2:] == ['sau_pool_size{pool="browser"} 4', 'sau_pool_size{pool="ffmpeg"} 1.5']
+
+    # 回调异常时不输出样本，也不影响其他指标
+    gauge.set_function(lambda: 1 / 0)
+    assert gauge.render()[2:] == []
+
+
+def test_registry_render_and_reregister(registry):
+    registry.counter("sau_b", "B").inc()
+    registry.gauge("sau_a", "A").set(1)
+    assert registry.counter("sau_b", "B") is registry.get("sau_b")
+    with pytest.raises(ValueError):
+        registry.gauge("sau_b", "B")
+
+    text = registry.render()
+    assert text.endswith("\n")
+    # 按指标名排序输出
+    assert text.index("# HELP sau_a") < text.index("# HELP sau_b")
+    assert "sau_b_total 1\n" in text
+
+
+def test_sharded_totals_across_threads(registry):
+    counter = registry.counter("sau_threads", "Threaded increments")
+    histogram = registry.histogram("sau_threads_seconds", "Threaded observations", buckets=(1.0,))
+
+    def worker():
+        for _ in range(100):
+            counter.inc()
+            histogram.observe(0.5)
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert counter.render()[-1] == "sau_threads_total 800"
+    assert "sau_threads_seconds_count 800" in histogram.render()
+    # 导出时已退出线程的分片并入公共部分
+    assert counter._shards == []
+
+
+def test_dead_shards_folded_on_append(registry):
+    counter = registry.counter("sau_short_lived", "Short-lived thread increments")
+
+    for _ in range(metrics.FOLD_EVERY * 2):
+        thread = threading.Thread(target=counter.inc)
+        thread.start()
+        thread.join()
+
+    # 不导出也不会无限累积已退出线程的分片
+    assert len(counter._shards) < metrics.FOLD_EVERY
+    assert counter.render()[-1] == f"sau_short_lived_total {metrics.FOLD_EVERY * 2}"
@@ -0,0 +1,206 @@
+"""
+发布队列单元测试
+SQLite 持久化队列：领取任务与租约、心跳续约、回收过期租约，视频提交后失败不再重试，
+以及查询接口不返回内部字段
+"""
+
+import asyncio
+import importlib
+import sqlite3
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("playwright.async_api")
+
+SAU_DIR = Path(__file__).resolve().parents[2] / "sau_backend"
+
+
+@pytest.fixture
+def queue_module(monkeypatch, tmp_path):
+    # 与应用启动时一致，platforms 等模块按 sau_backend 目录导入；模块级全局实例的数据库建在临时目录
+    monkeypatch.syspath_prepend(str(SAU_DIR))
+    monkeypatch.chdir(tmp_path)
+    return importlib.import_module("sau_backend.publish_queue")
+
+
+@pytest.fixture
+def queue(queue_module, monkeypatch, tmp_path):
+    queue = queue_module.PublishQueue(str(tmp_path / "queue.db"), platform_limits={},
+                                      max_attempts=2, lease_seconds=30)
+    queue.owner = "test-owner"
+    # 不在全局事件循环中启动工作池，由测试直接驱动
+    monkeypatch.setattr(queue, "start", lambda: None)
+    return queue
+
+
+def _submit(queue, tmp_path, platform="stub", accounts=1):
+    video = tmp_path / "video.mp4"
+    video.write_bytes(b"video")
+    targets = [SimpleNamespace(id=i + 1, platform=platform, account_name=f"账号{i + 1}")
+               for i in range(accounts)]
+    return queue.submit_video_job(1, targets, str(video), "标题", "描述", ["标签"])
+
+
+def _task_row(queue, task_id):
+    conn = sqlite3.connect(queue.db_path)
+    conn.row_factory = sqlite3.Row
+    try:
+        return conn.execute("SELECT * FROM publish_tasks WHERE id = ?", (task_id,)).fetchone()
+    finally:
+        conn.close()
+
+
+def _expire_lease(queue, task_id):
+    conn = sqlite3.connect(queue.db_path)
+    try:
+        conn.execute("UPDATE publish_tasks SET lease_expires_at = ? WHERE id = ?", (time.time() - 1, task_id))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def test_claim_takes_lease_and_heartbeat_renews(queue, tmp_path):
+    queue.register_executor("stub", None)
+    _submit(queue, tmp_path)
+
+    task = queue._claim_next({}, {})
+    assert task["attempts"] == 1 and task["tags"] == ["标签"]
+    row = _task_row(queue, task["id"])
+    assert (row["status"], row["owner"]) == ("running", "test-owner")
+    # 已领取的任务不会被再次领取
+    assert queue._claim_next({}, {}) is None
+
+    lease = row["lease_expires_at"]
+    time.sleep(0.01)
+    assert queue._renew_lease(task)
+    assert _task_row(queue, task["id"])["lease_expires_at"] > lease
+    # 租约被其他进程接管后不再续约
+    queue.owner = "other-owner"
+    assert not queue._renew_lease(task)
+
+
+def test_claim_respects_running_limits(queue, tmp_path):
+    queue.register_executor("stub", None)
+    queue.account_limit = 1
+    _submit(queue, tmp_path, accounts=2)
+
+    assert queue._claim_next({"stub": queue.platform_limit}, {}) is None
+    task = queue._claim_next({}, {1: 1})
+    assert task["account_id"] == 2
+
+
+def test_reaper_requeues_only_expired_leases(queue, tmp_path):
+    queue.register_executor("stub", None)
+    _submit(queue, tmp_path, accounts=3)
+    expired, live, submitted = (queue._claim_next({}, {}) for _ in range(3))
+    queue._mark_submitted(submitted)
+    _expire_lease(queue, expired["id"])
+    _expire_lease(queue, submitted["id"])
+
+    assert queue._recover_interrupted() == 2
+    assert _task_row(queue, expired["id"])["status"] == "queued"
+    assert _task_row(queue, expired["id"])["owner"] is None
+    assert _task_row(queue, live["id"])["status"] == "running"
+    # 视频已提交给平台的任务无法确认平台侧状态，标记失败而不重新排队
+    assert _task_row(queue, submitted["id"])["status"] == "failed"
+
+    events = queue.get_task_events(expired["id"])
+    assert [event["to_status"] for event in events] == ["queued", "running", "queued"]
+
+
+def test_failure_before_submit_is_retried(queue, tmp_path):
+    async def executor(task):
+        raise RuntimeError("网络错误")
+
+    queue.register_executor("stub", executor)
+    _submit(queue, tmp_path)
+    task = queue._claim_next({}, {})
+    asyncio.run(queue._execute(task))
+
+    row = _task_row(queue, task["id"])
+    assert row["status"] == "queued"
+    assert row["available_at"] > time.time()
+
+
+def test_no_retry_after_submit(queue, tmp_path):
+    async def executor(task):
+        task["on_submit"]()
+        raise RuntimeError("发布按钮点击后页面崩溃")
+
+    queue.register_executor("stub", executor)
+    job_id = _submit(queue, tmp_path)
+    task = queue._claim_next({}, {})
+    asyncio.run(queue._execute(task))
+
+    row = _task_row(queue, task["id"])
+    assert row["status"] == "failed"
+    assert row["submitted_at"] is not None
+    assert "可能已部分发布" in row["message"]
+    # 作业结束后清理临时视频文件
+    assert queue.get_job(job_id)["status"] == "failed"
+    assert not (tmp_path / "video.mp4").exists()
+
+
+def test_result_dropped_after_lease_lost(queue, tmp_path):
+    """执行期间租约被回收并由其他进程接管：不覆盖新所有者的状态"""
+    async def executor(task):
+        return {"success": True, "message": "ok"}
+
+    queue.register_executor("stub", executor)
+    _submit(queue, tmp_path)
+    task = queue._claim_next({}, {})
+    conn = sqlite3.connect(queue.db_path)
+    conn.execute("UPDATE publish_tasks SET owner = 'other-owner' WHERE id = ?", (task["id"],))
+    conn.commit()
+    conn.close()
+
+    asyncio.run(queue._execute(task))
+    row = _task_row(queue, task["id"])
+    assert (row["status"], row["owner"]) == ("running", "other-owner")
+
+
+def test_workers_publish_with_account_limit(queue, tmp_path):
+    queue.workers = 3
+    peak = {"active": 0, "max": 0}
+
+    async def executor(task):
+        peak["active"] += 1
+        peak["max"] = max(peak["max"], peak["active"])
+        await asyncio.sleep(0.02)
+        peak["active"] -= 1
+        return {"success": True, "message": "ok"}
+
+    queue.register_executor("stub", executor)
+    job_ids = [_submit(queue, tmp_path) for _ in range(3)]
+
+    async def scenario():
+        serve = asyncio.create_task(queue._serve())
+        for _ in range(500):
+            jobs = [await queue._run_db(queue.get_job, job_id) for job_id in job_ids]
+            if all(job["status"] == "completed" for job in jobs):
+                break
+            await asyncio.sleep(0.01)
+        queue._stopping = True
+        queue._wakeup.set()
+        await serve
+        return jobs
+
+    jobs = asyncio.run(scenario())
+    assert all(job["status"] == "completed" for job in jobs)
+    # 同一账号的任务串行执行
+    assert peak["max"] == 1
+    assert queue._running_accounts == {1: 0}
+
+
+def test_job_hides_internal_fields(queue, tmp_path):
+    job_id = _submit(queue, tmp_path, platform="kuaishou")
+    job = queue.get_job(job_id, user_id=1)
+    assert "video_path" not in job and "cleanup_file" not in job
+    assert job["tags"] == ["标签"]
+    task = job["tasks"][0]
+    assert task["status"] == "failed"
+    assert not {"owner", "lease_expires_at", "available_at"} & task.keys()
+    assert queue.get_job(job_id, user_id=2) is None
@@ -0,0 +1,185 @@
+"""
+限流器单元测试
+滑动窗口计数、令牌桶、规则解析与匹配，以及 Redis 存储（fakeredis 模拟）与内存存储结果一致
+"""
+
+import pytest
+
+from sau_backend.utils import rate_limiter as rl
+from sau_backend.utils.rate_limiter import (
+    SLIDING_WINDOW, TOKEN_BUCKET, MemoryRateLimitStore, RateLimiter, RateLimitRule, RedisRateLimitStore,
+    parse_rule,
+)
+
+
+class FakeClock:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rl.time, "monotonic", clock)
+    monkeypatch.setattr(rl.time, "time", clock)
+    return clock
+
+
+@pytest.fixture(params=["memory", "redis"])
+def store(request):
+    if request.param == "memory":
+        return MemoryRateLimitStore(shards=4)
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")
+    return RedisRateLimitStore(client=fakeredis.FakeRedis(), key_prefix="test:ratelimit:")
+
+
+def test_parse_rule():
+    assert parse_rule("100/60") == RateLimitRule(100, 60.0)
+    assert parse_rule("10/s") == RateLimitRule(10, 1.0)
+    assert parse_rule("30/min:token_bucket") == RateLimitRule(30, 60.0, TOKEN_BUCKET)
+    assert parse_rule("30/60:token_bucket:60") == RateLimitRule(30, 60.0, TOKEN_BUCKET, 60)
+    assert str(parse_rule("30/60:token_bucket:60")) == "30/60:token_bucket:60"
+    for spec in ("0/60", "10/0", "10/60:leaky"):
+        with pytest.raises(ValueError):
+            parse_rule(spec)
+
+
+def test_parse_rules_skips_invalid():
+    rules = rl._parse_rules("/api/auth/login=10/60, /api/ai=30/60:token_bucket,broken,/x=bad/60")
+    assert rules == {
+        "/api/auth/login": RateLimitRule(10, 60.0),
+        "/api/ai": RateLimitRule(30, 60.0, TOKEN_BUCKET),
+    }
+
+
+def test_sliding_window_weights_previous_window():
+    rule = RateLimitRule(10, 60)
+    state = None
+    for _ in range(10):
+        allowed, _, _, state = rl._sliding_window(state, rule, 60.0, 1)
+        assert allowed
+    allowed, remaining, retry_after, state = rl._sliding_window(state, rule, 61.0, 1)
+    assert not allowed and remaining == 0
+
+    # 下一窗口过半：上一窗口 10 次按 50% 计入，估算值 5，还能再放行 5 次
+    results = []
+    for _ in range(6):
+        allowed, _, _, state = rl._sliding_window(state, rule, 150.0, 1)
+        results.append(allowed)
+    assert results == [True] * 5 + [False]
+
+    # 间隔超过一个窗口后状态清零
+    allowed, remaining, _, _ = rl._sliding_window(state, rule, 300.0, 1)
+    assert allowed and remaining == 9
+
+
+def test_sliding_window_retry_after():
+    rule = RateLimitRule(10, 60)
+    state = [1, 0, 10]
+    # 当前窗口已满且没有上一窗口：等到窗口滚动
+    allowed, _, retry_after, _ = rl._sliding_window(state, rule, 90.0, 1)
+    assert not allowed and retry_after == pytest.approx(30.0)
+
+    # 上一窗口满、当前窗口过半：上一窗口权重衰减到放得下一次即可
+    allowed, _, retry_after, _ = rl._sliding_window([0, 0, 10], rule, 90.0, 1)
+    assert allowed
+    allowed, _, retry_after, _ = rl._sliding_window([1, 10, 5], rule, 90.0, 1)
+    assert not allowed and retry_after == pytest.approx(6.0)
+
+
+def test_token_bucket_refill_and_burst():
+    rule = RateLimitRule(10, 10, TOKEN_BUCKET, burst=5)
+    state = None
+    for expected_remaining in (4, 3, 2, 1, 0):
+        allowed, remaining, _, state = rl._token_bucket(state, rule, 100.0, 1)
+        assert allowed and remaining == expected_remaining
+    allowed, _, retry_after, state = rl._token_bucket(state, rule, 100.0, 1)
+    assert not allowed and retry_after == pytest.approx(1.0)
+
+    # 每秒补充 1 个令牌，最多积攒 burst 个
+    allowed, remaining, _, state = rl._token_bucket(state, rule, 102.5, 1)
+    assert allowed and remaining == 1
+    allowed, remaining, _, _ = rl._token_bucket(state, rule, 1000.0, 1)
+    assert allowed and remaining == 4
+
+
+@pytest.mark.parametrize("algorithm", [SLIDING_WINDOW, TOKEN_BUCKET])
+def test_store_limits_and_peek(store, clock, algorithm):
+    rule = RateLimitRule(3, 60, algorithm)
+    assert [store.apply("k", rule)[0] for _ in range(4)] == [True, True, True, False]
+    # 其他键独立计数
+    assert store.apply("other", rule)[0]
+
+    store.reset("k")
+    assert store.apply("k", rule, peek=True)[:2] == (True, 2)
+    # peek 不消耗配额
+    assert store.apply("k", rule, peek=True)[:2] == (True, 2)
+
+    clock.now += 120
+    assert store.apply("other", rule)[:2] == (True, 2)
+
+
+def test_memory_store_caps_keys(clock):
+    store = MemoryRateLimitStore(shards=1, max_keys=10, sweep_interval=1000)
+    rule = RateLimitRule(5, 60)
+    for i in range(50):
+        store.apply(f"ip:{i}", rule)
+    assert len(store) <= 10
+
+    # 过期的状态在清理时丢弃
+    clock.now += 1000
+    store.sweep_interval = 1
+    store.apply("fresh", rule)
+    assert len(store) == 1
+
+
+def test_limiter_route_and_user_rules(clock):
+    clock.now = 960.0
+    limiter = RateLimiter(
+        default_rule=RateLimitRule(5, 60),
+        route_rules={"/api": RateLimitRule(3, 60), "/api/auth/login": RateLimitRule(1, 60)},
+        user_default_rule=RateLimitRule(2, 60),
+    )
+    assert limiter.route_rule("/api/auth/login")[0] == "/api/auth/login"
+    assert limiter.route_rule("/api/videos")[0] == "/api"
+    assert limiter.route_rule("/health")[0] == "*"
+
+    assert limiter.check_ip("/api/auth/login", "1.2.3.4").allowed
+    denied = limiter.check_ip("/api/auth/login", "1.2.3.4")
+    assert not denied.allowed
+    assert denied.headers()["Retry-After"] == "60"
+    # 不同前缀的规则独立计数
+    result = limiter.check_ip("/api/videos", "1.2.3.4")
+    assert result.allowed and result.headers()["X-RateLimit-Remaining"] == "2"
+
+    limiter.set_user_rule(7, RateLimitRule(1, 60))
+    assert limiter.check_user("/api/videos", 7).allowed
+    assert not limiter.check_user("/api/videos", 7).allowed
+    assert limiter.check_user("/api/videos", 8).limit == 2
+    limiter.user_default_rule = None
+    assert limiter.check_user("/api/videos", 9) is None
+
+    stats = limiter.get_stats()
+    assert (stats["allowed"], stats["denied"]) == (4, 2)
+
+
+def test_limiter_disabled_and_backend_fallback(clock):
+    class BrokenStore:
+        name = "broken"
+
+        def apply(self, *args):
+            raise ConnectionError("redis down")
+
+    limiter = RateLimiter(store=BrokenStore())
+    rule = RateLimitRule(1, 60)
+    assert limiter.hit("k", rule).allowed
+    # 共享存储不可用时退化为本地限流，仍然生效
+    assert not limiter.hit("k", rule).allowed
+    assert limiter.get_stats()["backend_errors"] == 2
+
+    limiter.enabled = False
+    assert all(limiter.hit("k", rule).allowed for _ in range(3))
@@ -0,0 +1,145 @@
+"""
+SQLite 连接池单元测试
+每线程连接复用、写锁排队、提交/回滚释放写锁，以及未归还租用的回收
+"""
+
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from sau_backend.utils.sqlite_pool import SQLitePool
+
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = SQLitePool(tmp_path / "test.db", busy_timeout=5)
+    with pool.session() as conn:
+        conn.execute("CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT)")
+    yield pool
+    pool.close_all()
+
+
+def _count(pool) -> int:
+    with pool.session() as conn:
+        return conn.execute("SELECT COUNT(*) FROM items").fetchone()[0]
+
+
+def test_connection_reused_per_thread(pool):
+    first = pool.connection()
+    second = pool.connection()
+    assert first._conn is second._conn
+    first.close()
+    second.close()
+
+    other = []
+    thread = threading.Thread(target=lambda: other.append(pool.connection()._conn))
+    thread.start()
+    thread.join()
+    assert other[0] is not first._conn
+    assert pool.get_stats()["created"] == 2
+
+
+def test_tuned_pragmas(pool):
+    with pool.session() as conn:
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1
+
+
+def test_session_commits_and_releases_write_lock(pool):
+    with pool.session(row_factory=sqlite3.Row) as conn:
+        conn.execute("INSERT INTO items (name) VALUES (?)", ("a",))
+        assert pool._write_lock.locked()
+    assert not pool._write_lock.locked()
+
+    with pool.session(row_factory=sqlite3.Row) as conn:
+        assert conn.execute("SELECT name FROM items").fetchone()["name"] == "a"
+
+
+def test_session_rolls_back_on_error(pool):
+    with pytest.raises(RuntimeError):
+        with pool.session() as conn:
+            conn.execute("INSERT INTO items (name) VALUES (?)", ("a",))
+            raise RuntimeError("boom")
+    assert not pool._write_lock.locked()
+    assert _count(pool) == 0
+
+
+def test_close_rolls_back_uncommitted(pool):
+    conn = pool.connection()
+    conn.execute("INSERT INTO items (name) VALUES (?)", ("a",))
+    conn.close()
+    # 重复 close 不会多归还一次
+    conn.close()
+    assert not pool._write_lock.locked()
+    assert _count(pool) == 0
+    assert conn._conn._leases == 0
+
+
+def test_writers_queue_on_write_lock(pool):
+    """多个线程同时写入时在进程内排队，不出现 database is locked"""
+    errors = []
+
+    def writer(index):
+        try:
+            for i in range(20):
+                with pool.session() as conn:
+                    conn.execute("INSERT INTO items (name) VALUES (?)", (f"{index}-{i}",))
+        except sqlite3.Error as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=writer, args=(index,)) for index in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert _count(pool) == 160
+    assert pool.get_stats()["write_lock_timeouts"] == 0
+
+
+def test_abandoned_lease_released(pool):
+    """调用方异常退出未归还租用时，回滚遗留事务并释放写锁，其他线程可以立即写入"""
+
+    def leaky():
+        conn = pool.connection()
+        conn.execute("INSERT INTO items (name) VALUES (?)", ("lost",))
+        raise RuntimeError("caller failed before close()")
+
+    try:
+        leaky()
+    except RuntimeError:
+        # 异常对象（连同引用租用的栈帧）在 except 块结束时释放
+        pass
+    assert not pool._write_lock.locked()
+    assert pool.get_stats()["abandoned"] == 1
+
+    written = []
+
+    def other_writer():
+        started = time.perf_counter()
+        with pool.session() as conn:
+            conn.execute("INSERT INTO items (name) VALUES (?)", ("ok",))
+        written.append(time.perf_counter() - started)
+
+    thread = threading.Thread(target=other_writer)
+    thread.start()
+    thread.join()
+    assert written and written[0] < 1
+    with pool.session() as conn:
+        assert [row[0] for row in conn.execute("SELECT name FROM items")] == ["ok"]
+
+
+def test_nested_leases_share_transaction(pool):
+    outer = pool.connection()
+    outer.execute("INSERT INTO items (name) VALUES (?)", ("a",))
+    inner = pool.connection()
+    inner.close()
+    # 内层租用归还不影响外层未提交的事务
+    assert outer.in_transaction
+    outer.commit()
+    outer.close()
+    assert not pool._write_lock.locked()
+    assert _count(pool) == 1